@@ -0,0 +1,233 @@
+/**
+ * Query language of the KG-Registry, compiled to SQL in the browser
+ *
+ * The same language as kg_registry.query_language, for example:
+ *
+ *     category:KnowledgeGraph domain:"drug discovery" format:kgx "protein interaction" -stub
+ *
+ * Queries compile to the same statement as in Python, with the parameters
+ * written as literals so that it can be shown and edited as SQL. Keep the
+ * two in step.
+ */
+
+const TOKEN_PATTERN = '[\\pL\\pN]+';
+
+// Lists of values a resource r has for each field
+const QUERY_FIELDS = {
+    id: '[r.id]',
+    category: '[r.category]',
+    domain: 'r.domains',
+    status: '[r.activity_status]',
+    collection: 'r.collection',
+    license: '[r.license.id, r.license.label]',
+    format: '(SELECT list(DISTINCT p.product_format) FROM resource_products p WHERE p.resource_id = r.id)',
+    product_category: '(SELECT list(DISTINCT p.product_category) FROM resource_products p WHERE p.resource_id = r.id)',
+};
+
+const CLAUSE_PATTERN = /(-)?(?:([A-Za-z_]+):)?(?:"([^"]*)"|(\S+))/g;
+const BARE_WORD = /^[^\s":\-][^\s":]*$/;
+const HAS_TERM = /[\p{L}\p{N}]/u;
+
+const PHRASE_SQL = (p) => `(
+    contains(lower(r.name), ${p})
+    OR contains(lower(r.description), ${p})
+    OR contains(lower(array_to_string(r.domains, ' ')), ${p})
+    OR EXISTS (
+        SELECT 1 FROM resource_products p
+        WHERE p.resource_id = r.id
+            AND (contains(lower(p.product_name), ${p})
+                OR contains(lower(p.product_description), ${p}))
+    )
+)`;
+
+const TERMS_SQL = (p) => `r.id IN (
+    SELECT resource_id FROM search_terms
+    WHERE term IN (SELECT UNNEST(regexp_extract_all(lower(${p}), '${TOKEN_PATTERN}')))
+    GROUP BY doc_id, doc_type, resource_id
+    HAVING COUNT(DISTINCT term)
+        = len(list_distinct(regexp_extract_all(lower(${p}), '${TOKEN_PATTERN}')))
+)`;
+
+// BM25 score of each resource and product having every term of the query
+const HITS_SQL = (query) => `
+    WITH query_terms AS (
+        SELECT DISTINCT UNNEST(regexp_extract_all(lower(${query}), '${TOKEN_PATTERN}')) AS term
+    ),
+    docs AS (
+        SELECT doc_id, doc_type, resource_id, SUM(length) AS length
+        FROM search_docs
+        GROUP BY ALL
+    ),
+    collection AS (
+        SELECT COUNT(*) AS n, AVG(length) AS avg_length FROM docs
+    ),
+    matches AS (
+        SELECT term, doc_id, doc_type, resource_id, SUM(tf) AS tf
+        FROM search_terms JOIN query_terms USING (term)
+        GROUP BY ALL
+    ),
+    document_frequency AS (
+        SELECT term, COUNT(*) AS df FROM matches GROUP BY term
+    ),
+    hits AS (
+        SELECT d.doc_id, d.doc_type, d.resource_id,
+            SUM(
+                ln(1 + (c.n - f.df + 0.5) / (f.df + 0.5))
+                * m.tf * (1.2 + 1)
+                / (m.tf + 1.2 * (1 - 0.75 + 0.75 * d.length / c.avg_length))
+            ) AS score
+        FROM matches m
+        JOIN document_frequency f USING (term)
+        JOIN docs d USING (doc_id, doc_type, resource_id)
+        CROSS JOIN collection c
+        GROUP BY ALL
+        HAVING COUNT(*) = (SELECT COUNT(*) FROM query_terms)
+    )
+`;
+
+const compiled = new Map();
+
+/**
+ * Write a string, or a list of strings, as a SQL literal
+ */
+function literal(value) {
+    if (Array.isArray(value)) {
+        return `[${value.map(literal).join(', ')}]`;
+    }
+    return `'${String(value).replace(/'/g, "''")}'`;
+}
+
+/**
+ * Parse a query into its clauses
+ *
+ * @param {string} query - Query
+ * @returns {Array<Object>} - Clauses with value, field, negated and phrase
+ * @throws {Error} - If a field is unknown or has no value, or a quote is not closed
+ */
+function parseQuery(query) {
+    const clauses = [];
+    for (const [, minus, rawField, phrase, word] of query.matchAll(CLAUSE_PATTERN)) {
+        if (word !== undefined && word.startsWith('"')) {
+            throw new Error(`Unterminated quote in query: ${query}`);
+        }
+        if (rawField !== undefined) {
+            const field = rawField.toLowerCase();
+            if (!(field in QUERY_FIELDS)) {
+                throw new Error(`Unknown field: ${field}, expected one of ${Object.keys(QUERY_FIELDS).join(', ')}`);
+            }
+            const value = (phrase === undefined ? word : phrase).trim();
+            if (!value) {
+                throw new Error(`Missing value for field ${field}`);
+            }
+            clauses.push({ value, field, negated: Boolean(minus), phrase: false });
+        } else if (word !== undefined && word.endsWith(':') && word.slice(0, -1).toLowerCase() in QUERY_FIELDS) {
+            throw new Error(`Missing value for field ${word.slice(0, -1).toLowerCase()}`);
+        } else if (HAS_TERM.test(phrase === undefined ? word : phrase)) {
+            clauses.push({
+                value: word || phrase.trim(),
+                field: null,
+                negated: Boolean(minus),
+                phrase: phrase !== undefined,
+            });
+        }
+    }
+    return clauses;
+}
+
+function formatClause(clause) {
+    let value = clause.value.replace(/"/g, '');
+    if (clause.phrase || !BARE_WORD.test(value)) {
+        value = `"${value}"`;
+    }
+    return (clause.negated ? '-' : '') + (clause.field ? `${clause.field}:` : '') + value;
+}
+
+/**
+ * Get the normalized form of a query, the same for queries matching the same resources
+ *
+ * @param {string} query - Query
+ * @returns {string} - Its clauses, lowercased, without duplicates and in a fixed order
+ */
+function normalizeQuery(query) {
+    const clauses = parseQuery(query).map(clause => ({ ...clause, value: clause.value.toLowerCase() }));
+    const key = clause => [clause.field || '', clause.negated ? 1 : 0, clause.phrase ? 1 : 0, clause.value];
+    clauses.sort((a, b) => {
+        const [x, y] = [key(a), key(b)];
+        for (let i = 0; i < x.length; i++) {
+            if (x[i] < y[i]) return -1;
+            if (x[i] > y[i]) return 1;
+        }
+        return 0;
+    });
+    return [...new Set(clauses.map(formatClause))].join(' ');
+}
+
+/**
+ * Compile a query into one SQL statement on the registry tables
+ *
+ * @param {string} query - Query
+ * @param {boolean} textIndex - Whether the search tables can be used for words;
+ *     without them, words are matched as substrings and results sorted by name
+ * @returns {string} - SQL statement, cached by normalized query
+ */
+function compileQuery(query, textIndex = true) {
+    const normalized = normalizeQuery(query);
+    const cacheKey = `${textIndex} ${normalized}`;
+    if (compiled.has(cacheKey)) {
+        return compiled.get(cacheKey);
+    }
+
+    const clauses = parseQuery(normalized);
+    const conditions = [];
+    const values = new Map();
+    for (const clause of clauses) {
+        if (clause.field !== null) {
+            const key = `${clause.field} ${clause.negated}`;
+            if (!values.has(key)) {
+                values.set(key, { field: clause.field, negated: clause.negated, alternatives: [] });
+            }
+            values.get(key).alternatives.push(clause.value);
+        }
+    }
+    for (const { field, negated, alternatives } of values.values()) {
+        const condition = `list_has_any([lower(v) FOR v IN ${QUERY_FIELDS[field]}], ${literal(alternatives)})`;
+        conditions.push(negated ? `NOT COALESCE(${condition}, FALSE)` : condition);
+    }
+
+    const ranked = [];
+    for (const clause of clauses) {
+        if (clause.field !== null) {
+            continue;
+        }
+        let condition;
+        if (clause.phrase || !textIndex) {
+            condition = PHRASE_SQL(literal(clause.value));
+        } else if (clause.negated) {
+            condition = TERMS_SQL(literal(clause.value));
+        } else {
+            ranked.push(clause.value);
+            continue;
+        }
+        if (clause.phrase && textIndex && !clause.negated) {
+            ranked.push(clause.value);
+        }
+        conditions.push(clause.negated ? `NOT COALESCE(${condition}, FALSE)` : condition);
+    }
+
+    let select = 'SELECT r.* FROM resources r';
+    let order = 'r.name, r.id';
+    if (ranked.length) {
+        select = `${HITS_SQL(literal(ranked.join(' ')))} ${select} JOIN (SELECT resource_id, MAX(score) AS score FROM hits GROUP BY resource_id) h ON r.id = h.resource_id`;
+        order = `h.score DESC, ${order}`;
+    }
+    const sql = `${select} WHERE ${conditions.join(' AND ') || 'TRUE'} ORDER BY ${order}`;
+    compiled.set(cacheKey, sql);
+    return sql;
+}
+
+export {
+    QUERY_FIELDS,
+    parseQuery,
+    normalizeQuery,
+    compileQuery
+};
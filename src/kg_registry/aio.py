@@ -0,0 +1,362 @@
+"""Asyncio access to the registry backends.
+
+The methods of :class:`~kg_registry.duckdb_backend.DuckDBBackend` and
+:class:`~kg_registry.parquet_backend.DuckDBParquetQuerier` block until DuckDB
+returns, which stalls an event loop. :class:`AsyncRegistry` runs them on a
+thread pool of its own instead, bounded by the backend's cursor pool: each
+worker reads on a cursor of its own, so no more reads run at once than the
+pool has cursors and none waits for one.
+
+Calls take a ``timeout``, and a call that times out or whose task is cancelled
+interrupts its query, so the worker is free for the next one. Identical calls
+made while one is running share its execution, and its result, instead of
+running again; as with the result cache, shared results must not be modified.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Union
+
+import duckdb
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.query_language import Clause
+
+__all__ = [
+    "STREAMED_OUTPUTS",
+    "AsyncRegistry",
+]
+
+#: Result modes that are read from after the call returns, which would then
+#: block the event loop, and are not available through :class:`AsyncRegistry`
+STREAMED_OUTPUTS = ("iter", "batches", "relation")
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn the arguments of a call into a hashable key, with their containers."""
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((name, _freeze(item)) for name, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, frozenset(_freeze(item) for item in value))
+    return value
+
+
+class _Execution:
+    """One run of a backend method, shared by the identical calls awaiting it."""
+
+    def __init__(self):
+        """Initialize the execution; :meth:`AsyncRegistry._start` sets its future."""
+        self.future: Optional[asyncio.Future] = None
+        #: Number of calls awaiting the result
+        self.waiters = 0
+        self._lock = threading.Lock()
+        self._cursor: Optional[duckdb.DuckDBPyConnection] = None
+        self._cancelled = False
+
+    def run(self, checkout: Callable, method: Callable, args: tuple, kwargs: Dict[str, Any]):
+        """Run the method on a worker, with the cursor it reads on recorded for :meth:`cancel`."""
+        with checkout() as cursor:
+            with self._lock:
+                if self._cancelled:
+                    return None
+                self._cursor = cursor
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._cursor = None
+
+    def cancel(self):
+        """Cancel the run, interrupting its query if it has started."""
+        with self._lock:
+            self._cancelled = True
+            if self._cursor is not None:
+                self._cursor.interrupt()
+        self.future.cancel()
+
+
+class AsyncRegistry:
+    """Awaitable versions of the query, search, statistics, lineage and facet methods.
+
+    Wraps a backend that is then only read through this wrapper; reads from
+    other threads would take cursors the workers count on.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        close_backend: bool = False,
+    ):
+        """Initialize the wrapper and start its workers.
+
+        Args:
+            backend: :class:`~kg_registry.duckdb_backend.DuckDBBackend` or
+                :class:`~kg_registry.parquet_backend.DuckDBParquetQuerier`,
+                with a ``pool_size`` to run more than one read at a time
+            workers: Number of reads running at the same time (default: the
+                size of the backend's cursor pool, or 1 without one)
+            timeout: Default number of seconds a call may take, or None for no limit
+            close_backend: Close the backend with the wrapper
+
+        Raises:
+            ValueError: If there are more workers than cursors
+        """
+        pool = getattr(backend, "pool", None)
+        if pool is None:
+            if workers not in (None, 1):
+                raise ValueError("A backend without a pool_size can only have one worker")
+            workers = 1
+            self._checkout: Callable = partial(nullcontext, backend.conn)
+        else:
+            workers = workers or pool.size
+            if workers > pool.size:
+                raise ValueError(f"{workers} workers need a pool_size of at least {workers}")
+            self._checkout = pool.checkout
+        self.backend = backend
+        self.workers = workers
+        self.timeout = timeout
+        self._close_backend = close_backend
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="kg-registry")
+        self._inflight: Dict[Hashable, _Execution] = {}
+
+    @classmethod
+    def open(
+        cls,
+        db_path: str,
+        workers: int = 4,
+        timeout: Optional[float] = None,
+        read_only: bool = True,
+        **options,
+    ) -> "AsyncRegistry":
+        """Open a database file with a backend of the right pool size.
+
+        Args:
+            db_path: Path to DuckDB database file
+            workers: Number of reads running at the same time
+            timeout: Default number of seconds a call may take, or None for no limit
+            read_only: Open the file read-only, see
+                :class:`~kg_registry.duckdb_backend.DuckDBBackend`
+            **options: Other arguments of the backend, such as ``cache_size``
+
+        Returns:
+            Wrapper that closes the backend when it is closed
+        """
+        backend = DuckDBBackend(db_path, pool_size=workers, read_only=read_only, **options)
+        return cls(backend, workers, timeout, close_backend=True)
+
+    async def call(self, name: str, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a method of the backend on a worker.
+
+        If an identical call is running, its result is awaited instead.
+
+        Args:
+            name: Name of the method
+            *args: Positional arguments of the method
+            timeout: Seconds the call may take (default: the wrapper's timeout)
+            **kwargs: Keyword arguments of the method
+
+        Returns:
+            What the method returns
+
+        Raises:
+            asyncio.TimeoutError: If the call took longer than the timeout; its
+                query is interrupted unless other calls are awaiting it
+            ValueError: If one of :data:`STREAMED_OUTPUTS` is requested
+        """
+        if kwargs.get("output") in STREAMED_OUTPUTS:
+            raise ValueError(
+                f"{kwargs['output']!r} results are read after the call returns; "
+                "use the backend from a thread instead"
+            )
+        method = getattr(self.backend, name)
+        key: Optional[Hashable] = (name, _freeze(args), _freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        execution = self._inflight.get(key) if key is not None else None
+        if execution is None:
+            execution = self._start(key, method, args, kwargs)
+        execution.waiters += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(execution.future), self.timeout if timeout is None else timeout
+            )
+        finally:
+            execution.waiters -= 1
+            if not execution.waiters and not execution.future.done():
+                self._cancel(key, execution)
+
+    def _start(
+        self, key: Optional[Hashable], method: Callable, args: tuple, kwargs: Dict[str, Any]
+    ) -> _Execution:
+        """Submit a method to the workers."""
+        execution = _Execution()
+        execution.future = asyncio.get_running_loop().run_in_executor(
+            self._executor, execution.run, self._checkout, method, args, kwargs
+        )
+        execution.future.add_done_callback(partial(self._finished, key, execution))
+        if key is not None:
+            self._inflight[key] = execution
+        return execution
+
+    def _finished(self, key: Optional[Hashable], execution: _Execution, future: asyncio.Future):
+        """Stop sharing a finished execution."""
+        if key is not None and self._inflight.get(key) is execution:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the error as retrieved, in case every caller has gone
+            future.exception()
+
+    def _cancel(self, key: Optional[Hashable], execution: _Execution):
+        """Cancel an execution nobody awaits any more."""
+        if key is not None and self._inflight.get(key) is execution:
+            del self._inflight[key]
+        execution.cancel()
+
+    async def query_resources(
+        self,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        timeout: Optional[float] = None,
+        **filters,
+    ) -> Any:
+        """Await :meth:`DuckDBBackend.query_resources`."""
+        return await self.call(
+            "query_resources", columns=columns, output=output, timeout=timeout, **filters
+        )
+
+    async def query_products(
+        self,
+        resource_id: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Await :meth:`DuckDBBackend.query_products`."""
+        return await self.call(
+            "query_products", resource_id, columns=columns, output=output, timeout=timeout
+        )
+
+    async def query_by_domain(
+        self, domain: str, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.query_by_domain`."""
+        return await self.call("query_by_domain", domain, timeout=timeout)
+
+    async def query_active_resources(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.query_active_resources`."""
+        return await self.call("query_active_resources", timeout=timeout)
+
+    async def search_resources(
+        self,
+        search_term: str,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Await :meth:`DuckDBBackend.search_resources`."""
+        return await self.call(
+            "search_resources", search_term, columns=columns, output=output, timeout=timeout
+        )
+
+    async def find_resources(
+        self,
+        query: Union[str, Sequence[Clause]],
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Await :meth:`DuckDBBackend.find_resources`."""
+        return await self.call(
+            "find_resources", query, columns=columns, output=output, timeout=timeout
+        )
+
+    async def search(
+        self,
+        query: str,
+        limit: Optional[int] = 20,
+        fields: Optional[List[str]] = None,
+        doc_types: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.search`."""
+        return await self.call("search", query, limit, fields, doc_types, timeout=timeout)
+
+    async def facet_search(
+        self,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        facets: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        limit: Optional[int] = 20,
+        offset: int = 0,
+        columns: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Await :meth:`DuckDBBackend.facet_search`."""
+        return await self.call(
+            "facet_search", filters, facets, query, limit, offset, columns, timeout=timeout
+        )
+
+    async def fuzzy_lookup(
+        self, text: str, k: int = 10, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.fuzzy_lookup`."""
+        return await self.call("fuzzy_lookup", text, k, timeout=timeout)
+
+    async def get_record(
+        self, resource_id: str, timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.get_record`."""
+        return await self.call("get_record", resource_id, timeout=timeout)
+
+    async def upstream(
+        self, entity_id: str, max_depth: Optional[int] = None, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.upstream`."""
+        return await self.call("upstream", entity_id, max_depth, timeout=timeout)
+
+    async def downstream(
+        self, entity_id: str, max_depth: Optional[int] = None, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Await :meth:`DuckDBBackend.downstream`."""
+        return await self.call("downstream", entity_id, max_depth, timeout=timeout)
+
+    async def get_resource_stats(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Await :meth:`DuckDBBackend.get_resource_stats`."""
+        return await self.call("get_resource_stats", timeout=timeout)
+
+    async def get_registry_stats(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Await :meth:`DuckDBBackend.get_registry_stats`."""
+        return await self.call("get_registry_stats", timeout=timeout)
+
+    async def get_changes(
+        self, since: Optional[int] = None, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Await :meth:`DuckDBBackend.get_changes`."""
+        return await self.call("get_changes", since, timeout=timeout)
+
+    async def aclose(self):
+        """Cancel the running calls, stop the workers and, if owned, close the backend."""
+        for key, execution in list(self._inflight.items()):
+            self._cancel(key, execution)
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(self._executor.shutdown, wait=True, cancel_futures=True)
+        )
+        if self._close_backend:
+            self.backend.close()
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.aclose()
@@ -0,0 +1,251 @@
+"""Caches used by KG-Registry: remote service responses on disk, and query results in memory."""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+__all__ = [
+    "DiskCache",
+    "CacheStats",
+    "ResultCache",
+    "estimate_size",
+]
+
+
+class DiskCache:
+    """A small JSON-file cache keyed by arbitrary strings.
+
+    Each entry is stored in its own file, named after the SHA-256 of its key, so
+    concurrent writers never contend on a single index file. Entries are written
+    atomically (write to a temporary file, then rename) so an interrupted run
+    never leaves a truncated entry behind.
+    """
+
+    def __init__(self, directory: Union[str, Path], ttl: Optional[float] = None):
+        """Initialize the cache.
+
+        Args:
+            directory: Directory to store cache entries in. Created if missing.
+            ttl: Default time-to-live in seconds. If None, entries never expire.
+        """
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        """Get the path of the file holding the entry for a key."""
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def get_entry(self, key: str) -> Optional[dict]:
+        """Get the full stored entry for a key, regardless of its age.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Dictionary with ``key``, ``stored_at`` and ``value``, or None if absent
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        return entry
+
+    def get(self, key: str, default: Any = None, ttl: Optional[float] = None) -> Any:
+        """Get a cached value if present and not expired.
+
+        Args:
+            key: Cache key
+            default: Value to return on a miss
+            ttl: Override the default time-to-live for this lookup
+
+        Returns:
+            The cached value, or ``default``
+        """
+        entry = self.get_entry(key)
+        if entry is None:
+            return default
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and time.time() - entry["stored_at"] > ttl:
+            return default
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value under a key.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+        """
+        path = self._path(key)
+        entry = {"key": key, "stored_at": time.time(), "value": value}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def delete(self, key: str) -> None:
+        """Remove an entry if present.
+
+        Args:
+            key: Cache key
+        """
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether a non-expired entry exists for a key."""
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+
+@dataclass
+class CacheStats:
+    """Counters of a :class:`ResultCache`."""
+
+    #: Lookups answered from the cache
+    hits: int = 0
+    #: Lookups that ran the query
+    misses: int = 0
+    #: Results dropped to stay within the size limits
+    evictions: int = 0
+    #: Times the cache was emptied because the data generation changed
+    invalidations: int = 0
+    #: Number of cached results
+    entries: int = 0
+    #: Estimated size of the cached results, in bytes
+    size: int = 0
+
+
+def estimate_size(value: Any) -> int:
+    """Estimate the memory used by a query result.
+
+    Args:
+        value: Result made of lists, tuples, dicts and scalars
+
+    Returns:
+        Approximate size in bytes, including nested values
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """A least recently used cache of query results, bounded by entries and/or bytes.
+
+    Results are cached along with the generation of the data they were computed
+    from (see :func:`kg_registry.ingest.current_generation`). The whole cache is
+    dropped as soon as a lookup is made at another generation, so results from
+    before a sync are never served after it.
+
+    Cached results are returned as they are, not copied, so every caller gets
+    the same objects and must not modify them.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 128, max_bytes: Optional[int] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results. If None, the number is not limited.
+            max_bytes: Maximum estimated size of the results. If None, the size is not limited.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._generation: Optional[int] = None
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: int, compute: Callable[[], Any]) -> Any:
+        """Get a result, computing and caching it on a miss.
+
+        Args:
+            key: Normalized method name and arguments
+            generation: Current generation of the data
+            compute: Function running the query
+
+        Returns:
+            The cached or computed result
+        """
+        with self._lock:
+            if generation != self._generation:
+                if self._results:
+                    self._stats.invalidations += 1
+                self._clear()
+                self._generation = generation
+            if key in self._results:
+                self._stats.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self._stats.misses += 1
+
+        result = compute()
+        size = estimate_size(result)
+        fits = self.max_bytes is None or size <= self.max_bytes
+        with self._lock:
+            # Unless a lookup at a newer generation cleared the cache meanwhile
+            if fits and generation == self._generation:
+                self._store(key, result, size)
+        return result
+
+    def _store(self, key: Hashable, result: Any, size: int) -> None:
+        """Add a result, evicting the least recently used ones beyond the limits."""
+        if key in self._results:
+            self._stats.size -= self._sizes.pop(key)
+            del self._results[key]
+        self._results[key] = result
+        self._sizes[key] = size
+        self._stats.size += size
+        while (self.max_entries is not None and len(self._results) > self.max_entries) or (
+            self.max_bytes is not None and self._stats.size > self.max_bytes
+        ):
+            oldest, _ = self._results.popitem(last=False)
+            self._stats.size -= self._sizes.pop(oldest)
+            self._stats.evictions += 1
+        self._stats.entries = len(self._results)
+
+    def _clear(self) -> None:
+        """Drop every result."""
+        self._results.clear()
+        self._sizes.clear()
+        self._stats.entries = 0
+        self._stats.size = 0
+
+    def clear(self) -> None:
+        """Drop every cached result, keeping the counters."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> CacheStats:
+        """Get a snapshot of the counters.
+
+        Returns:
+            Hits, misses, evictions, invalidations and current size
+        """
+        with self._lock:
+            return replace(self._stats)
@@ -0,0 +1,209 @@
+"""Changelog of the registry: what each sync added, changed and removed.
+
+Every sync that changes the registry tables records, in its transaction, one
+row in ``changes`` per resource and per product it added, changed or removed,
+with the generation it produced. Changed rows list the top-level fields whose
+values differ, so consumers can tell a renamed resource from a new product
+format without diffing the registry themselves.
+
+The sync already compares the content hash of every resource with the stored
+one, so only the records of the resources whose hash differs are read back
+and compared field by field; unchanged resources cost nothing, and a sync that
+only changes the storage profile records no changes. :func:`export_changes`
+writes the changes since a generation to ``registry/changes.json`` for
+downstream builds.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import duckdb
+
+from kg_registry.storage import read_records
+
+__all__ = [
+    "CHANGES_SCHEMAS",
+    "changed_fields",
+    "diff_resources",
+    "read_changes",
+    "export_changes",
+]
+
+#: Column definitions of the changelog table created with the registry tables
+CHANGES_SCHEMAS: Dict[str, str] = {
+    "changes": """
+        generation BIGINT,
+        entity_type VARCHAR,
+        entity_id VARCHAR,
+        resource_id VARCHAR,
+        change_type VARCHAR,
+        fields VARCHAR[]
+    """,
+}
+
+_MISSING = object()
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """List the top-level fields whose values differ between two records.
+
+    A field set to null and a missing field differ.
+
+    Args:
+        old: Earlier record
+        new: Later record
+
+    Returns:
+        Names of the fields added, removed or changed, sorted
+    """
+    return sorted(
+        name
+        for name in old.keys() | new.keys()
+        if old.get(name, _MISSING) != new.get(name, _MISSING)
+    )
+
+
+def _products(record: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Index the products of a record by ID; a repeated ID keeps the last one."""
+    return {
+        str(product["id"]): product
+        for product in record.get("products") or []
+        if isinstance(product, dict) and product.get("id")
+    }
+
+
+def diff_resources(
+    conn: duckdb.DuckDBPyConnection,
+    resources: Dict[str, Dict[str, Any]],
+    added: List[str],
+    changed: List[str],
+    removed: List[str],
+) -> Dict[str, List[Any]]:
+    """Work out the change rows of a sync, before it writes.
+
+    Only the stored records of ``changed`` are read, and resources whose
+    records turn out to be equal are left out.
+
+    Args:
+        conn: DuckDB connection with the registry tables, as before the sync
+        resources: New records by resource ID
+        added: IDs of the resources that are not in the tables
+        changed: IDs of the resources whose content hash differs
+        removed: IDs of the resources that are no longer in the source
+
+    Returns:
+        Column buffers of ``changes``, without the generation, for
+        :func:`kg_registry.ingest.insert_columns`
+    """
+    rows: Dict[str, List[Any]] = {
+        "entity_type": [],
+        "entity_id": [],
+        "resource_id": [],
+        "change_type": [],
+        "fields": [],
+    }
+
+    def add(entity_type, entity_id, resource_id, change_type, fields=None):
+        for name, value in zip(rows, (entity_type, entity_id, resource_id, change_type, fields)):
+            rows[name].append(value)
+
+    for resource_id in added:
+        add("resource", resource_id, resource_id, "added")
+        for product_id in _products(resources[resource_id]):
+            add("product", product_id, resource_id, "added")
+
+    old_records = read_records(conn, changed) if changed else {}
+    for resource_id in changed:
+        # Compare the records as they are stored, with dates as strings
+        new = json.loads(json.dumps(resources[resource_id], default=str))
+        old = old_records.get(resource_id, {})
+        fields = changed_fields(old, new)
+        if not fields:
+            continue
+        add("resource", resource_id, resource_id, "changed", fields)
+        if "products" not in fields:
+            continue
+        old_products, new_products = _products(old), _products(new)
+        for product_id, product in new_products.items():
+            if product_id not in old_products:
+                add("product", product_id, resource_id, "added")
+            elif product != old_products[product_id]:
+                fields = changed_fields(old_products[product_id], product)
+                add("product", product_id, resource_id, "changed", fields)
+        for product_id in old_products:
+            if product_id not in new_products:
+                add("product", product_id, resource_id, "removed")
+
+    if removed:
+        products: Dict[str, List[str]] = {}
+        for resource_id, product_id in conn.execute(
+            "SELECT resource_id, product_id FROM resource_products "
+            "WHERE resource_id IN (SELECT UNNEST($1)) ORDER BY resource_id, product_id",
+            [removed],
+        ).fetchall():
+            products.setdefault(resource_id, []).append(product_id)
+        for resource_id in removed:
+            add("resource", resource_id, resource_id, "removed")
+            for product_id in products.get(resource_id, []):
+                add("product", product_id, resource_id, "removed")
+    return rows
+
+
+def read_changes(conn: duckdb.DuckDBPyConnection, since: Optional[int] = None) -> Dict[str, Any]:
+    """Read the changes recorded after a generation.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        since: Generation to list the changes after (default: the one before
+            the current, so the changes of the last sync)
+
+    Returns:
+        Dictionary with the current ``generation`` and ``synced_at`` time of
+        the data, the ``since`` generation, and the ``changes``, each with its
+        ``generation``, ``entity_type`` (``resource`` or ``product``),
+        ``entity_id``, ``resource_id``, ``change_type`` (``added``,
+        ``changed`` or ``removed``) and, for changed entities, the top-level
+        ``fields`` that changed
+    """
+    generation, synced_at = conn.execute(
+        "SELECT generation, synced_at FROM registry_meta"
+    ).fetchone()
+    if since is None:
+        since = max(generation - 1, 0)
+    cursor = conn.execute(
+        """
+        SELECT * FROM changes
+        WHERE generation > $1
+        ORDER BY generation, resource_id, entity_type = 'product', entity_id
+        """,
+        [since],
+    )
+    columns = [desc[0] for desc in cursor.description]
+    return {
+        "generation": generation,
+        "since": since,
+        "synced_at": synced_at.isoformat() if synced_at else None,
+        "changes": [dict(zip(columns, row)) for row in cursor.fetchall()],
+    }
+
+
+def export_changes(
+    conn: duckdb.DuckDBPyConnection, path: Union[str, Path], since: Optional[int] = None
+) -> Dict[str, Any]:
+    """Write the changes recorded after a generation to a JSON file.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        path: Path of the JSON file, such as ``registry/changes.json``
+        since: Generation to list the changes after (default: the changes of
+            the last sync)
+
+    Returns:
+        The changes, as returned by :func:`read_changes`
+    """
+    changes = read_changes(conn, since)
+    with open(path, "w") as file:
+        json.dump(changes, file, indent=2)
+        file.write("\n")
+    return changes
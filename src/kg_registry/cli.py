@@ -1,16 +1,82 @@
 """Command line interface for KG-Registry."""
 
+import json
+import os
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
 import click
 
 from kg_registry import standardize_metadata
 from kg_registry.constants import ROOT
-from kg_registry.duckdb_backend import DuckDBBackend, sync_yaml_to_duckdb
+from kg_registry.duckdb_backend import DuckDBBackend, sync_resources_to_duckdb
+from kg_registry.history import git_commit
+from kg_registry.ingest import load_resources
 from kg_registry.parquet_backend import DuckDBParquetQuerier, ParquetBackend, sync_yaml_to_parquet
+from kg_registry.query_language import Clause, parse_query
+from kg_registry.search import FACETS
+from kg_registry.storage import STORAGE_PROFILES
 
 __all__ = [
     "main",
 ]
 
+#: Columns of the resources listed by the query commands
+LISTED_COLUMNS = ["id", "name", "category"]
+
+#: Columns of the products listed by the products command
+LISTED_PRODUCT_COLUMNS = ["product_id", "product_name", "product_category"]
+
+
+def resource_options(command):
+    """Add the options that bound the threads, memory and disk DuckDB uses."""
+    options = [
+        click.option("--threads", type=int, help="Number of threads DuckDB runs a query on"),
+        click.option("--memory-limit", help="Memory DuckDB may use, such as 2GB"),
+        click.option(
+            "--temp-directory", help="Directory DuckDB spills to when over the memory limit"
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def storage_option(command):
+    """Add the option choosing the storage profile of the source records."""
+    return click.option(
+        "--storage",
+        "storage_profile",
+        type=click.Choice(STORAGE_PROFILES),
+        help="How the source records are stored (default: as in the last sync, or full)",
+    )(command)
+
+
+def as_of_option(command):
+    """Add the option reading the database as it was at a snapshot."""
+    return click.option(
+        "--as-of",
+        help="Snapshot to read, by ID, git commit or ISO date (needs the history)",
+    )(command)
+
+
+@contextmanager
+def open_snapshot(db_path: str, as_of: Optional[str] = None, **settings) -> Iterator[DuckDBBackend]:
+    """Open a database read-only, as it was at a snapshot if one is given."""
+    with DuckDBBackend(db_path, read_only=True, **settings) as backend:
+        if as_of is None:
+            yield backend
+        else:
+            with backend.as_of(as_of) as past:
+                yield past
+
+
+def query_clauses(query: Optional[str], search: Optional[str] = None, **fields) -> List[Clause]:
+    """Combine a query with the search text and field values given as options."""
+    clauses = parse_query(" ".join(text for text in (query, search) if text))
+    clauses.extend(Clause(value, field) for field, value in fields.items() if value)
+    return clauses
+
 
 @click.group()
 def main():
@@ -34,11 +100,62 @@ def duckdb():
     default=str(ROOT / "registry" / "kg_registry.duckdb"),
     help="Path to DuckDB database file",
 )
-def duckdb_sync(yaml_file: str, db_path: str):
+@click.option(
+    "--stats-file",
+    default=str(ROOT / "registry" / "stats.json"),
+    help="Path to export the registry statistics to, or an empty string to skip",
+)
+@click.option(
+    "--changes-file",
+    default=str(ROOT / "registry" / "changes.json"),
+    help="Path to export the changes of this sync to, or an empty string to skip",
+)
+@storage_option
+@click.option(
+    "--history",
+    "keep_history",
+    is_flag=True,
+    help="Record a snapshot of the data at this and every later sync",
+)
+@resource_options
+def duckdb_sync(
+    yaml_file: str,
+    db_path: str,
+    stats_file: str,
+    changes_file: str,
+    storage_profile: Optional[str],
+    keep_history: bool,
+    threads: int,
+    memory_limit: str,
+    temp_directory: str,
+):
     """Sync YAML data to DuckDB database."""
     try:
-        count = sync_yaml_to_duckdb(yaml_file, db_path)
-        click.echo(f"Successfully synced {count} resources to DuckDB database at {db_path}")
+        resources = load_resources(yaml_file)
+        if resources is None:
+            click.echo(f"No resources found in {yaml_file}, database left unchanged")
+            return
+        summary = sync_resources_to_duckdb(
+            resources,
+            db_path,
+            storage_profile,
+            git_commit(yaml_file),
+            keep_history,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        )
+        click.echo(f"Successfully synced {summary.total} resources to DuckDB database at {db_path}")
+        click.echo(f"{summary.to_text()} (generation {summary.generation})")
+        if stats_file or changes_file:
+            with DuckDBBackend(db_path, read_only=True) as backend:
+                if stats_file:
+                    backend.export_stats(stats_file)
+                    click.echo(f"Exported statistics to {stats_file}")
+                # A sync without changes keeps the changes of the last one that had some
+                if changes_file and (summary.has_changes or not os.path.exists(changes_file)):
+                    exported = backend.export_changes(changes_file)
+                    click.echo(f"Exported {len(exported['changes'])} changes to {changes_file}")
     except Exception as e:
         click.echo(f"Error syncing data: {e}", err=True)
         raise click.Abort()
@@ -50,10 +167,26 @@ def duckdb_sync(yaml_file: str, db_path: str):
     default=str(ROOT / "registry" / "kg_registry.duckdb"),
     help="Path to DuckDB database file",
 )
-def duckdb_stats(db_path: str):
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    help="Print every statistic computed by the last sync as JSON",
+)
+@resource_options
+def duckdb_stats(db_path: str, as_json: bool, threads: int, memory_limit: str, temp_directory: str):
     """Show statistics about the DuckDB database."""
     try:
-        with DuckDBBackend(db_path) as backend:
+        with DuckDBBackend(
+            db_path,
+            read_only=True,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        ) as backend:
+            if as_json:
+                click.echo(json.dumps(backend.get_registry_stats(), indent=2))
+                return
             stats = backend.get_resource_stats()
             click.echo(f"Total resources: {stats['total_resources']}")
             click.echo(f"Active resources: {stats['active_resources']}")
@@ -68,7 +201,54 @@ def duckdb_stats(db_path: str):
         raise click.Abort()
 
 
+@duckdb.command(name="record")
+@click.argument("resource_id")
+@click.option(
+    "--db-path",
+    default=str(ROOT / "registry" / "kg_registry.duckdb"),
+    help="Path to DuckDB database file",
+)
+@as_of_option
+def duckdb_record(resource_id: str, db_path: str, as_of: Optional[str]):
+    """Print the source record of a resource as JSON."""
+    try:
+        with open_snapshot(db_path, as_of) as backend:
+            record = backend.get_record(resource_id)
+    except Exception as e:
+        click.echo(f"Error reading record: {e}", err=True)
+        raise click.Abort()
+    if record is None:
+        click.echo(f"No resource with ID {resource_id}", err=True)
+        raise click.Abort()
+    click.echo(json.dumps(record, indent=2))
+
+
+@duckdb.command(name="snapshots")
+@click.option(
+    "--db-path",
+    default=str(ROOT / "registry" / "kg_registry.duckdb"),
+    help="Path to DuckDB database file",
+)
+def duckdb_snapshots(db_path: str):
+    """List the snapshots recorded by syncs with the history enabled."""
+    try:
+        with DuckDBBackend(db_path, read_only=True) as backend:
+            if not backend.has_history:
+                click.echo("The history is not recorded; sync with --history to start it.")
+                return
+            for snapshot in backend.snapshots():
+                click.echo(
+                    f"  {snapshot['snapshot_id']}: {snapshot['commit'] or '-'} "
+                    f"{snapshot['taken_at']:%Y-%m-%d %H:%M:%S} "
+                    f"(generation {snapshot['generation']}, {snapshot['resources']} resources)"
+                )
+    except Exception as e:
+        click.echo(f"Error listing snapshots: {e}", err=True)
+        raise click.Abort()
+
+
 @duckdb.command(name="query")
+@click.argument("query", required=False)
 @click.option(
     "--db-path",
     default=str(ROOT / "registry" / "kg_registry.duckdb"),
@@ -77,34 +257,255 @@ def duckdb_stats(db_path: str):
 @click.option("--category", help="Filter by category")
 @click.option("--domain", help="Filter by domain")
 @click.option("--status", help="Filter by activity status")
-@click.option("--search", help="Search in name or description")
-def duckdb_query(db_path: str, category: str, domain: str, status: str, search: str):
-    """Query resources from DuckDB database."""
+@click.option("--search", help="Full-text search in names, descriptions, domains and products")
+@click.option("--id", "resource_id", help="Resource ID; suggests close matches if not found")
+@as_of_option
+@resource_options
+def duckdb_query(
+    query: str,
+    db_path: str,
+    category: str,
+    domain: str,
+    status: str,
+    search: str,
+    resource_id: str,
+    as_of: Optional[str],
+    threads: int,
+    memory_limit: str,
+    temp_directory: str,
+):
+    """Query resources from DuckDB database.
+
+    QUERY is written in the query language, such as
+    'category:KnowledgeGraph format:kgx "protein interaction" -stub'; the
+    options add to it.
+    """
     try:
-        with DuckDBBackend(db_path) as backend:
-            filters = {}
-            if category:
-                filters["category"] = category
-            if domain:
-                filters["domain"] = domain
-            if status:
-                filters["activity_status"] = status
-            if search:
-                filters["name_contains"] = search
-
-            if search:
-                resources = backend.search_resources(search)
-            else:
-                resources = backend.query_resources(**filters)
-
-            click.echo(f"Found {len(resources)} resources:")
+        clauses = query_clauses(
+            query, search, id=resource_id, category=category, domain=domain, status=status
+        )
+        with open_snapshot(
+            db_path,
+            as_of,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        ) as backend:
+            # Rows are printed as they are fetched rather than all read first
+            resources = backend.find_resources(clauses, columns=LISTED_COLUMNS, output="iter")
+
+            count = 0
             for resource in resources:
                 click.echo(f"  {resource['id']}: {resource['name']} ({resource['category']})")
+                count += 1
+
+            if resource_id and not count:
+                matches = backend.fuzzy_lookup(resource_id, k=5)
+                click.echo(f"No resource with ID '{resource_id}'.")
+                if matches:
+                    click.echo("Did you mean:")
+                    for match in matches:
+                        click.echo(
+                            f"  {match['entity_id']}: {match['text']} ({match['entity_type']})"
+                        )
+                return
+
+            click.echo(f"Found {count} resources.")
     except Exception as e:
         click.echo(f"Error querying data: {e}", err=True)
         raise click.Abort()
 
 
+@duckdb.command(name="products")
+@click.argument("resource_id", required=False)
+@click.option(
+    "--db-path",
+    default=str(ROOT / "registry" / "kg_registry.duckdb"),
+    help="Path to DuckDB database file",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=1000,
+    show_default=True,
+    help="Number of products read at a time",
+)
+@resource_options
+def duckdb_products(
+    resource_id: str,
+    db_path: str,
+    batch_size: int,
+    threads: int,
+    memory_limit: str,
+    temp_directory: str,
+):
+    """List the products of a resource, or of all resources, as they are read."""
+    try:
+        with DuckDBBackend(
+            db_path,
+            read_only=True,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        ) as backend:
+            products = backend.query_products(
+                resource_id,
+                columns=LISTED_PRODUCT_COLUMNS,
+                output="iter",
+                batch_size=batch_size,
+            )
+            count = 0
+            for product in products:
+                click.echo(
+                    f"  {product['product_id']}: {product['product_name']} "
+                    f"({product['product_category']})"
+                )
+                count += 1
+            click.echo(f"Found {count} products.")
+    except Exception as e:
+        click.echo(f"Error querying products: {e}", err=True)
+        raise click.Abort()
+
+
+@duckdb.command(name="facets")
+@click.option(
+    "--db-path",
+    default=str(ROOT / "registry" / "kg_registry.duckdb"),
+    help="Path to DuckDB database file",
+)
+@click.option("--category", multiple=True, help="Keep resources of this category (repeatable)")
+@click.option("--domain", multiple=True, help="Keep resources in this domain (repeatable)")
+@click.option("--status", multiple=True, help="Keep resources with this status (repeatable)")
+@click.option("--collection", multiple=True, help="Keep resources in this collection (repeatable)")
+@click.option(
+    "--format",
+    "product_format",
+    multiple=True,
+    help="Keep resources with products in this format (repeatable)",
+)
+@click.option("--search", help="Full-text search in names, descriptions, domains and products")
+@click.option(
+    "--facet",
+    "facets",
+    multiple=True,
+    type=click.Choice(list(FACETS)),
+    help="Facet to count (repeatable, default: all)",
+)
+@click.option("--limit", type=int, default=20, show_default=True, help="Resources per page")
+@click.option("--offset", type=int, default=0, show_default=True, help="Resources to skip")
+@click.option("--json", "as_json", is_flag=True, help="Print the page and counts as JSON")
+@resource_options
+def duckdb_facets(
+    db_path: str,
+    category: tuple,
+    domain: tuple,
+    status: tuple,
+    collection: tuple,
+    product_format: tuple,
+    search: str,
+    facets: tuple,
+    limit: int,
+    offset: int,
+    as_json: bool,
+    threads: int,
+    memory_limit: str,
+    temp_directory: str,
+):
+    """List resources matching filters with the counts of each facet value."""
+    try:
+        with DuckDBBackend(
+            db_path,
+            read_only=True,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        ) as backend:
+            filters = {
+                "category": list(category),
+                "domain": list(domain),
+                "activity_status": list(status),
+                "collection": list(collection),
+                "format": list(product_format),
+            }
+            results = backend.facet_search(
+                filters,
+                list(facets) or None,
+                search,
+                limit,
+                offset,
+                columns=LISTED_COLUMNS,
+            )
+            if as_json:
+                click.echo(json.dumps(results, indent=2))
+                return
+            hits = results["hits"]
+            click.echo(
+                f"Found {results['total']} resources"
+                + (f", showing {offset + 1}-{offset + len(hits)}:" if hits else ".")
+            )
+            for resource in hits:
+                click.echo(f"  {resource['id']}: {resource['name']} ({resource['category']})")
+            for facet, counts in results["facets"].items():
+                click.echo(f"\nBy {facet}:")
+                for value, count in counts.items():
+                    click.echo(f"  {value}: {count}")
+    except Exception as e:
+        click.echo(f"Error querying facets: {e}", err=True)
+        raise click.Abort()
+
+
+@duckdb.command(name="lineage")
+@click.argument("entity_id")
+@click.option(
+    "--db-path",
+    default=str(ROOT / "registry" / "kg_registry.duckdb"),
+    help="Path to DuckDB database file",
+)
+@click.option(
+    "--downstream",
+    is_flag=True,
+    help="List what depends on the entity instead of what it depends on",
+)
+@click.option("--max-depth", type=int, help="Maximum number of dependency steps to follow")
+@click.option(
+    "--type",
+    "entity_type",
+    type=click.Choice(["resource", "product"]),
+    help="Only list entities of this type",
+)
+@resource_options
+def duckdb_lineage(
+    entity_id: str,
+    db_path: str,
+    downstream: bool,
+    max_depth: int,
+    entity_type: str,
+    threads: int,
+    memory_limit: str,
+    temp_directory: str,
+):
+    """List the resources and products a resource or product depends on."""
+    try:
+        with DuckDBBackend(
+            db_path,
+            read_only=True,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        ) as backend:
+            walk = backend.downstream if downstream else backend.upstream
+            entities = walk(entity_id, max_depth)
+            if entity_type:
+                entities = [entity for entity in entities if entity["type"] == entity_type]
+            direction = "depending on" if downstream else "upstream of"
+            click.echo(f"Found {len(entities)} entities {direction} {entity_id}:")
+            for entity in entities:
+                click.echo(f"  {entity['id']} ({entity['type']}, depth {entity['depth']})")
+    except Exception as e:
+        click.echo(f"Error querying lineage: {e}", err=True)
+        raise click.Abort()
+
+
 @main.group()
 def parquet():
     """Commands for the Parquet backend."""
@@ -122,10 +523,11 @@ def parquet():
     default=str(ROOT / "registry" / "parquet"),
     help="Directory to store Parquet files",
 )
-def parquet_sync(yaml_file: str, output_dir: str):
+@storage_option
+def parquet_sync(yaml_file: str, output_dir: str, storage_profile: Optional[str]):
     """Sync YAML data to Parquet files."""
     try:
-        count = sync_yaml_to_parquet(yaml_file, output_dir)
+        count = sync_yaml_to_parquet(yaml_file, output_dir, storage_profile)
         click.echo(f"Successfully synced {count} resources to Parquet files in {output_dir}")
     except Exception as e:
         click.echo(f"Error syncing data: {e}", err=True)
@@ -158,6 +560,7 @@ def parquet_stats(parquet_dir: str):
 
 
 @parquet.command(name="query")
+@click.argument("query", required=False)
 @click.option(
     "--parquet-dir",
     default=str(ROOT / "registry" / "parquet"),
@@ -166,45 +569,27 @@ def parquet_stats(parquet_dir: str):
 @click.option("--category", help="Filter by category")
 @click.option("--domain", help="Filter by domain")
 @click.option("--status", help="Filter by activity status")
-@click.option("--search", help="Search in name or description")
-def parquet_query(parquet_dir: str, category: str, domain: str, status: str, search: str):
-    """Query resources from Parquet files."""
+@click.option("--search", help="Full-text search in names, descriptions, domains and products")
+def parquet_query(
+    query: str, parquet_dir: str, category: str, domain: str, status: str, search: str
+):
+    """Query resources from Parquet files.
+
+    QUERY is written in the query language, as for ``duckdb query``; the
+    options add to it.
+    """
     try:
+        clauses = query_clauses(query, search, category=category, domain=domain, status=status)
         # Use DuckDBParquetQuerier for direct querying without loading into memory
         with DuckDBParquetQuerier(parquet_dir) as querier:
-            if search:
-                # Build search query
-                search_query = """
-                    SELECT * FROM resources
-                    WHERE name ILIKE ? OR description ILIKE ?
-                    ORDER BY name
-                """
-                search_params = [f"%{search}%", f"%{search}%"]
-                resources = querier.execute_query(search_query, search_params)
-            else:
-                # Build filtered query
-                query = "SELECT * FROM resources WHERE 1=1"
-                params = []
-
-                if category:
-                    query += " AND category = ?"
-                    params.append(category)
-
-                if status:
-                    query += " AND activity_status = ?"
-                    params.append(status)
-
-                if domain:
-                    query += (
-                        " AND id IN (SELECT resource_id FROM resource_domains WHERE domain = ?)"
-                    )
-                    params.append(domain)
-
-                resources = querier.execute_query(query, params)
-
-            click.echo(f"Found {len(resources)} resources:")
+            # Only the listed columns are read from the files
+            resources = querier.find_resources(clauses, columns=LISTED_COLUMNS, output="iter")
+
+            count = 0
             for resource in resources:
                 click.echo(f"  {resource['id']}: {resource['name']} ({resource['category']})")
+                count += 1
+            click.echo(f"Found {count} resources.")
     except Exception as e:
         click.echo(f"Error querying resources: {e}", err=True)
         raise click.Abort()
@@ -0,0 +1,264 @@
+"""Batched SPARQL consistency checks of local metadata against an RDF source."""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import rdflib
+from SPARQLWrapper import JSON, SPARQLWrapper
+
+from kg_registry.constants import ROOT
+
+__all__ = [
+    "PropertyCheck",
+    "ConsistencyResult",
+    "DEFAULT_CHECKS",
+    "SparqlConsistencyChecker",
+    "load_registry_graph",
+]
+
+logger = logging.getLogger(__name__)
+
+#: Base IRI of resources in the published JSON-LD (see ``registry/context.jsonld``)
+REGISTRY_BASE_IRI = "http://purl.obolibrary.org/obo/"
+
+CONSISTENT = "CONSISTENT"
+INCONSISTENT = "INCONSISTENT"
+UNDECLARED_LOCAL = "UNDECLARED_LOCAL"
+UNDECLARED_REMOTE = "UNDECLARED_REMOTE"
+
+
+@dataclass
+class PropertyCheck:
+    """A property to compare between local metadata and the RDF source."""
+
+    #: Name used in the report
+    name: str
+    #: Full IRI of the predicate in the RDF source
+    predicate: str
+    #: Function extracting the expected value from a local resource record
+    local_value: Callable[[Dict[str, Any]], Optional[str]]
+
+
+@dataclass
+class ConsistencyResult:
+    """Outcome of comparing one property of one resource."""
+
+    resource_id: str
+    property: str
+    status: str
+    local: Optional[str] = None
+    remote: List[str] = field(default_factory=list)
+
+    def to_text(self) -> str:
+        """Format the result as a line of the plain-text report."""
+        if self.status == UNDECLARED_LOCAL:
+            msg = f"{self.status}: REMOTE:" + ",".join(self.remote)
+        elif self.status == INCONSISTENT:
+            msg = f"{self.status}: REMOTE:" + ",".join(self.remote) + f" != LOCAL:{self.local}"
+        else:
+            msg = self.status
+        return f"{self.resource_id} {self.property} {msg}"
+
+
+def _license_id(resource: Dict[str, Any]) -> Optional[str]:
+    license_data = resource.get("license")
+    if isinstance(license_data, dict):
+        return license_data.get("id")
+    return None
+
+
+#: Checks of the properties the registry publishes in ``registry/kgs.jsonld``
+DEFAULT_CHECKS = [
+    PropertyCheck(
+        "description", "http://purl.org/dc/elements/1.1/description", lambda r: r.get("description")
+    ),
+    PropertyCheck(
+        "activity_status",
+        "http://obofoundry.github.io/vocabulary/activity_status",
+        lambda r: r.get("activity_status"),
+    ),
+    PropertyCheck("license", "http://purl.org/dc/terms/1.1/license", _license_id),
+]
+
+
+def load_registry_graph(
+    path: Union[str, Path], context_path: Optional[Union[str, Path]] = None
+) -> rdflib.Graph:
+    """Load an RDF file into an in-process graph.
+
+    JSON-LD files are parsed with the local ``registry/context.jsonld`` in place of
+    their remote ``@context``, so no network access is needed.
+
+    Args:
+        path: Path to an RDF file (JSON-LD, Turtle, N-Triples, ...)
+        context_path: JSON-LD context to use. Defaults to ``registry/context.jsonld``.
+
+    Returns:
+        The loaded graph
+    """
+    graph = rdflib.Graph()
+    path = Path(path)
+    if path.suffix in {".jsonld", ".json"}:
+        context_path = Path(context_path or ROOT / "registry" / "context.jsonld")
+        data = json.loads(path.read_text())
+        data["@context"] = json.loads(context_path.read_text())["@context"]
+        graph.parse(data=json.dumps(data), format="json-ld")
+    else:
+        graph.parse(str(path))
+    return graph
+
+
+def _sparql_string(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+class SparqlConsistencyChecker:
+    """Compare local resource metadata against a SPARQL endpoint or an RDF graph.
+
+    All resources are grouped into a few ``VALUES``-parameterised queries per
+    property, which run concurrently on a bounded pool. Remote values are then
+    diffed against local metadata in memory.
+    """
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        graph: Optional[rdflib.Graph] = None,
+        checks: Optional[Sequence[PropertyCheck]] = None,
+        base_iri: str = REGISTRY_BASE_IRI,
+        batch_size: int = 200,
+        max_workers: int = 4,
+        timeout: int = 60,
+    ):
+        """Initialize the checker.
+
+        Args:
+            endpoint: URL of a SPARQL endpoint, e.g. a local Fuseki instance
+            graph: In-process RDF graph to query instead of an endpoint
+            checks: Properties to compare. Defaults to :data:`DEFAULT_CHECKS`.
+            base_iri: Prefix that turns a resource ID into its IRI
+            batch_size: Number of resources per query
+            max_workers: Maximum number of queries in flight against an endpoint
+            timeout: Timeout in seconds for each endpoint query
+        """
+        if (endpoint is None) == (graph is None):
+            raise ValueError("Exactly one of endpoint or graph must be given")
+        self.endpoint = endpoint
+        self.graph = graph
+        self.checks = list(checks or DEFAULT_CHECKS)
+        self.base_iri = base_iri
+        self.batch_size = batch_size
+        # rdflib graphs are not safe for concurrent queries
+        self.max_workers = max_workers if graph is None else 1
+        self.timeout = timeout
+
+    def build_query(self, predicate: str, resource_ids: Iterable[str]) -> str:
+        """Build the query fetching a predicate's values for a batch of resources.
+
+        Args:
+            predicate: Full IRI of the predicate
+            resource_ids: Resource IDs in the batch
+
+        Returns:
+            SPARQL query binding ``?id`` and ``?value``
+        """
+        rows = " ".join(f"({_sparql_string(rid)} <{self.base_iri}{rid}>)" for rid in resource_ids)
+        return (
+            "SELECT ?id ?value WHERE { "
+            f"VALUES (?id ?subject) {{ {rows} }} "
+            f"?subject <{predicate}> ?value . }}"
+        )
+
+    def _run(self, query: str) -> List[Dict[str, str]]:
+        """Run a query and return bindings as plain ``{variable: value}`` dictionaries."""
+        if self.graph is not None:
+            return [
+                {str(k): str(v) for k, v in row.asdict().items()} for row in self.graph.query(query)
+            ]
+        sparql = SPARQLWrapper(self.endpoint)
+        sparql.setQuery(query)
+        sparql.setReturnFormat(JSON)
+        sparql.setTimeout(self.timeout)
+        results = sparql.query().convert()
+        return [
+            {k: v["value"] for k, v in binding.items()}
+            for binding in results["results"]["bindings"]
+        ]
+
+    def fetch_remote(self, resource_ids: Sequence[str]) -> Dict[str, Dict[str, List[str]]]:
+        """Fetch the remote values of all checked properties.
+
+        Args:
+            resource_ids: IDs of the resources to fetch values for
+
+        Returns:
+            Dictionary from property name to a dictionary from resource ID to values
+        """
+        jobs = []
+        for check in self.checks:
+            for start in range(0, len(resource_ids), self.batch_size):
+                batch = resource_ids[start : start + self.batch_size]
+                jobs.append((check, self.build_query(check.predicate, batch)))
+        logger.info("Running %d queries for %d resources", len(jobs), len(resource_ids))
+
+        remote: Dict[str, Dict[str, List[str]]] = {check.name: {} for check in self.checks}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (check, _), bindings in zip(
+                jobs, executor.map(lambda job: self._run(job[1]), jobs)
+            ):
+                values = remote[check.name]
+                for binding in bindings:
+                    values.setdefault(binding["id"], []).append(binding["value"])
+        return remote
+
+    def compare(self, resources: Iterable[Dict[str, Any]]) -> List[ConsistencyResult]:
+        """Compare local resources against the RDF source.
+
+        Args:
+            resources: Resource records, as in ``registry/kgs.yml``
+
+        Returns:
+            One result per resource per checked property
+        """
+        resources = [r for r in resources if r.get("id")]
+        remote = self.fetch_remote([r["id"] for r in resources])
+
+        results = []
+        for resource in resources:
+            for check in self.checks:
+                expected = check.local_value(resource)
+                expected = "" if expected is None else str(expected)
+                values = sorted(remote[check.name].get(resource["id"], []))
+                if not values:
+                    status = UNDECLARED_REMOTE
+                elif expected in values:
+                    status = CONSISTENT
+                elif expected == "":
+                    status = UNDECLARED_LOCAL
+                else:
+                    status = INCONSISTENT
+                results.append(
+                    ConsistencyResult(resource["id"], check.name, status, expected or None, values)
+                )
+        return results
+
+    @staticmethod
+    def to_report(results: Iterable[ConsistencyResult]) -> Dict[str, Any]:
+        """Build a machine-readable report.
+
+        Args:
+            results: Results of :meth:`compare`
+
+        Returns:
+            Dictionary with a ``summary`` of counts by status and the list of ``results``
+        """
+        results = list(results)
+        summary: Dict[str, int] = {}
+        for result in results:
+            summary[result.status] = summary.get(result.status, 0) + 1
+        return {"summary": summary, "results": [asdict(result) for result in results]}
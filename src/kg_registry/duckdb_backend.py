@@ -1,242 +1,406 @@
 """DuckDB backend for enhanced querying of KG-Registry data."""
 
-import json
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import glob
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import duckdb
-import yaml
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from kg_registry import changes, history, lineage, lookup, search, stats, storage
+from kg_registry.cache import CacheStats, ResultCache
+from kg_registry.ingest import (
+    SyncSummary,
+    create_tables,
+    current_generation,
+    load_columns,
+    load_resources,
+    preview_sync,
+    sync_resources,
+)
+from kg_registry.pool import CursorPool
+from kg_registry.query_language import Clause, compile_query, normalize_query
+from kg_registry.results import (
+    PAGE_SIZE,
+    Page,
+    check_output,
+    fetch,
+    fetch_page,
+    projection,
+    resource_filters,
+)
 
 __all__ = [
     "DuckDBBackend",
+    "connect",
     "sync_yaml_to_duckdb",
+    "sync_resources_to_duckdb",
     "create_database",
 ]
 
+#: Suffix of the copies of a database file that syncs build before swapping them in
+STAGING_SUFFIX = ".staging"
+
+#: Suffix of the file syncs of a database file lock, so they run one at a time
+LOCK_SUFFIX = ".lock"
+
+
+def connect(
+    db_path: str = ":memory:",
+    read_only: bool = False,
+    threads: Optional[int] = None,
+    memory_limit: Optional[str] = None,
+    temp_directory: Optional[str] = None,
+) -> duckdb.DuckDBPyConnection:
+    """Open a DuckDB connection with bounded resources.
+
+    Args:
+        db_path: Path to DuckDB database file, or ``:memory:``
+        read_only: Open the file read-only, which several processes can do at once
+        threads: Number of threads DuckDB runs a query on (default: one per core)
+        memory_limit: Memory DuckDB may use, such as ``"2GB"`` (default: 80% of RAM)
+        temp_directory: Directory DuckDB spills to when over the memory limit
+
+    Returns:
+        DuckDB connection
+
+    Raises:
+        ValueError: If an in-memory database is opened read-only
+    """
+    if read_only and db_path == ":memory:":
+        raise ValueError("An in-memory database can not be opened read-only")
+    settings = {"threads": threads, "memory_limit": memory_limit, "temp_directory": temp_directory}
+    config = {name: value for name, value in settings.items() if value is not None}
+    return duckdb.connect(db_path, read_only=read_only, config=config)
+
 
 class DuckDBBackend:
     """DuckDB backend for querying KG-Registry data."""
 
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        cache_size: Optional[int] = None,
+        cache_bytes: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        pool_timeout: float = 30.0,
+        read_only: bool = False,
+        threads: Optional[int] = None,
+        memory_limit: Optional[str] = None,
+        temp_directory: Optional[str] = None,
+    ):
         """Initialize DuckDB backend.
 
+        Results of :meth:`query_resources`, :meth:`query_by_domain`,
+        :meth:`query_active_resources`, :meth:`search_resources` and
+        :meth:`get_resource_stats` are cached if ``cache_size`` or
+        ``cache_bytes`` is given. The cache is emptied whenever the generation
+        of the data changes, so a sync never leaves stale results behind.
+        Cached results are shared between calls and must not be modified.
+
+        With ``pool_size``, the backend can be shared between threads: every
+        read runs on a cursor of a :class:`~kg_registry.pool.CursorPool`, which
+        the thread has to itself until the read returns, and syncs are
+        serialized. Without it, a backend must only be used by one thread at a
+        time.
+
+        With ``read_only``, the file is opened with DuckDB's read-only flag,
+        which does not take the write lock, so any number of processes can
+        read it at once, and the tables are neither created nor upgraded:
+        the file must have been written by a sync of this version.
+
         Args:
             db_path: Path to DuckDB database file. If None, uses in-memory database.
+            cache_size: Maximum number of cached results
+            cache_bytes: Maximum estimated size of the cached results, in bytes
+            pool_size: Maximum number of reads running at the same time, from
+                different threads
+            pool_timeout: Seconds a read waits for a free cursor before raising
+                :class:`~kg_registry.pool.PoolTimeout`
+            read_only: Open the database file read-only; syncs then fail
+            threads: Number of threads DuckDB runs a query on
+            memory_limit: Memory DuckDB may use, such as ``"2GB"``
+            temp_directory: Directory DuckDB spills to when over the memory limit
         """
         self.db_path = db_path or ":memory:"
-        self.conn = duckdb.connect(self.db_path)
+        self.read_only = read_only
+        self.conn = connect(
+            self.db_path,
+            read_only,
+            threads=threads,
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+        )
+        #: Summary of the most recent sync, if any
+        self.last_sync: Optional[SyncSummary] = None
+        #: Cache of query results, if enabled
+        self.cache: Optional[ResultCache] = None
+        if cache_size or cache_bytes:
+            self.cache = ResultCache(cache_size, cache_bytes)
+        #: Cursors for reads from several threads, if enabled
+        self.pool: Optional[CursorPool] = None
+        if pool_size:
+            self.pool = CursorPool(self.conn, pool_size, pool_timeout)
+        self._write_lock = threading.RLock()
         self._init_tables()
 
     def _init_tables(self):
         """Initialize DuckDB tables for KG-Registry data."""
-        # Create resources table
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resources (
-                id VARCHAR PRIMARY KEY,
-                name VARCHAR,
-                description TEXT,
-                category VARCHAR,
-                activity_status VARCHAR,
-                homepage_url VARCHAR,
-                repository VARCHAR,
-                creation_date TIMESTAMP,
-                last_modified_date TIMESTAMP,
-                license_id VARCHAR,
-                license_label VARCHAR,
-                domains VARCHAR[],
-                contacts JSON,
-                curators JSON,
-                products JSON,
-                layout VARCHAR,
-                raw_data JSON,
-                sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
-        )
+        if not self.read_only:
+            create_tables(self.conn)
 
-        # Create domains table for better querying
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resource_domains (
-                resource_id VARCHAR,
-                domain VARCHAR,
-                PRIMARY KEY (resource_id, domain)
-            )
-        """
-        )
+    @contextmanager
+    def _reader(self, output: str = "dicts") -> Iterator[duckdb.DuckDBPyConnection]:
+        """Get the connection to run a read on.
 
-        # Create products table for better querying
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resource_products (
-                resource_id VARCHAR,
-                product_id VARCHAR,
-                product_name VARCHAR,
-                product_category VARCHAR,
-                product_description TEXT,
-                product_format VARCHAR,
-                product_url VARCHAR,
-                PRIMARY KEY (resource_id, product_id)
-            )
+        That is a pooled cursor if the pool is enabled, except for ``iter``,
+        ``batches`` and ``relation`` results, which are still read from after
+        the call returns and get a cursor of their own.
         """
-        )
-
-    def sync_from_yaml(self, yaml_file: str) -> int:
+        if self.pool is None:
+            yield self.conn
+        elif output in ("iter", "batches", "relation"):
+            yield self.pool.open_cursor()
+        else:
+            with self.pool.checkout() as cursor:
+                yield cursor
+
+    def sync_from_yaml(self, yaml_file: str, storage_profile: Optional[str] = None) -> int:
         """Sync data from YAML file to DuckDB.
 
+        Only resources that were added, changed or removed since the last sync
+        are written; the summary is kept in :attr:`last_sync`. If the history
+        is enabled, the snapshot of the sync records the git commit checked
+        out where the file is.
+
         Args:
             yaml_file: Path to YAML file containing resources data
+            storage_profile: How the source records are stored, see
+                :mod:`kg_registry.storage` (default: as in the last sync)
 
         Returns:
-            Number of resources synced
+            Number of resources in the database after the sync
         """
-        with open(yaml_file, "r") as f:
-            data = yaml.safe_load(f)
-
-        if not data or "resources" not in data:
+        resources = load_resources(yaml_file)
+        if resources is None:
             return 0
 
-        resources = data["resources"]
-        synced_count = 0
-
-        # Clear existing data
-        self.conn.execute("DELETE FROM resources")
-        self.conn.execute("DELETE FROM resource_domains")
-        self.conn.execute("DELETE FROM resource_products")
-
-        for resource in resources:
-            if not resource.get("id"):
-                continue
-
-            # Insert into resources table
-            self._insert_resource(resource)
-
-            # Insert domains
-            self._insert_domains(resource)
-
-            # Insert products
-            self._insert_products(resource)
-
-            synced_count += 1
-
-        return synced_count
-
-    def _insert_resource(self, resource: Dict[str, Any]):
-        """Insert a resource into the resources table."""
-        license_data = resource.get("license", {})
-
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO resources (
-                id, name, description, category, activity_status, homepage_url, repository,
-                creation_date, last_modified_date, license_id, license_label, domains,
-                contacts, curators, products, layout, raw_data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            [
-                resource.get("id"),
-                resource.get("name"),
-                resource.get("description"),
-                resource.get("category"),
-                resource.get("activity_status"),
-                resource.get("homepage_url"),
-                resource.get("repository"),
-                self._parse_date(resource.get("creation_date")),
-                self._parse_date(resource.get("last_modified_date")),
-                license_data.get("id") if isinstance(license_data, dict) else None,
-                license_data.get("label") if isinstance(license_data, dict) else license_data,
-                resource.get("domains", []),
-                json.dumps(resource.get("contacts", [])),
-                json.dumps(resource.get("curators", [])),
-                json.dumps(resource.get("products", [])),
-                resource.get("layout"),
-                json.dumps(resource),
-            ],
-        )
+        commit = history.git_commit(yaml_file) if self.has_history else None
+        return self.sync_from_resources(resources, storage_profile, commit).total
 
-    def _insert_domains(self, resource: Dict[str, Any]):
-        """Insert resource domains into the resource_domains table."""
-        resource_id = resource.get("id")
-        domains = resource.get("domains", [])
-
-        for domain in domains:
-            self.conn.execute(
-                """
-                INSERT OR IGNORE INTO resource_domains (resource_id, domain)
-                VALUES (?, ?)
-            """,
-                [resource_id, domain],
-            )
+    def sync_from_resources(
+        self,
+        resources: List[Dict[str, Any]],
+        storage_profile: Optional[str] = None,
+        commit: Optional[str] = None,
+    ) -> SyncSummary:
+        """Bring the database in line with the given resources.
 
-    def _insert_products(self, resource: Dict[str, Any]):
-        """Insert resource products into the resource_products table."""
-        resource_id = resource.get("id")
-        products = resource.get("products", [])
-
-        for product in products:
-            if not product.get("id"):
-                continue
-
-            self.conn.execute(
-                """
-                INSERT OR REPLACE INTO resource_products (
-                    resource_id, product_id, product_name, product_category,
-                    product_description, product_format, product_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-                [
-                    resource_id,
-                    product.get("id"),
-                    product.get("name"),
-                    product.get("category"),
-                    product.get("description"),
-                    product.get("format"),
-                    product.get("product_url"),
-                ],
-            )
+        Resources are compared by a hash of their source record, and only
+        those that were added, changed or removed are written, in a single
+        transaction.
 
-    def _parse_date(self, date_str: Optional[str]) -> Optional[datetime]:
-        """Parse date string to datetime object."""
-        if not date_str:
-            return None
-        try:
-            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-        except (ValueError, AttributeError):
-            return None
+        Args:
+            resources: Resource records, as in ``registry/kgs.yml``
+            storage_profile: How the source records are stored, see
+                :mod:`kg_registry.storage` (default: as in the last sync);
+                changing it rewrites every resource
+            commit: Git commit of the registry the resources come from,
+                recorded with the snapshot of the sync if the history is enabled
+
+        Returns:
+            Summary of the changes, also kept in :attr:`last_sync`
+        """
+        with self._write_lock:
+            self.last_sync = sync_resources(self.conn, resources, storage_profile, commit)
+            return self.last_sync
+
+    @property
+    def generation(self) -> int:
+        """Generation number of the data, incremented by every sync that changes it."""
+        with self._reader() as conn:
+            return current_generation(conn)
 
-    def query_resources(self, **filters) -> List[Dict[str, Any]]:
+    def cache_stats(self) -> Optional[CacheStats]:
+        """Get the hit, miss and eviction counters of the result cache.
+
+        Returns:
+            Counters, or None if the cache is disabled
+        """
+        return self.cache.stats() if self.cache else None
+
+    def _cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Get a result from the cache, if enabled, or compute it."""
+        if self.cache is None:
+            return compute()
+        return self.cache.get(key, self.generation, compute)
+
+    def query_resources(
+        self,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+        **filters,
+    ) -> Any:
         """Query resources with optional filters.
 
         Args:
+            columns: Columns to return, such as ``["id", "name", "category"]`` (default: all)
+            output: Result mode: ``dicts``, ``iter``, ``batches``, ``relation``, ``arrow``
+                or ``numpy``, see :mod:`kg_registry.results`
+            batch_size: Number of rows fetched at a time by ``iter`` and ``batches``
+                results (default: 1000)
             **filters: Keyword arguments for filtering resources
 
         Returns:
-            List of resources matching the filters
+            Resources matching the filters, as a list of dicts by default
         """
-        query = "SELECT * FROM resources WHERE 1=1"
-        params = []
+        check_output(output)
+        # Empty filters are ignored, so they don't make for another cache entry
+        filters = {name: value for name, value in filters.items() if value}
+        if output != "dicts":
+            return self._query_resources(filters, columns, output, batch_size)
+        return self._cached(
+            (
+                "query_resources",
+                None if columns is None else tuple(columns),
+                tuple(sorted(filters.items())),
+            ),
+            lambda: self._query_resources(filters, columns, output),
+        )
+
+    def _query_resources(
+        self,
+        filters: Dict[str, Any],
+        columns: Optional[List[str]],
+        output: str,
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Run the query of :meth:`query_resources`."""
+        conditions, params = resource_filters(filters)
+        query = f"SELECT {projection(columns)} FROM resources WHERE 1=1{conditions}"
+        with self._reader(output) as conn:
+            return fetch(conn, query, params, output, batch_size)
+
+    def page_resources(
+        self,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = PAGE_SIZE,
+        order_by: str = "id",
+        columns: Optional[List[str]] = None,
+        **filters,
+    ) -> Page:
+        """Get a page of resources, ordered by a column and then by ID.
+
+        Each page starts after the last resource of the previous one, so
+        resources added or removed by syncs in between don't make the
+        remaining pages skip or repeat resources.
+
+        Args:
+            after: ``Page.after`` of the previous page, or None for the first page
+            limit: Maximum number of resources of the page
+            order_by: Column to order the resources by; those without a value come last
+            columns: Columns to return (default: all)
+            **filters: Filters, as in :meth:`query_resources`
+
+        Returns:
+            The page, with the ``after`` cursor of the next page if there is one
+        """
+        conditions, params = resource_filters(filters)
+        with self._reader() as conn:
+            return fetch_page(
+                conn,
+                projection(columns),
+                "resources",
+                f"1=1{conditions}",
+                params,
+                sort=projection([order_by]),
+                key="id",
+                after=after,
+                limit=limit,
+            )
 
-        if filters.get("category"):
-            query += " AND category = ?"
-            params.append(filters["category"])
+    def query_products(
+        self,
+        resource_id: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Query products, ordered by resource and product ID.
 
-        if filters.get("activity_status"):
-            query += " AND activity_status = ?"
-            params.append(filters["activity_status"])
+        With ``output="iter"`` or ``"batches"``, the products of resources
+        with many, such as ``obo-db-ingest``, are read ``batch_size`` at a time
+        rather than all at once.
 
-        if filters.get("domain"):
-            query += " AND id IN (SELECT resource_id FROM resource_domains WHERE domain = ?)"
-            params.append(filters["domain"])
+        Args:
+            resource_id: ID of the resource whose products to return (default: all)
+            columns: Columns of ``resource_products`` to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
 
-        if filters.get("name_contains"):
-            query += " AND name ILIKE ?"
-            params.append(f"%{filters['name_contains']}%")
+        Returns:
+            Rows of the ``resource_products`` table
+        """
+        check_output(output)
+        query = f"SELECT {projection(columns)} FROM resource_products"
+        params = []
+        if resource_id:
+            query += " WHERE resource_id = ?"
+            params.append(resource_id)
+        query += " ORDER BY resource_id, product_id"
+        with self._reader(output) as conn:
+            return fetch(conn, query, params, output, batch_size)
+
+    def page_products(
+        self,
+        resource_id: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = PAGE_SIZE,
+        columns: Optional[List[str]] = None,
+    ) -> Page:
+        """Get a page of products, ordered by resource and product ID.
 
-        result = self.conn.execute(query, params).fetchall()
-        columns = [desc[0] for desc in self.conn.description]
+        Args:
+            resource_id: ID of the resource whose products to return (default: all)
+            after: ``Page.after`` of the previous page, or None for the first page
+            limit: Maximum number of products of the page
+            columns: Columns of ``resource_products`` to return (default: all)
 
-        return [dict(zip(columns, row)) for row in result]
+        Returns:
+            The page, with the ``after`` cursor of the next page if there is one
+        """
+        with self._reader() as conn:
+            return fetch_page(
+                conn,
+                projection(columns),
+                "resource_products",
+                "resource_id = ?" if resource_id else "1=1",
+                [resource_id] if resource_id else [],
+                sort="resource_id",
+                key="product_id",
+                after=after,
+                limit=limit,
+            )
 
     def query_by_domain(self, domain: str) -> List[Dict[str, Any]]:
         """Query resources by domain.
@@ -257,70 +421,358 @@ class DuckDBBackend:
         """
         return self.query_resources(activity_status="active")
 
-    def search_resources(self, search_term: str) -> List[Dict[str, Any]]:
-        """Search resources by name or description.
+    def search_resources(
+        self,
+        search_term: str,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Search resources by name, description, domains and products.
+
+        Uses the full-text index; resources must contain every term of the
+        search, in their own fields or a product's, and are ranked by BM25.
 
         Args:
             search_term: Term to search for
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
 
         Returns:
-            List of resources matching the search term
+            Resources matching the search term, best match first
         """
-        query = """
-            SELECT * FROM resources
-            WHERE name ILIKE ? OR description ILIKE ?
-            ORDER BY name
+        check_output(output)
+
+        def run():
+            with self._reader(output) as conn:
+                return search.search_resources(
+                    conn, search_term, columns=columns, output=output, batch_size=batch_size
+                )
+
+        if output != "dicts":
+            return run()
+        # Search is case-insensitive and only looks at the terms
+        key = (
+            "search_resources",
+            " ".join(search_term.lower().split()),
+            None if columns is None else tuple(columns),
+        )
+        return self._cached(key, run)
+
+    def find_resources(
+        self,
+        query: Union[str, Sequence[Clause]],
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Find the resources matching a query of :mod:`kg_registry.query_language`.
+
+        The query, such as ``category:KnowledgeGraph format:kgx "protein interaction" -stub``,
+        combines filters, product filters and text search, and runs as one statement.
+
+        Args:
+            query: Query, or its parsed clauses
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Matching resources, best match first if the query has words, by name otherwise
+
+        Raises:
+            ValueError: If the query cannot be parsed
         """
-        params = [f"%{search_term}%", f"%{search_term}%"]
+        check_output(output)
+        normalized = normalize_query(query)
+        compiled = compile_query(normalized, columns)
+
+        def run():
+            with self._reader(output) as conn:
+                return compiled.run(conn, output, batch_size)
+
+        if output != "dicts":
+            return run()
+        return self._cached(
+            ("find_resources", normalized, None if columns is None else tuple(columns)), run
+        )
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = 20,
+        fields: Optional[List[str]] = None,
+        doc_types: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rank resources and products against a query with BM25.
+
+        Args:
+            query: Free text; every term counts towards the score
+            limit: Maximum number of hits, or None for all
+            fields: Fields to search: ``name``, ``description``, ``domain`` (default: all)
+            doc_types: Document types to search: ``resource``, ``product`` (default: all)
+
+        Returns:
+            Hits with ``doc_id``, ``doc_type``, ``resource_id`` and ``score``, best first
+        """
+        with self._reader() as conn:
+            return search.search(conn, query, limit, fields, doc_types)
+
+    def facet_search(
+        self,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        facets: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        limit: Optional[int] = 20,
+        offset: int = 0,
+        columns: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Get a page of the resources matching filters, with the counts of their facet values.
+
+        Facets are ``category``, ``domain``, ``activity_status``, ``collection``
+        and ``format`` (of the resource's products), see :func:`kg_registry.search.facet_search`.
+
+        Args:
+            filters: Values to keep for some facets, such as ``{"domain": ["health"]}``;
+                a resource must have one of the values of every filter
+            facets: Facets to count (default: all)
+            query: Free text the resources must match, which then ranks them
+            limit: Maximum number of resources in the page, or None for all
+            offset: Number of resources before the page
+            columns: Columns to return (default: all)
+
+        Returns:
+            Dictionary with the ``total`` number of matching resources, the ``hits``
+            of the page and the ``facets``, each a dict from value to count
+        """
+
+        def run():
+            with self._reader() as conn:
+                return search.facet_search(conn, filters, facets, query, limit, offset, columns)
+
+        key = (
+            "facet_search",
+            tuple(sorted((name, str(value)) for name, value in (filters or {}).items() if value)),
+            None if facets is None else tuple(facets),
+            None if query is None else " ".join(query.lower().split()),
+            limit,
+            offset,
+            None if columns is None else tuple(columns),
+        )
+        return self._cached(key, run)
 
-        result = self.conn.execute(query, params).fetchall()
-        columns = [desc[0] for desc in self.conn.description]
+    def get_record(self, resource_id: str) -> Optional[Dict[str, Any]]:
+        """Get the source record of a resource, as in ``registry/kgs.yml``.
 
-        return [dict(zip(columns, row)) for row in result]
+        Works in every storage profile.
+
+        Args:
+            resource_id: ID of the resource
+
+        Returns:
+            The record, or None if there is no resource with that ID
+        """
+        with self._reader() as conn:
+            return storage.read_record(conn, resource_id)
+
+    def fuzzy_lookup(self, text: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Find the resources and products whose ID, name or infores ID best match a text.
+
+        Tolerates typos, case, spaces and punctuation, so ``pharm-gkb`` finds
+        ``pharmgkb``.
+
+        Args:
+            text: Approximate ID or name
+            k: Maximum number of matches
+
+        Returns:
+            Matches with ``entity_type``, ``entity_id``, ``resource_id``, ``kind``,
+            ``text``, ``score`` and ``similarity``, best first
+        """
+        with self._reader() as conn:
+            return lookup.fuzzy_lookup(conn, text, k)
+
+    def upstream(self, entity_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the resources and products an entity depends on, directly or not.
+
+        Args:
+            entity_id: Resource or product ID
+            max_depth: Maximum number of edges to follow, or None for no limit
+
+        Returns:
+            Dependencies with their ``type``, ``id`` and ``depth``, nearest first
+        """
+        with self._reader() as conn:
+            return lineage.upstream(conn, entity_id, max_depth)
+
+    def downstream(self, entity_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the resources and products that depend on an entity, directly or not.
+
+        Args:
+            entity_id: Resource or product ID
+            max_depth: Maximum number of edges to follow, or None for no limit
+
+        Returns:
+            Dependents with their ``type``, ``id`` and ``depth``, nearest first
+        """
+        with self._reader() as conn:
+            return lineage.downstream(conn, entity_id, max_depth)
+
+    def build_lineage_closure(self):
+        """Precompute the lineage of every entity for :meth:`upstream` and :meth:`downstream`.
+
+        Once built, the closure is refreshed by every sync that changes the data.
+        """
+        with self._write_lock:
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                lineage.build_closure(self.conn)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def drop_lineage_closure(self):
+        """Drop the precomputed lineage, so syncs stop refreshing it."""
+        with self._write_lock:
+            lineage.drop_closure(self.conn)
+
+    @property
+    def has_history(self) -> bool:
+        """Whether syncs record snapshots, see :mod:`kg_registry.history`."""
+        with self._reader() as conn:
+            return history.has_history(conn)
+
+    def enable_history(self, commit: Optional[str] = None):
+        """Record a snapshot of the data at every sync that changes it, from now on.
+
+        The current data, if any, is recorded as the first snapshot.
+
+        Args:
+            commit: Git commit of the registry the current data was synced from
+        """
+        with self._write_lock:
+            history.enable_history(self.conn, commit)
+
+    def drop_history(self):
+        """Drop the recorded snapshots, so syncs stop recording them."""
+        with self._write_lock:
+            history.drop_history(self.conn)
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """List the recorded snapshots.
+
+        Returns:
+            Snapshots with ``snapshot_id``, ``commit``, ``taken_at``,
+            ``generation`` and their number of ``resources``, oldest first
+        """
+        with self._reader() as conn:
+            return history.list_snapshots(conn)
+
+    def as_of(self, snapshot: history.SnapshotKey) -> "DuckDBBackend":
+        """Get the registry as it was at a recorded snapshot.
+
+        The rows of the snapshot are copied into a new in-memory backend and
+        its indexes rebuilt, so every query method answers as it would have
+        then. Keep the backend for as long as it is needed, and close it.
+
+        Args:
+            snapshot: Snapshot ID, git commit or a prefix of one, or a time
+                (the last snapshot taken at or before it)
+
+        Returns:
+            In-memory backend with the data of the snapshot
+
+        Raises:
+            ValueError: If the history is not enabled, or no snapshot matches
+        """
+        with self._reader() as conn:
+            found = history.resolve_snapshot(conn, snapshot)
+            tables = {
+                table: history.snapshot_columns(conn, table, found["snapshot_id"])
+                for table in history.HISTORY_TABLES
+            }
+            closure = lineage.has_closure(conn)
+        past = DuckDBBackend()
+        if closure:
+            lineage.build_closure(past.conn)
+        load_columns(past.conn, tables, found["generation"], found["taken_at"])
+        return past
 
     def get_resource_stats(self) -> Dict[str, Any]:
         """Get statistics about resources in the database.
 
+        The numbers are read from the statistics computed by the last sync.
+
         Returns:
             Dictionary with resource statistics
         """
-        stats = {}
-
-        # Total resources
-        stats["total_resources"] = self.conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
-
-        # Active resources
-        stats["active_resources"] = self.conn.execute(
-            "SELECT COUNT(*) FROM resources WHERE activity_status = 'active'"
-        ).fetchone()[0]
-
-        # Resources by category
-        category_counts = self.conn.execute(
-            """
-            SELECT category, COUNT(*) as count
-            FROM resources
-            WHERE category IS NOT NULL
-            GROUP BY category
-            ORDER BY count DESC
+        registry_stats = self.get_registry_stats()
+        return {
+            "total_resources": registry_stats["totals"]["resources"],
+            "active_resources": registry_stats["totals"]["active_resources"],
+            "by_category": registry_stats["counts"]["category"],
+            "by_domain": registry_stats["counts"]["domain"],
+        }
+
+    def get_registry_stats(self) -> Dict[str, Any]:
+        """Get the statistics computed by the last sync.
+
+        Returns:
+            Totals, counts by dimension and field usage, see
+            :func:`kg_registry.stats.read_stats`
         """
-        ).fetchall()
-        stats["by_category"] = {cat: count for cat, count in category_counts}
-
-        # Resources by domain
-        domain_counts = self.conn.execute(
-            """
-            SELECT domain, COUNT(*) as count
-            FROM resource_domains
-            GROUP BY domain
-            ORDER BY count DESC
+        return self._cached(("get_registry_stats",), self._read_stats)
+
+    def _read_stats(self) -> Dict[str, Any]:
+        """Run the queries of :meth:`get_registry_stats`."""
+        with self._reader() as conn:
+            return stats.read_stats(conn)
+
+    def export_stats(self, path: str) -> Dict[str, Any]:
+        """Write the statistics computed by the last sync to a JSON file.
+
+        Args:
+            path: Path of the JSON file, such as ``registry/stats.json``
+
+        Returns:
+            The statistics written
+        """
+        with self._reader() as conn:
+            return stats.export_stats(conn, path)
+
+    def get_changes(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """Get the resources and products the syncs after a generation changed.
+
+        Args:
+            since: Generation to list the changes after (default: the changes
+                of the last sync)
+
+        Returns:
+            The changes, see :func:`kg_registry.changes.read_changes`
         """
-        ).fetchall()
-        stats["by_domain"] = {domain: count for domain, count in domain_counts}
+        with self._reader() as conn:
+            return changes.read_changes(conn, since)
+
+    def export_changes(self, path: str, since: Optional[int] = None) -> Dict[str, Any]:
+        """Write the changes of the syncs after a generation to a JSON file.
 
-        return stats
+        Args:
+            path: Path of the JSON file, such as ``registry/changes.json``
+            since: Generation to list the changes after (default: the changes
+                of the last sync)
+
+        Returns:
+            The changes written
+        """
+        with self._reader() as conn:
+            return changes.export_changes(conn, path, since)
 
     def close(self):
         """Close the DuckDB connection."""
+        if self.pool:
+            self.pool.close()
         if self.conn:
             self.conn.close()
 
@@ -343,8 +795,141 @@ def sync_yaml_to_duckdb(yaml_file: str, db_path: str = None) -> int:
     Returns:
         Number of resources synced
     """
-    with DuckDBBackend(db_path) as backend:
-        return backend.sync_from_yaml(yaml_file)
+    if db_path is None or db_path == ":memory:":
+        with DuckDBBackend(db_path) as backend:
+            return backend.sync_from_yaml(yaml_file)
+
+    resources = load_resources(yaml_file)
+    if resources is None:
+        return 0
+    return sync_resources_to_duckdb(resources, db_path).total
+
+
+def sync_resources_to_duckdb(
+    resources: List[Dict[str, Any]],
+    db_path: str,
+    storage_profile: Optional[str] = None,
+    commit: Optional[str] = None,
+    keep_history: bool = False,
+    **settings,
+) -> SyncSummary:
+    """Sync resources into a database file, swapping the result in atomically.
+
+    The resources are first compared with the file, read-only, and nothing
+    else happens if they are the same. Otherwise the sync runs on a staging
+    copy next to the database file, which is then checkpointed and renamed
+    over the original. Readers that have the file open keep the previous
+    generation, readers that open it afterwards get the new one, and none see
+    a partial sync. If the sync is interrupted, the original file is left as
+    it was; a staging copy left by a crash is discarded by the next sync.
+
+    Syncs of one file run one at a time, holding a lock on ``<db_path>.lock``
+    where the platform supports it.
+
+    Args:
+        resources: Resource records, as in ``registry/kgs.yml``
+        db_path: Path to DuckDB database file
+        storage_profile: How the source records are stored, see
+            :mod:`kg_registry.storage` (default: as in the last sync)
+        commit: Git commit of the registry the resources come from, recorded
+            with the snapshot of the sync if the history is enabled
+        keep_history: Enable the history first, if it is not, see
+            :meth:`DuckDBBackend.enable_history`
+        **settings: ``threads``, ``memory_limit`` and ``temp_directory`` of the
+            connection, see :func:`connect`
+
+    Returns:
+        Summary of the changes
+
+    Raises:
+        RuntimeError: If the database file was written in place during the sync
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    with _sync_lock(db_path):
+        if os.path.exists(db_path):
+            preview = _preview_file(db_path, resources, storage_profile, keep_history)
+            if preview is not None and not preview.has_changes:
+                return preview
+        for leftover in glob.glob(glob.escape(db_path) + "*" + STAGING_SUFFIX + "*"):
+            os.remove(leftover)
+        if os.path.exists(db_path + ".wal"):
+            # Fold the changes of a writer that did not checkpoint into the
+            # file, so the copy has them and no WAL is left to replay
+            with duckdb.connect(db_path) as conn:
+                conn.execute("CHECKPOINT")
+
+        handle, staging = tempfile.mkstemp(
+            prefix=os.path.basename(db_path) + ".", suffix=STAGING_SUFFIX, dir=directory
+        )
+        os.close(handle)
+        try:
+            if os.path.exists(db_path):
+                shutil.copyfile(db_path, staging)
+            else:
+                os.remove(staging)
+            with DuckDBBackend(staging, **settings) as backend:
+                if keep_history and not backend.has_history:
+                    backend.enable_history()
+                summary = backend.sync_from_resources(resources, storage_profile, commit)
+                backend.conn.execute("CHECKPOINT")
+            if os.path.exists(db_path + ".wal"):
+                raise RuntimeError(
+                    f"{db_path} was written during the sync; its changes would be lost"
+                )
+            os.replace(staging, db_path)
+        except BaseException:
+            for path in (staging, staging + ".wal"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        _fsync_directory(directory)
+    return summary
+
+
+@contextmanager
+def _sync_lock(db_path: str) -> Iterator[None]:
+    """Hold an exclusive lock on ``<db_path>.lock``, released if the process dies."""
+    with open(db_path + LOCK_SUFFIX, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _preview_file(
+    db_path: str,
+    resources: List[Dict[str, Any]],
+    storage_profile: Optional[str],
+    keep_history: bool,
+) -> Optional[SyncSummary]:
+    """Work out what a sync would change in a database file, without writing to it.
+
+    Returns:
+        The summary of the changes, or None if the file cannot tell, such as
+        one written by an older version
+    """
+    try:
+        try:
+            conn = duckdb.connect(db_path, read_only=True)
+        except duckdb.ConnectionException:
+            # This process already has the file open read-write
+            conn = duckdb.connect(db_path)
+        with conn:
+            if keep_history and not history.has_history(conn):
+                return None
+            return preview_sync(conn, resources, storage_profile)
+    except duckdb.Error:
+        return None
+
+
+def _fsync_directory(directory: str):
+    """Flush a rename in a directory to disk, where the platform supports it."""
+    if os.name != "posix":
+        return
+    handle = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
 
 
 def create_database(db_path: str = None) -> DuckDBBackend:
@@ -0,0 +1,691 @@
+"""Surgical, round-trip edits of the YAML frontmatter of resource pages.
+
+Utilities that modify resource pages describe their changes as :class:`Patch`
+objects instead of re-serializing whole documents. A page is parsed once with
+ruamel's round-trip loader, all patches for it are applied to the parsed data,
+and only the lines of the nodes that actually changed are re-emitted. Every
+other byte of the file (key order, quoting, line folding, comments and the
+Markdown body) is left untouched, so a patch produces the minimal diff.
+
+Patch paths are dotted keys with optional list selectors::
+
+    name                                  top-level key
+    license.label                         nested key
+    products[id=kg-microbe.graph].format  key of the product whose ``id`` matches
+    products[0]                           item by position
+    domains[=other]                       scalar item equal to ``other``
+"""
+
+import logging
+from dataclasses import dataclass
+from io import StringIO
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+
+from kg_registry.constants import RESOURCE_DIRECTORY
+
+__all__ = [
+    "SET",
+    "APPEND",
+    "REMOVE",
+    "Patch",
+    "FrontmatterDocument",
+    "parse_path",
+    "patch_file",
+    "patch_files",
+    "resource_path",
+]
+
+logger = logging.getLogger(__name__)
+
+#: Set a key or list item, replacing any existing value
+SET = "set"
+#: Append a value to a list unless it is already present (products match by ``id``)
+APPEND = "append"
+#: Remove a key or list item, if present
+REMOVE = "remove"
+
+OPERATIONS = (SET, APPEND, REMOVE)
+
+Step = Union[str, int, Tuple[Optional[str], str]]
+
+
+@dataclass(frozen=True)
+class Patch:
+    """A single change to the frontmatter of a page."""
+
+    #: Path of the node to change, e.g. ``products[id=foo].product_file_size``
+    path: str
+    #: Value to set or append. Ignored for removals.
+    value: Any = None
+    #: One of :data:`SET`, :data:`APPEND` or :data:`REMOVE`
+    op: str = SET
+
+    def __post_init__(self):
+        if self.op not in OPERATIONS:
+            raise ValueError(f"Unknown patch operation: {self.op}")
+
+
+def parse_path(path: str) -> List[Step]:
+    """Parse a patch path into steps.
+
+    Args:
+        path: Path such as ``products[id=foo].warnings``
+
+    Returns:
+        List of steps: a string for a mapping key, an int for a list position, or a
+        ``(field, value)`` tuple for a list selector. ``field`` is None when items are
+        compared directly against ``value``.
+    """
+    steps: List[Step] = []
+    i = 0
+    while i < len(path):
+        char = path[i]
+        if char == ".":
+            i += 1
+        elif char == "[":
+            end = path.find("]", i)
+            if end == -1:
+                raise ValueError(f"Unclosed selector in path: {path}")
+            selector = path[i + 1 : end]
+            if "=" in selector:
+                name, value = selector.split("=", 1)
+                steps.append((name or None, value))
+            else:
+                try:
+                    steps.append(int(selector))
+                except ValueError:
+                    raise ValueError(f"Invalid selector [{selector}] in path: {path}") from None
+            i = end + 1
+        else:
+            end = i
+            while end < len(path) and path[end] not in ".[":
+                end += 1
+            steps.append(path[i:end])
+            i = end
+    if not steps:
+        raise ValueError("Empty patch path")
+    return steps
+
+
+def _contains(items: List[Any], value: Any) -> bool:
+    """Check whether a list already holds a value; mappings with an ``id`` match by ``id``."""
+    if isinstance(value, Mapping) and "id" in value:
+        return any(isinstance(item, Mapping) and item.get("id") == value["id"] for item in items)
+    return value in items
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Check whether setting a value would leave the data unchanged."""
+    return old == new and isinstance(old, bool) == isinstance(new, bool)
+
+
+@dataclass
+class _Node:
+    """Position of a container node in the original frontmatter."""
+
+    node: Any
+    #: Owning container and key, or None for the root
+    parent: Optional[Tuple[Any, Any]]
+    #: Original keys (mappings) or positions (sequences) in file order
+    keys: List[Any]
+    #: Original child values by key or position
+    values: Dict[Any, Any]
+    #: Line span ``[start, end)`` of each child by key or position
+    spans: Dict[Any, Tuple[int, int]]
+    #: Column of the children's keys (mappings) or of their ``-`` (sequences)
+    column: int
+    #: Whether the node is written in flow style, e.g. ``[a, b]``
+    flow: bool
+    #: Nesting depth; the root mapping is 0
+    depth: int
+
+
+@dataclass
+class _Edit:
+    """Replacement of the original lines ``[start, end)``."""
+
+    start: int
+    end: int
+    lines: List[str]
+    #: Container the edit writes into
+    anchor: Any
+    #: IDs of original containers whose text the edit replaces
+    covers: frozenset
+    #: Tie-breaker for edits at the same line: deeper nodes first, then new keys by name
+    order: Tuple[Any, ...] = ()
+
+
+class FrontmatterDocument:
+    """A page with YAML frontmatter that can be patched in place."""
+
+    def __init__(self, text: str, width: int = 80):
+        """Parse a page.
+
+        Args:
+            text: Full text of the page, starting with a ``---`` line
+            width: Line width used when emitting changed nodes
+
+        Raises:
+            ValueError: If the page does not start with a YAML frontmatter mapping
+        """
+        self.text = text
+        self.width = width
+        lines = text.splitlines(keepends=True)
+        if not lines or lines[0].rstrip("\r\n") != "---":
+            raise ValueError("Page does not start with YAML frontmatter")
+        try:
+            close = next(i for i in range(1, len(lines)) if lines[i].rstrip("\r\n") == "---")
+        except StopIteration:
+            raise ValueError("Unterminated YAML frontmatter") from None
+        self._head = lines[0]
+        self._lines = lines[1:close]
+        self._tail = "".join(lines[close:])
+
+        loader = YAML()
+        loader.preserve_quotes = True
+        loader.allow_duplicate_keys = True
+        self.data = loader.load("".join(self._lines))
+        if self.data is None:
+            self.data = CommentedMap()
+        if not isinstance(self.data, CommentedMap):
+            raise ValueError("YAML frontmatter is not a mapping")
+
+        self._nodes: Dict[int, _Node] = {}
+        self._index(self.data, None, self._trim(0, len(self._lines)), 0)
+        self._indexes: Dict[Tuple[int, Optional[str]], Dict[Any, int]] = {}
+        self._touched: Dict[Tuple[int, Any], Tuple[Any, Any]] = {}
+        self._dirty: set = set()
+        self.sequence_indent = self._detect_sequence_indent()
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs) -> "FrontmatterDocument":
+        """Parse a page from a file."""
+        return cls(Path(path).read_text(encoding="utf-8"), **kwargs)
+
+    @property
+    def changed(self) -> bool:
+        """Whether any applied patch changed the data."""
+        return bool(self._touched)
+
+    # Parsing
+
+    def _trim(self, start: int, end: int) -> int:
+        """Move the end of a span back over trailing blank lines."""
+        while end > start + 1 and not self._lines[end - 1].strip():
+            end -= 1
+        return end
+
+    def _index(self, node: Any, parent: Optional[Tuple[Any, Any]], end: int, depth: int):
+        """Record the positions of a container and its descendants."""
+        if isinstance(node, CommentedMap):
+            keys = list(node.keys())
+            starts = [node.lc.key(key) for key in keys]
+            column = starts[0][1] if starts else 0
+        elif isinstance(node, CommentedSeq):
+            keys = list(range(len(node)))
+            starts = [node.lc.item(i) for i in keys]
+            column = self._dash_column(*starts[0]) if starts else 0
+        else:
+            return
+        spans = {}
+        for i, key in enumerate(keys):
+            start = starts[i][0]
+            stop = starts[i + 1][0] if i + 1 < len(keys) else end
+            spans[key] = (start, self._trim(start, max(stop, start + 1)))
+        self._nodes[id(node)] = _Node(
+            node=node,
+            parent=parent,
+            keys=keys,
+            values={key: node[key] for key in keys},
+            spans=spans,
+            column=column,
+            flow=node.fa.flow_style(),
+            depth=depth,
+        )
+        for key in keys:
+            self._index(node[key], (node, key), spans[key][1], depth + 1)
+
+    def _dash_column(self, line: int, column: int) -> int:
+        """Find the column of the ``-`` introducing a block sequence item."""
+        text = self._lines[line] if line < len(self._lines) else ""
+        dash = text.rfind("-", 0, column)
+        return dash if dash >= 0 else max(column - 2, 0)
+
+    def _detect_sequence_indent(self) -> bool:
+        """Detect whether block sequences are indented under their key."""
+        for info in self._nodes.values():
+            if isinstance(info.node, CommentedSeq) and not info.flow and info.parent:
+                owner = self._nodes.get(id(info.parent[0]))
+                if owner is not None and isinstance(owner.node, CommentedMap):
+                    return info.column > owner.column
+        return False
+
+    # Applying patches
+
+    def apply(self, patch: Patch) -> bool:
+        """Apply a patch to the data.
+
+        Args:
+            patch: Patch to apply
+
+        Returns:
+            True if the data changed
+
+        Raises:
+            KeyError: If an intermediate node of the path does not exist, unless
+                the patch removes, in which case there is nothing to remove
+        """
+        steps = parse_path(patch.path)
+        node = self.data
+        owner: Optional[Tuple[Any, Any]] = None
+        for step in steps[:-1]:
+            key = self._resolve(node, step)
+            if key is None:
+                if patch.op == REMOVE:
+                    return False
+                raise KeyError(f"{patch.path}: no match for {step!r}")
+            owner = (node, key)
+            node = node[key]
+        step = steps[-1]
+
+        if isinstance(node, CommentedMap) or isinstance(node, dict):
+            if not isinstance(step, str):
+                raise KeyError(f"{patch.path}: {step!r} does not select a mapping key")
+            changed = self._apply_to_mapping(node, step, patch)
+            if changed:
+                self._touch(node, step)
+            return changed
+
+        if isinstance(node, list):
+            if owner is None:
+                raise KeyError(f"{patch.path}: the frontmatter root is not a list")
+            changed = self._apply_to_sequence(node, step, patch)
+            if changed:
+                self._touch(*owner)
+            return changed
+
+        raise KeyError(f"{patch.path}: {type(node).__name__} value cannot be patched")
+
+    def apply_all(
+        self, patches: Iterable[Patch], errors: Optional[List[Tuple[Patch, KeyError]]] = None
+    ) -> int:
+        """Apply patches in order.
+
+        Args:
+            patches: Patches to apply
+            errors: If given, patches that cannot be applied are skipped and
+                added to this list with their error, instead of raising
+
+        Returns:
+            Number of patches that changed the data
+        """
+        changed = 0
+        for patch in patches:
+            try:
+                changed += self.apply(patch)
+            except KeyError as e:
+                if errors is None:
+                    raise
+                errors.append((patch, e))
+        return changed
+
+    def _touch(self, container: Any, key: Any):
+        self._touched.setdefault((id(container), key), (container, key))
+
+    def _resolve(self, node: Any, step: Step) -> Any:
+        """Resolve a path step to a key or position of a container, or None if absent."""
+        if isinstance(step, str):
+            if isinstance(node, Mapping):
+                return step if step in node else None
+            raise KeyError(f"Cannot look up key {step!r} in a {type(node).__name__}")
+        if not isinstance(node, list):
+            raise KeyError(f"Cannot select {step!r} in a {type(node).__name__}")
+        if isinstance(step, int):
+            position = step + len(node) if step < 0 else step
+            return position if 0 <= position < len(node) else None
+        name, value = step
+        index_key = (id(node), name)
+        index = self._indexes.get(index_key)
+        if index is None:
+            index = {}
+            for position, item in enumerate(node):
+                if name is None:
+                    item_value = item if isinstance(item, (str, int, float, bool)) else None
+                else:
+                    item_value = item.get(name) if isinstance(item, Mapping) else None
+                if item_value is not None:
+                    index.setdefault(str(item_value), position)
+            self._indexes[index_key] = index
+        return index.get(value)
+
+    def _invalidate(self, sequence: list):
+        for key in [key for key in self._indexes if key[0] == id(sequence)]:
+            del self._indexes[key]
+
+    def _apply_to_mapping(self, node: Mapping, key: str, patch: Patch) -> bool:
+        if patch.op == SET:
+            if key in node and _same(node[key], patch.value):
+                return False
+            node[key] = patch.value
+            return True
+        if patch.op == REMOVE:
+            if key not in node:
+                return False
+            del node[key]
+            return True
+        # APPEND
+        if key not in node or node[key] is None:
+            node[key] = [patch.value]
+            return True
+        items = node[key]
+        if not isinstance(items, list):
+            node[key] = [items, patch.value]
+            return True
+        if _contains(items, patch.value):
+            return False
+        items.append(patch.value)
+        self._invalidate(items)
+        return True
+
+    def _apply_to_sequence(self, sequence: list, step: Step, patch: Patch) -> bool:
+        if isinstance(step, str):
+            raise KeyError(f"{patch.path}: {step!r} does not select a list item")
+        position = self._resolve(sequence, step)
+        if patch.op == REMOVE:
+            if position is None:
+                return False
+            del sequence[position]
+            self._invalidate(sequence)
+            return True
+        if patch.op == SET:
+            if position is None:
+                if not isinstance(step, tuple) or step[0] is None:
+                    raise KeyError(f"{patch.path}: no match for {step!r}")
+                sequence.append(patch.value)
+            elif _same(sequence[position], patch.value):
+                return False
+            else:
+                sequence[position] = patch.value
+            self._invalidate(sequence)
+            return True
+        # APPEND into a list item that is itself a list
+        if position is None:
+            raise KeyError(f"{patch.path}: no match for {step!r}")
+        items = sequence[position]
+        if not isinstance(items, list):
+            raise KeyError(f"{patch.path}: item is not a list")
+        if _contains(items, patch.value):
+            return False
+        items.append(patch.value)
+        self._invalidate(items)
+        self._dirty.add(id(items))
+        return True
+
+    # Rendering
+
+    def _dump(self, data: Any, indent: int) -> List[str]:
+        """Emit data as block YAML lines indented by a number of columns."""
+        dumper = YAML()
+        dumper.width = self.width
+        dumper.allow_unicode = True
+        if self.sequence_indent:
+            dumper.indent(mapping=2, sequence=4, offset=2)
+        else:
+            dumper.indent(mapping=2, sequence=2, offset=0)
+        stream = StringIO()
+        dumper.dump(data, stream)
+        lines = stream.getvalue().splitlines(keepends=True)
+        dedent = min(
+            (len(line) - len(line.lstrip(" ")) for line in lines if line.strip()), default=0
+        )
+        pad = " " * indent
+        return [pad + line[dedent:] if line.strip() else line for line in lines]
+
+    def _covers(self, value: Any) -> frozenset:
+        """Get the IDs of an original container and all of its original descendants."""
+        covered = set()
+        stack = [value]
+        while stack:
+            node = stack.pop()
+            info = self._nodes.get(id(node))
+            if info is None or id(node) in covered:
+                continue
+            covered.add(id(node))
+            stack.extend(info.values.values())
+        return frozenset(covered)
+
+    def _edit_mapping(self, mapping: Any, key: Any, edits: List[_Edit], sequences: Dict[int, Any]):
+        """Create the edit for one changed key of an original mapping."""
+        info = self._nodes.get(id(mapping))
+        if info is None:
+            # Created by a patch; emitted with its (changed) ancestor
+            return
+        if info.flow or (not info.keys and info.parent is not None):
+            self._escalate(info, edits, sequences)
+            return
+
+        was_present = key in info.spans
+        is_present = key in mapping
+        if was_present and is_present:
+            original = info.values[key]
+            current = mapping[key]
+            if current is original:
+                if isinstance(current, CommentedSeq) and id(current) in self._nodes:
+                    sequences[id(current)] = current
+                return
+            start, end = info.spans[key]
+            lines = self._dump({key: current}, info.column)
+            prefix = self._lines[start][: info.column]
+            lines[0] = prefix + lines[0][info.column :]
+            edits.append(_Edit(start, end, lines, mapping, self._covers(original)))
+        elif was_present:
+            start, end = info.spans[key]
+            if self._lines[start][: info.column].strip():
+                # First key of a list item: the "- " would go with it
+                self._escalate(info, edits, sequences)
+                return
+            edits.append(_Edit(start, end, [], mapping, self._covers(info.values[key])))
+        elif is_present:
+            position = self._insertion_point(info, key)
+            if position is None:
+                self._escalate(info, edits, sequences)
+                return
+            lines = self._dump({key: mapping[key]}, info.column)
+            edits.append(
+                _Edit(position, position, lines, mapping, frozenset(), (-info.depth, str(key)))
+            )
+
+    def _insertion_point(self, info: _Node, key: Any) -> Optional[int]:
+        """Find the line before which a new key goes, keeping sorted mappings sorted."""
+        if not info.keys:
+            return len(self._lines)
+        names = [str(name) for name in info.keys]
+        if names == sorted(names):
+            for name, original in zip(names, info.keys):
+                if name > str(key):
+                    start = info.spans[original][0]
+                    if self._lines[start][: info.column].strip():
+                        return None
+                    return start
+        return max(end for _, end in info.spans.values())
+
+    def _escalate(self, info: _Node, edits: List[_Edit], sequences: Dict[int, Any]):
+        """Re-emit a whole node whose change cannot be expressed line by line."""
+        if info.parent is None:
+            edits.append(
+                _Edit(
+                    0,
+                    len(self._lines),
+                    self._dump(self.data, 0),
+                    None,
+                    self._covers(self.data),
+                )
+            )
+            return
+        container, key = info.parent
+        owner = self._nodes[id(container)]
+        if isinstance(container, CommentedSeq):
+            self._dirty.add(id(info.node))
+            sequences[id(container)] = container
+        elif owner.flow:
+            self._escalate(owner, edits, sequences)
+        else:
+            start, end = owner.spans[key]
+            lines = self._dump({key: container[key]}, owner.column)
+            lines[0] = self._lines[start][: owner.column] + lines[0][owner.column :]
+            edits.append(_Edit(start, end, lines, container, self._covers(info.node)))
+
+    def _edit_sequence(self, sequence: Any, edits: List[_Edit], sequences: Dict[int, Any]):
+        """Create the edits for items added to, removed from or replaced in an original list."""
+        info = self._nodes[id(sequence)]
+        if info.flow or not info.keys:
+            self._escalate(info, edits, sequences)
+            return
+        positions = {id(value): position for position, value in info.values.items()}
+        kept: List[Optional[int]] = [
+            positions.get(id(item)) if id(item) not in self._dirty else None for item in sequence
+        ]
+        order = [position for position in kept if position is not None]
+        if order != sorted(set(order)):
+            # Reordered: re-emit the whole list
+            self._escalate(info, edits, sequences)
+            return
+
+        # Walk the runs of new items between kept items
+        previous = -1
+        run: List[Any] = []
+        for item, position in list(zip(sequence, kept)) + [(None, len(info.keys))]:
+            if position is None:
+                run.append(item)
+                continue
+            removed = list(range(previous + 1, position))
+            if removed or run:
+                if removed:
+                    start = info.spans[removed[0]][0]
+                    end = info.spans[removed[-1]][1]
+                elif position < len(info.keys):
+                    start = end = info.spans[position][0]
+                else:
+                    start = end = info.spans[previous][1]
+                covers = frozenset().union(*(self._covers(info.values[p]) for p in removed))
+                lines = self._dump(run, info.column) if run else []
+                edits.append(_Edit(start, end, lines, sequence, covers, (-info.depth, "")))
+            previous = position
+            run = []
+
+    def render(self) -> str:
+        """Get the full text of the page with all applied patches.
+
+        Returns:
+            The original text if nothing changed, otherwise the text with only the
+            changed nodes re-emitted
+        """
+        if not self._touched:
+            return self.text
+        edits: List[_Edit] = []
+        sequences: Dict[int, Any] = {}
+        for container, key in self._touched.values():
+            if isinstance(container, Mapping):
+                self._edit_mapping(container, key, edits, sequences)
+            elif id(container) in self._nodes:
+                # A list nested directly in a list changed: re-emit that item
+                self._dirty.add(id(container[key]))
+                sequences[id(container)] = container
+        processed = set()
+        while len(processed) < len(sequences):
+            for sequence_id, sequence in list(sequences.items()):
+                if sequence_id not in processed:
+                    processed.add(sequence_id)
+                    self._edit_sequence(sequence, edits, sequences)
+
+        covered = frozenset().union(*(edit.covers for edit in edits))
+        edits = [edit for edit in edits if edit.anchor is None or id(edit.anchor) not in covered]
+        edits.sort(key=lambda edit: (edit.start, edit.end, edit.order))
+
+        out = [self._head]
+        position = 0
+        for edit in edits:
+            if edit.start < position:
+                raise RuntimeError("Conflicting patches")
+            out.extend(self._lines[position : edit.start])
+            out.extend(edit.lines)
+            position = edit.end
+        out.extend(self._lines[position:])
+        out.append(self._tail)
+        return "".join(out)
+
+
+def resource_path(resource_id: str, directory: Union[str, Path] = RESOURCE_DIRECTORY) -> Path:
+    """Get the path of a resource's page, ``resource/<id>/<id>.md``."""
+    return Path(directory, resource_id, f"{resource_id}.md")
+
+
+def patch_file(
+    path: Union[str, Path],
+    patches: Iterable[Patch],
+    width: int = 80,
+    errors: Optional[List[Tuple[Patch, KeyError]]] = None,
+) -> bool:
+    """Apply patches to a page and write it back if anything changed.
+
+    Args:
+        path: Path of the page
+        patches: Patches to apply, in order
+        width: Line width used when emitting changed nodes
+        errors: If given, patches that cannot be applied are skipped and
+            added to this list with their error, instead of raising
+
+    Returns:
+        True if the file was written
+    """
+    document = FrontmatterDocument.load(path, width=width)
+    if not document.apply_all(patches, errors):
+        return False
+    text = document.render()
+    if text == document.text:
+        return False
+    Path(path).write_text(text, encoding="utf-8")
+    return True
+
+
+def patch_files(
+    patches: Mapping[Union[str, Path], Iterable[Patch]],
+    width: int = 80,
+    errors: Optional[Dict[Path, List[Tuple[Patch, Exception]]]] = None,
+) -> Dict[Path, bool]:
+    """Apply patches to many pages, reading and writing each page once.
+
+    A patch that cannot be applied is logged and skipped, and the other
+    patches of its page are still applied.
+
+    Args:
+        patches: Dictionary from page path to the patches for that page
+        width: Line width used when emitting changed nodes
+        errors: If given, filled with the patches that could not be applied,
+            with their error, by page path
+
+    Returns:
+        Dictionary from page path to whether it was written. Pages that could not be
+        read or parsed are logged and map to False.
+    """
+    results = {}
+    for path, file_patches in patches.items():
+        path = Path(path)
+        file_patches = list(file_patches)
+        failed: List[Tuple[Patch, Exception]] = []
+        try:
+            results[path] = patch_file(path, file_patches, width=width, errors=failed)
+        except (OSError, ValueError) as e:
+            logger.error("Could not patch %s: %s", path, e)
+            results[path] = False
+            failed = [(patch, e) for patch in file_patches]
+        else:
+            for patch, e in failed:
+                logger.error("Could not apply %s %s to %s: %s", patch.op, patch.path, path, e)
+        if failed and errors is not None:
+            errors[path] = failed
+    return results
@@ -0,0 +1,349 @@
+"""Concurrent, cached client for the GitHub REST API."""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+
+from kg_registry.cache import DiskCache
+
+__all__ = [
+    "GITHUB_API",
+    "GitHubClient",
+]
+
+logger = logging.getLogger(__name__)
+
+#: Base URL of the public GitHub REST API
+GITHUB_API = "https://api.github.com"
+
+USER_AGENT = "kgregistry/1.0 (https://kghub.org/kg-registry/)"
+
+
+class _RateLimiter:
+    """Bound in-flight requests by a fixed ceiling and by the server's rate-limit budget.
+
+    The budget is learned from the ``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``
+    headers of every response. Once the remaining budget is used up by requests
+    already in flight, new requests wait until the window resets instead of
+    sleeping for a fixed interval before each call.
+    """
+
+    def __init__(self, max_concurrency: int, clock: Callable[[], float] = time.time):
+        self.max_concurrency = max(1, max_concurrency)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._remaining: Optional[int] = None
+        self._reset: Optional[float] = None
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """Last known remaining request budget, if any."""
+        return self._remaining
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._cond:
+            while True:
+                now = self._clock()
+                if self._reset is not None and now >= self._reset:
+                    self._remaining = None
+                    self._reset = None
+                if self._in_flight >= self.max_concurrency:
+                    self._cond.wait()
+                    continue
+                if self._remaining is not None and self._in_flight >= self._remaining:
+                    # Budget is exhausted by what is already in flight. Wait for those
+                    # to report back, or for the window to reset.
+                    timeout = None if self._in_flight else max(0.0, self._reset - now)
+                    if timeout:
+                        logger.warning("GitHub rate limit reached, waiting %.0fs", timeout)
+                    self._cond.wait(timeout)
+                    continue
+                self._in_flight += 1
+                return
+
+    def release(self, headers: Optional[Dict[str, str]] = None):
+        """Mark a request as finished and record the budget it reported."""
+        with self._cond:
+            self._in_flight -= 1
+            if headers is not None:
+                self._update(headers)
+            self._cond.notify_all()
+
+    def block_until(self, reset: float):
+        """Stop sending requests until the given epoch time."""
+        with self._cond:
+            self._remaining = 0
+            self._reset = reset if self._reset is None else max(self._reset, reset)
+            self._cond.notify_all()
+
+    def _update(self, headers: Dict[str, str]):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining_value = int(remaining)
+            reset_value = float(reset)
+        except ValueError:
+            return
+        if self._reset is None or reset_value > self._reset:
+            # A new window started
+            self._remaining = remaining_value
+            self._reset = reset_value
+        elif reset_value == self._reset:
+            # Responses can arrive out of order; the lowest count is the most recent
+            self._remaining = min(self._remaining, remaining_value)
+
+
+class GitHubClient:
+    """Client for the GitHub REST API.
+
+    Features:
+
+    - Authenticates with a token (argument or ``GITHUB_TOKEN`` environment variable)
+    - Runs requests concurrently, bounded by ``max_workers`` and by the rate-limit
+      budget GitHub reports in its ``X-RateLimit-*`` headers
+    - Follows ``Link: rel="next"`` pagination
+    - Keeps an optional on-disk ETag cache, so unchanged resources come back as
+      ``304 Not Modified`` (which do not count against the authenticated quota)
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        cache_dir: Optional[Union[str, Path]] = None,
+        max_workers: int = 8,
+        api_url: str = GITHUB_API,
+        timeout: float = 30,
+        max_retries: int = 3,
+    ):
+        """Initialize the client.
+
+        Args:
+            token: GitHub token. Defaults to the ``GITHUB_TOKEN`` environment variable.
+            cache_dir: Directory for the ETag cache. If None, responses are not cached.
+            max_workers: Maximum number of concurrent requests
+            api_url: Base URL of the API, e.g. a local fake for testing
+            timeout: Timeout in seconds for each request
+            max_retries: Number of retries after a rate-limit rejection
+        """
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_workers = max(1, max_workers)
+        self.cache = DiskCache(cache_dir) if cache_dir else None
+        self._limiter = _RateLimiter(self.max_workers)
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        """Get the session for the current thread."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["Accept"] = "application/vnd.github+json"
+            session.headers["User-Agent"] = USER_AGENT
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            self._local.session = session
+        return session
+
+    def _url(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.api_url}/{path.lstrip('/')}"
+
+    def _get_page(self, url: str) -> Tuple[Any, Optional[str]]:
+        """Get a single page of results.
+
+        Returns:
+            Tuple of (decoded JSON body or None if not found, URL of the next page or None)
+
+        Raises:
+            requests.HTTPError: If the request fails, or keeps being rate limited
+        """
+        cached = self.cache.get(url) if self.cache else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            response = None
+            try:
+                response = self._session().get(url, headers=headers, timeout=self.timeout)
+            finally:
+                self._limiter.release(response.headers if response is not None else None)
+
+            if response.status_code == 304:
+                if cached and "data" in cached:
+                    logger.debug("Not modified: %s", url)
+                    return cached["data"], cached.get("next")
+                if not headers:
+                    raise requests.HTTPError(
+                        f"304 Not Modified for an unconditional request: {url}", response=response
+                    )
+                # The cache entry has no body to reuse, so ask for the full response
+                logger.debug("Not modified but not cached, fetching again: %s", url)
+                cached, headers = None, {}
+                continue
+
+            if response.status_code in (403, 429) and attempt < self.max_retries:
+                wait_until = self._rejected_until(response)
+                if wait_until is not None:
+                    logger.warning("Rate limited on %s, retrying", url)
+                    self._limiter.block_until(wait_until)
+                    attempt += 1
+                    continue
+
+            if response.status_code == 404:
+                return None, None
+            response.raise_for_status()
+
+            data = response.json() if response.status_code != 204 and response.content else []
+            next_url = response.links.get("next", {}).get("url")
+            if self.cache and (
+                response.headers.get("ETag") or response.headers.get("Last-Modified")
+            ):
+                self.cache.set(
+                    url,
+                    {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                        "data": data,
+                        "next": next_url,
+                    },
+                )
+            return data, next_url
+
+    @staticmethod
+    def _rejected_until(response: requests.Response) -> Optional[float]:
+        """Get the time at which a rate-limited request may be retried, if it was rate limited."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return time.time() + float(retry_after)
+            except ValueError:
+                return time.time() + 60
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                return float(response.headers["X-RateLimit-Reset"])
+            except (KeyError, ValueError):
+                return time.time() + 60
+        return None
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Get a single API resource.
+
+        Args:
+            path: API path (e.g. ``repos/org/repo``) or full URL
+            params: Query parameters
+
+        Returns:
+            Decoded JSON body, or None if the resource does not exist
+        """
+        url = requests.Request("GET", self._url(path), params=params).prepare().url
+        data, _ = self._get_page(url)
+        return data
+
+    def get_paginated(self, path: str, params: Optional[Dict[str, Any]] = None) -> Optional[List]:
+        """Get all pages of a list resource by following ``Link`` headers.
+
+        Args:
+            path: API path (e.g. ``repos/org/repo/contributors``) or full URL
+            params: Query parameters. ``per_page`` defaults to 100.
+
+        Returns:
+            Concatenated items of all pages, or None if the resource does not exist
+        """
+        params = {"per_page": 100, **(params or {})}
+        url = requests.Request("GET", self._url(path), params=params).prepare().url
+        items: Optional[List] = None
+        while url:
+            data, url = self._get_page(url)
+            if data is None:
+                break
+            items = (items or []) + list(data)
+        return items
+
+    def map(self, func: Callable[[str], Any], keys: Iterable[str]) -> Dict[str, Any]:
+        """Apply a client method to many keys concurrently.
+
+        Args:
+            func: Callable taking a single key, typically a bound method of this client
+            keys: Keys to apply ``func`` to
+
+        Returns:
+            Dictionary from key to result. Keys whose call raised map to None.
+        """
+        keys = list(dict.fromkeys(keys))
+
+        def _call(key: str) -> Any:
+            try:
+                return func(key)
+            except requests.RequestException as e:
+                logger.error("Failed: %s (%s)", key, e)
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(keys, executor.map(_call, keys)))
+
+    def get_repository(self, repo_path: str) -> Optional[Dict[str, Any]]:
+        """Get metadata for a repository.
+
+        Args:
+            repo_path: Repository path, "org/repo"
+
+        Returns:
+            Repository metadata, or None if it does not exist
+        """
+        return self.get_json(f"repos/{repo_path}")
+
+    def get_license(self, repo_path: str) -> Optional[str]:
+        """Get the SPDX identifier GitHub detected for a repository's license.
+
+        Args:
+            repo_path: Repository path, "org/repo"
+
+        Returns:
+            SPDX identifier (possibly ``NOASSERTION``), or None if no license was found
+        """
+        repository = self.get_repository(repo_path)
+        if not repository or not repository.get("license"):
+            return None
+        return repository["license"].get("spdx_id")
+
+    def get_contributors(self, repo_path: str) -> List[Dict[str, Any]]:
+        """Get all contributors to a repository.
+
+        Args:
+            repo_path: Repository path, "org/repo"
+
+        Returns:
+            List of contributor records, empty if the repository does not exist
+        """
+        return self.get_paginated(f"repos/{repo_path}/contributors") or []
+
+    def get_contributors_many(self, repo_paths: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get contributors for many repositories concurrently.
+
+        Args:
+            repo_paths: Repository paths, "org/repo"
+
+        Returns:
+            Dictionary from repository path to list of contributor records
+        """
+        results = self.map(self.get_contributors, repo_paths)
+        return {repo_path: contributors or [] for repo_path, contributors in results.items()}
@@ -0,0 +1,317 @@
+"""History of the registry: the rows of every sync, kept as snapshots.
+
+Once :func:`enable_history` is called, every sync that changes the data
+records a snapshot in ``registry_snapshots``, keyed by an ID, the git commit
+of the registry it was synced from and the time it was taken. The rows of
+the tables filled from the source records, :data:`HISTORY_TABLES`, are kept
+in a ``<table>_history`` table each, with the snapshot they were written by
+(``valid_from``) and the one that replaced or removed them (``valid_to``,
+NULL while they are current). A sync only adds rows for the resources it
+rewrites, and closes those of the resources it rewrites or removes, so the
+history grows with the changes, not with the number of snapshots.
+
+:func:`snapshot_columns` reads the rows a table had at a snapshot, from which
+:meth:`DuckDBBackend.as_of <kg_registry.duckdb_backend.DuckDBBackend.as_of>`
+rebuilds the registry as it was then.
+"""
+
+import os
+import subprocess  # noqa:S404 - only runs git with fixed arguments
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+import duckdb
+
+__all__ = [
+    "HISTORY_TABLES",
+    "SNAPSHOTS_SCHEMA",
+    "SnapshotKey",
+    "enable_history",
+    "drop_history",
+    "has_history",
+    "upgrade_history",
+    "record_snapshot",
+    "list_snapshots",
+    "resolve_snapshot",
+    "snapshot_columns",
+    "git_commit",
+]
+
+#: Tables whose rows are kept, with the column holding the resource ID
+HISTORY_TABLES: Dict[str, str] = {
+    "resources": "id",
+    "resource_domains": "resource_id",
+    "resource_products": "resource_id",
+}
+
+#: Column definitions of ``registry_snapshots``
+SNAPSHOTS_SCHEMA = """
+    snapshot_id BIGINT PRIMARY KEY,
+    commit VARCHAR,
+    taken_at TIMESTAMP,
+    generation BIGINT
+"""
+
+#: A snapshot ID, a git commit or a prefix of one, or a time (the last
+#: snapshot taken at or before it)
+SnapshotKey = Union[int, str, datetime]
+
+_SNAPSHOTS_TABLE = "registry_snapshots"
+
+# Whether a row of a history table was current at snapshot $1
+_VALID_AT = "valid_from <= $1 AND (valid_to IS NULL OR valid_to > $1)"
+
+
+def has_history(conn: duckdb.DuckDBPyConnection) -> bool:
+    """Check whether the history is recorded.
+
+    Args:
+        conn: DuckDB connection
+
+    Returns:
+        True if ``registry_snapshots`` exists
+    """
+    return bool(
+        conn.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = $1 AND NOT temporary",
+            [_SNAPSHOTS_TABLE],
+        ).fetchone()[0]
+    )
+
+
+def enable_history(conn: duckdb.DuckDBPyConnection, commit: Optional[str] = None):
+    """Start recording the history of the registry tables.
+
+    If the tables have data, their current rows are recorded as the first
+    snapshot. Does nothing if the history is already recorded.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        commit: Git commit of the registry the data was synced from, if known
+    """
+    if has_history(conn):
+        return
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"CREATE TABLE {_SNAPSHOTS_TABLE} ({SNAPSHOTS_SCHEMA})")
+        for table in HISTORY_TABLES:
+            conn.execute(
+                f"CREATE TABLE {table}_history AS "
+                "SELECT *, NULL::BIGINT AS valid_from, NULL::BIGINT AS valid_to "
+                f"FROM {table} LIMIT 0"
+            )
+        if conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0]:
+            generation = conn.execute("SELECT generation FROM registry_meta").fetchone()[0]
+            record_snapshot(conn, generation, None, None, commit)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def drop_history(conn: duckdb.DuckDBPyConnection):
+    """Drop the history and its snapshots, so syncs stop recording them.
+
+    Args:
+        conn: DuckDB connection
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {_SNAPSHOTS_TABLE}")
+    for table in HISTORY_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}_history")
+
+
+def upgrade_history(conn: duckdb.DuckDBPyConnection):
+    """Add the columns added to the registry tables to their history tables.
+
+    Rows recorded before have NULL in them.
+
+    Args:
+        conn: DuckDB connection with the registry and history tables
+    """
+    missing = conn.execute(
+        """
+        SELECT c.table_name, c.column_name, c.data_type
+        FROM duckdb_columns() c
+        WHERE c.table_name IN (SELECT UNNEST($1))
+            AND NOT EXISTS (
+                SELECT 1 FROM duckdb_columns() h
+                WHERE h.table_name = c.table_name || '_history' AND h.column_name = c.column_name
+            )
+        ORDER BY c.table_name, c.column_index
+        """,
+        [list(HISTORY_TABLES)],
+    ).fetchall()
+    for table, name, column_type in missing:
+        conn.execute(f'ALTER TABLE {table}_history ADD COLUMN "{name}" {column_type}')
+
+
+def record_snapshot(
+    conn: duckdb.DuckDBPyConnection,
+    generation: int,
+    stale: Optional[List[str]],
+    written: Optional[List[str]],
+    commit: Optional[str] = None,
+) -> int:
+    """Record the changes of a sync as a new snapshot.
+
+    Called by the sync once the registry tables have their new rows. This
+    does not start a transaction, so it can run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the registry and history tables
+        generation: Generation number of the data after the sync
+        stale: IDs of the resources whose earlier rows were deleted, or None
+            if all of them were
+        written: IDs of the resources whose rows were written, or None if all
+            of them were
+        commit: Git commit of the registry the data was synced from, if known
+
+    Returns:
+        ID of the snapshot
+    """
+    taken_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    snapshot_id = conn.execute(
+        f"INSERT INTO {_SNAPSHOTS_TABLE} "
+        f"SELECT COALESCE(MAX(snapshot_id), 0) + 1, $1, $2, $3 FROM {_SNAPSHOTS_TABLE} "
+        "RETURNING snapshot_id",
+        [commit, taken_at, generation],
+    ).fetchone()[0]
+    for table, key in HISTORY_TABLES.items():
+        if stale is None:
+            conn.execute(
+                f"UPDATE {table}_history SET valid_to = $1 WHERE valid_to IS NULL", [snapshot_id]
+            )
+        elif stale:
+            conn.execute(
+                f"UPDATE {table}_history SET valid_to = $1 "
+                f"WHERE valid_to IS NULL AND {key} IN (SELECT UNNEST($2))",
+                [snapshot_id, stale],
+            )
+        if written is None:
+            conn.execute(
+                f"INSERT INTO {table}_history BY NAME SELECT *, $1 AS valid_from FROM {table}",
+                [snapshot_id],
+            )
+        elif written:
+            conn.execute(
+                f"INSERT INTO {table}_history BY NAME SELECT *, $1 AS valid_from FROM {table} "
+                f"WHERE {key} IN (SELECT UNNEST($2))",
+                [snapshot_id, written],
+            )
+    return snapshot_id
+
+
+def list_snapshots(conn: duckdb.DuckDBPyConnection) -> List[Dict[str, Any]]:
+    """List the recorded snapshots.
+
+    Args:
+        conn: DuckDB connection with the history tables
+
+    Returns:
+        Snapshots with ``snapshot_id``, ``commit``, ``taken_at``, ``generation``
+        and ``resources``, the number of resources they had, oldest first
+    """
+    cursor = conn.execute(f"""
+        SELECT s.*, (
+            SELECT COUNT(*) FROM resources_history h
+            WHERE h.valid_from <= s.snapshot_id
+                AND (h.valid_to IS NULL OR h.valid_to > s.snapshot_id)
+        ) AS resources
+        FROM {_SNAPSHOTS_TABLE} s
+        ORDER BY snapshot_id
+        """)
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def resolve_snapshot(conn: duckdb.DuckDBPyConnection, snapshot: SnapshotKey) -> Dict[str, Any]:
+    """Find a recorded snapshot.
+
+    Strings are looked up as a snapshot ID if they are digits, as a time if
+    they are an ISO 8601 date, and as a git commit otherwise; a commit synced
+    more than once gives its last snapshot. Aware times are compared in UTC.
+
+    Args:
+        conn: DuckDB connection with the history tables
+        snapshot: Snapshot ID, git commit or a prefix of one, or a time
+
+    Returns:
+        The snapshot, with ``snapshot_id``, ``commit``, ``taken_at`` and ``generation``
+
+    Raises:
+        ValueError: If no snapshot matches
+    """
+    if not has_history(conn):
+        raise ValueError("The history is not recorded, see enable_history()")
+    if isinstance(snapshot, str):
+        if snapshot.isdigit():
+            snapshot = int(snapshot)
+        else:
+            try:
+                snapshot = datetime.fromisoformat(snapshot.replace("Z", "+00:00"))
+            except ValueError:
+                pass
+    if isinstance(snapshot, datetime):
+        if snapshot.tzinfo is not None:
+            snapshot = snapshot.astimezone(timezone.utc).replace(tzinfo=None)
+        condition = "taken_at <= $1"
+    elif isinstance(snapshot, int):
+        condition = "snapshot_id = $1"
+    else:
+        condition = "starts_with(commit, $1)"
+    cursor = conn.execute(
+        f"SELECT * FROM {_SNAPSHOTS_TABLE} WHERE {condition} ORDER BY snapshot_id DESC LIMIT 1",
+        [snapshot],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"No snapshot matches {snapshot!r}")
+    return dict(zip([desc[0] for desc in cursor.description], row))
+
+
+def snapshot_columns(
+    conn: duckdb.DuckDBPyConnection, table: str, snapshot_id: int
+) -> Dict[str, List[Any]]:
+    """Read the rows a table had at a snapshot.
+
+    Args:
+        conn: DuckDB connection with the history tables
+        table: One of :data:`HISTORY_TABLES`
+        snapshot_id: ID of the snapshot
+
+    Returns:
+        Dictionary from column name to the list of its values, as the column
+        buffers of :func:`kg_registry.ingest.insert_columns`
+    """
+    cursor = conn.execute(
+        f"SELECT * EXCLUDE (valid_from, valid_to) FROM {table}_history WHERE {_VALID_AT}",
+        [snapshot_id],
+    )
+    names = [desc[0] for desc in cursor.description]
+    rows = cursor.fetchall()
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def git_commit(path: str) -> Optional[str]:
+    """Get the commit checked out in the git repository of a path.
+
+    Args:
+        path: File or directory in the repository
+
+    Returns:
+        Full commit hash, or None if the path is not in a git repository
+    """
+    if not os.path.isdir(path):
+        path = os.path.dirname(os.path.abspath(path))
+    try:
+        # git is looked up on PATH like any user's, and no argument comes from input
+        result = subprocess.run(  # noqa:S603,S607
+            ["git", "rev-parse", "HEAD"],
+            cwd=path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
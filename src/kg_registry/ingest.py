@@ -0,0 +1,1041 @@
+"""Columnar bulk ingest of registry resources into DuckDB tables.
+
+Shared by :class:`~kg_registry.duckdb_backend.DuckDBBackend` and
+:class:`~kg_registry.parquet_backend.ParquetBackend`. Resources are turned into
+one list per column in a single pass, and each table is then loaded with one
+``INSERT ... SELECT UNNEST(?), UNNEST(?), ...`` statement, so the whole sync is a
+handful of statements in one transaction instead of one statement per row.
+
+Each resource row stores a hash of its source record, so :func:`sync_resources`
+can rewrite only the resources that were added or changed since the last sync.
+Every sync that changes something also increments the generation number in
+``registry_meta`` in the same transaction, so readers can tell whether the data
+changed since they last looked.
+
+How the source records themselves are stored is the storage profile of the
+tables, see :mod:`kg_registry.storage`. Once the history is enabled, every
+sync that changes something also records a snapshot, see
+:mod:`kg_registry.history`, and every incremental sync records what it
+changed, see :mod:`kg_registry.changes`.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import duckdb
+import yaml
+
+from kg_registry.changes import CHANGES_SCHEMAS, diff_resources
+from kg_registry.history import HISTORY_TABLES, has_history, record_snapshot, upgrade_history
+from kg_registry.lineage import LINEAGE_SCHEMAS, build_closure, has_closure, index_lineage
+from kg_registry.lookup import LOOKUP_SCHEMAS, index_lookup
+from kg_registry.search import SEARCH_SCHEMAS, index_resources
+from kg_registry.stats import STATS_SCHEMAS, index_stats
+from kg_registry.storage import DEFAULT_STORAGE, check_storage
+
+__all__ = [
+    "CONTACTS_TYPE",
+    "LICENSE_TYPE",
+    "PRODUCT_SLOT_COLUMNS",
+    "COMPATIBILITY_VIEWS",
+    "TABLE_SCHEMAS",
+    "ResourceColumns",
+    "SyncSummary",
+    "create_tables",
+    "current_generation",
+    "current_storage",
+    "parse_date",
+    "content_hash",
+    "product_slot_values",
+    "build_columns",
+    "insert_columns",
+    "bulk_load",
+    "load_columns",
+    "preview_sync",
+    "sync_resources",
+    "load_resources",
+]
+
+#: Type of ``contacts`` and ``curators`` columns: a list of the schema's
+#: ``Contact`` records (``Individual`` or ``Organization``) with their
+#: ``ContactDetails``
+CONTACTS_TYPE = (
+    "STRUCT(category VARCHAR, label VARCHAR, orcid VARCHAR, contact_details STRUCT("
+    "contact_type VARCHAR, contact_type_name VARCHAR, contact_type_url VARCHAR, value VARCHAR"
+    ")[])[]"
+)
+
+#: Type of ``license`` columns, after the schema's ``License``
+LICENSE_TYPE = "STRUCT(id VARCHAR, label VARCHAR, logo VARCHAR)"
+
+#: Typed columns of ``resource_products`` for the product slots of the schema
+#: (``Product`` and its subclasses), named after the slots
+PRODUCT_SLOT_COLUMNS: Dict[str, str] = {
+    "product_file_size": "BIGINT",
+    "compression": "VARCHAR",
+    "dump_format": "VARCHAR",
+    "license": LICENSE_TYPE,
+    "versions": "VARCHAR[]",
+    "latest_version": "VARCHAR",
+    "infores_id": "VARCHAR",
+    "repository": "VARCHAR",
+    "original_source": "VARCHAR[]",
+    "secondary_source": "VARCHAR[]",
+    "produced_by": "VARCHAR[]",
+    "tags": "VARCHAR[]",
+    "compatibility": "STRUCT(standard VARCHAR, version VARCHAR)[]",
+    "contacts": CONTACTS_TYPE,
+    "curators": CONTACTS_TYPE,
+    "warnings": "VARCHAR[]",
+    "collection": "VARCHAR[]",
+    "layout": "VARCHAR",
+    "creation_date": "TIMESTAMP",
+    "last_modified_date": "TIMESTAMP",
+    # GraphProduct
+    "node_count": "BIGINT",
+    "edge_count": "BIGINT",
+    "predicates": "VARCHAR[]",
+    "node_categories": "VARCHAR[]",
+    # ProgrammingInterface
+    "is_public": "BOOLEAN",
+    "is_neo4j": "BOOLEAN",
+    "connection_url": "VARCHAR",
+}
+
+_PRODUCT_SLOT_DEFINITIONS = ",\n        ".join(
+    f"{name} {column_type}" for name, column_type in PRODUCT_SLOT_COLUMNS.items()
+)
+
+#: Column definitions of each registry table, in load order
+TABLE_SCHEMAS: Dict[str, str] = {
+    "resources": f"""
+        id VARCHAR PRIMARY KEY,
+        name VARCHAR,
+        description TEXT,
+        category VARCHAR,
+        activity_status VARCHAR,
+        homepage_url VARCHAR,
+        repository VARCHAR,
+        creation_date TIMESTAMP,
+        last_modified_date TIMESTAMP,
+        license {LICENSE_TYPE},
+        domains VARCHAR[],
+        contacts {CONTACTS_TYPE},
+        curators {CONTACTS_TYPE},
+        products JSON,
+        layout VARCHAR,
+        collection VARCHAR[],
+        infores_id VARCHAR,
+        record_fields VARCHAR[],
+        raw_data JSON,
+        sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        content_hash VARCHAR
+    """,
+    # Domains table for better querying
+    "resource_domains": """
+        resource_id VARCHAR,
+        domain VARCHAR,
+        PRIMARY KEY (resource_id, domain)
+    """,
+    # Products table for better querying
+    "resource_products": f"""
+        resource_id VARCHAR,
+        product_id VARCHAR,
+        product_name VARCHAR,
+        product_category VARCHAR,
+        product_description TEXT,
+        product_format VARCHAR,
+        product_url VARCHAR,
+        {_PRODUCT_SLOT_DEFINITIONS},
+        PRIMARY KEY (resource_id, product_id)
+    """,
+    # Full-text search index, see kg_registry.search
+    **SEARCH_SCHEMAS,
+    # Typo-tolerant lookup by name or ID, see kg_registry.lookup
+    **LOOKUP_SCHEMAS,
+    # Dependencies between resources and products, see kg_registry.lineage
+    **LINEAGE_SCHEMAS,
+    # Counts and totals computed by each sync, see kg_registry.stats
+    **STATS_SCHEMAS,
+    # What each sync added, changed and removed, see kg_registry.changes
+    **CHANGES_SCHEMAS,
+    # Single row describing the last sync
+    "registry_meta": """
+        generation BIGINT NOT NULL,
+        synced_at TIMESTAMP,
+        storage_profile VARCHAR
+    """,
+}
+
+#: Columns added to the tables after their first release, created on databases
+#: that predate them
+ADDED_COLUMNS: Dict[str, Dict[str, str]] = {
+    "resources": {
+        "content_hash": "VARCHAR",
+        "license": LICENSE_TYPE,
+        "collection": "VARCHAR[]",
+        "infores_id": "VARCHAR",
+        "record_fields": "VARCHAR[]",
+    },
+    "resource_products": PRODUCT_SLOT_COLUMNS,
+    "registry_meta": {"storage_profile": "VARCHAR"},
+}
+
+#: Added columns that are filled from the source records when they are added,
+#: with the SQL filling them, so the database is usable before the next sync
+FILLED_COLUMNS: Dict[str, Dict[str, str]] = {
+    "resources": {
+        "collection": "CAST(raw_data -> '$.collection' AS VARCHAR[])",
+        "infores_id": "raw_data ->> '$.infores_id'",
+        "record_fields": "json_keys(raw_data)",
+    },
+}
+
+# Structure of the contacts for json_transform(), which leaves out missing keys
+_CONTACTS_STRUCTURE = json.dumps(
+    [
+        {
+            "category": "VARCHAR",
+            "label": "VARCHAR",
+            "orcid": "VARCHAR",
+            "contact_details": [
+                {
+                    "contact_type": "VARCHAR",
+                    "contact_type_name": "VARCHAR",
+                    "contact_type_url": "VARCHAR",
+                    "value": "VARCHAR",
+                }
+            ],
+        }
+    ]
+)
+
+#: Columns that were stored as JSON before they were typed, with their type
+#: and the SQL converting their JSON values
+RETYPED_COLUMNS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    table: {
+        name: (CONTACTS_TYPE, f"json_transform({name}, '{_CONTACTS_STRUCTURE}')")
+        for name in ("contacts", "curators")
+    }
+    for table in ("resources", "resource_products")
+}
+
+#: Columns replaced by a single typed column, with the SQL filling it from them
+REPLACED_COLUMNS: Dict[str, Dict[str, Tuple[List[str], str]]] = {
+    "resources": {
+        "license": (
+            ["license_id", "license_label"],
+            "CASE WHEN license_id IS NOT NULL OR license_label IS NOT NULL THEN {"
+            "'id': license_id, 'label': license_label, 'logo': raw_data ->> '$.license.logo'"
+            "} END",
+        )
+    },
+    "resource_products": {
+        "license": (
+            ["license_id", "license_label"],
+            "CASE WHEN license_id IS NOT NULL OR license_label IS NOT NULL THEN {"
+            "'id': license_id, 'label': license_label, 'logo': NULL::VARCHAR} END",
+        )
+    },
+}
+
+_COMPATIBILITY_VIEW = """
+    SELECT * EXCLUDE (license)
+        REPLACE (to_json(contacts) AS contacts, to_json(curators) AS curators),
+        license.id AS license_id,
+        license.label AS license_label
+    FROM {}
+"""
+
+#: Views giving the tables the form they had before their nested columns were
+#: typed: ``contacts`` and ``curators`` as JSON, and ``license`` split into
+#: ``license_id`` and ``license_label``
+COMPATIBILITY_VIEWS: Dict[str, str] = {
+    f"{table}_json": _COMPATIBILITY_VIEW.format(table)
+    for table in ("resources", "resource_products")
+}
+
+#: Column of each table holding the resource ID
+RESOURCE_KEYS: Dict[str, str] = {
+    "resources": "id",
+    "resource_domains": "resource_id",
+    "resource_products": "resource_id",
+    "search_terms": "resource_id",
+    "search_docs": "resource_id",
+    "lineage_edges": "resource_id",
+}
+
+#: JSON columns of ``resources`` derived in SQL from ``raw_data``, so each
+#: resource is serialized only once, in the ``full`` storage profile
+DERIVED_RESOURCE_COLUMNS = {
+    "products": "COALESCE(json_extract(raw_data, '$.products'), '[]')",
+}
+
+
+def load_resources(yaml_file: str) -> Optional[List[Dict[str, Any]]]:
+    """Load the resources from a registry YAML file.
+
+    Uses libyaml's C loader when PyYAML was built with it.
+
+    Args:
+        yaml_file: Path to YAML file containing resources data, e.g. ``registry/kgs.yml``
+
+    Returns:
+        List of resource records, or None if the file has no ``resources``
+    """
+    with open(yaml_file, "r") as f:
+        data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+    if not data or "resources" not in data:
+        return None
+    return data["resources"]
+
+
+def create_tables(conn: duckdb.DuckDBPyConnection):
+    """Create the registry tables if they do not exist.
+
+    Args:
+        conn: DuckDB connection
+    """
+    existing = {row[0] for row in conn.execute("SHOW TABLES").fetchall()}
+    column_types = {
+        (table, name): column_type
+        for table, name, column_type in conn.execute(
+            "SELECT table_name, column_name, data_type FROM duckdb_columns()"
+        ).fetchall()
+    }
+    # Lookup indexes with a separate postings table are dropped and rebuilt
+    if "lookup_trigrams" in existing and ("lookup_trigrams", "postings") not in column_types:
+        for table in ["lookup_postings", "lookup_trigrams"]:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        existing -= {"lookup_postings", "lookup_trigrams"}
+    for table, columns in TABLE_SCHEMAS.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    for table, added in ADDED_COLUMNS.items():
+        for name, column_type in added.items():
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {column_type}")
+    history = has_history(conn)
+    if history:
+        upgrade_history(conn)
+    for table, filled in FILLED_COLUMNS.items():
+        history_table = [f"{table}_history"] if history and table in HISTORY_TABLES else []
+        for target in [table, *history_table]:
+            for name, fill in filled.items():
+                if target in existing and (target, name) not in column_types:
+                    conn.execute(f"UPDATE {target} SET {name} = {fill}")
+
+    # Product columns are filled from the source records, so databases synced
+    # before they existed, or before they were typed, forget their hashes and
+    # the next sync rewrites them. Meanwhile, values are converted in place.
+    outdated = "resource_products" in existing and any(
+        ("resource_products", name) not in column_types for name in PRODUCT_SLOT_COLUMNS
+    )
+    for table, retyped in RETYPED_COLUMNS.items():
+        for name, (column_type, conversion) in retyped.items():
+            if column_types.get((table, name)) == "JSON":
+                conn.execute(
+                    f"ALTER TABLE {table} ALTER {name} SET DATA TYPE {column_type} "
+                    f"USING {conversion}"
+                )
+                outdated = True
+    for table, replaced in REPLACED_COLUMNS.items():
+        for name, (old_names, fill) in replaced.items():
+            if all((table, old_name) in column_types for old_name in old_names):
+                conn.execute(f"UPDATE {table} SET {name} = {fill}")
+                for old_name in old_names:
+                    conn.execute(f"ALTER TABLE {table} DROP COLUMN {old_name}")
+                outdated = True
+    if outdated:
+        conn.execute("UPDATE resources SET content_hash = NULL")
+    for view, query in COMPATIBILITY_VIEWS.items():
+        conn.execute(f"CREATE OR REPLACE VIEW {view} AS {query}")
+    conn.execute(
+        "INSERT INTO registry_meta (generation) SELECT 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM registry_meta)"
+    )
+    # Index databases synced before the indexes existed
+    if "resources" in existing and not existing.issuperset(SEARCH_SCHEMAS):
+        for table in SEARCH_SCHEMAS:
+            conn.execute(f"DELETE FROM {table}")
+        index_resources(conn)
+    if "resources" in existing and not existing.issuperset(LOOKUP_SCHEMAS):
+        index_lookup(conn)
+    if "resources" in existing and not existing.issuperset(LINEAGE_SCHEMAS):
+        index_lineage(conn)
+    if "resources" in existing and not existing.issuperset(STATS_SCHEMAS):
+        index_stats(conn)
+
+
+def current_generation(conn: duckdb.DuckDBPyConnection) -> int:
+    """Get the generation number of the registry tables.
+
+    The generation starts at 0 and is incremented by every sync that changes
+    the tables, in the same transaction as the changes.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+
+    Returns:
+        Generation number
+    """
+    return conn.execute("SELECT generation FROM registry_meta").fetchone()[0]
+
+
+def current_storage(conn: duckdb.DuckDBPyConnection) -> str:
+    """Get the storage profile of the registry tables, see :mod:`kg_registry.storage`.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+
+    Returns:
+        Profile of the last sync, ``full`` for tables synced before there were others
+    """
+    storage = conn.execute("SELECT storage_profile FROM registry_meta").fetchone()[0]
+    return storage or DEFAULT_STORAGE
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    """Parse an ISO 8601 date string to a naive UTC datetime.
+
+    Args:
+        value: Date string such as ``2024-02-12T00:00:00Z``
+
+    Returns:
+        Parsed datetime, or None if the value is empty or not a valid date string
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def content_hash(resource: Dict[str, Any]) -> str:
+    """Hash the canonical JSON form of a resource record.
+
+    Keys are sorted, so the hash does not depend on the key order in the YAML.
+
+    Args:
+        resource: Resource record, as in ``registry/kgs.yml``
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    canonical = json.dumps(
+        resource, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _text(value: Any) -> Optional[str]:
+    """Coerce a scalar to text for a VARCHAR column."""
+    return None if value is None else str(value)
+
+
+def _texts(value: Any) -> Optional[List[Optional[str]]]:
+    """Coerce a list, or a single value, to a list for a VARCHAR[] column."""
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        value = [value]
+    return [_text(item) for item in value]
+
+
+def _integer(value: Any) -> Optional[int]:
+    """Coerce an integer, or a string of digits, for a BIGINT column."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _boolean(value: Any) -> Optional[bool]:
+    """Coerce a boolean, or ``true``/``false`` text, for a BOOLEAN column."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return None
+
+
+def _compatibility(value: Any) -> Optional[List[Dict[str, Optional[str]]]]:
+    """Coerce standard compatibility records to a list of STRUCTs."""
+    if not isinstance(value, list):
+        return None
+    return [
+        {"standard": _text(item.get("standard")), "version": _text(item.get("version"))}
+        for item in value
+        if isinstance(item, dict)
+    ]
+
+
+def _contacts(value: Any) -> Optional[List[Dict[str, Any]]]:
+    """Coerce contact records to a list of STRUCTs, keeping the slots of the schema."""
+    if not isinstance(value, list):
+        return None
+    return [
+        {
+            "category": _text(contact.get("category")),
+            "label": _text(contact.get("label")),
+            "orcid": _text(contact.get("orcid")),
+            "contact_details": [
+                {
+                    "contact_type": _text(detail.get("contact_type")),
+                    "contact_type_name": _text(detail.get("contact_type_name")),
+                    "contact_type_url": _text(detail.get("contact_type_url")),
+                    "value": _text(detail.get("value")),
+                }
+                for detail in contact.get("contact_details") or []
+                if isinstance(detail, dict)
+            ],
+        }
+        for contact in value
+        if isinstance(contact, dict)
+    ]
+
+
+def _license(value: Any) -> Optional[Dict[str, Optional[str]]]:
+    """Coerce a license, given as a record or just a label, to a STRUCT."""
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return {key: _text(value.get(key)) for key in ("id", "label", "logo")}
+    return {"id": None, "label": _text(value), "logo": None}
+
+
+_SLOT_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "BIGINT": _integer,
+    "BOOLEAN": _boolean,
+    "VARCHAR": _text,
+    "VARCHAR[]": _texts,
+    "TIMESTAMP": parse_date,
+    PRODUCT_SLOT_COLUMNS["compatibility"]: _compatibility,
+    CONTACTS_TYPE: _contacts,
+    LICENSE_TYPE: _license,
+}
+
+
+def product_slot_values(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the values of the :data:`PRODUCT_SLOT_COLUMNS` of a product.
+
+    Values that don't have the type of their column, such as a size that is
+    not a number, are left out (NULL) rather than failing the sync.
+
+    Args:
+        product: Product record, as in ``registry/kgs.yml``
+
+    Returns:
+        Dictionary from column name to value
+    """
+    return {
+        name: _SLOT_CONVERTERS[column_type](product.get(name))
+        for name, column_type in PRODUCT_SLOT_COLUMNS.items()
+    }
+
+
+class ResourceColumns:
+    """Column buffers for the registry tables, filled in one pass over the resources."""
+
+    def __init__(self, storage: str = DEFAULT_STORAGE):
+        """Initialize empty buffers.
+
+        Args:
+            storage: How the source records are stored, one of
+                :data:`~kg_registry.storage.STORAGE_PROFILES`
+
+        Raises:
+            ValueError: If the storage profile is unknown
+        """
+        #: Storage profile of the source records
+        self.storage = check_storage(storage)
+        self.resources: Dict[str, List[Any]] = {
+            name: []
+            for name in [
+                "id",
+                "name",
+                "description",
+                "category",
+                "activity_status",
+                "homepage_url",
+                "repository",
+                "creation_date",
+                "last_modified_date",
+                "license",
+                "domains",
+                "contacts",
+                "curators",
+                "layout",
+                "collection",
+                "infores_id",
+                "record_fields",
+                "raw_data",
+                "content_hash",
+            ]
+        }
+        # Without the whole record in raw_data, products are serialized apart
+        if storage != DEFAULT_STORAGE:
+            self.resources["products"] = []
+        self.resource_domains: Dict[str, List[Any]] = {"resource_id": [], "domain": []}
+        self.resource_products: Dict[str, List[Any]] = {
+            name: []
+            for name in [
+                "resource_id",
+                "product_id",
+                "product_name",
+                "product_category",
+                "product_description",
+                "product_format",
+                "product_url",
+                *PRODUCT_SLOT_COLUMNS,
+            ]
+        }
+        #: Number of resources with an ID that were added
+        self.count = 0
+        self._positions: Dict[str, int] = {}
+        self._domains: set = set()
+        self._products: Dict[tuple, int] = {}
+
+    def tables(self) -> Dict[str, Dict[str, List[Any]]]:
+        """Get the buffers by table name."""
+        return {
+            "resources": self.resources,
+            "resource_domains": self.resource_domains,
+            "resource_products": self.resource_products,
+        }
+
+    @property
+    def derived(self) -> Dict[str, str]:
+        """Columns of ``resources`` derived in SQL from the buffered ones."""
+        return DERIVED_RESOURCE_COLUMNS if self.storage == DEFAULT_STORAGE else {}
+
+    def _record_row(self, resource: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the values of the columns holding the source record, as per the storage profile."""
+        if self.storage == DEFAULT_STORAGE:
+            return {"raw_data": json.dumps(resource, default=str)}
+        # A null marks the products to put back, so a null of the record stays null
+        products = resource.get("products")
+        return {
+            "products": json.dumps(products, default=str) if "products" in resource else "[]",
+            "raw_data": json.dumps(
+                resource if products is None else {**resource, "products": None}, default=str
+            ),
+        }
+
+    @staticmethod
+    def _set_row(columns: Dict[str, List[Any]], position: Optional[int], row: Dict[str, Any]):
+        """Append a row, or overwrite the row at a position."""
+        for name, values in columns.items():
+            if position is None:
+                values.append(row[name])
+            else:
+                values[position] = row[name]
+
+    def add(self, resource: Dict[str, Any], digest: Optional[str] = None) -> bool:
+        """Add a resource to the buffers.
+
+        A resource that repeats an earlier ID replaces its row, and a repeated
+        product ID replaces the earlier product, as ``INSERT OR REPLACE`` would.
+
+        Args:
+            resource: Resource record, as in ``registry/kgs.yml``
+            digest: The record's :func:`content_hash`, if already computed
+
+        Returns:
+            True if the resource had an ID and was added
+        """
+        resource_id = resource.get("id")
+        if not resource_id:
+            return False
+        self.count += 1
+
+        domains = resource.get("domains") or []
+        position = self._positions.get(resource_id)
+        self._set_row(
+            self.resources,
+            position,
+            {
+                "id": resource_id,
+                "name": _text(resource.get("name")),
+                "description": _text(resource.get("description")),
+                "category": _text(resource.get("category")),
+                "activity_status": _text(resource.get("activity_status")),
+                "homepage_url": _text(resource.get("homepage_url")),
+                "repository": _text(resource.get("repository")),
+                "creation_date": parse_date(resource.get("creation_date")),
+                "last_modified_date": parse_date(resource.get("last_modified_date")),
+                "license": _license(resource.get("license")),
+                "domains": [_text(domain) for domain in domains],
+                "contacts": _contacts(resource.get("contacts")) or [],
+                "curators": _contacts(resource.get("curators")) or [],
+                "layout": _text(resource.get("layout")),
+                "collection": _texts(resource.get("collection")),
+                "infores_id": _text(resource.get("infores_id")),
+                "record_fields": list(resource),
+                **self._record_row(resource),
+                "content_hash": digest or content_hash(resource),
+            },
+        )
+        self._positions.setdefault(resource_id, len(self.resources["id"]) - 1)
+
+        for domain in domains:
+            key = (resource_id, _text(domain))
+            if key not in self._domains:
+                self._domains.add(key)
+                self._set_row(
+                    self.resource_domains, None, {"resource_id": key[0], "domain": key[1]}
+                )
+
+        for product in resource.get("products") or []:
+            if not product.get("id"):
+                continue
+            key = (resource_id, _text(product["id"]))
+            self._set_row(
+                self.resource_products,
+                self._products.get(key),
+                {
+                    "resource_id": resource_id,
+                    "product_id": key[1],
+                    "product_name": _text(product.get("name")),
+                    "product_category": _text(product.get("category")),
+                    "product_description": _text(product.get("description")),
+                    "product_format": _text(product.get("format")),
+                    "product_url": _text(product.get("product_url")),
+                    **product_slot_values(product),
+                },
+            )
+            self._products.setdefault(key, len(self.resource_products["resource_id"]) - 1)
+        return True
+
+
+def build_columns(
+    resources: Iterable[Dict[str, Any]], storage: str = DEFAULT_STORAGE
+) -> ResourceColumns:
+    """Build column buffers for all registry tables in one pass.
+
+    Args:
+        resources: Resource records, as in ``registry/kgs.yml``
+        storage: How the source records are stored, see :mod:`kg_registry.storage`
+
+    Returns:
+        Filled column buffers
+    """
+    columns = ResourceColumns(storage)
+    for resource in resources:
+        columns.add(resource)
+    return columns
+
+
+def insert_columns(
+    conn: duckdb.DuckDBPyConnection,
+    table: str,
+    columns: Dict[str, List[Any]],
+    derived: Optional[Dict[str, str]] = None,
+):
+    """Insert column buffers into a table with a single statement.
+
+    Args:
+        conn: DuckDB connection
+        table: Name of the table to insert into
+        columns: Dictionary from column name to the list of its values
+        derived: Additional columns as SQL expressions over the buffered columns
+    """
+    names = list(columns)
+    if not names or not columns[names[0]]:
+        return
+    derived = derived or {}
+    unnested = ", ".join(f"UNNEST(${i + 1}) AS {name}" for i, name in enumerate(names))
+    targets = names + list(derived)
+    expressions = names + list(derived.values())
+    conn.execute(
+        f"INSERT INTO {table} ({', '.join(targets)}) "
+        f"SELECT {', '.join(expressions)} FROM (SELECT {unnested})",
+        [columns[name] for name in names],
+    )
+
+
+def _write(
+    conn: duckdb.DuckDBPyConnection,
+    columns: ResourceColumns,
+    stale: Optional[List[str]] = None,
+    commit: Optional[str] = None,
+    changes: Optional[Dict[str, List[Any]]] = None,
+) -> int:
+    """Delete stale rows and insert the buffered rows in one transaction.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        columns: Rows to insert
+        stale: IDs of the resources whose rows are deleted first, or None to
+            delete all rows
+        commit: Git commit of the registry, recorded with the snapshot if the
+            history is enabled
+        changes: Column buffers of the ``changes`` rows of the sync, without
+            the generation, see :func:`kg_registry.changes.diff_resources`
+
+    Returns:
+        New generation number
+    """
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for table, key in RESOURCE_KEYS.items():
+            if stale is None:
+                conn.execute(f"DELETE FROM {table}")
+            elif stale:
+                conn.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT UNNEST($1))", [stale])
+        for table, buffers in columns.tables().items():
+            insert_columns(
+                conn,
+                table,
+                buffers,
+                columns.derived if table == "resources" else None,
+            )
+        index_resources(conn, None if stale is None else columns.resources["id"])
+        index_lookup(conn, stale, None if stale is None else columns.resources["id"])
+        index_lineage(conn, None if stale is None else columns.resources["id"])
+        if has_closure(conn):
+            build_closure(conn)
+        index_stats(conn)
+        generation = conn.execute(
+            "UPDATE registry_meta SET generation = generation + 1, synced_at = CURRENT_TIMESTAMP, "
+            "storage_profile = $1 RETURNING generation",
+            [columns.storage],
+        ).fetchone()[0]
+        if changes:
+            insert_columns(
+                conn,
+                "changes",
+                {"generation": [generation] * len(changes["entity_id"]), **changes},
+            )
+        if has_history(conn):
+            written = None if stale is None else columns.resources["id"]
+            record_snapshot(conn, generation, stale, written, commit)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return generation
+
+
+def bulk_load(
+    conn: duckdb.DuckDBPyConnection,
+    resources: Iterable[Dict[str, Any]],
+    storage: str = DEFAULT_STORAGE,
+) -> int:
+    """Replace the contents of the registry tables with the given resources.
+
+    All tables are cleared and loaded in one transaction, so the load either
+    fully succeeds or leaves the previous contents in place.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resources: Resource records, as in ``registry/kgs.yml``
+        storage: How the source records are stored, see :mod:`kg_registry.storage`
+
+    Returns:
+        Number of resources loaded
+    """
+    columns = build_columns(resources, storage)
+    _write(conn, columns)
+    return columns.count
+
+
+def load_columns(
+    conn: duckdb.DuckDBPyConnection,
+    tables: Dict[str, Dict[str, List[Any]]],
+    generation: int,
+    synced_at: Optional[datetime] = None,
+):
+    """Replace the contents of the registry tables with rows read elsewhere.
+
+    The rows of the tables filled from the source records are inserted as
+    they are, such as those of a snapshot from
+    :func:`kg_registry.history.snapshot_columns`, and the indexes and
+    statistics are rebuilt from them, in one transaction.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        tables: Column buffers by table name
+        generation: Generation number the tables get
+        synced_at: Time of the sync the rows come from
+    """
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for table in RESOURCE_KEYS:
+            conn.execute(f"DELETE FROM {table}")
+        for table, buffers in tables.items():
+            insert_columns(conn, table, buffers)
+        index_resources(conn)
+        index_lookup(conn)
+        index_lineage(conn)
+        if has_closure(conn):
+            build_closure(conn)
+        index_stats(conn)
+        conn.execute(
+            "UPDATE registry_meta SET generation = $1, synced_at = $2", [generation, synced_at]
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+@dataclass
+class SyncSummary:
+    """Outcome of an incremental sync."""
+
+    #: IDs of resources that were not in the database
+    added: List[str] = field(default_factory=list)
+    #: IDs of resources whose source record changed
+    changed: List[str] = field(default_factory=list)
+    #: IDs of resources that are no longer in the source
+    removed: List[str] = field(default_factory=list)
+    #: Number of resources left as they were
+    unchanged: int = 0
+    #: Generation number of the tables after the sync
+    generation: int = 0
+
+    @property
+    def total(self) -> int:
+        """Number of resources in the database after the sync."""
+        return len(self.added) + len(self.changed) + self.unchanged
+
+    @property
+    def has_changes(self) -> bool:
+        """Whether any resource was added, changed or removed."""
+        return bool(self.added or self.changed or self.removed)
+
+    def to_text(self) -> str:
+        """Format the counts as one line."""
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+def _compare(
+    conn: duckdb.DuckDBPyConnection,
+    resources: Iterable[Dict[str, Any]],
+    storage: Optional[str],
+) -> Tuple[str, Dict[str, Dict[str, Any]], Dict[str, str], Dict[str, str], SyncSummary]:
+    """Compare resources with the tables, as :func:`sync_resources` does before writing.
+
+    Returns:
+        The storage profile, the resources and their content hashes by ID,
+        the stored hashes by ID, and the summary of the changes, without the
+        generation
+    """
+    storage = check_storage(storage or current_storage(conn))
+    latest: Dict[str, Dict[str, Any]] = {}
+    for resource in resources:
+        if resource.get("id"):
+            latest[resource["id"]] = resource
+    hashes = {resource_id: content_hash(resource) for resource_id, resource in latest.items()}
+    previous = dict(conn.execute("SELECT id, content_hash FROM resources").fetchall())
+    existing = previous
+    if storage != current_storage(conn):
+        existing = dict.fromkeys(previous)
+
+    summary = SyncSummary(
+        removed=[resource_id for resource_id in existing if resource_id not in hashes]
+    )
+    for resource_id, digest in hashes.items():
+        if resource_id not in existing:
+            summary.added.append(resource_id)
+        elif existing[resource_id] != digest:
+            summary.changed.append(resource_id)
+        else:
+            summary.unchanged += 1
+    return storage, latest, hashes, previous, summary
+
+
+def preview_sync(
+    conn: duckdb.DuckDBPyConnection,
+    resources: Iterable[Dict[str, Any]],
+    storage: Optional[str] = None,
+) -> SyncSummary:
+    """Work out what :func:`sync_resources` would change, without writing anything.
+
+    Only reads, so it runs on read-only connections too.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resources: Resource records, as in ``registry/kgs.yml``
+        storage: How the source records are stored (default: as in the last sync)
+
+    Returns:
+        Summary of the changes the sync would make, with the current generation
+
+    Raises:
+        ValueError: If the storage profile is unknown
+    """
+    summary = _compare(conn, resources, storage)[-1]
+    summary.generation = current_generation(conn)
+    return summary
+
+
+def sync_resources(
+    conn: duckdb.DuckDBPyConnection,
+    resources: Iterable[Dict[str, Any]],
+    storage: Optional[str] = None,
+    commit: Optional[str] = None,
+) -> SyncSummary:
+    """Bring the registry tables in line with the given resources.
+
+    Resources are compared with the database by their :func:`content_hash`.
+    Removed resources are deleted, added and changed resources are rewritten
+    along with their domain and product rows, and unchanged resources are not
+    touched, so their ``sync_timestamp`` records when they last changed. The
+    writes and the generation increment happen in one transaction, and none at
+    all if nothing changed.
+
+    Resource IDs are expected to be unique; if one repeats, the last record wins.
+
+    Changing the storage profile rewrites every resource, which all count as
+    changed. The ``changes`` table only records the resources whose records
+    differ, see :mod:`kg_registry.changes`.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resources: Resource records, as in ``registry/kgs.yml``
+        storage: How the source records are stored, see :mod:`kg_registry.storage`
+            (default: as in the last sync)
+        commit: Git commit of the registry the resources come from, recorded
+            with the snapshot of the sync if the history is enabled
+
+    Returns:
+        Summary of the changes
+
+    Raises:
+        ValueError: If the storage profile is unknown
+    """
+    storage, latest, hashes, previous, summary = _compare(conn, resources, storage)
+    if summary.has_changes:
+        columns = ResourceColumns(storage)
+        for resource_id in summary.added + summary.changed:
+            columns.add(latest[resource_id], hashes[resource_id])
+        changes = diff_resources(
+            conn,
+            latest,
+            summary.added,
+            [
+                resource_id
+                for resource_id in summary.changed
+                if previous[resource_id] != hashes[resource_id]
+            ],
+            summary.removed,
+        )
+        summary.generation = _write(
+            conn, columns, summary.changed + summary.removed, commit, changes
+        )
+    else:
+        summary.generation = current_generation(conn)
+    return summary
@@ -0,0 +1,286 @@
+"""Lineage of resources and products: which sources each one is built from.
+
+A sync fills the ``lineage_edges`` table with one row per dependency, from
+the typed product columns of ``resource_products``:
+
+- ``has_product``: a resource depends on each of its products
+- ``original_source`` and ``secondary_source``: a product depends on the
+  resources it is built from, or on their products when the reference is
+  a ``resource.product`` ID
+- ``produced_by``: a product depends on the process product that made it
+
+Every edge points from the dependent entity (``src``) to the one it depends on
+(``dst``), so :func:`upstream` follows the edges and :func:`downstream` follows
+them backwards. "Which KGs derive from DrugBank?" is
+``downstream(conn, "drugbank")`` restricted to resources.
+
+Both walk the edges with a recursive CTE. Optionally, :func:`build_closure`
+precomputes every reachable pair with its shortest distance into
+``lineage_closure``, which then answers both by reading the rows of one
+entity. The closure is refreshed by every sync once it exists.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import duckdb
+
+__all__ = [
+    "LINEAGE_SCHEMAS",
+    "CLOSURE_SCHEMA",
+    "LINEAGE_RELATIONS",
+    "index_lineage",
+    "build_closure",
+    "drop_closure",
+    "has_closure",
+    "upstream",
+    "downstream",
+]
+
+#: Column definitions of the lineage tables created with the registry tables
+LINEAGE_SCHEMAS: Dict[str, str] = {
+    "lineage_edges": """
+        src_type VARCHAR,
+        src_id VARCHAR,
+        dst_type VARCHAR,
+        dst_id VARCHAR,
+        relation VARCHAR,
+        resource_id VARCHAR
+    """,
+}
+
+#: Column definitions of the optional transitive closure of ``lineage_edges``.
+#: Each reachable pair is stored once per ``direction`` (``upstream`` or
+#: ``downstream``), keyed by the entity it is looked up by, and rows are sorted
+#: by that key, so both lookups read only the row groups of the entity.
+CLOSURE_SCHEMA = """
+    direction VARCHAR,
+    entity_type VARCHAR,
+    entity_id VARCHAR,
+    related_type VARCHAR,
+    related_id VARCHAR,
+    depth INTEGER
+"""
+
+#: Values of ``lineage_edges.relation``
+LINEAGE_RELATIONS = ("has_product", "original_source", "secondary_source", "produced_by")
+
+#: Depth of the first walk of an unbounded :func:`upstream` or :func:`downstream`
+INITIAL_DEPTH = 8
+
+# Source references are resource IDs, or product IDs, which are all of the
+# form resource.product
+_REFERENCE_TYPE = "CASE WHEN contains({0}, '.') THEN 'product' ELSE 'resource' END"
+
+_EDGES_SQL = f"""
+    SELECT 'resource', resource_id, 'product', product_id, 'has_product', resource_id
+    FROM resource_products WHERE {{filter}}
+    UNION ALL
+    SELECT 'product', product_id, {_REFERENCE_TYPE.format("ref")}, ref, 'original_source',
+        resource_id
+    FROM (SELECT *, UNNEST(original_source) AS ref FROM resource_products WHERE {{filter}})
+    UNION ALL
+    SELECT 'product', product_id, {_REFERENCE_TYPE.format("ref")}, ref, 'secondary_source',
+        resource_id
+    FROM (SELECT *, UNNEST(secondary_source) AS ref FROM resource_products WHERE {{filter}})
+    UNION ALL
+    SELECT 'product', product_id, 'product', ref, 'produced_by', resource_id
+    FROM (SELECT *, UNNEST(produced_by) AS ref FROM resource_products WHERE {{filter}})
+"""
+
+_CLOSURE_TABLE = "lineage_closure"
+
+
+def index_lineage(conn: duckdb.DuckDBPyConnection, resource_ids: Optional[List[str]] = None):
+    """Add the lineage edges of resources from their product rows.
+
+    Edges are keyed by ``resource_id``, so the sync deletes those of stale
+    resources along with their other rows. This does not start a transaction,
+    so it can run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resource_ids: Resources to add, or None to rebuild the whole table
+    """
+    if resource_ids is None:
+        conn.execute("DELETE FROM lineage_edges")
+        conn.execute(f"INSERT INTO lineage_edges {_EDGES_SQL.format(filter='TRUE')}")
+    elif resource_ids:
+        conn.execute(
+            f"INSERT INTO lineage_edges "
+            f"{_EDGES_SQL.format(filter='resource_id IN (SELECT UNNEST($1))')}",
+            [resource_ids],
+        )
+
+
+def has_closure(conn: duckdb.DuckDBPyConnection) -> bool:
+    """Check whether the transitive closure was built.
+
+    Args:
+        conn: DuckDB connection
+
+    Returns:
+        True if ``lineage_closure`` exists
+    """
+    return bool(
+        conn.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = $1 AND NOT temporary",
+            [_CLOSURE_TABLE],
+        ).fetchone()[0]
+    )
+
+
+def build_closure(conn: duckdb.DuckDBPyConnection):
+    """Create or refresh ``lineage_closure`` from ``lineage_edges``.
+
+    Each entity gets one row per entity it depends on and one per entity
+    depending on it, directly or not, with the length of the shortest path
+    between them. Pairs are found one path length at a time, extending only
+    the pairs found at the previous length and keeping those not found before,
+    so each pair is joined once. This does not start a transaction, so it can
+    run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the lineage tables
+    """
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE lineage_steps AS
+        SELECT DISTINCT src_type, src_id, dst_type, dst_id FROM lineage_edges
+        """)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE lineage_pairs AS
+        SELECT *, 1 AS depth FROM lineage_steps
+        WHERE NOT (src_type = dst_type AND src_id = dst_id)
+        """)
+    conn.execute("CREATE OR REPLACE TEMP TABLE lineage_frontier AS SELECT * FROM lineage_pairs")
+    depth = 1
+    while True:
+        depth += 1
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE lineage_frontier AS
+            SELECT *, {depth} AS depth FROM (
+                SELECT DISTINCT f.src_type, f.src_id, s.dst_type, s.dst_id
+                FROM lineage_frontier f
+                JOIN lineage_steps s ON s.src_type = f.dst_type AND s.src_id = f.dst_id
+                WHERE NOT (f.src_type = s.dst_type AND f.src_id = s.dst_id)
+            )
+            ANTI JOIN lineage_pairs USING (src_type, src_id, dst_type, dst_id)
+            """)
+        if not conn.execute("SELECT COUNT(*) FROM lineage_frontier").fetchone()[0]:
+            break
+        conn.execute("INSERT INTO lineage_pairs SELECT * FROM lineage_frontier")
+
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {_CLOSURE_TABLE} ({CLOSURE_SCHEMA})")
+    conn.execute(f"DELETE FROM {_CLOSURE_TABLE}")
+    conn.execute(f"""
+        INSERT INTO {_CLOSURE_TABLE}
+        SELECT 'upstream', src_type, src_id, dst_type, dst_id, depth FROM lineage_pairs
+        UNION ALL
+        SELECT 'downstream', dst_type, dst_id, src_type, src_id, depth FROM lineage_pairs
+        ORDER BY 1, 3
+        """)
+    for table in ("lineage_steps", "lineage_pairs", "lineage_frontier"):
+        conn.execute(f"DROP TABLE {table}")
+
+
+def drop_closure(conn: duckdb.DuckDBPyConnection):
+    """Drop ``lineage_closure``, so syncs stop refreshing it.
+
+    Args:
+        conn: DuckDB connection
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {_CLOSURE_TABLE}")
+
+
+def _walk(
+    conn: duckdb.DuckDBPyConnection, entity_id: str, max_depth: int, reverse: bool
+) -> List[Dict[str, Any]]:
+    """Get the entities reachable from an entity within a number of edges."""
+    near, far = ("dst", "src") if reverse else ("src", "dst")
+    cursor = conn.execute(
+        f"""
+        WITH RECURSIVE walk(node_type, node_id, depth) AS (
+            SELECT * FROM (VALUES ('resource', $1, 0), ('product', $1, 0))
+            UNION
+            SELECT e.{far}_type, e.{far}_id, w.depth + 1
+            FROM walk w
+            JOIN lineage_edges e ON e.{near}_type = w.node_type AND e.{near}_id = w.node_id
+            WHERE w.depth < $2
+        )
+        SELECT node_type AS type, node_id AS id, MIN(depth) AS depth
+        FROM walk WHERE node_id != $1
+        GROUP BY node_type, node_id
+        ORDER BY depth, type, id
+        """,
+        [entity_id, max_depth],
+    )
+    return [dict(zip(("type", "id", "depth"), row)) for row in cursor.fetchall()]
+
+
+def _lineage(
+    conn: duckdb.DuckDBPyConnection, entity_id: str, max_depth: Optional[int], reverse: bool
+) -> List[Dict[str, Any]]:
+    if max_depth is not None and max_depth < 1:
+        return []
+    if has_closure(conn):
+        cursor = conn.execute(
+            f"""
+            SELECT related_type AS type, related_id AS id, depth FROM {_CLOSURE_TABLE}
+            WHERE direction = $1 AND entity_id = $2 AND related_id != $2 AND depth <= $3
+            ORDER BY depth, type, id
+            """,
+            [
+                "downstream" if reverse else "upstream",
+                entity_id,
+                max_depth if max_depth is not None else 2**31 - 1,
+            ],
+        )
+        # An entity reached through both start types keeps its shortest distance
+        nodes: Dict[tuple, Dict[str, Any]] = {}
+        for row in cursor.fetchall():
+            nodes.setdefault(row[:2], dict(zip(("type", "id", "depth"), row)))
+        return list(nodes.values())
+    if max_depth is not None:
+        return _walk(conn, entity_id, max_depth, reverse)
+    # The walk repeats nodes along cycles, so it needs a bound. Anything farther
+    # than the bound is reached through a node exactly at it, so the walk is
+    # only run again, deeper, while some node is that far.
+    depth = INITIAL_DEPTH
+    while True:
+        nodes = _walk(conn, entity_id, depth, reverse)
+        if not nodes or nodes[-1]["depth"] < depth:
+            return nodes
+        depth *= 2
+
+
+def upstream(
+    conn: duckdb.DuckDBPyConnection, entity_id: str, max_depth: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Get the resources and products an entity depends on, directly or not.
+
+    Args:
+        conn: DuckDB connection with the lineage tables
+        entity_id: Resource or product ID
+        max_depth: Maximum number of edges to follow, or None for no limit
+
+    Returns:
+        Dependencies with their ``type`` (``resource`` or ``product``), ``id``
+        and ``depth``, the length of the shortest path to them, nearest first
+    """
+    return _lineage(conn, entity_id, max_depth, reverse=False)
+
+
+def downstream(
+    conn: duckdb.DuckDBPyConnection, entity_id: str, max_depth: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Get the resources and products that depend on an entity, directly or not.
+
+    Args:
+        conn: DuckDB connection with the lineage tables
+        entity_id: Resource or product ID
+        max_depth: Maximum number of edges to follow, or None for no limit
+
+    Returns:
+        Dependents with their ``type`` (``resource`` or ``product``), ``id`` and
+        ``depth``, the length of the shortest path from them, nearest first
+    """
+    return _lineage(conn, entity_id, max_depth, reverse=True)
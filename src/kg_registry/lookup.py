@@ -0,0 +1,307 @@
+"""Typo-tolerant lookup of resources and products by name or ID.
+
+Resource and product IDs, names and ``infores_id`` values are normalized by
+lowercasing them and dropping everything but letters and digits, so that
+``PharmGKB``, ``pharm-gkb`` and ``pharmgkb`` are the same, and are indexed by
+their trigrams in two tables:
+
+- ``lookup_entries``: one row per indexed value, keyed by ``entry_id``
+- ``lookup_trigrams``: one row per trigram, keyed by the trigram, with the
+  number of entries containing it and their postings, the ``entry_id`` and
+  number of distinct trigrams of each entry, in ``entry_id`` order
+
+A lookup reads the entry counts of the query's trigrams, then the postings of
+the rarest ones, up to :data:`MAX_POSTINGS` of them, and fetches the entries
+sharing most of these trigrams. Every read is a primary key lookup, which
+DuckDB answers from the table's index however the rows were written, so a
+lookup reads a few rows instead of scanning the tables. These candidates are
+then ranked by Jaro-Winkler similarity and trigram overlap.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import duckdb
+
+__all__ = [
+    "LOOKUP_SCHEMAS",
+    "normalize",
+    "trigrams",
+    "index_lookup",
+    "fuzzy_lookup",
+]
+
+#: Column definitions of the lookup tables
+LOOKUP_SCHEMAS: Dict[str, str] = {
+    "lookup_entries": """
+        entry_id BIGINT PRIMARY KEY,
+        entity_type VARCHAR,
+        entity_id VARCHAR,
+        resource_id VARCHAR,
+        kind VARCHAR,
+        text VARCHAR,
+        normalized VARCHAR
+    """,
+    "lookup_trigrams": """
+        trigram VARCHAR PRIMARY KEY,
+        entry_count INTEGER,
+        postings STRUCT(entry_id BIGINT, trigram_count INTEGER)[]
+    """,
+}
+
+#: Maximum number of postings a lookup reads
+MAX_POSTINGS = 20_000
+
+#: Number of candidates that are reranked, per requested result
+CANDIDATES_PER_RESULT = 5
+
+#: Minimum number of candidates that are reranked
+MIN_CANDIDATES = 50
+
+# SQL versions of normalize() and trigrams(), used when indexing
+_NORMALIZED = "regexp_replace(lower({}), '[^\\pL\\pN]+', '', 'g')"
+_TRIGRAMS = (
+    "list_distinct(list_transform(range(len({0}) + 1), "
+    "i -> substr('  ' || {0} || ' ', i + 1, 3)))"
+)
+
+_ENTRIES_SQL = """
+    SELECT 'resource' AS entity_type, id AS entity_id, id AS resource_id, 'id' AS kind,
+        id AS text
+    FROM resources WHERE {resource_filter}
+    UNION ALL
+    SELECT 'resource', id, id, 'name', name
+    FROM resources WHERE {resource_filter}
+    UNION ALL
+    SELECT 'resource', id, id, 'infores_id', infores_id
+    FROM resources WHERE {resource_filter}
+    UNION ALL
+    SELECT 'product', product_id, resource_id, 'id', product_id
+    FROM resource_products WHERE {product_filter}
+    UNION ALL
+    SELECT 'product', product_id, resource_id, 'name', product_name
+    FROM resource_products WHERE {product_filter}
+    UNION ALL
+    SELECT 'product', product ->> '$.id', id, 'infores_id', product ->> '$.infores_id'
+    FROM (SELECT id, UNNEST(CAST(products AS JSON[])) AS product FROM resources
+        WHERE {resource_filter})
+"""
+
+
+def index_lookup(
+    conn: duckdb.DuckDBPyConnection,
+    stale: Optional[List[str]] = None,
+    resource_ids: Optional[List[str]] = None,
+):
+    """Update the lookup tables for resources that changed.
+
+    Entries of stale resources are removed, then entries for the given
+    resources are added from the registry tables. This does not start a
+    transaction, so it can run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the registry and lookup tables
+        stale: Resources whose entries are removed, or None to remove all entries
+        resource_ids: Resources to add, or None to add all resources
+    """
+    if stale is None:
+        for table in LOOKUP_SCHEMAS:
+            conn.execute(f"DELETE FROM {table}")
+    elif stale:
+        removed = "SELECT entry_id FROM lookup_entries WHERE resource_id IN (SELECT UNNEST($1))"
+        # Rewrite the postings of the trigrams of the removed entries without them
+        conn.execute(
+            f"""
+            UPDATE lookup_trigrams t
+            SET entry_count = len(r.postings), postings = r.postings
+            FROM (
+                WITH removed AS (
+                    SELECT entry_id, {_TRIGRAMS.format("normalized")} AS trigrams
+                    FROM lookup_entries WHERE entry_id IN ({removed})
+                ),
+                affected AS (SELECT DISTINCT UNNEST(trigrams) AS trigram FROM removed)
+                SELECT trigram, COALESCE(k.postings, []) AS postings
+                FROM affected
+                LEFT JOIN (
+                    SELECT trigram, list(posting ORDER BY posting.entry_id) AS postings
+                    FROM (
+                        SELECT trigram, UNNEST(postings) AS posting FROM lookup_trigrams
+                        WHERE trigram IN (SELECT trigram FROM affected)
+                    )
+                    WHERE posting.entry_id NOT IN (SELECT entry_id FROM removed)
+                    GROUP BY trigram
+                ) k USING (trigram)
+            ) r
+            WHERE t.trigram = r.trigram
+            """,
+            [stale],
+        )
+        conn.execute("DELETE FROM lookup_trigrams WHERE entry_count = 0")
+        conn.execute(f"DELETE FROM lookup_entries WHERE entry_id IN ({removed})", [stale])
+
+    if resource_ids is None:
+        entries_sql = _ENTRIES_SQL.format(resource_filter="TRUE", product_filter="TRUE")
+        params = []
+    elif resource_ids:
+        entries_sql = _ENTRIES_SQL.format(
+            resource_filter="id IN (SELECT UNNEST($1))",
+            product_filter="resource_id IN (SELECT UNNEST($1))",
+        )
+        params = [resource_ids]
+    else:
+        return
+    cursor = conn.execute("SELECT COALESCE(MAX(entry_id), 0) + 1 FROM lookup_entries")
+    first_id = cursor.fetchone()[0]
+    normalized = _NORMALIZED.format("text")
+    conn.execute(
+        f"""
+        INSERT INTO lookup_entries
+        SELECT {first_id} + row_number() OVER () - 1, *
+        FROM (
+            SELECT DISTINCT *, {normalized} AS normalized FROM ({entries_sql})
+            WHERE text IS NOT NULL AND {normalized} != ''
+        )
+        """,
+        params,
+    )
+    # New entries have higher IDs than all others, so appending keeps the postings in order
+    conn.execute(f"""
+        INSERT INTO lookup_trigrams
+        SELECT trigram, COUNT(*),
+            list({{'entry_id': entry_id, 'trigram_count': len(trigrams)}} ORDER BY entry_id)
+        FROM (
+            SELECT entry_id, {_TRIGRAMS.format("normalized")} AS trigrams,
+                UNNEST(trigrams) AS trigram
+            FROM lookup_entries WHERE entry_id >= {first_id}
+        )
+        GROUP BY trigram
+        ON CONFLICT (trigram) DO UPDATE SET
+            entry_count = entry_count + excluded.entry_count,
+            postings = list_concat(postings, excluded.postings)
+        """)
+
+
+def normalize(text: str) -> str:
+    """Lowercase a text and drop everything but letters and digits.
+
+    Args:
+        text: ID or name
+
+    Returns:
+        Normalized text
+    """
+    return "".join(char for char in text.lower() if char.isalnum())
+
+
+def trigrams(normalized: str) -> List[str]:
+    """Get the distinct trigrams of a normalized text.
+
+    The text is padded like in PostgreSQL's pg_trgm, so short values and the
+    start and end of values weigh in.
+
+    Args:
+        normalized: Text returned by :func:`normalize`
+
+    Returns:
+        Trigrams, in order of first occurrence
+    """
+    padded = f"  {normalized} "
+    return list(dict.fromkeys(padded[i : i + 3] for i in range(len(normalized) + 1)))
+
+
+def _placeholders(values: List[Any], start: int = 1) -> str:
+    return ", ".join(f"${i}" for i in range(start, start + len(values)))
+
+
+def fuzzy_lookup(conn: duckdb.DuckDBPyConnection, text: str, k: int = 10) -> List[Dict[str, Any]]:
+    """Find the resources and products whose ID, name or infores ID best match a text.
+
+    Args:
+        conn: DuckDB connection with the lookup tables
+        text: Approximate ID or name, such as ``pharm-gkb`` or ``rtx kg2``
+        k: Maximum number of matches
+
+    Returns:
+        Matches with ``entity_type`` (``resource`` or ``product``), ``entity_id``,
+        ``resource_id``, the matching ``kind`` of value and its ``text``, the
+        trigram ``similarity`` and the Jaro-Winkler ``score``, best first, with
+        one match per entity
+    """
+    query = normalize(text)
+    if not query:
+        return []
+    query_trigrams = trigrams(query)
+
+    # Equality on the primary key, spelled out as an IN list, reads the rows by index
+    counts = conn.execute(
+        f"""
+        SELECT trigram, entry_count FROM lookup_trigrams
+        WHERE trigram IN ({_placeholders(query_trigrams)})
+        ORDER BY entry_count, trigram
+        """,
+        query_trigrams,
+    ).fetchall()
+    if not counts:
+        return []
+
+    # Read the postings of the rarest trigrams, as long as they fit the budget
+    limit = max(k * CANDIDATES_PER_RESULT, MIN_CANDIDATES)
+    probed = []
+    budget = MAX_POSTINGS
+    for trigram, entry_count in counts:
+        budget -= entry_count
+        if budget < 0:
+            break
+        probed.append(trigram)
+    if probed:
+        candidates = conn.execute(
+            f"""
+            SELECT posting.entry_id
+            FROM (
+                SELECT UNNEST(postings) AS posting FROM lookup_trigrams
+                WHERE trigram IN ({_placeholders(probed)})
+            )
+            GROUP BY posting.entry_id
+            ORDER BY COUNT(*) DESC,
+                abs(ANY_VALUE(posting.trigram_count) - {len(query_trigrams)}), posting.entry_id
+            LIMIT {limit}
+            """,
+            probed,
+        ).fetchall()
+    else:
+        # Even the rarest trigram is too common for its entries to be ranked
+        # without reading them all, so the first of them are reranked
+        candidates = conn.execute(
+            f"SELECT UNNEST(postings[:{limit}]).entry_id FROM lookup_trigrams WHERE trigram = $1",
+            [counts[0][0]],
+        ).fetchall()
+    if not candidates:
+        return []
+
+    ids = [row[0] for row in candidates]
+    cursor = conn.execute(
+        f"""
+        SELECT entity_type, entity_id, resource_id, kind, text, normalized,
+            jaro_winkler_similarity(normalized, $1) AS score
+        FROM lookup_entries WHERE entry_id IN ({_placeholders(ids, 2)})
+        """,
+        [query, *ids],
+    )
+    columns = [desc[0] for desc in cursor.description]
+    matches = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    query_set = set(query_trigrams)
+    for match in matches:
+        entry_set = set(trigrams(match.pop("normalized")))
+        shared = len(query_set & entry_set)
+        match["similarity"] = shared / (len(query_set) + len(entry_set) - shared)
+    matches.sort(
+        key=lambda m: (-m["score"], -m["similarity"], m["entity_type"], m["entity_id"], m["kind"])
+    )
+
+    results = []
+    seen = set()
+    for match in matches:
+        entity = (match["entity_type"], match["entity_id"])
+        if entity not in seen:
+            seen.add(entity)
+            results.append(match)
+    return results[:k]
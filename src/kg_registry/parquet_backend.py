@@ -1,12 +1,31 @@
 """Parquet backend for enhanced querying of KG-Registry data."""
 
-import json
 import os
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import duckdb
-import yaml
+
+from kg_registry import lineage, lookup, search, storage
+from kg_registry.ingest import (
+    ADDED_COLUMNS,
+    FILLED_COLUMNS,
+    SyncSummary,
+    create_tables,
+    load_resources,
+    sync_resources,
+)
+from kg_registry.pool import CursorPool
+from kg_registry.query_language import Clause, compile_query
+from kg_registry.results import (
+    PAGE_SIZE,
+    Page,
+    check_output,
+    fetch,
+    fetch_page,
+    projection,
+    resource_filters,
+)
 
 __all__ = [
     "ParquetBackend",
@@ -14,6 +33,21 @@ __all__ = [
     "create_database",
 ]
 
+#: Tables exported to Parquet
+PARQUET_TABLES = [
+    "resources",
+    "resource_domains",
+    "resource_products",
+    "search_terms",
+    "search_docs",
+]
+
+#: Tables that Parquet directories exported before the search index may lack
+OPTIONAL_TABLES = {"search_terms", "search_docs"}
+
+#: Columns of ``resource_products`` the lineage edges are derived from
+LINEAGE_SOURCE_COLUMNS = {"original_source", "secondary_source", "produced_by"}
+
 
 class ParquetBackend:
     """Parquet backend for querying KG-Registry data.
@@ -31,189 +65,59 @@ class ParquetBackend:
         self.output_dir = output_dir
         # Always use in-memory database for processing
         self.conn = duckdb.connect(":memory:")
+        #: Summary of the most recent sync, if any
+        self.last_sync: Optional[SyncSummary] = None
         self._init_tables()
 
     def _init_tables(self):
         """Initialize DuckDB tables for KG-Registry data."""
-        # Create resources table
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resources (
-                id VARCHAR PRIMARY KEY,
-                name VARCHAR,
-                description TEXT,
-                category VARCHAR,
-                activity_status VARCHAR,
-                homepage_url VARCHAR,
-                repository VARCHAR,
-                creation_date TIMESTAMP,
-                last_modified_date TIMESTAMP,
-                license_id VARCHAR,
-                license_label VARCHAR,
-                domains VARCHAR[],
-                contacts JSON,
-                curators JSON,
-                products JSON,
-                layout VARCHAR,
-                raw_data JSON,
-                sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
-        )
+        create_tables(self.conn)
 
-        # Create domains table for better querying
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resource_domains (
-                resource_id VARCHAR,
-                domain VARCHAR,
-                PRIMARY KEY (resource_id, domain)
-            )
-        """
-        )
-
-        # Create products table for better querying
-        self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS resource_products (
-                resource_id VARCHAR,
-                product_id VARCHAR,
-                product_name VARCHAR,
-                product_category VARCHAR,
-                product_description TEXT,
-                product_format VARCHAR,
-                product_url VARCHAR,
-                PRIMARY KEY (resource_id, product_id)
-            )
-        """
-        )
-
-    def sync_from_yaml(self, yaml_file: str) -> int:
+    def sync_from_yaml(self, yaml_file: str, storage_profile: Optional[str] = None) -> int:
         """Sync data from YAML file to in-memory DuckDB database.
 
+        Only resources that were added, changed or removed since the last sync
+        are written; the summary is kept in :attr:`last_sync`.
+
         Args:
             yaml_file: Path to YAML file containing resources data
+            storage_profile: How the source records are stored, see
+                :mod:`kg_registry.storage` (default: as in the last sync)
 
         Returns:
-            Number of resources synced
+            Number of resources in the database after the sync
         """
-        with open(yaml_file, "r") as f:
-            data = yaml.safe_load(f)
-
-        if not data or "resources" not in data:
+        resources = load_resources(yaml_file)
+        if resources is None:
             return 0
 
-        resources = data["resources"]
-        synced_count = 0
-
-        # Clear existing data
-        self.conn.execute("DELETE FROM resources")
-        self.conn.execute("DELETE FROM resource_domains")
-        self.conn.execute("DELETE FROM resource_products")
+        return self.sync_from_resources(resources, storage_profile).total
 
-        for resource in resources:
-            if not resource.get("id"):
-                continue
+    def sync_from_resources(
+        self, resources: List[Dict[str, Any]], storage_profile: Optional[str] = None
+    ) -> SyncSummary:
+        """Bring the in-memory database in line with the given resources.
 
-            # Insert into resources table
-            self._insert_resource(resource)
+        Only resources that were added, changed or removed are written, in a
+        single transaction. If anything changed, the tables are then exported
+        to Parquet if an output directory is set.
 
-            # Insert domains
-            self._insert_domains(resource)
-
-            # Insert products
-            self._insert_products(resource)
+        Args:
+            resources: Resource records, as in ``registry/kgs.yml``
+            storage_profile: How the source records are stored, see
+                :mod:`kg_registry.storage` (default: as in the last sync);
+                changing it rewrites every resource
 
-            synced_count += 1
+        Returns:
+            Summary of the changes, also kept in :attr:`last_sync`
+        """
+        self.last_sync = sync_resources(self.conn, resources, storage_profile)
 
         # Export to Parquet if output directory is specified
-        if self.output_dir and synced_count > 0:
+        if self.output_dir and self.last_sync.has_changes:
             self.export_to_parquet()
 
-        return synced_count
-
-    def _insert_resource(self, resource: Dict[str, Any]):
-        """Insert a resource into the resources table."""
-        license_data = resource.get("license", {})
-
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO resources (
-                id, name, description, category, activity_status, homepage_url, repository,
-                creation_date, last_modified_date, license_id, license_label, domains,
-                contacts, curators, products, layout, raw_data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            [
-                resource.get("id"),
-                resource.get("name"),
-                resource.get("description"),
-                resource.get("category"),
-                resource.get("activity_status"),
-                resource.get("homepage_url"),
-                resource.get("repository"),
-                self._parse_date(resource.get("creation_date")),
-                self._parse_date(resource.get("last_modified_date")),
-                license_data.get("id") if isinstance(license_data, dict) else None,
-                license_data.get("label") if isinstance(license_data, dict) else license_data,
-                resource.get("domains", []),
-                json.dumps(resource.get("contacts", [])),
-                json.dumps(resource.get("curators", [])),
-                json.dumps(resource.get("products", [])),
-                resource.get("layout"),
-                json.dumps(resource),
-            ],
-        )
-
-    def _insert_domains(self, resource: Dict[str, Any]):
-        """Insert resource domains into the resource_domains table."""
-        resource_id = resource.get("id")
-        domains = resource.get("domains", [])
-
-        for domain in domains:
-            self.conn.execute(
-                """
-                INSERT OR IGNORE INTO resource_domains (resource_id, domain)
-                VALUES (?, ?)
-            """,
-                [resource_id, domain],
-            )
-
-    def _insert_products(self, resource: Dict[str, Any]):
-        """Insert resource products into the resource_products table."""
-        resource_id = resource.get("id")
-        products = resource.get("products", [])
-
-        for product in products:
-            if not product.get("id"):
-                continue
-
-            self.conn.execute(
-                """
-                INSERT OR REPLACE INTO resource_products (
-                    resource_id, product_id, product_name, product_category,
-                    product_description, product_format, product_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-                [
-                    resource_id,
-                    product.get("id"),
-                    product.get("name"),
-                    product.get("category"),
-                    product.get("description"),
-                    product.get("format"),
-                    product.get("product_url"),
-                ],
-            )
-
-    def _parse_date(self, date_str: Optional[str]) -> Optional[datetime]:
-        """Parse date string to datetime object."""
-        if not date_str:
-            return None
-        try:
-            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-        except (ValueError, AttributeError):
-            return None
+        return self.last_sync
 
     def export_to_parquet(self):
         """Export all tables to Parquet files."""
@@ -224,44 +128,132 @@ class ParquetBackend:
         os.makedirs(self.output_dir, exist_ok=True)
 
         # Export each table to a Parquet file
-        tables = ["resources", "resource_domains", "resource_products"]
-        for table in tables:
+        for table in PARQUET_TABLES:
             output_path = os.path.join(self.output_dir, f"{table}.parquet")
             self.conn.execute(f"COPY {table} TO '{output_path}' (FORMAT PARQUET)")
 
-    def query_resources(self, **filters) -> List[Dict[str, Any]]:
+    def query_resources(
+        self,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+        **filters,
+    ) -> Any:
         """Query resources with optional filters.
 
         Args:
+            columns: Columns to return, such as ``["id", "name", "category"]`` (default: all)
+            output: Result mode: ``dicts``, ``iter``, ``batches``, ``relation``, ``arrow``
+                or ``numpy``, see :mod:`kg_registry.results`
+            batch_size: Number of rows fetched at a time by ``iter`` and ``batches``
+                results (default: 1000)
             **filters: Keyword arguments for filtering resources
 
         Returns:
-            List of resources matching the filters
+            Resources matching the filters, as a list of dicts by default
         """
-        query = "SELECT * FROM resources WHERE 1=1"
-        params = []
+        check_output(output)
+        conditions, params = resource_filters(filters)
+        query = f"SELECT {projection(columns)} FROM resources WHERE 1=1{conditions}"
+        return fetch(self.conn, query, params, output, batch_size)
+
+    def page_resources(
+        self,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = PAGE_SIZE,
+        order_by: str = "id",
+        columns: Optional[List[str]] = None,
+        **filters,
+    ) -> Page:
+        """Get a page of resources, ordered by a column and then by ID.
+
+        Each page starts after the last resource of the previous one, so
+        resources added or removed by syncs in between don't make the
+        remaining pages skip or repeat resources.
 
-        if filters.get("category"):
-            query += " AND category = ?"
-            params.append(filters["category"])
+        Args:
+            after: ``Page.after`` of the previous page, or None for the first page
+            limit: Maximum number of resources of the page
+            order_by: Column to order the resources by; those without a value come last
+            columns: Columns to return (default: all)
+            **filters: Filters, as in :meth:`query_resources`
 
-        if filters.get("activity_status"):
-            query += " AND activity_status = ?"
-            params.append(filters["activity_status"])
+        Returns:
+            The page, with the ``after`` cursor of the next page if there is one
+        """
+        conditions, params = resource_filters(filters)
+        return fetch_page(
+            self.conn,
+            projection(columns),
+            "resources",
+            f"1=1{conditions}",
+            params,
+            sort=projection([order_by]),
+            key="id",
+            after=after,
+            limit=limit,
+        )
 
-        if filters.get("domain"):
-            query += " AND id IN (SELECT resource_id FROM resource_domains WHERE domain = ?)"
-            params.append(filters["domain"])
+    def query_products(
+        self,
+        resource_id: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Query products, ordered by resource and product ID.
 
-        if filters.get("name_contains"):
-            query += " AND name ILIKE ?"
-            params.append(f"%{filters['name_contains']}%")
+        With ``output="iter"`` or ``"batches"``, the products of resources
+        with many, such as ``obo-db-ingest``, are read ``batch_size`` at a time
+        rather than all at once.
 
-        result_cursor = self.conn.execute(query, params)
-        columns = [desc[0] for desc in result_cursor.description]
-        result = result_cursor.fetchall()
+        Args:
+            resource_id: ID of the resource whose products to return (default: all)
+            columns: Columns of ``resource_products`` to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Rows of the ``resource_products`` table
+        """
+        check_output(output)
+        query = f"SELECT {projection(columns)} FROM resource_products"
+        params = []
+        if resource_id:
+            query += " WHERE resource_id = ?"
+            params.append(resource_id)
+        query += " ORDER BY resource_id, product_id"
+        return fetch(self.conn, query, params, output, batch_size)
+
+    def page_products(
+        self,
+        resource_id: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = PAGE_SIZE,
+        columns: Optional[List[str]] = None,
+    ) -> Page:
+        """Get a page of products, ordered by resource and product ID.
 
-        return [dict(zip(columns, row)) for row in result]
+        Args:
+            resource_id: ID of the resource whose products to return (default: all)
+            after: ``Page.after`` of the previous page, or None for the first page
+            limit: Maximum number of products of the page
+            columns: Columns of ``resource_products`` to return (default: all)
+
+        Returns:
+            The page, with the ``after`` cursor of the next page if there is one
+        """
+        return fetch_page(
+            self.conn,
+            projection(columns),
+            "resource_products",
+            "resource_id = ?" if resource_id else "1=1",
+            [resource_id] if resource_id else [],
+            sort="resource_id",
+            key="product_id",
+            after=after,
+            limit=limit,
+        )
 
     def query_by_domain(self, domain: str) -> List[Dict[str, Any]]:
         """Query resources by domain.
@@ -282,27 +274,174 @@ class ParquetBackend:
         """
         return self.query_resources(activity_status="active")
 
-    def search_resources(self, search_term: str) -> List[Dict[str, Any]]:
-        """Search resources by name or description.
+    def search_resources(
+        self,
+        search_term: str,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Search resources by name, description, domains and products.
+
+        Uses the full-text index; resources must contain every term of the
+        search, in their own fields or a product's, and are ranked by BM25.
 
         Args:
             search_term: Term to search for
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
 
         Returns:
-            List of resources matching the search term
+            Resources matching the search term, best match first
         """
-        query = """
-            SELECT * FROM resources
-            WHERE name ILIKE ? OR description ILIKE ?
-            ORDER BY name
+        return search.search_resources(
+            self.conn, search_term, columns=columns, output=output, batch_size=batch_size
+        )
+
+    def find_resources(
+        self,
+        query: Union[str, Sequence[Clause]],
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Find the resources matching a query of :mod:`kg_registry.query_language`.
+
+        The query, such as ``category:KnowledgeGraph format:kgx "protein interaction" -stub``,
+        combines filters, product filters and text search, and runs as one statement.
+
+        Args:
+            query: Query, or its parsed clauses
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`query_resources`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Matching resources, best match first if the query has words, by name otherwise
+
+        Raises:
+            ValueError: If the query cannot be parsed
         """
-        params = [f"%{search_term}%", f"%{search_term}%"]
+        check_output(output)
+        return compile_query(query, columns).run(self.conn, output, batch_size)
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = 20,
+        fields: Optional[List[str]] = None,
+        doc_types: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rank resources and products against a query with BM25.
 
-        result_cursor = self.conn.execute(query, params)
-        columns = [desc[0] for desc in result_cursor.description]
-        result = result_cursor.fetchall()
+        Args:
+            query: Free text; every term counts towards the score
+            limit: Maximum number of hits, or None for all
+            fields: Fields to search: ``name``, ``description``, ``domain`` (default: all)
+            doc_types: Document types to search: ``resource``, ``product`` (default: all)
 
-        return [dict(zip(columns, row)) for row in result]
+        Returns:
+            Hits with ``doc_id``, ``doc_type``, ``resource_id`` and ``score``, best first
+        """
+        return search.search(self.conn, query, limit, fields, doc_types)
+
+    def facet_search(
+        self,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        facets: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        limit: Optional[int] = 20,
+        offset: int = 0,
+        columns: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Get a page of the resources matching filters, with the counts of their facet values.
+
+        Facets are ``category``, ``domain``, ``activity_status``, ``collection``
+        and ``format`` (of the resource's products), see :func:`kg_registry.search.facet_search`.
+
+        Args:
+            filters: Values to keep for some facets, such as ``{"domain": ["health"]}``;
+                a resource must have one of the values of every filter
+            facets: Facets to count (default: all)
+            query: Free text the resources must match, which then ranks them
+            limit: Maximum number of resources in the page, or None for all
+            offset: Number of resources before the page
+            columns: Columns to return (default: all)
+
+        Returns:
+            Dictionary with the ``total`` number of matching resources, the ``hits``
+            of the page and the ``facets``, each a dict from value to count
+        """
+        return search.facet_search(self.conn, filters, facets, query, limit, offset, columns)
+
+    def get_record(self, resource_id: str) -> Optional[Dict[str, Any]]:
+        """Get the source record of a resource, as in ``registry/kgs.yml``.
+
+        Args:
+            resource_id: ID of the resource
+
+        Returns:
+            The record, or None if there is no resource with that ID
+        """
+        return storage.read_record(self.conn, resource_id)
+
+    def fuzzy_lookup(self, text: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Find the resources and products whose ID, name or infores ID best match a text.
+
+        Tolerates typos, case, spaces and punctuation, so ``pharm-gkb`` finds
+        ``pharmgkb``.
+
+        Args:
+            text: Approximate ID or name
+            k: Maximum number of matches
+
+        Returns:
+            Matches with ``entity_type``, ``entity_id``, ``resource_id``, ``kind``,
+            ``text``, ``score`` and ``similarity``, best first
+        """
+        return lookup.fuzzy_lookup(self.conn, text, k)
+
+    def upstream(self, entity_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the resources and products an entity depends on, directly or not.
+
+        Args:
+            entity_id: Resource or product ID
+            max_depth: Maximum number of edges to follow, or None for no limit
+
+        Returns:
+            Dependencies with their ``type``, ``id`` and ``depth``, nearest first
+        """
+        return lineage.upstream(self.conn, entity_id, max_depth)
+
+    def downstream(self, entity_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the resources and products that depend on an entity, directly or not.
+
+        Args:
+            entity_id: Resource or product ID
+            max_depth: Maximum number of edges to follow, or None for no limit
+
+        Returns:
+            Dependents with their ``type``, ``id`` and ``depth``, nearest first
+        """
+        return lineage.downstream(self.conn, entity_id, max_depth)
+
+    def build_lineage_closure(self):
+        """Precompute the lineage of every entity for :meth:`upstream` and :meth:`downstream`.
+
+        Once built, the closure is refreshed by every sync that changes the data.
+        """
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            lineage.build_closure(self.conn)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def drop_lineage_closure(self):
+        """Drop the precomputed lineage, so syncs stop refreshing it."""
+        lineage.drop_closure(self.conn)
 
     def get_resource_stats(self) -> Dict[str, Any]:
         """Get statistics about resources in the database.
@@ -370,8 +509,8 @@ class ParquetBackend:
             True if data was loaded successfully, False otherwise
         """
         # Whitelist of valid table names
-        valid_tables = {"resources", "resource_domains", "resource_products"}
-        tables = ["resources", "resource_domains", "resource_products"]
+        valid_tables = set(PARQUET_TABLES)
+        tables = PARQUET_TABLES
         success = True
 
         for table in tables:
@@ -383,6 +522,8 @@ class ParquetBackend:
 
             parquet_path = os.path.join(directory, f"{table}.parquet")
             if not os.path.exists(parquet_path):
+                if table in OPTIONAL_TABLES:
+                    continue
                 print(f"Warning: {parquet_path} does not exist")
                 success = False
                 continue
@@ -394,6 +535,32 @@ class ParquetBackend:
             query = f"CREATE TABLE {table} AS SELECT * FROM read_parquet('{safe_path}')"
             self.conn.execute(query)
 
+        # Fill the resource columns that older exports lack from the source records
+        resource_columns = {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT column_name FROM duckdb_columns() WHERE table_name = 'resources'"
+            ).fetchall()
+        }
+        for name, fill in FILLED_COLUMNS["resources"].items():
+            if name not in resource_columns:
+                column_type = ADDED_COLUMNS["resources"][name]
+                self.conn.execute(f"ALTER TABLE resources ADD COLUMN {name} {column_type}")
+                self.conn.execute(f"UPDATE resources SET {name} = {fill}")
+        # The lookup index is not exported, so it is rebuilt from the loaded tables
+        lookup.index_lookup(self.conn)
+        # So are the lineage edges, from product columns that older exports lack
+        product_columns = {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT column_name FROM duckdb_columns() WHERE table_name = 'resource_products'"
+            ).fetchall()
+        }
+        self.conn.execute("DELETE FROM lineage_edges")
+        if product_columns.issuperset(LINEAGE_SOURCE_COLUMNS):
+            lineage.index_lineage(self.conn)
+        if lineage.has_closure(self.conn):
+            lineage.build_closure(self.conn)
         return success
 
     def close(self):
@@ -410,18 +577,22 @@ class ParquetBackend:
         self.close()
 
 
-def sync_yaml_to_parquet(yaml_file: str, output_dir: str) -> int:
+def sync_yaml_to_parquet(
+    yaml_file: str, output_dir: str, storage_profile: Optional[str] = None
+) -> int:
     """Sync YAML data to Parquet files.
 
     Args:
         yaml_file: Path to YAML file
         output_dir: Directory to store Parquet files
+        storage_profile: How the source records are stored, see
+            :mod:`kg_registry.storage` (default: full)
 
     Returns:
         Number of resources synced
     """
     with ParquetBackend(output_dir) as backend:
-        return backend.sync_from_yaml(yaml_file)
+        return backend.sync_from_yaml(yaml_file, storage_profile)
 
 
 def create_database(output_dir: Optional[str] = None) -> ParquetBackend:
@@ -439,21 +610,35 @@ def create_database(output_dir: Optional[str] = None) -> ParquetBackend:
 class DuckDBParquetQuerier:
     """Utility class to query Parquet files directly using DuckDB without loading into memory."""
 
-    def __init__(self, parquet_dir: str):
+    def __init__(
+        self, parquet_dir: str, pool_size: Optional[int] = None, pool_timeout: float = 30.0
+    ):
         """Initialize DuckDB Parquet querier.
 
+        With ``pool_size``, the querier can be shared between threads, as
+        :class:`~kg_registry.duckdb_backend.DuckDBBackend`: every read runs on
+        a cursor of a :class:`~kg_registry.pool.CursorPool`.
+
         Args:
             parquet_dir: Directory containing Parquet files
+            pool_size: Maximum number of reads running at the same time, from
+                different threads
+            pool_timeout: Seconds a read waits for a free cursor before raising
+                :class:`~kg_registry.pool.PoolTimeout`
         """
         self.parquet_dir = parquet_dir
         self.conn = duckdb.connect(":memory:")
         self._register_tables()
+        #: Cursors for reads from several threads, if enabled
+        self.pool: Optional[CursorPool] = None
+        if pool_size:
+            self.pool = CursorPool(self.conn, pool_size, pool_timeout)
 
     def _register_tables(self):
         """Register Parquet files as virtual tables in DuckDB."""
         # Whitelist of valid table names
-        valid_tables = {"resources", "resource_domains", "resource_products"}
-        tables = ["resources", "resource_domains", "resource_products"]
+        valid_tables = set(PARQUET_TABLES)
+        tables = PARQUET_TABLES
 
         for table in tables:
             # Validate table name against whitelist to prevent SQL injection
@@ -469,32 +654,154 @@ class DuckDBParquetQuerier:
                 safe_path = parquet_path.replace("'", "''")
                 query = f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{safe_path}')"
                 self.conn.execute(query)
-            else:
+            elif table not in OPTIONAL_TABLES:
                 print(f"Warning: {parquet_path} does not exist")
 
-    def execute_query(self, query: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    @contextmanager
+    def _reader(self, output: str = "dicts") -> Iterator[duckdb.DuckDBPyConnection]:
+        """Get the connection to run a read on, as ``DuckDBBackend._reader``."""
+        if self.pool is None:
+            yield self.conn
+        elif output in ("iter", "batches", "relation"):
+            yield self.pool.open_cursor()
+        else:
+            with self.pool.checkout() as cursor:
+                yield cursor
+
+    def execute_query(
+        self,
+        query: str,
+        params: Optional[List[Any]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
         """Execute a SQL query directly on Parquet files.
 
+        Only the columns the query selects are read from the files, so
+        selecting fewer columns, in any result mode, reads less data. With
+        ``output="iter"`` or ``"batches"``, rows are read ``batch_size`` at a
+        time, so large results are never held in memory at once.
+
         Args:
             query: SQL query to execute
             params: Query parameters
+            output: Result mode: ``dicts``, ``iter``, ``batches``, ``relation``, ``arrow``
+                or ``numpy``, see :mod:`kg_registry.results`
+            batch_size: Number of rows fetched at a time by ``iter`` and ``batches``
+                results (default: 1000)
 
         Returns:
-            List of results as dictionaries
+            Results in the requested mode; in the default mode, errors are
+            printed and give an empty list
         """
+        check_output(output)
+        if output != "dicts":
+            with self._reader(output) as conn:
+                return fetch(conn, query, params, output, batch_size)
         try:
-            result_cursor = self.conn.execute(query, params or [])
-            if result_cursor and result_cursor.description:
-                columns = [desc[0] for desc in result_cursor.description]
-                result = result_cursor.fetchall()
-                return [dict(zip(columns, row)) for row in result]
+            with self._reader() as conn:
+                result_cursor = conn.execute(query, params or [])
+                if result_cursor and result_cursor.description:
+                    columns = [desc[0] for desc in result_cursor.description]
+                    result = result_cursor.fetchall()
+                    return [dict(zip(columns, row)) for row in result]
             return []
         except Exception as e:
             print(f"Error executing query: {e}")
             return []
 
+    def _has_tables(self, tables: Sequence[str]) -> bool:
+        """Check whether the Parquet directory includes the given tables."""
+        return all(
+            os.path.exists(os.path.join(self.parquet_dir, f"{table}.parquet")) for table in tables
+        )
+
+    def has_search_index(self) -> bool:
+        """Check whether the Parquet directory includes the search index."""
+        return self._has_tables(search.SEARCH_SCHEMAS)
+
+    def get_record(self, resource_id: str) -> Optional[Dict[str, Any]]:
+        """Get the source record of a resource, as in ``registry/kgs.yml``.
+
+        Args:
+            resource_id: ID of the resource
+
+        Returns:
+            The record, or None if there is no resource with that ID
+        """
+        with self._reader() as conn:
+            return storage.read_record(conn, resource_id)
+
+    def search_resources(
+        self,
+        search_term: str,
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Search resources with the full-text index, as ``ParquetBackend.search_resources``.
+
+        Parquet directories exported before the search index fall back to
+        matching the term as a substring of the name or description.
+
+        Args:
+            search_term: Term to search for
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`execute_query`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Resources matching the search term
+        """
+        if self.has_search_index():
+            with self._reader(output) as conn:
+                return search.search_resources(
+                    conn, search_term, columns=columns, output=output, batch_size=batch_size
+                )
+        query = f"""
+            SELECT {projection(columns)} FROM resources
+            WHERE name ILIKE ? OR description ILIKE ?
+            ORDER BY name
+        """
+        return self.execute_query(
+            query, [f"%{search_term}%", f"%{search_term}%"], output, batch_size
+        )
+
+    def find_resources(
+        self,
+        query: Union[str, Sequence[Clause]],
+        columns: Optional[List[str]] = None,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Find the resources matching a query of :mod:`kg_registry.query_language`.
+
+        The query, such as ``category:KnowledgeGraph format:kgx "protein interaction" -stub``,
+        combines filters, product filters and text search, and runs as one statement.
+        Words are matched as substrings in Parquet directories exported before
+        the search index.
+
+        Args:
+            query: Query, or its parsed clauses
+            columns: Columns to return (default: all)
+            output: Result mode, see :meth:`execute_query`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Matching resources, best match first if the query has words, by name otherwise
+
+        Raises:
+            ValueError: If the query cannot be parsed
+        """
+        check_output(output)
+        compiled = compile_query(query, columns, text_index=self.has_search_index())
+        with self._reader(output) as conn:
+            return compiled.run(conn, output, batch_size)
+
     def close(self):
         """Close the DuckDB connection."""
+        if self.pool:
+            self.pool.close()
         if self.conn:
             self.conn.close()
 
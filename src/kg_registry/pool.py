@@ -0,0 +1,122 @@
+"""A bounded pool of DuckDB cursors, so several threads can read one database.
+
+A DuckDB connection object must not be used by two threads at once: a query
+run by one thread replaces the result, and the ``description``, that another
+thread is reading. ``conn.cursor()`` opens another connection to the same
+database instance, which sees the same data and can run queries in parallel
+with the others. :class:`CursorPool` keeps up to ``size`` such cursors and
+hands each thread its own for the duration of a read.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import duckdb
+
+__all__ = [
+    "PoolTimeout",
+    "CursorPool",
+]
+
+
+class PoolTimeout(TimeoutError):
+    """Raised when no cursor becomes free within the checkout timeout."""
+
+
+class CursorPool:
+    """A bounded pool of cursors on one DuckDB connection.
+
+    Cursors are opened on first need, up to ``size``, and reused afterwards.
+    Checkouts are reentrant: a thread that already holds a cursor gets the
+    same one again, so nested reads neither deadlock nor take a second cursor.
+    """
+
+    def __init__(self, conn: duckdb.DuckDBPyConnection, size: int = 8, timeout: float = 30.0):
+        """Initialize the pool.
+
+        Args:
+            conn: Connection to open the cursors from
+            size: Maximum number of cursors
+            timeout: Default number of seconds a checkout waits for a free cursor
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.conn = conn
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[duckdb.DuckDBPyConnection] = []
+        self._cursors: List[duckdb.DuckDBPyConnection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def open_cursor(self) -> duckdb.DuckDBPyConnection:
+        """Open a cursor outside the pool, for results that outlive a checkout.
+
+        Returns:
+            A new cursor, owned by the caller
+        """
+        with self._lock:
+            if self._closed:
+                raise duckdb.ConnectionException("The cursor pool is closed")
+            return self.conn.cursor()
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Borrow a cursor for the current thread.
+
+        Args:
+            timeout: Seconds to wait for a free cursor, instead of the pool's default
+
+        Yields:
+            A cursor that no other thread uses until it is returned
+
+        Raises:
+            PoolTimeout: If every cursor stayed in use for the whole timeout
+        """
+        held = getattr(self._local, "cursor", None)
+        if held is not None:
+            yield held
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"No cursor became free within {timeout} seconds")
+        try:
+            with self._lock:
+                if self._closed:
+                    raise duckdb.ConnectionException("The cursor pool is closed")
+                if self._idle:
+                    cursor = self._idle.pop()
+                else:
+                    cursor = self.conn.cursor()
+                    self._cursors.append(cursor)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._local.cursor = cursor
+        try:
+            yield cursor
+        finally:
+            self._local.cursor = None
+            with self._lock:
+                self._idle.append(cursor)
+            self._slots.release()
+
+    @property
+    def opened(self) -> int:
+        """Number of cursors opened so far."""
+        with self._lock:
+            return len(self._cursors)
+
+    def close(self):
+        """Close every cursor of the pool; checkouts fail from then on."""
+        with self._lock:
+            self._closed = True
+            for cursor in self._cursors:
+                cursor.close()
+            self._cursors.clear()
+            self._idle.clear()
@@ -0,0 +1,278 @@
+"""Query language for resources, compiled to one parameterized SQL statement.
+
+A query is a list of clauses separated by spaces, such as::
+
+    category:KnowledgeGraph domain:"drug discovery" format:kgx "protein interaction" -stub
+
+- ``field:value`` keeps the resources with that value for one of the
+  :data:`QUERY_FIELDS`; ``format`` and ``product_category`` look at their
+  products. Values with spaces are quoted: ``domain:"drug discovery"``.
+- A word keeps the resources that contain it, in their own name, description
+  or domains or in those of one of their products, as :func:`search_resources
+  <kg_registry.search.search_resources>` does, and ranks them with BM25.
+- A quoted phrase must appear as it is in one of those fields.
+- A ``-`` in front of a clause excludes the resources it matches instead.
+
+Clauses on the same field are alternatives, and resources must match every
+other clause. Fields and values are case-insensitive.
+
+A query is parsed once, and the statement compiled from it is cached by its
+normalized form, :func:`normalize_query`, so the same query written with its
+clauses in another order or case reuses it. Without the search tables, as in
+Parquet directories exported before them, words are matched as substrings
+instead.
+
+``assets/js/query-language.js`` compiles the same language for the advanced
+search page of the website.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import duckdb
+
+from kg_registry.results import fetch, projection
+from kg_registry.search import FACETS, HITS_SQL, TOKEN_PATTERN, hits_params
+
+__all__ = [
+    "QUERY_FIELDS",
+    "COMPILED_CACHE_SIZE",
+    "Clause",
+    "CompiledQuery",
+    "parse_query",
+    "normalize_query",
+    "compile_query",
+]
+
+#: Fields of ``field:value`` clauses, with the SQL expression of the list of
+#: values a resource ``r`` has for each
+QUERY_FIELDS: Dict[str, str] = {
+    "id": "[r.id]",
+    "category": FACETS["category"],
+    "domain": FACETS["domain"],
+    "status": FACETS["activity_status"],
+    "collection": FACETS["collection"],
+    "license": "[r.license.id, r.license.label]",
+    "format": FACETS["format"],
+    "product_category": (
+        "(SELECT list(DISTINCT p.product_category) FROM resource_products p "
+        "WHERE p.resource_id = r.id)"
+    ),
+}
+
+#: Number of compiled statements kept by :func:`compile_query`
+COMPILED_CACHE_SIZE = 256
+
+# An optional "-", an optional "field:", then a quoted phrase or a word
+_CLAUSE_PATTERN = re.compile(r'(-)?(?:([A-Za-z_]+):)?(?:"([^"]*)"|(\S+))')
+
+# Words that can be written without quotes
+_BARE_WORD = re.compile(r'[^\s":\-][^\s":]*')
+
+# Whether a word has a term to search, as TOKEN_PATTERN would find
+_HAS_TERM = re.compile(r"[^\W_]")
+
+# Whether a resource has a phrase in its fields or those of one of its products
+_PHRASE_SQL = """(
+    contains(lower(r.name), {0})
+    OR contains(lower(r.description), {0})
+    OR contains(lower(array_to_string(r.domains, ' ')), {0})
+    OR EXISTS (
+        SELECT 1 FROM resource_products p
+        WHERE p.resource_id = r.id
+            AND (contains(lower(p.product_name), {0})
+                OR contains(lower(p.product_description), {0}))
+    )
+)"""
+
+# Whether a resource, or one of its products, has every term of a word
+_TERMS_SQL = f"""r.id IN (
+    SELECT resource_id FROM search_terms
+    WHERE term IN (SELECT UNNEST(regexp_extract_all(lower({{0}}), '{TOKEN_PATTERN}')))
+    GROUP BY doc_id, doc_type, resource_id
+    HAVING COUNT(DISTINCT term)
+        = len(list_distinct(regexp_extract_all(lower({{0}}), '{TOKEN_PATTERN}')))
+)"""
+
+
+@dataclass(frozen=True)
+class Clause:
+    """Clause of a query."""
+
+    #: Value to match, or the text to search for
+    value: str
+    #: One of :data:`QUERY_FIELDS`, or None for text
+    field: Optional[str] = None
+    #: Whether the clause excludes the resources it matches
+    negated: bool = False
+    #: Whether the text was quoted, so it must appear as it is
+    phrase: bool = False
+
+    def __str__(self) -> str:
+        value = self.value.replace('"', "")
+        if self.phrase or not _BARE_WORD.fullmatch(value):
+            value = f'"{value}"'
+        return ("-" if self.negated else "") + (f"{self.field}:" if self.field else "") + value
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    """SQL statement compiled from a query, with its parameters."""
+
+    #: Statement selecting the matching rows of ``resources``, best match first
+    #: if the query has words to rank by, by name otherwise
+    sql: str
+    #: Named parameters of the statement
+    params: Tuple[Tuple[str, Any], ...]
+
+    def run(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        output: str = "dicts",
+        batch_size: Optional[int] = None,
+    ) -> Any:
+        """Run the statement.
+
+        Args:
+            conn: DuckDB connection with the registry tables
+            output: Result mode, see :mod:`kg_registry.results`
+            batch_size: Number of rows fetched at a time by streamed results
+
+        Returns:
+            Matching resources
+        """
+        return fetch(conn, self.sql, dict(self.params), output, batch_size)
+
+
+def parse_query(query: str) -> List[Clause]:
+    """Parse a query into its clauses.
+
+    Words without any letter or digit, which match everything, are left out.
+
+    Args:
+        query: Query, such as ``category:KnowledgeGraph "protein interaction" -stub``
+
+    Returns:
+        Clauses of the query, in order
+
+    Raises:
+        ValueError: If a field is not one of :data:`QUERY_FIELDS`, has no
+            value, or a quote is not closed
+    """
+    clauses = []
+    for match in _CLAUSE_PATTERN.finditer(query):
+        minus, field, phrase, word = match.groups()
+        if word is not None and word.startswith('"'):
+            raise ValueError(f"Unterminated quote in query: {query!r}")
+        if field is not None:
+            field = field.lower()
+            if field not in QUERY_FIELDS:
+                raise ValueError(
+                    f"Unknown field: {field!r}, expected one of {', '.join(QUERY_FIELDS)}"
+                )
+            value = word if phrase is None else phrase
+            if not value.strip():
+                raise ValueError(f"Missing value for field {field!r}")
+            clauses.append(Clause(value.strip(), field, bool(minus)))
+        elif word is not None and word.endswith(":") and word[:-1].lower() in QUERY_FIELDS:
+            raise ValueError(f"Missing value for field {word[:-1].lower()!r}")
+        elif _HAS_TERM.search(word if phrase is None else phrase):
+            clauses.append(Clause(word or phrase.strip(), None, bool(minus), phrase is not None))
+    return clauses
+
+
+def normalize_query(query: Union[str, Sequence[Clause]]) -> str:
+    """Get the normalized form of a query, the same for queries matching the same resources.
+
+    Args:
+        query: Query, or its clauses
+
+    Returns:
+        Its clauses, lowercased, without duplicates and in a fixed order
+    """
+    clauses = parse_query(query) if isinstance(query, str) else query
+    normalized = {
+        Clause(clause.value.lower(), clause.field, clause.negated, clause.phrase)
+        for clause in clauses
+    }
+    ordered = sorted(normalized, key=lambda c: (c.field or "", c.negated, c.phrase, c.value))
+    return " ".join(str(clause) for clause in ordered)
+
+
+def compile_query(
+    query: Union[str, Sequence[Clause]],
+    columns: Optional[Sequence[str]] = None,
+    text_index: bool = True,
+) -> CompiledQuery:
+    """Compile a query into one SQL statement on the registry tables.
+
+    Args:
+        query: Query, or its clauses
+        columns: Columns of ``resources`` to return (default: all)
+        text_index: Whether the search tables can be used for words; without
+            them, words are matched as substrings and results sorted by name
+
+    Returns:
+        The compiled statement, shared by every call with the same
+        normalized query, columns and ``text_index``
+
+    Raises:
+        ValueError: If the query cannot be parsed
+    """
+    return _compile(normalize_query(query), None if columns is None else tuple(columns), text_index)
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _compile(
+    normalized: str, columns: Optional[Tuple[str, ...]], text_index: bool
+) -> CompiledQuery:
+    params: Dict[str, Any] = {}
+
+    def param(value: Any) -> str:
+        name = f"p{len(params)}"
+        params[name] = value
+        return f"${name}"
+
+    clauses = parse_query(normalized)
+    conditions = []
+    values: Dict[Tuple[str, bool], List[str]] = {}
+    for clause in clauses:
+        if clause.field is not None:
+            values.setdefault((clause.field, clause.negated), []).append(clause.value)
+    for (field, negated), alternatives in values.items():
+        condition = (
+            f"list_has_any([lower(v) FOR v IN {QUERY_FIELDS[field]}], {param(alternatives)})"
+        )
+        conditions.append(f"NOT COALESCE({condition}, FALSE)" if negated else condition)
+
+    ranked = []
+    for clause in clauses:
+        if clause.field is not None:
+            continue
+        if clause.phrase or not text_index:
+            condition = _PHRASE_SQL.format(param(clause.value))
+        elif clause.negated:
+            condition = _TERMS_SQL.format(param(clause.value))
+        else:
+            ranked.append(clause.value)
+            continue
+        if clause.phrase and text_index and not clause.negated:
+            ranked.append(clause.value)
+        conditions.append(f"NOT COALESCE({condition}, FALSE)" if clause.negated else condition)
+
+    select = f"SELECT {projection(columns, 'r')} FROM resources r"
+    order = "r.name, r.id"
+    if ranked:
+        params.update(hits_params(" ".join(ranked), match_all=True))
+        select = (
+            f"{HITS_SQL} {select} JOIN (SELECT resource_id, MAX(score) AS score FROM hits "
+            "GROUP BY resource_id) h ON r.id = h.resource_id"
+        )
+        order = "h.score DESC, " + order
+    where = " AND ".join(conditions) or "TRUE"
+    return CompiledQuery(
+        f"{select} WHERE {where} ORDER BY {order}",
+        tuple(params.items()),
+    )
@@ -0,0 +1,275 @@
+"""Column projection and result modes shared by the query methods of the backends.
+
+Query methods return a list of dicts by default. The ``output`` argument picks
+another form of the same rows:
+
+- ``"dicts"``: a list with one dict per row
+- ``"iter"``: a lazy iterator of dicts, fetched in batches on a cursor of its own
+- ``"batches"``: a ``pyarrow.RecordBatchReader`` streaming the rows in record
+  batches (needs pyarrow)
+- ``"relation"``: a DuckDB relation, run again each time it is consumed
+- ``"arrow"``: a ``pyarrow.Table`` (needs pyarrow)
+- ``"numpy"``: a dict of NumPy arrays, one per column (needs numpy)
+
+Combined with a ``columns`` projection, only the requested columns are read, so
+the copies of resources (``raw_data`` and ``products`` JSON, and the nested
+``contacts`` and ``curators``) are never materialized when they are not needed,
+and Parquet scans skip their column chunks.
+
+Streamed results (``iter`` and ``batches``) hold ``batch_size`` rows at a time,
+:data:`ITER_BATCH_SIZE` by default, however many rows the query returns.
+
+:func:`fetch_page` reads a page of rows after a keyset cursor instead: pages are
+ordered by a sort column and a unique key, and each one starts after the
+``(sort value, key)`` of the last row of the previous one, so rows added or
+removed by a sync in between don't shift the rows of later pages.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import duckdb
+
+__all__ = [
+    "OUTPUT_MODES",
+    "ITER_BATCH_SIZE",
+    "PAGE_SIZE",
+    "Page",
+    "projection",
+    "check_output",
+    "resource_filters",
+    "fetch",
+    "fetch_page",
+]
+
+#: Values of the ``output`` argument of query methods
+OUTPUT_MODES = ("dicts", "iter", "batches", "relation", "arrow", "numpy")
+
+#: Default number of rows fetched at a time by ``"iter"`` and ``"batches"`` results
+ITER_BATCH_SIZE = 1000
+
+#: Default number of rows of a page
+PAGE_SIZE = 100
+
+
+@dataclass
+class Page:
+    """Page of rows read by :func:`fetch_page`."""
+
+    #: Rows of the page, one dict per row
+    rows: List[Dict[str, Any]]
+    #: ``(sort value, key)`` of the last row, to pass as ``after`` to get the
+    #: next page, or None if this is the last page
+    after: Optional[Tuple[Any, Any]] = None
+
+
+def projection(columns: Optional[Sequence[str]] = None, alias: Optional[str] = None) -> str:
+    """Build the select list of a query.
+
+    Args:
+        columns: Column names, or None for all columns
+        alias: Table alias to qualify the columns with
+
+    Returns:
+        Comma-separated, quoted column names, or ``*``
+
+    Raises:
+        ValueError: If ``columns`` is empty or not a list of names
+    """
+    prefix = f"{alias}." if alias else ""
+    if columns is None:
+        return f"{prefix}*"
+    if isinstance(columns, str) or not columns:
+        raise ValueError("columns must be a non-empty list of column names")
+    quoted = []
+    for column in columns:
+        if not isinstance(column, str):
+            raise ValueError(f"Invalid column name: {column!r}")
+        # Quoting keeps names from being read as SQL; unknown ones fail to bind
+        quoted.append(prefix + '"' + column.replace('"', '""') + '"')
+    return ", ".join(quoted)
+
+
+def check_output(output: str):
+    """Check that a result mode is one of :data:`OUTPUT_MODES`.
+
+    Raises:
+        ValueError: If it is not
+    """
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {output!r}, expected one of {OUTPUT_MODES}")
+
+
+def resource_filters(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Build the conditions of the filters of ``query_resources`` on the ``resources`` table.
+
+    Args:
+        filters: Values of the ``id``, ``category``, ``activity_status``,
+            ``domain`` and ``name_contains`` filters; empty ones are ignored
+
+    Returns:
+        Conditions to append to a ``WHERE`` clause, each starting with
+        ``AND``, and their ``?`` parameters
+    """
+    conditions = ""
+    params: List[Any] = []
+
+    if filters.get("id"):
+        conditions += " AND id = ?"
+        params.append(filters["id"])
+
+    if filters.get("category"):
+        conditions += " AND category = ?"
+        params.append(filters["category"])
+
+    if filters.get("activity_status"):
+        conditions += " AND activity_status = ?"
+        params.append(filters["activity_status"])
+
+    if filters.get("domain"):
+        conditions += " AND id IN (SELECT resource_id FROM resource_domains WHERE domain = ?)"
+        params.append(filters["domain"])
+
+    if filters.get("name_contains"):
+        conditions += " AND name ILIKE ?"
+        params.append(f"%{filters['name_contains']}%")
+
+    return conditions, params
+
+
+def _check_positive(name: str, value: int):
+    if not isinstance(value, int) or value < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+
+
+def _iter_dicts(
+    conn: duckdb.DuckDBPyConnection,
+    query: str,
+    params: Union[List[Any], Dict[str, Any]],
+    batch_size: int,
+) -> Iterator[Dict[str, Any]]:
+    # A cursor of its own, so other queries on the connection don't cut the iteration short
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = [desc[0] for desc in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+
+def fetch(
+    conn: duckdb.DuckDBPyConnection,
+    query: str,
+    params: Union[List[Any], Dict[str, Any], None] = None,
+    output: str = "dicts",
+    batch_size: Optional[int] = None,
+) -> Any:
+    """Run a query and return its rows in the given mode.
+
+    Args:
+        conn: DuckDB connection
+        query: SQL query with ``?``, ``$n`` or ``$name`` parameters
+        params: Query parameters, as a list or, for ``$name`` parameters, a dict
+        output: One of :data:`OUTPUT_MODES`
+        batch_size: Number of rows fetched at a time by ``iter`` and ``batches``
+            results (default: :data:`ITER_BATCH_SIZE`)
+
+    Returns:
+        Rows in the requested form
+
+    Raises:
+        ValueError: If ``batch_size`` is not a positive integer
+    """
+    check_output(output)
+    batch_size = ITER_BATCH_SIZE if batch_size is None else batch_size
+    _check_positive("batch_size", batch_size)
+    params = [] if params is None else params
+    if output == "dicts":
+        cursor = conn.execute(query, params)
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    if output == "iter":
+        return _iter_dicts(conn, query, params, batch_size)
+    if output == "batches":
+        # The reader keeps the result of the cursor alive after it goes out of scope
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        # to_arrow_reader() replaced fetch_record_batch() in DuckDB 1.4
+        to_reader = getattr(cursor, "to_arrow_reader", None) or cursor.fetch_record_batch
+        return to_reader(batch_size)
+
+    relation = conn.sql(query, params=params or None)
+    if output == "relation":
+        return relation
+    if output == "arrow":
+        # to_arrow_table() replaced fetch_arrow_table() in DuckDB 1.4
+        to_arrow = getattr(relation, "to_arrow_table", None) or relation.fetch_arrow_table
+        return to_arrow()
+    return relation.fetchnumpy()
+
+
+def fetch_page(
+    conn: duckdb.DuckDBPyConnection,
+    select: str,
+    source: str,
+    where: str = "1=1",
+    params: Optional[List[Any]] = None,
+    sort: str = "id",
+    key: str = "id",
+    after: Optional[Sequence[Any]] = None,
+    limit: int = PAGE_SIZE,
+) -> Page:
+    """Read the page of rows that follows a keyset cursor.
+
+    Rows are ordered by ``sort``, with missing values last, then by ``key``;
+    together, they must identify a row.
+
+    Args:
+        conn: DuckDB connection
+        select: Select list, such as one built by :func:`projection`
+        source: Table or subquery to read from
+        where: Condition on the rows, with ``?`` parameters
+        params: Parameters of ``where``
+        sort: SQL expression to order the rows by
+        key: SQL expression of the unique key breaking ties in ``sort``
+        after: ``(sort value, key)`` of the row to start after, as given by
+            :attr:`Page.after`, or None for the first page
+        limit: Maximum number of rows of the page
+
+    Returns:
+        The page, with the cursor of the next page if there is one
+
+    Raises:
+        ValueError: If ``after`` is not a pair or ``limit`` is not a positive integer
+    """
+    _check_positive("limit", limit)
+    params = list(params or [])
+    if after is not None:
+        if isinstance(after, str) or len(after) != 2:
+            raise ValueError(f"after must be a (sort value, key) pair, got {after!r}")
+        value, last_key = after
+        if value is None:
+            # Only rows without a sort value come after a row without one
+            where = f"({where}) AND {sort} IS NULL AND {key} > ?"
+            params.append(last_key)
+        else:
+            where = f"({where}) AND ({sort} > ? OR ({sort} = ? AND {key} > ?) OR {sort} IS NULL)"
+            params.extend([value, value, last_key])
+    # One more row than the page tells whether there is a next page
+    cursor = conn.execute(
+        f"SELECT {select}, {sort} AS _page_sort, {key} AS _page_key FROM {source} "
+        f"WHERE {where} ORDER BY _page_sort NULLS LAST, _page_key LIMIT {limit + 1}",
+        params,
+    )
+    columns = [desc[0] for desc in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    keys = [(row.pop("_page_sort"), row.pop("_page_key")) for row in rows]
+    if len(rows) > limit:
+        return Page(rows[:limit], keys[limit - 1])
+    return Page(rows)
@@ -0,0 +1,385 @@
+"""Full-text search over registry resources and products with BM25 ranking.
+
+The index is kept in two plain DuckDB tables, so no extension is needed and the
+tables can be exported to Parquet alongside the others:
+
+- ``search_terms``: one row per term, document and field, with the term
+  frequency ``tf``
+- ``search_docs``: the ``length`` of each document field, in terms
+
+A document is a resource (fields ``name``, ``description`` and ``domain``) or a
+product (fields ``name`` and ``description``). A product listed by several
+resources is one document per resource, told apart by ``resource_id``.
+
+Text is tokenized in SQL with :data:`TOKEN_PATTERN` after lowercasing, both when
+indexing and when searching, so queries and documents are always tokenized the
+same way.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import duckdb
+
+from kg_registry.results import fetch, projection
+
+__all__ = [
+    "TOKEN_PATTERN",
+    "SEARCH_SCHEMAS",
+    "FIELDS",
+    "DOC_TYPES",
+    "FACETS",
+    "HITS_SQL",
+    "index_resources",
+    "hits_params",
+    "search",
+    "search_resources",
+    "facet_search",
+]
+
+#: Regular expression matching one term, applied to lowercased text
+TOKEN_PATTERN = r"[\pL\pN]+"
+
+#: Column definitions of the search index tables
+SEARCH_SCHEMAS: Dict[str, str] = {
+    "search_terms": """
+        term VARCHAR,
+        doc_id VARCHAR,
+        doc_type VARCHAR,
+        field VARCHAR,
+        tf INTEGER,
+        resource_id VARCHAR
+    """,
+    "search_docs": """
+        doc_id VARCHAR,
+        doc_type VARCHAR,
+        field VARCHAR,
+        length INTEGER,
+        resource_id VARCHAR
+    """,
+}
+
+#: Indexed fields
+FIELDS = ["name", "description", "domain"]
+
+#: Indexed document types
+DOC_TYPES = ["resource", "product"]
+
+#: Facets of :func:`facet_search`, with the SQL expression of the list of values
+#: a resource ``r`` has for each
+FACETS: Dict[str, str] = {
+    "category": "[r.category]",
+    "domain": "r.domains",
+    "activity_status": "[r.activity_status]",
+    "collection": "r.collection",
+    "format": (
+        "(SELECT list(DISTINCT p.product_format) FROM resource_products p "
+        "WHERE p.resource_id = r.id)"
+    ),
+}
+
+#: Default BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKENS = f"regexp_extract_all(lower({{}}), '{TOKEN_PATTERN}')"
+
+_FIELDS_SQL = f"""
+    WITH fields AS (
+        SELECT id AS doc_id, 'resource' AS doc_type, 'name' AS field,
+            {_TOKENS.format("name")} AS tokens, id AS resource_id
+        FROM resources WHERE {{resource_filter}}
+        UNION ALL
+        SELECT id, 'resource', 'description', {_TOKENS.format("description")}, id
+        FROM resources WHERE {{resource_filter}}
+        UNION ALL
+        SELECT id, 'resource', 'domain', {_TOKENS.format("array_to_string(domains, ' ')")}, id
+        FROM resources WHERE {{resource_filter}}
+        UNION ALL
+        SELECT product_id, 'product', 'name', {_TOKENS.format("product_name")}, resource_id
+        FROM resource_products WHERE {{product_filter}}
+        UNION ALL
+        SELECT product_id, 'product', 'description', {_TOKENS.format("product_description")},
+            resource_id
+        FROM resource_products WHERE {{product_filter}}
+    )
+"""
+
+#: Common table expressions ending with ``hits``, the BM25 score of each
+#: document matching ``$query``, with the parameters of :func:`hits_params`
+HITS_SQL = f"""
+    WITH query_terms AS (
+        SELECT DISTINCT UNNEST({_TOKENS.format("$query")}) AS term
+    ),
+    docs AS (
+        SELECT doc_id, doc_type, resource_id, SUM(length) AS length
+        FROM search_docs
+        WHERE field IN (SELECT UNNEST($fields)) AND doc_type IN (SELECT UNNEST($doc_types))
+        GROUP BY ALL
+    ),
+    collection AS (
+        SELECT COUNT(*) AS n, AVG(length) AS avg_length FROM docs
+    ),
+    matches AS (
+        SELECT term, doc_id, doc_type, resource_id, SUM(tf) AS tf
+        FROM search_terms JOIN query_terms USING (term)
+        WHERE field IN (SELECT UNNEST($fields)) AND doc_type IN (SELECT UNNEST($doc_types))
+        GROUP BY ALL
+    ),
+    document_frequency AS (
+        SELECT term, COUNT(*) AS df FROM matches GROUP BY term
+    ),
+    hits AS (
+        SELECT d.doc_id, d.doc_type, d.resource_id,
+            SUM(
+                ln(1 + (c.n - f.df + 0.5) / (f.df + 0.5))
+                * m.tf * ($k1 + 1)
+                / (m.tf + $k1 * (1 - $b + $b * d.length / c.avg_length))
+            ) AS score
+        FROM matches m
+        JOIN document_frequency f USING (term)
+        JOIN docs d USING (doc_id, doc_type, resource_id)
+        CROSS JOIN collection c
+        GROUP BY ALL
+        HAVING NOT $match_all OR COUNT(*) = (SELECT COUNT(*) FROM query_terms)
+    )
+"""
+
+
+def index_resources(conn: duckdb.DuckDBPyConnection, resource_ids: Optional[List[str]] = None):
+    """Add resources and their products to the search index.
+
+    The index rows of these resources must already have been deleted. This
+    does not start a transaction, so it can run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the registry and search tables
+        resource_ids: Resources to index, or None to index all resources
+    """
+    if resource_ids is None:
+        fields_sql = _FIELDS_SQL.format(resource_filter="TRUE", product_filter="TRUE")
+        params = []
+    elif resource_ids:
+        fields_sql = _FIELDS_SQL.format(
+            resource_filter="id IN (SELECT UNNEST($1))",
+            product_filter="resource_id IN (SELECT UNNEST($1))",
+        )
+        params = [resource_ids]
+    else:
+        return
+    conn.execute(
+        f"""
+        INSERT INTO search_docs (doc_id, doc_type, field, length, resource_id)
+        {fields_sql}
+        SELECT doc_id, doc_type, field, len(tokens), resource_id
+        FROM fields WHERE len(tokens) > 0
+        """,
+        params,
+    )
+    conn.execute(
+        f"""
+        INSERT INTO search_terms (term, doc_id, doc_type, field, tf, resource_id)
+        {fields_sql}
+        SELECT term, doc_id, doc_type, field, COUNT(*), resource_id
+        FROM (SELECT *, UNNEST(tokens) AS term FROM fields)
+        GROUP BY ALL
+        """,
+        params,
+    )
+
+
+def hits_params(
+    query: str,
+    fields: Optional[List[str]] = None,
+    doc_types: Optional[List[str]] = None,
+    match_all: bool = False,
+) -> Dict[str, Any]:
+    """Get the parameters of :data:`HITS_SQL`.
+
+    Args:
+        query: Free text; every term counts towards the score
+        fields: Fields to search, from :data:`FIELDS` (default: all)
+        doc_types: Document types to search, from :data:`DOC_TYPES` (default: all)
+        match_all: Only score documents that contain every query term
+
+    Returns:
+        Named query parameters
+    """
+    return {
+        "query": query,
+        "fields": list(fields or FIELDS),
+        "doc_types": list(doc_types or DOC_TYPES),
+        "match_all": match_all,
+        "k1": K1,
+        "b": B,
+    }
+
+
+def search(
+    conn: duckdb.DuckDBPyConnection,
+    query: str,
+    limit: Optional[int] = 20,
+    fields: Optional[List[str]] = None,
+    doc_types: Optional[List[str]] = None,
+    match_all: bool = False,
+) -> List[Dict[str, Any]]:
+    """Rank resources and products against a query with BM25.
+
+    Args:
+        conn: DuckDB connection with the search tables
+        query: Free text; every term counts towards the score
+        limit: Maximum number of hits, or None for all
+        fields: Fields to search, from :data:`FIELDS` (default: all)
+        doc_types: Document types to search, from :data:`DOC_TYPES` (default: all)
+        match_all: Only return documents that contain every query term
+
+    Returns:
+        Hits with ``doc_id``, ``doc_type``, ``resource_id`` and ``score``, best first
+    """
+    params = hits_params(query, fields, doc_types, match_all)
+    params["limit"] = limit
+    cursor = conn.execute(
+        f"{HITS_SQL} SELECT * FROM hits ORDER BY score DESC, doc_id, resource_id LIMIT $limit",
+        params,
+    )
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def search_resources(
+    conn: duckdb.DuckDBPyConnection,
+    query: str,
+    fields: Optional[List[str]] = None,
+    columns: Optional[List[str]] = None,
+    output: str = "dicts",
+    batch_size: Optional[int] = None,
+) -> Any:
+    """Find the resources matching every query term, best first.
+
+    A resource matches if the resource itself or one of its products contains
+    every term; it is ranked by its best-scoring document.
+
+    Args:
+        conn: DuckDB connection with the registry and search tables
+        query: Free text
+        fields: Fields to search, from :data:`FIELDS` (default: all)
+        columns: Columns of ``resources`` to return (default: all)
+        output: Result mode, see :mod:`kg_registry.results`
+        batch_size: Number of rows fetched at a time by streamed results
+
+    Returns:
+        Rows of the ``resources`` table
+    """
+    return fetch(
+        conn,
+        f"""
+        {HITS_SQL}
+        SELECT {projection(columns, "r")} FROM resources r
+        JOIN (SELECT resource_id, MAX(score) AS score FROM hits GROUP BY resource_id) h
+            ON r.id = h.resource_id
+        ORDER BY h.score DESC, r.name
+        """,
+        hits_params(query, fields, None, True),
+        output,
+        batch_size,
+    )
+
+
+def facet_search(
+    conn: duckdb.DuckDBPyConnection,
+    filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+    facets: Optional[Sequence[str]] = None,
+    query: Optional[str] = None,
+    limit: Optional[int] = 20,
+    offset: int = 0,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Get a page of the resources matching filters, with the counts of their facet values.
+
+    The resources are filtered once, and the page, the total and the counts of
+    every facet are all read from that set by one query, the counts with
+    ``GROUPING SETS``. Counts are numbers of matching resources, so they
+    reflect the filters, including those on the facet itself.
+
+    Args:
+        conn: DuckDB connection with the registry and search tables
+        filters: Values to keep for some :data:`FACETS`; a resource matches a
+            filter if it has any of its values, and must match every filter
+        facets: Facets to count, from :data:`FACETS` (default: all)
+        query: Free text the resources must match, as in :func:`search_resources`,
+            which then ranks them; without it they are sorted by name
+        limit: Maximum number of resources in the page, or None for all
+        offset: Number of resources before the page
+        columns: Columns of ``resources`` to return (default: all)
+
+    Returns:
+        Dictionary with the ``total`` number of matching resources, the ``hits``
+        of the page and, for each facet, the number of matching resources per
+        value, most frequent first
+
+    Raises:
+        ValueError: If a filter or facet is not one of :data:`FACETS`
+    """
+    facets = list(FACETS if facets is None else facets)
+    filters = {name: value for name, value in (filters or {}).items() if value}
+    for name in [*facets, *filters]:
+        if name not in FACETS:
+            raise ValueError(f"Unknown facet: {name!r}, expected one of {', '.join(FACETS)}")
+
+    params: Dict[str, Any] = {"limit": limit, "offset": offset}
+    conditions = ["TRUE"]
+    for i, (name, value) in enumerate(filters.items()):
+        params[f"filter_{i}"] = [value] if isinstance(value, str) else list(value)
+        conditions.append(f"list_has_any({FACETS[name]}, $filter_{i})")
+    if query is None:
+        ctes, source, score, order = "WITH", "resources r", "NULL", "r.name, r.id"
+    else:
+        params.update(hits_params(query, None, None, True))
+        ctes = f"{HITS_SQL},"
+        source = (
+            "resources r JOIN (SELECT resource_id, MAX(score) AS score FROM hits "
+            "GROUP BY resource_id) h ON r.id = h.resource_id"
+        )
+        score, order = "h.score", "m.score DESC, r.name, r.id"
+
+    counts = "SELECT NULL::VARCHAR AS facet, NULL::VARCHAR AS value, 0 AS count WHERE FALSE"
+    if facets:
+        unnested = ", ".join(f"UNNEST(f_{name}) AS {name}" for name in facets)
+        counts = f"""
+            SELECT
+                CASE {" ".join(f"WHEN GROUPING({n}) = 0 THEN '{n}'" for n in facets)} END
+                    AS facet,
+                CAST(COALESCE({", ".join(facets)}) AS VARCHAR) AS value,
+                COUNT(DISTINCT id) AS count
+            FROM (SELECT id, {unnested} FROM matched)
+            GROUP BY GROUPING SETS ({", ".join(f"({n})" for n in facets)})
+            HAVING value IS NOT NULL
+        """
+    facet_columns = "".join(f", {FACETS[name]} AS f_{name}" for name in facets)
+    cursor = conn.execute(
+        f"""
+        {ctes}
+        matched AS MATERIALIZED (
+            SELECT r.id, r.name, {score} AS score{facet_columns}
+            FROM {source}
+            WHERE {" AND ".join(conditions)}
+        ),
+        counts AS ({counts}),
+        page AS (
+            SELECT {projection(columns, "r")}
+            FROM matched m JOIN resources r ON r.id = m.id
+            ORDER BY {order}
+            LIMIT $limit OFFSET $offset
+        )
+        SELECT
+            (SELECT COUNT(*) FROM matched),
+            (SELECT list(page) FROM page),
+            (SELECT list(struct_pack(facet, value, count) ORDER BY facet, count DESC, value)
+                FROM counts)
+        """,
+        params,
+    )
+    total, hits, counted = cursor.fetchone()
+    results = {name: {} for name in facets}
+    for row in counted or []:
+        results[row["facet"]][row["value"]] = row["count"]
+    return {"total": total, "hits": hits or [], "facets": results}
@@ -0,0 +1,183 @@
+"""Statistics of the registry, computed by each sync and stored with the data.
+
+Every sync that changes the registry tables recomputes, in its transaction:
+
+- ``registry_counts``: the number of resources or products per value of each
+  of the :data:`STAT_DIMENSIONS`, such as resources per category or products
+  per format
+- ``registry_field_usage``: the number of resource and product records that
+  set each field, for schema coverage
+- ``registry_totals``: one row with the number of resources, active resources
+  and products, and the total and median product file size
+
+Readers then get every number from a few small tables instead of aggregating
+the registry, and :func:`export_stats` writes them to ``registry/stats.json``
+for the website and dashboards.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import duckdb
+
+__all__ = [
+    "STATS_SCHEMAS",
+    "STAT_DIMENSIONS",
+    "index_stats",
+    "read_stats",
+    "export_stats",
+]
+
+#: Column definitions of the statistics tables created with the registry tables
+STATS_SCHEMAS: Dict[str, str] = {
+    "registry_counts": """
+        dimension VARCHAR,
+        value VARCHAR,
+        count BIGINT
+    """,
+    "registry_field_usage": """
+        entity_type VARCHAR,
+        field VARCHAR,
+        count BIGINT
+    """,
+    "registry_totals": """
+        resources BIGINT,
+        active_resources BIGINT,
+        products BIGINT,
+        sized_products BIGINT,
+        product_file_size BIGINT,
+        median_product_file_size DOUBLE
+    """,
+}
+
+#: Dimensions of ``registry_counts``, with the rows they count and the SQL
+#: expression of their value. Rows without a value are not counted.
+STAT_DIMENSIONS: Dict[str, Tuple[str, str]] = {
+    "category": ("resources", "category"),
+    "activity_status": ("resources", "activity_status"),
+    "license": ("resources", "COALESCE(license.label, license.id)"),
+    "domain": ("resource_domains", "domain"),
+    "collection": ("(SELECT UNNEST(collection) AS collection FROM resources)", "collection"),
+    "product_category": ("resource_products", "product_category"),
+    "format": ("resource_products", "product_format"),
+    "compression": ("resource_products", "compression"),
+    "product_license": ("resource_products", "COALESCE(license.label, license.id)"),
+}
+
+_FIELD_USAGE_SQL = """
+    SELECT 'resource', field, COUNT(*)
+    FROM (SELECT UNNEST(record_fields) AS field FROM resources)
+    GROUP BY field
+    UNION ALL
+    SELECT 'product', field, COUNT(*)
+    FROM (
+        SELECT UNNEST(json_keys(product)) AS field
+        FROM (SELECT UNNEST(CAST(products AS JSON[])) AS product FROM resources)
+    )
+    GROUP BY field
+"""
+
+_TOTALS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM resources),
+        (SELECT COUNT(*) FROM resources WHERE activity_status = 'active'),
+        COUNT(*),
+        COUNT(product_file_size),
+        SUM(product_file_size),
+        CAST(MEDIAN(product_file_size) AS DOUBLE)
+    FROM resource_products
+"""
+
+
+def _counts_sql() -> str:
+    """Build the query counting every dimension, in one pass over each source."""
+    sources: Dict[str, List[Tuple[str, str]]] = {}
+    for dimension, (source, expression) in STAT_DIMENSIONS.items():
+        sources.setdefault(source, []).append((dimension, expression))
+    queries = []
+    for source, dimensions in sources.items():
+        names = [dimension for dimension, _ in dimensions]
+        queries.append(f"""
+            SELECT
+                CASE {" ".join(f"WHEN GROUPING({n}) = 0 THEN '{n}'" for n in names)} END,
+                CAST(COALESCE({", ".join(names)}) AS VARCHAR) AS value,
+                COUNT(*)
+            FROM (SELECT {", ".join(f"{e} AS {n}" for n, e in dimensions)} FROM {source})
+            GROUP BY GROUPING SETS ({", ".join(f"({n})" for n in names)})
+            HAVING value IS NOT NULL
+            """)
+    return " UNION ALL ".join(queries)
+
+
+def index_stats(conn: duckdb.DuckDBPyConnection):
+    """Recompute the statistics tables from the registry tables.
+
+    This does not start a transaction, so it can run inside the sync's.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+    """
+    for table in STATS_SCHEMAS:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"INSERT INTO registry_counts {_counts_sql()}")
+    conn.execute(f"INSERT INTO registry_field_usage {_FIELD_USAGE_SQL}")
+    conn.execute(f"INSERT INTO registry_totals {_TOTALS_SQL}")
+
+
+def read_stats(conn: duckdb.DuckDBPyConnection) -> Dict[str, Any]:
+    """Read the statistics computed by the last sync.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+
+    Returns:
+        Dictionary with the ``generation`` and ``synced_at`` time of the data,
+        the ``totals``, the ``counts`` of each dimension and the ``field_usage``
+        of resources and products, most frequent first
+    """
+    generation, synced_at = conn.execute(
+        "SELECT generation, synced_at FROM registry_meta"
+    ).fetchone()
+    row = conn.execute("SELECT * FROM registry_totals").fetchone() or (0, 0, 0, 0, None, None)
+    counts: Dict[str, Dict[str, int]] = {dimension: {} for dimension in STAT_DIMENSIONS}
+    for dimension, value, count in conn.execute(
+        "SELECT * FROM registry_counts ORDER BY dimension, count DESC, value"
+    ).fetchall():
+        counts.setdefault(dimension, {})[value] = count
+    field_usage: Dict[str, Dict[str, int]] = {"resource": {}, "product": {}}
+    for entity_type, name, count in conn.execute(
+        "SELECT * FROM registry_field_usage ORDER BY entity_type, count DESC, field"
+    ).fetchall():
+        field_usage[entity_type][name] = count
+    return {
+        "generation": generation,
+        "synced_at": synced_at.isoformat() if synced_at else None,
+        "totals": {
+            "resources": row[0],
+            "active_resources": row[1],
+            "products": row[2],
+            "sized_products": row[3],
+            "product_file_size": row[4] or 0,
+            "median_product_file_size": row[5],
+        },
+        "counts": counts,
+        "field_usage": field_usage,
+    }
+
+
+def export_stats(conn: duckdb.DuckDBPyConnection, path: Union[str, Path]) -> Dict[str, Any]:
+    """Write the statistics computed by the last sync to a JSON file.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        path: Path of the JSON file, such as ``registry/stats.json``
+
+    Returns:
+        The statistics, as returned by :func:`read_stats`
+    """
+    stats = read_stats(conn)
+    with open(path, "w") as file:
+        json.dump(stats, file, indent=2)
+        file.write("\n")
+    return stats
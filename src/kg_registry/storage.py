@@ -0,0 +1,102 @@
+"""Storage profiles for the source records of the resources.
+
+Every resource row keeps its source record, as in ``registry/kgs.yml``, next to
+the typed columns derived from it. How it is kept is the storage profile of
+the tables, chosen at sync time:
+
+- ``"full"``: the whole record, as JSON, in the ``raw_data`` column. The
+  default.
+- ``"compact"``: the record without its products in ``raw_data``, which are
+  already in the ``products`` column. They make up most of the record, so
+  this stores most of it only once; :data:`RECORD_SQL` puts it back together.
+
+There is no compressed profile: DuckDB already compresses ``raw_data`` with
+FSST, and records compressed one by one, with zlib or zstd, came out larger
+than that, both in the database and in the Parquet export.
+
+Queries never read the records: the fields they filter and count on have
+columns of their own in every profile. :func:`read_record` gets the record of
+one resource back, and :func:`read_records` those of several, whatever the
+profile.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+import duckdb
+
+__all__ = [
+    "STORAGE_PROFILES",
+    "DEFAULT_STORAGE",
+    "RECORD_SQL",
+    "check_storage",
+    "read_records",
+    "read_record",
+]
+
+#: Ways of storing the source records, see the module documentation
+STORAGE_PROFILES = ("full", "compact")
+
+#: Profile of tables synced without choosing one
+DEFAULT_STORAGE = "full"
+
+#: SQL expression of the source record of a ``resources`` row. In the
+#: ``compact`` profile, ``raw_data`` has a null in place of the products.
+RECORD_SQL = (
+    "CASE WHEN json_type(raw_data, '$.products') = 'NULL' AND json_type(products) <> 'NULL' "
+    "THEN json_merge_patch(raw_data, json_object('products', products)) ELSE raw_data END"
+)
+
+
+def check_storage(storage: str) -> str:
+    """Check that a storage profile is one of :data:`STORAGE_PROFILES`.
+
+    Args:
+        storage: Storage profile
+
+    Returns:
+        The same profile
+
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    if storage not in STORAGE_PROFILES:
+        raise ValueError(
+            f"Unknown storage profile: {storage!r}, expected one of {', '.join(STORAGE_PROFILES)}"
+        )
+    return storage
+
+
+def read_records(
+    conn: duckdb.DuckDBPyConnection, resource_ids: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Read the source records of resources, in any storage profile.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resource_ids: IDs of the resources
+
+    Returns:
+        Records by resource ID, without the IDs that have no resource
+    """
+    return {
+        resource_id: json.loads(record)
+        for resource_id, record in conn.execute(
+            f"SELECT id, {RECORD_SQL} FROM resources "
+            "WHERE id IN (SELECT UNNEST($1)) AND raw_data IS NOT NULL",
+            [resource_ids],
+        ).fetchall()
+    }
+
+
+def read_record(conn: duckdb.DuckDBPyConnection, resource_id: str) -> Optional[Dict[str, Any]]:
+    """Read the source record of a resource, in any storage profile.
+
+    Args:
+        conn: DuckDB connection with the registry tables
+        resource_id: ID of the resource
+
+    Returns:
+        The record, or None if there is no resource with that ID
+    """
+    return read_records(conn, [resource_id]).get(resource_id)
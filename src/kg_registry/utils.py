@@ -1,16 +1,29 @@
 """Test data integrity, beyond what's possible with the JSON schema."""
 
+import email.utils
+import logging
+import os
+import time
+from datetime import timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
 import requests
 import yaml
 
+from kg_registry.cache import DiskCache
 from kg_registry.constants import RESOURCE_DIRECTORY, ROOT
 
 __all__ = [
     "get_data",
     "query_wikidata",
+    "query_wikidata_values",
+    "WikidataClient",
     "get_new_data",
 ]
 
+logger = logging.getLogger(__name__)
+
 
 def get_data():
     """Get ontology data."""
@@ -33,14 +46,240 @@ def get_data():
 # See https://www.wikidata.org/wiki/Wikidata:SPARQL_query_service#Interfacing
 WIKIDATA_SPARQL = "https://query.wikidata.org/bigdata/namespace/wdq/sparql"
 
+#: Placeholder in query templates that is replaced by a ``VALUES`` block
+VALUES_PLACEHOLDER = "{{VALUES}}"
+
+#: Prefixes predeclared by the Wikidata query service, used to match bindings to values
+WIKIDATA_PREFIXES = {
+    "wd": "http://www.wikidata.org/entity/",
+    "wdt": "http://www.wikidata.org/prop/direct/",
+    "p": "http://www.wikidata.org/prop/",
+    "ps": "http://www.wikidata.org/prop/statement/",
+    "pq": "http://www.wikidata.org/prop/qualifier/",
+}
+
+#: Default location of the on-disk Wikidata cache
+WIKIDATA_CACHE_DIRECTORY = ROOT.joinpath(".cache", "wikidata")
+
+#: Default time-to-live of cached results, in seconds
+WIKIDATA_CACHE_TTL = 24 * 60 * 60
+
+
+def _normalize_query(query: str) -> str:
+    """Normalize query text so that formatting differences share a cache entry."""
+    return " ".join(query.split())
+
+
+def _term_value(term: str) -> str:
+    """Get the value a SPARQL term takes in a JSON result binding."""
+    term = term.strip()
+    if term.startswith("<") and term.endswith(">"):
+        return term[1:-1]
+    if term.startswith('"'):
+        return term[1 : term.rindex('"')]
+    prefix, sep, local = term.partition(":")
+    if sep and prefix in WIKIDATA_PREFIXES:
+        return WIKIDATA_PREFIXES[prefix] + local
+    return term
+
+
+class WikidataClient:
+    """Client for the Wikidata SPARQL endpoint with batching and an on-disk cache.
+
+    Results are cached with a time-to-live, keyed by normalized query text.
+    Per-value lookups are merged into a few queries with ``VALUES`` blocks and
+    cached per value, so adding one resource only queries for that resource.
+    In offline mode, only the cache is consulted, for reproducible builds.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = WIKIDATA_SPARQL,
+        cache_dir: Optional[Union[str, Path]] = WIKIDATA_CACHE_DIRECTORY,
+        ttl: Optional[float] = WIKIDATA_CACHE_TTL,
+        offline: bool = False,
+        batch_size: int = 200,
+        timeout: float = 60,
+        max_retries: int = 3,
+    ):
+        """Initialize the client.
+
+        Args:
+            endpoint: SPARQL endpoint URL
+            cache_dir: Directory for cached results. If None, results are not cached.
+            ttl: Time-to-live of cached results in seconds. If None, they never expire.
+            offline: If True, serve results only from the cache (ignoring the TTL)
+            batch_size: Default number of values per ``VALUES`` block
+            timeout: Timeout in seconds for each request
+            max_retries: Number of retries when the endpoint asks to back off
+        """
+        self.endpoint = endpoint
+        self.cache = DiskCache(cache_dir, ttl=ttl) if cache_dir else None
+        self.offline = offline
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "kgregistry/1.0 (https://kghub.org/kg-registry/)"
+
+    def _cached(self, key: str) -> Any:
+        if self.cache is None:
+            return None
+        if self.offline:
+            entry = self.cache.get_entry(key)
+            return entry["value"] if entry else None
+        return self.cache.get(key)
+
+    def _fetch(self, query: str) -> List[Dict[str, Any]]:
+        """Run a query against the endpoint, honouring ``Retry-After``."""
+        for attempt in range(self.max_retries + 1):
+            res = self.session.get(
+                self.endpoint,
+                params={"query": query, "format": "json"},
+                timeout=self.timeout,
+            )
+            if res.status_code in (429, 503) and attempt < self.max_retries:
+                delay = self._retry_after(res.headers.get("Retry-After"), attempt)
+                logger.warning("Wikidata asked to back off, retrying in %.0fs", delay)
+                time.sleep(delay)
+                continue
+            res.raise_for_status()
+            return res.json()["results"]["bindings"]
+        res.raise_for_status()
+        return []
+
+    @staticmethod
+    def _retry_after(value: Optional[str], attempt: int) -> float:
+        """Get the number of seconds to wait from a ``Retry-After`` header.
+
+        The header is a number of seconds or an HTTP date, without a time zone
+        meaning UTC; a missing or malformed one backs off exponentially.
+        """
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                parsed = None
+            if parsed is not None:
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                return max(0.0, parsed.timestamp() - time.time())
+        return float(2**attempt)
+
+    def query(self, query: str) -> List[Dict[str, Any]]:
+        """Query the endpoint and return the result bindings.
 
-def query_wikidata(query: str):
+        Args:
+            query: SPARQL query
+
+        Returns:
+            List of result bindings
+
+        Raises:
+            LookupError: If offline and the query is not cached
+        """
+        key = _normalize_query(query)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise LookupError(f"Query is not cached and the client is offline: {key}")
+        bindings = self._fetch(query)
+        if self.cache is not None:
+            self.cache.set(key, bindings)
+        return bindings
+
+    def query_values(
+        self,
+        template: str,
+        variable: str,
+        values: Iterable[str],
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Look up many values with a few batched queries.
+
+        Args:
+            template: SPARQL query containing ``{{VALUES}}`` where the ``VALUES``
+                block should go, e.g. ``SELECT ?item ?label WHERE { {{VALUES}}
+                ?item rdfs:label ?label }``
+            variable: Name of the variable bound by the ``VALUES`` block, without ``?``
+            values: SPARQL terms to look up, e.g. ``wd:Q42`` or ``"P123"``
+            batch_size: Number of values per query. Defaults to the client's batch size.
+
+        Returns:
+            Dictionary from each value to the bindings in which it appears
+
+        Raises:
+            ValueError: If the template has no ``{{VALUES}}`` placeholder
+            LookupError: If offline and some values are not cached
+        """
+        if VALUES_PLACEHOLDER not in template:
+            raise ValueError(f"Query template must contain {VALUES_PLACEHOLDER}")
+        variable = variable.lstrip("?$")
+        batch_size = batch_size or self.batch_size
+        normalized = _normalize_query(template)
+
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        missing = []
+        for value in dict.fromkeys(values):
+            cached = self._cached(f"{normalized}\n{value}")
+            if cached is not None:
+                results[value] = cached
+            else:
+                missing.append(value)
+
+        if missing and self.offline:
+            raise LookupError(f"{len(missing)} values are not cached and the client is offline")
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            block = f"VALUES ?{variable} {{ {' '.join(batch)} }}"
+            bindings = self._fetch(template.replace(VALUES_PLACEHOLDER, block))
+            by_value: Dict[str, List[Dict[str, Any]]] = {}
+            for binding in bindings:
+                if variable in binding:
+                    by_value.setdefault(binding[variable]["value"], []).append(binding)
+            for value in batch:
+                results[value] = by_value.get(_term_value(value), [])
+                if self.cache is not None:
+                    self.cache.set(f"{normalized}\n{value}", results[value])
+
+        return results
+
+
+_default_client: Optional[WikidataClient] = None
+
+
+def _get_default_client() -> WikidataClient:
+    """Get the shared client, offline if ``KG_REGISTRY_OFFLINE`` is set."""
+    global _default_client
+    if _default_client is None:
+        offline = os.environ.get("KG_REGISTRY_OFFLINE", "").lower() in {"1", "true", "yes"}
+        _default_client = WikidataClient(offline=offline)
+    return _default_client
+
+
+def query_wikidata(query: str, client: Optional[WikidataClient] = None):
     """Query the Wikidata SPARQL endpoint and return JSON."""
-    headers = {"User-Agent": "kgregistry/1.0 (https://kghub.org/kg-registry/)"}
-    res = requests.get(WIKIDATA_SPARQL, params={"query": query, "format": "json"}, headers=headers)
-    res.raise_for_status()
-    res_json = res.json()
-    return res_json["results"]["bindings"]
+    return (client or _get_default_client()).query(query)
+
+
+def query_wikidata_values(
+    template: str,
+    variable: str,
+    values: Iterable[str],
+    batch_size: Optional[int] = None,
+    client: Optional[WikidataClient] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Look up many values on Wikidata with batched ``VALUES`` queries.
+
+    See :meth:`WikidataClient.query_values`.
+    """
+    return (client or _get_default_client()).query_values(template, variable, values, batch_size)
 
 
 def get_new_data():
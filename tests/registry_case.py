@@ -0,0 +1,39 @@
+"""Test case with the registry tables in an in-memory database, shared by the tests."""
+
+import unittest
+from typing import Any, Dict, List, Optional
+
+import duckdb
+
+from kg_registry.history import enable_history
+from kg_registry.ingest import create_tables, sync_resources
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Test case that creates the registry tables in ``self.conn`` before each test.
+
+    Subclasses set :attr:`resources` to the records to sync into the tables,
+    and leave it unset to start each test with empty tables.
+    """
+
+    #: Resources synced into the tables before each test, if any
+    resources: Optional[List[Dict[str, Any]]] = None
+
+    #: Whether the history is enabled before the first sync
+    history = False
+
+    #: Git commit recorded by the first sync
+    commit: Optional[str] = None
+
+    def setUp(self):
+        """Create the tables in an in-memory database and sync the resources."""
+        self.conn = duckdb.connect(":memory:")
+        create_tables(self.conn)
+        if self.history:
+            enable_history(self.conn)
+        if self.resources is not None:
+            sync_resources(self.conn, self.resources, commit=self.commit)
+
+    def tearDown(self):
+        """Close the connection."""
+        self.conn.close()
@@ -0,0 +1,165 @@
+"""Test the asyncio wrapper of the backends."""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from kg_registry.aio import AsyncRegistry
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.parquet_backend import DuckDBParquetQuerier, ParquetBackend
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha KG",
+        "category": "KnowledgeGraph",
+        "domains": ["health"],
+        "products": [
+            {"id": "alpha.graph", "category": "GraphProduct", "original_source": ["beta"]},
+        ],
+    },
+    {
+        "id": "beta",
+        "name": "Beta",
+        "category": "DataSource",
+        "products": [{"id": "beta.tsv", "category": "Product", "format": "tsv"}],
+    },
+]
+
+
+class SlowBackend(DuckDBBackend):
+    """Backend with a query that runs until it is interrupted."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the backend and count the calls of its methods."""
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self.threads = set()
+
+    def slow(self) -> int:
+        """Count a range far too long to finish."""
+        self.calls += 1
+        with self._reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM range(1000000000000)").fetchone()[0]
+
+    def wait(self, seconds: float) -> float:
+        """Sleep without reading, noting the worker thread."""
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        time.sleep(seconds)
+        return seconds
+
+
+class TestAsyncRegistry(unittest.IsolatedAsyncioTestCase):
+    """Test awaiting the backend methods."""
+
+    def setUp(self):
+        """Sync the resources into an in-memory backend with a cursor pool."""
+        self.backend = SlowBackend(pool_size=2)
+        self.backend.sync_from_resources(RESOURCES)
+        self.backend.build_lineage_closure()
+
+    def tearDown(self):
+        """Close the backend."""
+        self.backend.close()
+
+    async def test_methods(self):
+        """Test that the methods answer as those of the backend."""
+        async with AsyncRegistry(self.backend) as registry:
+            self.assertEqual(2, registry.workers)
+            self.assertEqual(["alpha"], [r["id"] for r in await registry.query_by_domain("health")])
+            self.assertEqual(["beta"], [r["id"] for r in await registry.search_resources("beta")])
+            self.assertEqual(
+                ["alpha"],
+                [r["id"] for r in await registry.find_resources("category:KnowledgeGraph")],
+            )
+            self.assertEqual(2, (await registry.get_resource_stats())["total_resources"])
+            self.assertIn("alpha.graph", [e["id"] for e in await registry.downstream("beta")])
+            self.assertEqual(
+                {"health": 1},
+                (await registry.facet_search(facets=["domain"]))["facets"]["domain"],
+            )
+            self.assertEqual(RESOURCES[1], await registry.get_record("beta"))
+            with self.assertRaises(ValueError):
+                await registry.query_resources(output="iter")
+
+    async def test_coalescing(self):
+        """Test that identical calls made together run once, and different ones in parallel."""
+        async with AsyncRegistry(self.backend) as registry:
+            results = await asyncio.gather(*(registry.call("wait", 0.2) for _ in range(5)))
+            self.assertEqual([0.2] * 5, results)
+            self.assertEqual(1, self.backend.calls)
+            await asyncio.gather(registry.call("wait", 0.2), registry.call("wait", 0.21))
+            self.assertEqual(3, self.backend.calls)
+            self.assertEqual(2, len(self.backend.threads))
+            await registry.call("wait", 0.2)
+            self.assertEqual(4, self.backend.calls)
+
+    async def test_timeout(self):
+        """Test that a call that times out is interrupted and frees its worker."""
+        async with AsyncRegistry(self.backend, workers=1) as registry:
+            started = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                await registry.call("slow", timeout=0.2)
+            self.assertEqual(2, len(await registry.query_resources(timeout=5)))
+            self.assertLess(time.monotonic() - started, 5)
+
+    async def test_cancellation(self):
+        """Test that the query runs until every caller sharing it is cancelled."""
+        async with AsyncRegistry(self.backend, workers=1) as registry:
+            first = asyncio.ensure_future(registry.call("slow"))
+            second = asyncio.ensure_future(registry.call("slow"))
+            await asyncio.sleep(0.2)
+            first.cancel()
+            await asyncio.sleep(0.1)
+            self.assertFalse(second.done())
+            second.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await second
+            self.assertEqual(1, self.backend.calls)
+            self.assertEqual(2, len(await registry.query_resources(timeout=5)))
+
+    def test_workers(self):
+        """Test that there are no more workers than cursors."""
+        with self.assertRaises(ValueError):
+            AsyncRegistry(self.backend, workers=3)
+        with DuckDBBackend() as backend, self.assertRaises(ValueError):
+            AsyncRegistry(backend, workers=2)
+
+
+class TestBackends(unittest.IsolatedAsyncioTestCase):
+    """Test wrapping the other backends."""
+
+    async def test_open(self):
+        """Test opening a database file read-only."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "registry.duckdb")
+            with DuckDBBackend(path) as backend:
+                backend.sync_from_resources(RESOURCES)
+            async with AsyncRegistry.open(path, workers=2, timeout=5) as registry:
+                self.assertTrue(registry.backend.read_only)
+                self.assertEqual(1, (await registry.get_changes())["generation"])
+
+    async def test_parquet(self):
+        """Test the Parquet querier, with and without a cursor pool."""
+        with tempfile.TemporaryDirectory() as directory:
+            with ParquetBackend(directory) as backend:
+                backend.sync_from_resources(RESOURCES)
+            for pool_size in (None, 2):
+                with DuckDBParquetQuerier(directory, pool_size) as querier:
+                    async with AsyncRegistry(querier) as registry:
+                        results = await asyncio.gather(
+                            registry.search_resources("alpha"),
+                            registry.get_record("beta"),
+                            registry.call("execute_query", "SELECT COUNT(*) AS n FROM resources"),
+                        )
+                        self.assertEqual("alpha", results[0][0]["id"])
+                        self.assertEqual(RESOURCES[1], results[1])
+                        self.assertEqual([{"n": 2}], results[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+"""Test the changelog recorded by the syncs."""
+
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+import yaml
+from click.testing import CliRunner
+
+from kg_registry.changes import changed_fields, read_changes
+from kg_registry.cli import main
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import bulk_load, sync_resources
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha KG",
+        "category": "KnowledgeGraph",
+        "creation_date": "2024-01-01",
+        "products": [
+            {"id": "alpha.graph", "category": "GraphProduct", "format": "kgx"},
+            {"id": "alpha.tsv", "category": "Product", "format": "tsv"},
+        ],
+    },
+    {
+        "id": "beta",
+        "name": "Beta",
+        "category": "DataSource",
+        "products": [{"id": "beta.tsv", "category": "Product"}],
+    },
+    {"id": "gamma", "name": "Gamma", "category": "DataSource"},
+]
+
+
+def change_rows(changes):
+    """Reduce changes to tuples of their entity, type and fields."""
+    return [
+        (change["entity_id"], change["change_type"], change["fields"])
+        for change in changes["changes"]
+    ]
+
+
+class TestChanges(RegistryTestCase):
+    """Test the changes recorded by incremental syncs."""
+
+    resources = RESOURCES
+
+    def test_first_sync(self):
+        """Test that every resource and product of the first sync is added."""
+        changes = read_changes(self.conn)
+        self.assertEqual((1, 0), (changes["generation"], changes["since"]))
+        self.assertEqual(
+            [
+                ("alpha", "added", None),
+                ("alpha.graph", "added", None),
+                ("alpha.tsv", "added", None),
+                ("beta", "added", None),
+                ("beta.tsv", "added", None),
+                ("gamma", "added", None),
+            ],
+            change_rows(changes),
+        )
+
+    def test_field_diffs(self):
+        """Test that changed resources and products list the fields that changed."""
+        changed = copy.deepcopy(RESOURCES[:2])
+        changed[0]["name"] = "Alpha Graph"
+        changed[0]["products"][0]["format"] = "jsonl"
+        changed[0]["products"][0]["node_count"] = 10
+        del changed[0]["products"][1]
+        changed[0]["products"].append({"id": "alpha.owl", "category": "Product"})
+        changed.append({"id": "delta", "name": "Delta", "category": "DataSource"})
+        sync_resources(self.conn, changed)
+        self.assertEqual(
+            [
+                ("alpha", "changed", ["name", "products"]),
+                ("alpha.graph", "changed", ["format", "node_count"]),
+                ("alpha.owl", "added", None),
+                ("alpha.tsv", "removed", None),
+                ("delta", "added", None),
+                ("gamma", "removed", None),
+            ],
+            change_rows(read_changes(self.conn)),
+        )
+        self.assertEqual(12, len(read_changes(self.conn, 0)["changes"]))
+
+    def test_removed_products(self):
+        """Test that removing a resource removes its products too."""
+        sync_resources(self.conn, RESOURCES[::2])
+        self.assertEqual(
+            [("beta", "removed", None), ("beta.tsv", "removed", None)],
+            change_rows(read_changes(self.conn)),
+        )
+
+    def test_storage_change(self):
+        """Test that rewriting the records in another profile records no changes."""
+        summary = sync_resources(self.conn, RESOURCES, "compact")
+        self.assertEqual(3, len(summary.changed))
+        self.assertEqual([], read_changes(self.conn)["changes"])
+        changed = copy.deepcopy(RESOURCES)
+        changed[2]["domains"] = ["health"]
+        sync_resources(self.conn, changed)
+        self.assertEqual([("gamma", "changed", ["domains"])], change_rows(read_changes(self.conn)))
+
+    def test_bulk_load(self):
+        """Test that a full reload keeps the changes and records none."""
+        bulk_load(self.conn, RESOURCES[:1])
+        self.assertEqual([], read_changes(self.conn)["changes"])
+        self.assertEqual(6, len(read_changes(self.conn, 0)["changes"]))
+
+    def test_changed_fields(self):
+        """Test that a missing field differs from a null one."""
+        self.assertEqual(["a", "c"], changed_fields({"a": None, "b": 1}, {"b": 1, "c": 2}))
+        self.assertEqual([], changed_fields({"a": [1]}, {"a": [1]}))
+
+
+class TestExport(unittest.TestCase):
+    """Test writing the changes to a JSON file."""
+
+    def test_export(self):
+        """Test that the changes of the last sync are written."""
+        with tempfile.TemporaryDirectory() as directory, DuckDBBackend() as backend:
+            path = os.path.join(directory, "changes.json")
+            backend.sync_from_resources(RESOURCES)
+            backend.sync_from_resources(RESOURCES[1:])
+            exported = backend.export_changes(path)
+            with open(path) as file:
+                self.assertEqual(exported, json.load(file))
+            self.assertEqual((2, 1), (exported["generation"], exported["since"]))
+            self.assertEqual(
+                ["alpha", "alpha.graph", "alpha.tsv"],
+                [change["entity_id"] for change in exported["changes"]],
+            )
+            self.assertEqual(9, len(backend.get_changes(0)["changes"]))
+
+    def test_sync_command(self):
+        """Test that a sync without changes leaves the exported changes as they are."""
+        with tempfile.TemporaryDirectory() as directory:
+            yaml_file = os.path.join(directory, "kgs.yml")
+            path = os.path.join(directory, "changes.json")
+            args = ["duckdb", "sync", "--yaml-file", yaml_file, "--stats-file", ""]
+            args += ["--db-path", os.path.join(directory, "registry.duckdb")]
+            args += ["--changes-file", path]
+            runner = CliRunner()
+
+            def sync(resources):
+                with open(yaml_file, "w") as file:
+                    yaml.safe_dump({"resources": resources}, file)
+                result = runner.invoke(main, args)
+                self.assertEqual(0, result.exit_code, result.output)
+                with open(path) as file:
+                    return json.load(file)
+
+            self.assertEqual(6, len(sync(RESOURCES)["changes"]))
+            exported = sync(RESOURCES[1:])
+            self.assertEqual(
+                (2, 1, 3), (exported["generation"], exported["since"], len(exported["changes"]))
+            )
+            self.assertEqual(exported, sync(RESOURCES[1:]))
+            os.unlink(path)
+            self.assertEqual(exported, sync(RESOURCES[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
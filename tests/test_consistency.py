@@ -0,0 +1,97 @@
+"""Test the SPARQL consistency checker against an in-process RDF graph."""
+
+import unittest
+
+import rdflib
+
+from kg_registry.consistency import PropertyCheck, SparqlConsistencyChecker
+
+TURTLE = """
+@prefix obo: <http://purl.obolibrary.org/obo/> .
+@prefix dce: <http://purl.org/dc/elements/1.1/> .
+@prefix obofmd: <http://obofoundry.github.io/vocabulary/> .
+
+obo:alpha dce:description "Alpha resource" ; obofmd:activity_status "active" .
+obo:beta dce:description "Remote beta" ; obofmd:activity_status "inactive" .
+obo:gamma obofmd:activity_status "active" .
+"""
+
+RESOURCES = [
+    {"id": "alpha", "description": "Alpha resource", "activity_status": "active"},
+    {"id": "beta", "description": "Local beta", "activity_status": "inactive"},
+    {"id": "gamma", "activity_status": "active"},
+    {"id": "delta", "description": "Only local", "activity_status": "active"},
+]
+
+
+class TestSparqlConsistencyChecker(unittest.TestCase):
+    """Test the SPARQL consistency checker."""
+
+    def setUp(self):
+        """Load the graph."""
+        self.graph = rdflib.Graph()
+        self.graph.parse(data=TURTLE, format="turtle")
+
+    def _statuses(self, checker):
+        return {(r.resource_id, r.property): r.status for r in checker.compare(RESOURCES)}
+
+    def test_statuses(self):
+        """Test each outcome of a comparison."""
+        checker = SparqlConsistencyChecker(graph=self.graph)
+        statuses = self._statuses(checker)
+        self.assertEqual("CONSISTENT", statuses["alpha", "description"])
+        self.assertEqual("INCONSISTENT", statuses["beta", "description"])
+        self.assertEqual("CONSISTENT", statuses["beta", "activity_status"])
+        self.assertEqual("UNDECLARED_REMOTE", statuses["delta", "description"])
+        self.assertEqual("UNDECLARED_REMOTE", statuses["gamma", "license"])
+
+    def test_undeclared_local(self):
+        """Test a value present remotely but missing locally."""
+        graph = rdflib.Graph()
+        graph.parse(data=TURTLE, format="turtle")
+        graph.add(
+            (
+                rdflib.URIRef("http://purl.obolibrary.org/obo/gamma"),
+                rdflib.URIRef("http://purl.org/dc/elements/1.1/description"),
+                rdflib.Literal("Gamma"),
+            )
+        )
+        statuses = self._statuses(SparqlConsistencyChecker(graph=graph))
+        self.assertEqual("UNDECLARED_LOCAL", statuses["gamma", "description"])
+
+    def test_batching(self):
+        """Test that resources are grouped into a few queries per property."""
+        checker = SparqlConsistencyChecker(graph=self.graph, batch_size=3)
+        queries = []
+        run = checker._run
+
+        def _record(query):
+            queries.append(query)
+            return run(query)
+
+        checker._run = _record
+        results = checker.compare(RESOURCES)
+        # 3 default properties x 2 batches of resources
+        self.assertEqual(6, len(queries))
+        self.assertEqual(12, len(results))
+
+    def test_report(self):
+        """Test the machine-readable report."""
+        check = PropertyCheck(
+            "status",
+            "http://obofoundry.github.io/vocabulary/activity_status",
+            lambda r: r.get("activity_status"),
+        )
+        checker = SparqlConsistencyChecker(graph=self.graph, checks=[check])
+        report = checker.to_report(checker.compare(RESOURCES))
+        self.assertEqual({"CONSISTENT": 3, "UNDECLARED_REMOTE": 1}, report["summary"])
+        self.assertEqual("alpha", report["results"][0]["resource_id"])
+
+    def test_requires_one_source(self):
+        """Test that exactly one of an endpoint or a graph is required."""
+        with self.assertRaises(ValueError):
+            SparqlConsistencyChecker()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,26 @@
 """Test DuckDB backend functionality."""
 
+import importlib.util
 import json
 import os
+import subprocess
+import sys
 import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from unittest import mock
 
+import duckdb
 import yaml
 
-from kg_registry.duckdb_backend import DuckDBBackend, sync_yaml_to_duckdb
+from kg_registry.cache import ResultCache
+from kg_registry.duckdb_backend import (
+    STAGING_SUFFIX,
+    DuckDBBackend,
+    sync_resources_to_duckdb,
+    sync_yaml_to_duckdb,
+)
 
 
 class TestDuckDBBackend(unittest.TestCase):
@@ -219,6 +231,245 @@ class TestDuckDBBackend(unittest.TestCase):
             if os.path.exists(db_path):
                 os.unlink(db_path)
 
+    def test_staged_sync(self):
+        """Test that file syncs swap in a staging copy, and survive interrupted syncs."""
+        resources = self.test_data["resources"]
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "registry.duckdb")
+            staging = db_path + STAGING_SUFFIX
+            # Left behind by a crashed sync
+            Path(staging).write_text("not a database")
+
+            summary = sync_resources_to_duckdb(resources, db_path)
+            self.assertEqual((2, 1), (len(summary.added), summary.generation))
+            self.assertFalse(os.path.exists(staging))
+
+            # A reader that has the file open keeps its snapshot
+            with DuckDBBackend(db_path) as reader:
+                with mock.patch(
+                    "kg_registry.duckdb_backend.sync_resources", side_effect=RuntimeError
+                ):
+                    with self.assertRaises(RuntimeError):
+                        sync_resources_to_duckdb(resources[:1], db_path)
+                summary = sync_resources_to_duckdb(resources[:1], db_path)
+                self.assertEqual(2, summary.generation)
+                self.assertEqual(1, reader.generation)
+                self.assertEqual(
+                    2, reader.conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+                )
+
+            with DuckDBBackend(db_path) as backend:
+                self.assertEqual(2, backend.generation)
+                self.assertEqual(
+                    1, backend.conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+                )
+            self.assertEqual(
+                ["registry.duckdb", "registry.duckdb.lock"], sorted(os.listdir(directory))
+            )
+
+            # Nothing changed: the file is neither copied nor replaced
+            mtime = os.stat(db_path).st_mtime_ns
+            with mock.patch("kg_registry.duckdb_backend.shutil.copyfile") as copyfile:
+                summary = sync_resources_to_duckdb(resources[:1], db_path)
+            copyfile.assert_not_called()
+            self.assertEqual((False, 2), (summary.has_changes, summary.generation))
+            self.assertEqual(mtime, os.stat(db_path).st_mtime_ns)
+
+    def test_concurrent_syncs(self):
+        """Test that syncs of one file from several threads run one after the other."""
+        resources = self.test_data["resources"]
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "registry.duckdb")
+            # Each thread syncs a different name, so every sync changes the data
+            versions = [[{**resources[0], "name": f"Version {i}"}] for i in range(4)]
+            with ThreadPoolExecutor(4) as executor:
+                summaries = list(
+                    executor.map(
+                        lambda version: sync_resources_to_duckdb(version, db_path), versions
+                    )
+                )
+            self.assertEqual([1, 2, 3, 4], sorted(s.generation for s in summaries))
+            with DuckDBBackend(db_path, read_only=True) as backend:
+                self.assertEqual(4, backend.generation)
+            self.assertEqual(
+                ["registry.duckdb", "registry.duckdb.lock"], sorted(os.listdir(directory))
+            )
+
+    def test_read_only(self):
+        """Test that read-only backends run no DDL and share the file between processes."""
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "registry.duckdb")
+            duckdb.connect(db_path).close()
+            with DuckDBBackend(db_path, read_only=True) as backend:
+                self.assertEqual([], backend.conn.execute("SHOW TABLES").fetchall())
+
+            sync_resources_to_duckdb(self.test_data["resources"], db_path)
+            with DuckDBBackend(db_path, read_only=True, pool_size=2) as backend:
+                self.assertEqual(1, len(backend.query_active_resources()))
+                with self.assertRaises(duckdb.Error):
+                    backend.sync_from_resources([])
+                # Another process reads the file while this one has it open
+                result = subprocess.run(
+                    [sys.executable, "-m", "kg_registry.cli", "duckdb", "stats"]
+                    + ["--db-path", db_path, "--threads", "1"],
+                    capture_output=True,
+                    text=True,
+                )
+                self.assertEqual(0, result.returncode, result.stderr)
+                self.assertIn("Total resources: 2", result.stdout)
+
+        with self.assertRaises(ValueError):
+            DuckDBBackend(read_only=True)
+
+    def test_resource_settings(self):
+        """Test that threads, memory limit and temporary directory are set on the connection."""
+        with tempfile.TemporaryDirectory() as directory:
+            with DuckDBBackend(
+                threads=2, memory_limit="512MB", temp_directory=directory
+            ) as backend:
+                settings = dict(
+                    backend.conn.execute(
+                        "SELECT name, value FROM duckdb_settings() "
+                        "WHERE name IN ('threads', 'memory_limit', 'temp_directory')"
+                    ).fetchall()
+                )
+        self.assertEqual("2", settings["threads"])
+        self.assertEqual(directory, settings["temp_directory"])
+        self.assertTrue(settings["memory_limit"].endswith("MiB"), settings["memory_limit"])
+
+    def test_projection_and_output_modes(self):
+        """Test selecting columns and getting results in other forms."""
+        with DuckDBBackend(cache_size=10) as backend:
+            backend.sync_from_resources(self.test_data["resources"])
+            self.assertEqual(
+                [{"id": "test-resource-1", "category": "TestCategory"}],
+                backend.query_resources(columns=["id", "category"], activity_status="active"),
+            )
+            rows = backend.query_resources(columns=["id"], output="iter")
+            self.assertEqual({"id": "test-resource-1"}, next(rows))
+            backend.query_resources()
+            self.assertEqual([{"id": "test-resource-2"}], list(rows))
+
+            relation = backend.search_resources("test", columns=["id", "name"], output="relation")
+            self.assertEqual(["id", "name"], relation.columns)
+            self.assertEqual(2, len(relation.fetchall()))
+
+            with self.assertRaises(ValueError):
+                backend.query_resources(output="csv")
+            with self.assertRaises(ValueError):
+                backend.query_resources(columns=[])
+            with self.assertRaises(duckdb.BinderException):
+                backend.query_resources(columns=['id" FROM resources; --'])
+
+    def test_streamed_products(self):
+        """Test reading the products of an aggregator in batches."""
+        aggregator = {
+            "id": "aggregator",
+            "name": "Aggregator",
+            "category": "Aggregator",
+            "products": [
+                {"id": f"aggregator.p{i:03}", "name": f"P{i}", "category": "Product"}
+                for i in range(250)
+            ],
+        }
+        with DuckDBBackend(pool_size=2) as backend:
+            backend.sync_from_resources([aggregator, *self.test_data["resources"]])
+            products = backend.query_products(
+                "aggregator", columns=["product_id"], output="iter", batch_size=100
+            )
+            self.assertEqual(
+                [f"aggregator.p{i:03}" for i in range(250)], [row["product_id"] for row in products]
+            )
+            self.assertEqual(251, len(backend.query_products(columns=["product_id"])))
+            if importlib.util.find_spec("pyarrow"):
+                batches = backend.query_products(
+                    "aggregator", columns=["product_id"], output="batches", batch_size=100
+                )
+                self.assertEqual([100, 100, 50], [batch.num_rows for batch in batches])
+            with self.assertRaises(ValueError):
+                backend.query_products(output="iter", batch_size=0)
+
+    def test_keyset_pages(self):
+        """Test that pages neither skip nor repeat resources when syncs happen in between."""
+        resources = [
+            {"id": f"resource-{i:02}", "name": f"Name {i % 5}", "category": "Test"}
+            for i in range(20)
+        ]
+        resources.append({"id": "unnamed", "category": "Test"})
+        with DuckDBBackend() as backend:
+            backend.sync_from_resources(resources)
+            first = backend.page_resources(limit=8, order_by="name", columns=["id"])
+            self.assertEqual(8, len(first.rows))
+            self.assertEqual(("Name 1", "resource-16"), first.after)
+
+            # Resources removed before and after the cursor, and one added after it
+            backend.sync_from_resources(
+                [r for r in resources if r["id"] not in ("resource-00", "resource-19")]
+                + [{"id": "added", "name": "Name 9", "category": "Test"}]
+            )
+            seen = [row["id"] for row in first.rows]
+            page = first
+            while page.after is not None:
+                page = backend.page_resources(page.after, limit=8, order_by="name", columns=["id"])
+                seen.extend(row["id"] for row in page.rows)
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual("unnamed", seen[-1])
+            self.assertIn("added", seen)
+            self.assertNotIn("resource-19", seen)
+            self.assertEqual(21, len(seen))
+
+            page = backend.page_resources(limit=5, columns=["id"], category="Test")
+            self.assertEqual(("resource-04", "resource-04"), page.after)
+            products = backend.page_products(limit=10)
+            self.assertEqual([], products.rows)
+            self.assertIsNone(products.after)
+            with self.assertRaises(ValueError):
+                backend.page_resources(after="resource-04")
+
+    def test_result_cache(self):
+        """Test that cached results are reused until a sync changes the data."""
+        with DuckDBBackend(cache_size=10) as backend:
+            backend.sync_from_resources(self.test_data["resources"])
+            first = backend.query_resources(category="TestCategory", domain=None)
+            self.assertEqual("test-resource-1", first[0]["id"])
+            self.assertIs(first, backend.query_resources(category="TestCategory"))
+            backend.search_resources("Test")
+            backend.search_resources("  test ")
+            backend.get_resource_stats()
+            stats = backend.cache_stats()
+            self.assertEqual((2, 3, 3), (stats.hits, stats.misses, stats.entries))
+            self.assertGreater(stats.size, 0)
+
+            # An unchanged sync keeps the cache, a change invalidates it
+            backend.sync_from_resources(self.test_data["resources"])
+            backend.get_resource_stats()
+            self.assertEqual(3, backend.cache_stats().hits)
+            backend.sync_from_resources(self.test_data["resources"][:1])
+            self.assertEqual(1, backend.get_resource_stats()["total_resources"])
+            stats = backend.cache_stats()
+            self.assertEqual((1, 1), (stats.invalidations, stats.entries))
+
+        with DuckDBBackend() as backend:
+            self.assertIsNone(backend.cache_stats())
+
+    def test_result_cache_limits(self):
+        """Test that the least recently used results are evicted beyond the limits."""
+        cache = ResultCache(max_entries=2)
+        for key in ["a", "b", "a", "c"]:
+            cache.get(key, 1, lambda: [key])
+        self.assertEqual(["a"], cache.get("a", 1, lambda: None))
+        self.assertIsNone(cache.get("b", 1, lambda: None))
+        stats = cache.stats()
+        self.assertEqual((2, 4, 2), (stats.hits, stats.misses, stats.evictions))
+
+        cache = ResultCache(max_entries=None, max_bytes=1000)
+        cache.get("small", 1, lambda: ["x"])
+        cache.get("large", 1, lambda: ["x" * 2000])
+        cache.get("medium", 1, lambda: ["x" * 700])
+        cache.get("medium 2", 1, lambda: ["x" * 700])
+        self.assertEqual(1, cache.stats().entries)
+        self.assertLessEqual(cache.stats().size, 1000)
+
     def test_context_manager(self):
         """Test DuckDB backend as context manager."""
         with tempfile.NamedTemporaryFile(mode="w", suffix=".yml", delete=False) as f:
@@ -0,0 +1,212 @@
+"""Test surgical frontmatter patches."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import frontmatter
+
+from kg_registry.frontmatter_patch import (
+    APPEND,
+    REMOVE,
+    FrontmatterDocument,
+    Patch,
+    parse_path,
+    patch_file,
+    patch_files,
+)
+
+PAGE = """---
+activity_status: active
+description: "A quoted description that is long enough to have been folded by an
+  earlier dump"
+domains:
+- biomedical
+- other
+id: example
+products:
+- category: GraphProduct
+  id: example.graph
+  name: Example graph
+  product_url: https://example.org/graph.tar.gz
+  warnings:
+  - 'Existing: warning'
+- category: Product
+  id: example.other
+  name: Other
+tags: [a, b]
+---
+# Example
+
+Body text  with  odd   spacing.
+"""
+
+INDENTED_PAGE = """---
+id: indented
+products:
+  - id: indented.graph
+    name: Graph
+---
+"""
+
+
+def _apply(text, *patches):
+    document = FrontmatterDocument(text)
+    document.apply_all(patches)
+    return document.render()
+
+
+class TestParsePath(unittest.TestCase):
+    """Test parsing patch paths."""
+
+    def test_parse(self):
+        """Test keys, positions and selectors, including IDs with dots."""
+        self.assertEqual(
+            ["products", ("id", "a.b.c"), "warnings"], parse_path("products[id=a.b.c].warnings")
+        )
+        self.assertEqual(["domains", (None, "other")], parse_path("domains[=other]"))
+        self.assertEqual(["products", -1, "name"], parse_path("products[-1].name"))
+        with self.assertRaises(ValueError):
+            parse_path("products[id=x")
+
+
+class TestFrontmatterDocument(unittest.TestCase):
+    """Test patching a document."""
+
+    def test_unchanged(self):
+        """Test that a document without effective patches renders byte-identical."""
+        document = FrontmatterDocument(PAGE)
+        self.assertFalse(document.apply(Patch("id", "example")))
+        self.assertFalse(document.apply(Patch("missing", op=REMOVE)))
+        self.assertFalse(document.apply(Patch("domains", "other", APPEND)))
+        self.assertFalse(document.changed)
+        self.assertEqual(PAGE, document.render())
+
+    def test_set_existing_key(self):
+        """Test that only the changed key is re-emitted."""
+        result = _apply(PAGE, Patch("products[id=example.other].name", "Renamed"))
+        self.assertEqual(PAGE.replace("name: Other", "name: Renamed"), result)
+
+    def test_insert_sorted(self):
+        """Test that new keys go in sorted position within sorted mappings."""
+        result = _apply(PAGE, Patch("products[id=example.graph].product_file_size", 1024))
+        self.assertIn("  name: Example graph\n  product_file_size: 1024\n  product_url:", result)
+        self.assertEqual(PAGE, result.replace("  product_file_size: 1024\n", ""))
+
+    def test_append(self):
+        """Test appending to existing and missing lists."""
+        result = _apply(
+            PAGE,
+            Patch("products[id=example.graph].warnings", "New: warning", APPEND),
+            Patch("products[id=example.graph].warnings", "Existing: warning", APPEND),
+            Patch("products[id=example.other].warnings", "First", APPEND),
+            Patch("products[id=example.other].warnings", "Second", APPEND),
+        )
+        metadata = frontmatter.loads(result).metadata
+        self.assertEqual(["Existing: warning", "New: warning"], metadata["products"][0]["warnings"])
+        self.assertEqual(["First", "Second"], metadata["products"][1]["warnings"])
+        self.assertIn('description: "A quoted description', result)
+
+    def test_append_product(self):
+        """Test that products are appended once, matched by ID."""
+        product = {"id": "example.new", "name": "New", "category": "Product"}
+        document = FrontmatterDocument(PAGE)
+        self.assertTrue(document.apply(Patch("products", product, APPEND)))
+        self.assertFalse(document.apply(Patch("products", dict(product, name="X"), APPEND)))
+        result = document.render()
+        self.assertIn("  name: Other\n- id: example.new\n  name: New\n", result)
+        self.assertTrue(
+            result.endswith("tags: [a, b]\n---\n# Example\n\nBody text  with  odd   spacing.\n")
+        )
+
+    def test_remove(self):
+        """Test removing list items and keys, including the first key of an item."""
+        result = _apply(
+            PAGE,
+            Patch("products[id=example.graph]", op=REMOVE),
+            Patch("domains[=other]", op=REMOVE),
+            Patch("products[id=example.other].category", op=REMOVE),
+        )
+        metadata = frontmatter.loads(result).metadata
+        self.assertEqual(["biomedical"], metadata["domains"])
+        self.assertEqual([{"id": "example.other", "name": "Other"}], metadata["products"])
+        self.assertIn('an\n  earlier dump"\n', result)
+
+    def test_replace_scalar_item(self):
+        """Test replacing a scalar list item in place."""
+        result = _apply(PAGE, Patch("domains[=other]", "stub"))
+        self.assertEqual(PAGE.replace("- other\n", "- stub\n"), result)
+
+    def test_flow_style(self):
+        """Test that flow-style collections are re-emitted as a whole."""
+        result = _apply(PAGE, Patch("tags", "c", APPEND))
+        self.assertIn("tags: [a, b, c]\n", result)
+
+    def test_indented_sequences(self):
+        """Test that new lists follow the document's sequence indentation."""
+        result = _apply(
+            INDENTED_PAGE,
+            Patch("products", {"id": "indented.other"}, APPEND),
+            Patch("domains", "stub", APPEND),
+        )
+        self.assertIn("    name: Graph\n  - id: indented.other\n", result)
+        self.assertIn("domains:\n  - stub\n", result)
+
+    def test_missing_intermediate(self):
+        """Test that a path through a missing node is an error."""
+        with self.assertRaises(KeyError):
+            FrontmatterDocument(PAGE).apply(Patch("products[id=missing].name", "x"))
+
+
+class TestPatchFiles(unittest.TestCase):
+    """Test patching files on disk."""
+
+    def test_patch_files(self):
+        """Test that only changed files are written."""
+        with tempfile.TemporaryDirectory() as directory:
+            changed = Path(directory, "changed.md")
+            unchanged = Path(directory, "unchanged.md")
+            broken = Path(directory, "broken.md")
+            for path in (changed, unchanged):
+                path.write_text(PAGE)
+            broken.write_text("no frontmatter\n")
+            mtime = unchanged.stat().st_mtime_ns
+
+            results = patch_files(
+                {
+                    changed: [Patch("activity_status", "inactive")],
+                    unchanged: [Patch("activity_status", "active")],
+                    broken: [Patch("id", "x")],
+                }
+            )
+            self.assertEqual({changed: True, unchanged: False, broken: False}, results)
+            self.assertEqual(
+                PAGE.replace("status: active", "status: inactive"), changed.read_text()
+            )
+            self.assertEqual(mtime, unchanged.stat().st_mtime_ns)
+            self.assertFalse(patch_file(changed, [Patch("activity_status", "inactive")]))
+
+    def test_failing_patch(self):
+        """Test that a failing patch is reported and the other patches of the page applied."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "page.md")
+            path.write_text(PAGE)
+            failing = Patch("products[id=missing].name", "x")
+            errors = {}
+            results = patch_files(
+                {
+                    path: [
+                        Patch("missing[id=x].name", op=REMOVE),
+                        failing,
+                        Patch("activity_status", "inactive"),
+                    ]
+                },
+                errors=errors,
+            )
+            self.assertEqual({path: True}, results)
+            self.assertEqual([failing], [patch for patch, _ in errors[path]])
+            self.assertIn("status: inactive", path.read_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
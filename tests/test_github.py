@@ -0,0 +1,165 @@
+"""Test the GitHub client against a local fake API."""
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from kg_registry.github import GitHubClient
+
+CONTRIBUTORS = [{"login": f"user{i}", "contributions": 100 - i} for i in range(5)]
+PAGE_SIZE = 2
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """Serve a tiny subset of the GitHub API with ETags, pagination and rate limits."""
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Silence request logging."""
+
+    def do_GET(self):  # noqa: N802
+        """Handle a GET request."""
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            self._respond()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _respond(self):
+        path, _, query = self.path.partition("?")
+        params = dict(p.split("=", 1) for p in query.split("&") if p)
+        parts = path.strip("/").split("/")
+        if len(parts) < 3 or parts[0] != "repos" or parts[1] != "org":
+            return self._send(404, {"message": "Not Found"})
+
+        if len(parts) == 3:
+            body = {"full_name": f"org/{parts[2]}", "license": {"spdx_id": "CC-BY-4.0"}}
+            return self._send(200, body, etag=f'"repo-{parts[2]}"')
+
+        page = int(params.get("page", 1))
+        start = (page - 1) * PAGE_SIZE
+        body = CONTRIBUTORS[start : start + PAGE_SIZE]
+        links = None
+        if start + PAGE_SIZE < len(CONTRIBUTORS):
+            base = f"http://{self.headers['Host']}{path}"
+            links = f'<{base}?per_page=100&page={page + 1}>; rel="next"'
+        return self._send(200, body, etag=f'"{parts[2]}-page-{page}"', links=links)
+
+    def _send(self, status, body, etag=None, links=None):
+        server = self.server
+        headers = {
+            "X-RateLimit-Remaining": str(server.remaining),
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+        }
+        if etag and self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            status, payload = 304, b""
+        else:
+            payload = json.dumps(body).encode()
+            if etag:
+                headers["ETag"] = etag
+            if links:
+                headers["Link"] = links
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestGitHubClient(unittest.TestCase):
+    """Test the GitHub client."""
+
+    def setUp(self):
+        """Start the fake API."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.not_modified = 0
+        self.server.remaining = 5000
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Stop the fake API."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def test_pagination(self):
+        """Test that all pages are followed via Link headers."""
+        client = GitHubClient(token="", api_url=self.api_url)
+        contributors = client.get_contributors("org/repo")
+        self.assertEqual(CONTRIBUTORS, contributors)
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_missing_repository(self):
+        """Test that a missing repository gives no contributors."""
+        client = GitHubClient(token="", api_url=self.api_url)
+        self.assertEqual([], client.get_contributors("other/repo"))
+        self.assertIsNone(client.get_repository("other/repo"))
+
+    def test_token(self):
+        """Test that the token is sent as a bearer token."""
+        client = GitHubClient(token="secret", api_url=self.api_url)
+        self.assertEqual("CC-BY-4.0", client.get_license("org/repo"))
+        _, headers = self.server.requests[0]
+        self.assertEqual("Bearer secret", headers["Authorization"])
+
+    def test_etag_cache(self):
+        """Test that a second run revalidates with ETags and reuses cached bodies."""
+        first = GitHubClient(token="", api_url=self.api_url, cache_dir=self.cache_dir.name)
+        self.assertEqual(CONTRIBUTORS, first.get_contributors("org/repo"))
+        self.assertEqual(0, self.server.not_modified)
+
+        second = GitHubClient(token="", api_url=self.api_url, cache_dir=self.cache_dir.name)
+        self.assertEqual(CONTRIBUTORS, second.get_contributors("org/repo"))
+        self.assertEqual(3, self.server.not_modified)
+
+    def test_etag_cache_without_body(self):
+        """Test that a 304 for a cache entry without a body fetches the page again."""
+        client = GitHubClient(token="", api_url=self.api_url, cache_dir=self.cache_dir.name)
+        url = f"{self.api_url}/repos/org/repo"
+        client.cache.set(url, {"etag": '"repo-repo"'})
+        self.assertEqual("org/repo", client.get_repository("org/repo")["full_name"])
+        self.assertEqual(1, self.server.not_modified)
+        self.assertNotIn("If-None-Match", self.server.requests[-1][1])
+
+    def test_concurrency(self):
+        """Test that many repositories are fetched concurrently, up to the worker limit."""
+        self.server.delay = 0.05
+        client = GitHubClient(token="", api_url=self.api_url, max_workers=4)
+        repos = [f"org/repo{i}" for i in range(8)]
+        results = client.map(client.get_repository, repos)
+        self.assertEqual(repos, [results[repo]["full_name"] for repo in repos])
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def test_rate_limit_bounds_concurrency(self):
+        """Test that a small remaining budget serializes requests."""
+        self.server.delay = 0.02
+        self.server.remaining = 1
+        client = GitHubClient(token="", api_url=self.api_url, max_workers=4)
+        # Learn the budget from a first response
+        client.get_repository("org/first")
+        client.map(client.get_repository, [f"org/repo{i}" for i in range(4)])
+        self.assertEqual(1, self.server.max_in_flight)
+
+
+if __name__ == "__main__":
+    unittest.main()
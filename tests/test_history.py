@@ -0,0 +1,128 @@
+"""Test the history of the registry."""
+
+import copy
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from kg_registry.duckdb_backend import DuckDBBackend, sync_resources_to_duckdb
+from kg_registry.history import resolve_snapshot
+from kg_registry.ingest import sync_resources
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha KG",
+        "category": "KnowledgeGraph",
+        "domains": ["health"],
+        "products": [
+            {"id": "alpha.graph", "category": "GraphProduct", "original_source": ["beta"]},
+        ],
+    },
+    {
+        "id": "beta",
+        "name": "Beta",
+        "category": "DataSource",
+        "products": [{"id": "beta.tsv", "category": "Product", "format": "tsv"}],
+    },
+    {"id": "gamma", "name": "Gamma", "category": "DataSource", "domains": ["health"]},
+]
+
+
+def history_rows(conn):
+    """Count the rows of each history table."""
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}_history").fetchone()[0]
+        for table in ("resources", "resource_domains", "resource_products")
+    }
+
+
+class TestHistory(RegistryTestCase):
+    """Test recording snapshots."""
+
+    resources = RESOURCES
+    history = True
+    commit = "aaaa111"
+
+    def test_growth(self):
+        """Test that only the rows of changed resources are added."""
+        self.assertEqual(
+            {"resources": 3, "resource_domains": 2, "resource_products": 2},
+            history_rows(self.conn),
+        )
+        changed = copy.deepcopy(RESOURCES)
+        changed[1]["products"][0]["format"] = "csv"
+        for commit in ("bbbb222", "cccc333", "dddd444"):
+            sync_resources(self.conn, changed, commit=commit)
+        self.assertEqual(
+            {"resources": 4, "resource_domains": 2, "resource_products": 3},
+            history_rows(self.conn),
+        )
+        sync_resources(self.conn, changed[:2], commit="eeee555")
+        self.assertEqual(3, len(self.conn.execute("SELECT * FROM registry_snapshots").fetchall()))
+        self.assertEqual(
+            [(1, 3)],
+            self.conn.execute(
+                "SELECT valid_from, valid_to FROM resources_history WHERE id = 'gamma'"
+            ).fetchall(),
+        )
+
+    def test_resolve(self):
+        """Test finding snapshots by ID, commit and time."""
+        sync_resources(self.conn, RESOURCES[1:], commit="bbbb222")
+        self.assertEqual(1, resolve_snapshot(self.conn, "aaaa")["snapshot_id"])
+        self.assertEqual(2, resolve_snapshot(self.conn, "2")["snapshot_id"])
+        self.assertEqual(
+            "bbbb222", resolve_snapshot(self.conn, datetime.now(timezone.utc))["commit"]
+        )
+        for key in ("ffff", 3, datetime.now(timezone.utc) - timedelta(days=1)):
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                resolve_snapshot(self.conn, key)
+
+
+class TestAsOf(unittest.TestCase):
+    """Test reading the registry as it was at a snapshot."""
+
+    def test_as_of(self):
+        """Test that the query methods answer as they did at the snapshot."""
+        changed = copy.deepcopy(RESOURCES[:2])
+        changed[0]["name"] = "Alpha Graph"
+        with DuckDBBackend() as backend:
+            backend.sync_from_resources(RESOURCES)
+            with self.assertRaises(ValueError):
+                backend.as_of(1)
+            backend.build_lineage_closure()
+            backend.enable_history("aaaa111")
+            backend.sync_from_resources(changed, commit="bbbb222")
+            self.assertEqual(2, backend.snapshots()[1]["resources"])
+
+            with backend.as_of("aaaa111") as past:
+                self.assertEqual(1, past.generation)
+                self.assertEqual(RESOURCES[0], past.get_record("alpha"))
+                self.assertEqual(["gamma"], [r["id"] for r in past.search_resources("gamma")])
+                self.assertEqual(3, past.get_resource_stats()["total_resources"])
+                self.assertIn("alpha.graph", [e["id"] for e in past.downstream("beta")])
+            with backend.as_of(2) as past:
+                self.assertEqual("Alpha Graph", past.get_record("alpha")["name"])
+                self.assertIsNone(past.get_record("gamma"))
+
+    def test_sync_to_file(self):
+        """Test enabling the history when syncing a database file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "registry.duckdb")
+            sync_resources_to_duckdb(RESOURCES, path)
+            sync_resources_to_duckdb(RESOURCES, path, commit="aaaa111", keep_history=True)
+            sync_resources_to_duckdb(RESOURCES[:1], path, commit="bbbb222")
+            with DuckDBBackend(path, read_only=True) as backend:
+                self.assertEqual(
+                    [(None, 3), ("bbbb222", 1)],
+                    [(s["commit"], s["resources"]) for s in backend.snapshots()],
+                )
+                with backend.as_of(1) as past:
+                    self.assertIsNotNone(past.get_record("gamma"))
+
+
+if __name__ == "__main__":
+    unittest.main()
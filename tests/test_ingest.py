@@ -0,0 +1,304 @@
+"""Test columnar bulk ingest into DuckDB tables."""
+
+import copy
+import json
+import unittest
+from datetime import datetime
+
+import duckdb
+
+from kg_registry.ingest import (
+    build_columns,
+    bulk_load,
+    content_hash,
+    create_tables,
+    current_generation,
+    parse_date,
+    product_slot_values,
+    sync_resources,
+)
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha",
+        "creation_date": "2024-02-12T00:00:00Z",
+        "license": {"id": "https://example.org/license", "label": "Example"},
+        "domains": ["genomics", "health", "genomics"],
+        "contacts": [{"label": "Person"}],
+        "products": [
+            {"id": "alpha.graph", "name": "Graph", "format": "kgx"},
+            {"id": "alpha.graph", "name": "Graph (replaced)", "format": "kgx"},
+            {"name": "No ID"},
+        ],
+    },
+    {"id": "beta", "license": "CC0", "domains": []},
+    {"name": "Missing ID"},
+]
+
+
+class TestIngest(unittest.TestCase):
+    """Test bulk loading registry tables."""
+
+    def setUp(self):
+        """Create the tables."""
+        self.conn = duckdb.connect(":memory:")
+        create_tables(self.conn)
+
+    def tearDown(self):
+        """Close the connection."""
+        self.conn.close()
+
+    def test_build_columns(self):
+        """Test that one pass fills aligned buffers for every table."""
+        columns = build_columns(RESOURCES)
+        self.assertEqual(2, columns.count)
+        self.assertEqual(["alpha", "beta"], columns.resources["id"])
+        self.assertEqual(
+            [
+                {"id": "https://example.org/license", "label": "Example", "logo": None},
+                {"id": None, "label": "CC0", "logo": None},
+            ],
+            columns.resources["license"],
+        )
+        self.assertEqual(
+            [("alpha", "genomics"), ("alpha", "health")],
+            list(zip(*columns.resource_domains.values())),
+        )
+        self.assertEqual(["Graph (replaced)"], columns.resource_products["product_name"])
+        for table in columns.tables().values():
+            self.assertEqual(1, len({len(values) for values in table.values()}))
+
+    def test_bulk_load(self):
+        """Test loading all tables, including columns derived from the raw record."""
+        self.assertEqual(2, bulk_load(self.conn, RESOURCES))
+        row = self.conn.execute(
+            "SELECT creation_date, license.label, domains, contacts, curators, raw_data "
+            "FROM resources WHERE id = 'alpha'"
+        ).fetchone()
+        self.assertEqual(datetime(2024, 2, 12), row[0])
+        self.assertEqual("Example", row[1])
+        self.assertEqual(["genomics", "health", "genomics"], row[2])
+        self.assertEqual(
+            [{"category": None, "label": "Person", "orcid": None, "contact_details": []}], row[3]
+        )
+        self.assertEqual([], row[4])
+        self.assertEqual("Alpha", json.loads(row[5])["name"])
+        self.assertEqual(
+            ("CC0", None),
+            self.conn.execute(
+                "SELECT license.label, license.id FROM resources WHERE id = 'beta'"
+            ).fetchone(),
+        )
+
+    def test_reload_replaces(self):
+        """Test that a second load replaces the previous contents."""
+        bulk_load(self.conn, RESOURCES)
+        bulk_load(self.conn, [{"id": "gamma"}])
+        self.assertEqual([("gamma",)], self.conn.execute("SELECT id FROM resources").fetchall())
+        self.assertEqual(
+            0, self.conn.execute("SELECT COUNT(*) FROM resource_domains").fetchone()[0]
+        )
+
+    def test_failed_load_rolls_back(self):
+        """Test that a failing load leaves the previous contents in place."""
+        bulk_load(self.conn, RESOURCES)
+        self.conn.execute("DROP TABLE resource_products")
+        with self.assertRaises(duckdb.Error):
+            bulk_load(self.conn, [{"id": "gamma"}])
+        self.assertEqual(2, self.conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0])
+
+    def test_content_hash(self):
+        """Test that the hash ignores key order but not values."""
+        resource = {"id": "x", "domains": ["a", "b"], "license": {"id": "l", "label": "L"}}
+        reordered = {"license": {"label": "L", "id": "l"}, "domains": ["a", "b"], "id": "x"}
+        self.assertEqual(content_hash(resource), content_hash(reordered))
+        self.assertNotEqual(
+            content_hash(resource), content_hash(dict(resource, domains=["b", "a"]))
+        )
+
+    def test_sync_summary(self):
+        """Test that an incremental sync only rewrites what changed."""
+        summary = sync_resources(self.conn, RESOURCES)
+        self.assertEqual(["alpha", "beta"], summary.added)
+        self.assertEqual(2, summary.total)
+
+        self.conn.execute("UPDATE resources SET sync_timestamp = '2000-01-01'")
+        resources = copy.deepcopy(RESOURCES[:2])
+        resources[0]["domains"] = ["chemistry"]
+        resources[0]["products"] = [{"id": "alpha.new", "name": "New"}]
+        resources.append({"id": "gamma", "domains": ["health"]})
+        resources.remove(resources[1])
+
+        summary = sync_resources(self.conn, resources)
+        self.assertEqual(
+            (["gamma"], ["alpha"], ["beta"], 0),
+            (summary.added, summary.changed, summary.removed, summary.unchanged),
+        )
+        self.assertEqual(
+            [("alpha", "chemistry"), ("gamma", "health")],
+            self.conn.execute(
+                "SELECT resource_id, domain FROM resource_domains ORDER BY ALL"
+            ).fetchall(),
+        )
+        self.assertEqual(
+            [("alpha", "alpha.new")],
+            self.conn.execute("SELECT resource_id, product_id FROM resource_products").fetchall(),
+        )
+
+        summary = sync_resources(self.conn, resources[::-1])
+        self.assertFalse(summary.has_changes)
+        self.assertEqual(2, summary.unchanged)
+
+    def test_sync_timestamp(self):
+        """Test that unchanged rows keep the time they were last written."""
+        sync_resources(self.conn, RESOURCES)
+        self.conn.execute("UPDATE resources SET sync_timestamp = '2000-01-01'")
+        sync_resources(self.conn, [RESOURCES[0], dict(RESOURCES[1], name="Beta")])
+        timestamps = dict(self.conn.execute("SELECT id, sync_timestamp FROM resources").fetchall())
+        self.assertEqual(datetime(2000, 1, 1), timestamps["alpha"])
+        self.assertGreater(timestamps["beta"], datetime(2000, 1, 1))
+
+    def test_generation(self):
+        """Test that the generation only advances when a sync changes something."""
+        self.assertEqual(0, current_generation(self.conn))
+        self.assertEqual(1, sync_resources(self.conn, RESOURCES).generation)
+        self.assertEqual(1, sync_resources(self.conn, RESOURCES).generation)
+        self.assertEqual(2, sync_resources(self.conn, RESOURCES[:1]).generation)
+        bulk_load(self.conn, RESOURCES)
+        self.assertEqual(3, current_generation(self.conn))
+        create_tables(self.conn)
+        self.assertEqual(
+            [(3,)], self.conn.execute("SELECT generation FROM registry_meta").fetchall()
+        )
+
+    def test_missing_hash_column(self):
+        """Test that databases from before content hashes are upgraded and fully rewritten."""
+        conn = duckdb.connect(":memory:")
+        create_tables(conn)
+        conn.execute("ALTER TABLE resources DROP COLUMN content_hash")
+        conn.execute("INSERT INTO resources (id, name) VALUES ('alpha', 'Old')")
+        create_tables(conn)
+        self.assertEqual(["alpha"], sync_resources(conn, [{"id": "alpha"}]).changed)
+        conn.close()
+
+    def test_product_slot_columns(self):
+        """Test that product slots are loaded into typed columns."""
+        product = {
+            "id": "gamma.graph",
+            "name": "Graph",
+            "category": "GraphProduct",
+            "product_file_size": 2048,
+            "compression": "tar.gz",
+            "license": {"id": "https://example.org/license", "label": "Example"},
+            "versions": ["2", "1"],
+            "original_source": ["alpha", "beta.graph"],
+            "compatibility": [{"standard": "biolink", "version": "v4.2.5"}],
+            "warnings": "Not available",
+            "node_count": "12",
+            "edge_count": "many",
+            "is_public": True,
+            "contacts": [{"label": "Person"}],
+        }
+        sync_resources(self.conn, [{"id": "gamma", "products": [product]}])
+        row = self.conn.execute("""
+            SELECT product_file_size, compression, license.id, versions[1], original_source,
+                compatibility[1].standard, warnings, node_count, edge_count, is_public,
+                is_neo4j, contacts[1].label
+            FROM resource_products
+            """).fetchone()
+        self.assertEqual(
+            (
+                2048,
+                "tar.gz",
+                "https://example.org/license",
+                "2",
+                ["alpha", "beta.graph"],
+                "biolink",
+                ["Not available"],
+                12,
+                None,
+                True,
+                None,
+                "Person",
+            ),
+            row,
+        )
+        self.assertEqual(
+            {"id": None, "label": "CC0", "logo": None},
+            product_slot_values({"license": "CC0"})["license"],
+        )
+
+    def test_missing_product_columns(self):
+        """Test that databases from before typed product columns are rewritten on next sync."""
+        resources = [{"id": "gamma", "products": [{"id": "gamma.graph", "is_public": False}]}]
+        sync_resources(self.conn, resources)
+        self.conn.execute("ALTER TABLE resource_products DROP COLUMN is_public")
+        create_tables(self.conn)
+        self.assertEqual(["gamma"], sync_resources(self.conn, resources).changed)
+        self.assertEqual(
+            [(False,)], self.conn.execute("SELECT is_public FROM resource_products").fetchall()
+        )
+
+    def test_compatibility_views(self):
+        """Test that the JSON views keep the form the tables had before nested types."""
+        product = {"id": "alpha.graph", "curators": [{"label": "Curator"}], "license": "CC0"}
+        bulk_load(self.conn, [dict(RESOURCES[0], products=[product])])
+        row = self.conn.execute(
+            "SELECT contacts ->> '$[0].label', license_id, license_label FROM resources_json"
+        ).fetchone()
+        self.assertEqual(("Person", "https://example.org/license", "Example"), row)
+        row = self.conn.execute(
+            "SELECT curators ->> '$[0].label', license_label, contacts "
+            "FROM resource_products_json"
+        ).fetchone()
+        self.assertEqual(("Curator", "CC0", None), row)
+
+    def test_json_columns_migration(self):
+        """Test that databases with JSON contacts and split licenses are converted on open."""
+        resource = dict(RESOURCES[0], license=dict(RESOURCES[0]["license"], logo="logo.png"))
+        sync_resources(self.conn, [resource])
+        # Back to the columns of earlier releases
+        self.conn.execute("""
+            ALTER TABLE resources ALTER contacts SET DATA TYPE JSON
+            USING '[{"label": "Person", "orcid": 1234, "contact_details": [{"value": "a@b"}]}]'
+            """)
+        self.conn.execute("ALTER TABLE resources ALTER curators SET DATA TYPE JSON USING '[]'")
+        self.conn.execute("ALTER TABLE resources ADD COLUMN license_id VARCHAR")
+        self.conn.execute("ALTER TABLE resources ADD COLUMN license_label VARCHAR")
+        self.conn.execute(
+            "UPDATE resources SET license_id = license.id, license_label = license.label"
+        )
+        self.conn.execute("ALTER TABLE resources DROP COLUMN license")
+
+        create_tables(self.conn)
+        row = self.conn.execute("""
+            SELECT contacts[1].label, contacts[1].orcid, contacts[1].contact_details[1].value,
+                curators, license, content_hash
+            FROM resources
+            """).fetchone()
+        self.assertEqual(
+            (
+                "Person",
+                "1234",
+                "a@b",
+                [],
+                {"id": "https://example.org/license", "label": "Example", "logo": "logo.png"},
+                None,
+            ),
+            row,
+        )
+        self.assertEqual(
+            ("Example",), self.conn.execute("SELECT license_label FROM resources_json").fetchone()
+        )
+        self.assertEqual(["alpha"], sync_resources(self.conn, [resource]).changed)
+
+    def test_parse_date(self):
+        """Test that dates are normalized to naive UTC."""
+        self.assertEqual(datetime(2024, 1, 1, 22), parse_date("2024-01-02T00:00:00+02:00"))
+        self.assertIsNone(parse_date("not a date"))
+        self.assertIsNone(parse_date(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
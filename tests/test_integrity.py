@@ -12,6 +12,7 @@ import yaml
 
 # from kg_registry.standardize_metadata import ModifiedDumper
 # from kg_registry.utils import RESOURCE_DIRECTORY, get_data, get_new_data
+# from kg_registry.github import GitHubClient
 
 HERE = Path(__file__).parent.resolve()
 ROOT = HERE.parent
@@ -276,10 +277,8 @@ class TestIntegrity(unittest.TestCase):
 #         if not repository.startswith("https://github.com"):
 #             return None
 #         r = repository.removeprefix("https://github.com/").rstrip("/")
-#         url = f"https://api.github.com/repos/{r}"
-#         res = requests.get(url)
-#         res.raise_for_status()
-#         return res.json()
+#         # Shares the ETag cache with ``processor.py extract-contributors``
+#         return GitHubClient(cache_dir=ROOT.joinpath(".cache", "github")).get_repository(r)
 
 #     def test_repository_license(self):
 #         """Test that the repository has a license that's correct."""
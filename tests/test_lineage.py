@@ -0,0 +1,203 @@
+"""Test the lineage edges and the upstream and downstream queries."""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from kg_registry import lineage
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import create_tables, sync_resources
+from kg_registry.lineage import build_closure, downstream, drop_closure, has_closure, upstream
+from kg_registry.parquet_backend import ParquetBackend
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "drugbank",
+        "name": "DrugBank",
+        "products": [{"id": "drugbank.xml", "original_source": ["drugbank"]}],
+    },
+    {"id": "chembl", "name": "ChEMBL", "products": [{"id": "chembl.db"}]},
+    {
+        "id": "kg",
+        "name": "Drug KG",
+        "products": [
+            {
+                "id": "kg.graph",
+                "original_source": ["drugbank", "chembl"],
+                "secondary_source": ["drugbank.xml"],
+                "produced_by": ["kg.builder"],
+            },
+            {"id": "kg.builder"},
+        ],
+    },
+    {
+        "id": "kg2",
+        "name": "Drug KG 2",
+        "products": [{"id": "kg2.graph", "original_source": ["kg"]}],
+    },
+    {"id": "uberon", "name": "Uberon"},
+]
+
+
+def entities(results):
+    """Get the type, ID and depth of lineage results."""
+    return [(result["type"], result["id"], result["depth"]) for result in results]
+
+
+class TestLineage(RegistryTestCase):
+    """Test the lineage of synced resources."""
+
+    resources = RESOURCES
+
+    def edges(self, src_id):
+        """Get the edges from an entity."""
+        return self.conn.execute(
+            "SELECT relation, dst_type, dst_id FROM lineage_edges WHERE src_id = $1 ORDER BY ALL",
+            [src_id],
+        ).fetchall()
+
+    def test_edges(self):
+        """Test the edges emitted for products, their sources and processes."""
+        self.assertEqual(
+            [("has_product", "product", "kg.builder"), ("has_product", "product", "kg.graph")],
+            self.edges("kg"),
+        )
+        self.assertEqual(
+            [
+                ("original_source", "resource", "chembl"),
+                ("original_source", "resource", "drugbank"),
+                ("produced_by", "product", "kg.builder"),
+                ("secondary_source", "product", "drugbank.xml"),
+            ],
+            self.edges("kg.graph"),
+        )
+        self.assertEqual([], self.edges("uberon"))
+
+    def test_upstream(self):
+        """Test listing dependencies with the length of the shortest path to them."""
+        self.assertEqual(
+            [
+                ("product", "kg2.graph", 1),
+                ("resource", "kg", 2),
+                ("product", "kg.builder", 3),
+                ("product", "kg.graph", 3),
+                ("product", "drugbank.xml", 4),
+                ("resource", "chembl", 4),
+                ("resource", "drugbank", 4),
+                ("product", "chembl.db", 5),
+            ],
+            entities(upstream(self.conn, "kg2")),
+        )
+        self.assertEqual(
+            [("product", "kg2.graph", 1), ("resource", "kg", 2)],
+            entities(upstream(self.conn, "kg2", max_depth=2)),
+        )
+        self.assertEqual([], upstream(self.conn, "kg2", max_depth=0))
+        self.assertEqual([], upstream(self.conn, "uberon"))
+        self.assertEqual([], upstream(self.conn, "unknown"))
+
+    def test_downstream(self):
+        """Test listing dependents, through cycles and product references."""
+        self.assertEqual(
+            [
+                ("product", "drugbank.xml", 1),
+                ("product", "kg.graph", 1),
+                ("resource", "kg", 2),
+                ("product", "kg2.graph", 3),
+                ("resource", "kg2", 4),
+            ],
+            entities(downstream(self.conn, "drugbank")),
+        )
+        self.assertEqual(
+            ["chembl", "kg", "kg2"],
+            sorted(
+                result["id"]
+                for result in downstream(self.conn, "chembl.db")
+                if result["type"] == "resource"
+            ),
+        )
+
+    def test_unbounded_walk(self):
+        """Test that unbounded walks go deeper than the first bound."""
+        with mock.patch.object(lineage, "INITIAL_DEPTH", 1):
+            self.assertEqual(
+                entities(upstream(self.conn, "kg2", max_depth=100)),
+                entities(upstream(self.conn, "kg2")),
+            )
+
+    def test_closure(self):
+        """Test that the closure gives the results of the walks and follows syncs."""
+        entity_ids = ["kg2", "kg.graph", "drugbank", "uberon"]
+        queries = [(f, entity_id) for f in (upstream, downstream) for entity_id in entity_ids]
+        expected = [function(self.conn, entity_id) for function, entity_id in queries]
+        expected_depth_2 = [function(self.conn, entity_id, 2) for function, entity_id in queries]
+
+        self.assertFalse(has_closure(self.conn))
+        build_closure(self.conn)
+        self.assertTrue(has_closure(self.conn))
+        self.assertEqual(
+            expected, [function(self.conn, entity_id) for function, entity_id in queries]
+        )
+        self.assertEqual(
+            expected_depth_2,
+            [function(self.conn, entity_id, 2) for function, entity_id in queries],
+        )
+
+        resources = [dict(resource) for resource in RESOURCES]
+        resources[3]["products"] = [{"id": "kg2.graph", "original_source": ["uberon"]}]
+        sync_resources(self.conn, resources)
+        self.assertEqual(
+            [("product", "kg2.graph", 1), ("resource", "uberon", 2)],
+            entities(upstream(self.conn, "kg2")),
+        )
+
+        drop_closure(self.conn)
+        self.assertFalse(has_closure(self.conn))
+        self.assertEqual(2, len(upstream(self.conn, "kg2")))
+
+    def test_incremental_sync(self):
+        """Test that a sync replaces the edges of changed and removed resources."""
+        sync_resources(self.conn, [RESOURCES[0], dict(RESOURCES[2], products=[])])
+        self.assertEqual([], self.edges("kg"))
+        self.assertEqual([], self.edges("kg2"))
+        self.assertEqual([("original_source", "resource", "drugbank")], self.edges("drugbank.xml"))
+
+    def test_index_existing_database(self):
+        """Test that databases synced before the edges existed get them on open."""
+        self.conn.execute("DROP TABLE lineage_edges")
+        create_tables(self.conn)
+        self.assertEqual(8, len(upstream(self.conn, "kg2")))
+
+
+class TestBackendLineage(unittest.TestCase):
+    """Test the lineage methods of the backends."""
+
+    def test_duckdb_backend(self):
+        """Test lineage queries with and without the closure."""
+        with DuckDBBackend() as backend:
+            backend.sync_from_resources(RESOURCES)
+            expected = backend.downstream("drugbank", max_depth=2)
+            backend.build_lineage_closure()
+            self.assertEqual(expected, backend.downstream("drugbank", max_depth=2))
+            self.assertEqual("kg", backend.upstream("kg2")[1]["id"])
+            backend.drop_lineage_closure()
+            self.assertEqual("kg", backend.upstream("kg2")[1]["id"])
+
+    def test_parquet_backend(self):
+        """Test that the edges are rebuilt when loading an export."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with ParquetBackend(temp_dir) as backend:
+                backend.sync_from_resources(RESOURCES)
+                expected = backend.upstream("kg2")
+            with ParquetBackend() as backend:
+                backend.load_from_parquet(temp_dir)
+                self.assertEqual(expected, backend.upstream("kg2"))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
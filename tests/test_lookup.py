@@ -0,0 +1,146 @@
+"""Test the trigram index for typo-tolerant lookup."""
+
+import unittest
+from unittest import mock
+
+from kg_registry import lookup
+from kg_registry.ingest import create_tables, sync_resources
+from kg_registry.lookup import fuzzy_lookup, normalize, trigrams
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "pharmgkb",
+        "name": "PharmGKB",
+        "infores_id": "pharmgkb",
+        "products": [
+            {"id": "pharmgkb.drugs", "name": "PharmGKB Drugs"},
+            {"id": "pharmgkb.genes", "name": "PharmGKB Genes", "infores_id": "pharmgkb-genes"},
+        ],
+    },
+    {
+        "id": "rtx-kg2",
+        "name": "RTX-KG2",
+        "products": [{"id": "rtx-kg2.graph", "name": "RTX-KG2 graph"}],
+    },
+    {"id": "uberon", "name": "Uber-Anatomy Ontology"},
+]
+
+
+class TestLookup(RegistryTestCase):
+    """Test looking up entities indexed by a sync."""
+
+    resources = RESOURCES
+
+    def lookup_ids(self, text, k=10):
+        """Get the IDs of the entities matching a text."""
+        return [match["entity_id"] for match in fuzzy_lookup(self.conn, text, k)]
+
+    def assert_index_consistent(self):
+        """Assert that the postings and their counts match the entries."""
+        self.assertEqual(
+            [],
+            self.conn.execute(f"""
+                SELECT * FROM lookup_trigrams
+                FULL JOIN (
+                    SELECT trigram, COUNT(*) AS n,
+                        list({{'entry_id': entry_id, 'trigram_count': len(trigrams)}}
+                            ORDER BY entry_id) AS expected
+                    FROM (
+                        SELECT entry_id, {lookup._TRIGRAMS.format("normalized")} AS trigrams,
+                            UNNEST(trigrams) AS trigram
+                        FROM lookup_entries
+                    )
+                    GROUP BY trigram
+                )
+                USING (trigram)
+                WHERE entry_count IS DISTINCT FROM n OR postings IS DISTINCT FROM expected
+                """).fetchall(),
+        )
+
+    def test_normalize(self):
+        """Test that Python and SQL normalize and split values the same way."""
+        for text in ["PharmGKB", "rtx-kg2", "Uber-Anatomy Ontology", "Café_Straße 2", "x"]:
+            normalized = normalize(text)
+            sql_normalized, sql_trigrams = self.conn.execute(
+                f"SELECT {lookup._NORMALIZED.format('$1')} AS n, {lookup._TRIGRAMS.format('n')}",
+                [text],
+            ).fetchone()
+            self.assertEqual(sql_normalized, normalized)
+            self.assertEqual(sorted(sql_trigrams), sorted(trigrams(normalized)))
+        self.assertEqual(["  r", " rt", "rtx", "tx "], trigrams("rtx"))
+
+    def test_fuzzy_lookup(self):
+        """Test matching IDs and names despite case, punctuation and typos."""
+        self.assertEqual("pharmgkb", self.lookup_ids("pharm-gkb")[0])
+        self.assertEqual("rtx-kg2", self.lookup_ids("RTX KG2")[0])
+        self.assertEqual("uberon", self.lookup_ids("ubrn")[0])
+        self.assertEqual("uberon", self.lookup_ids("uber anatomy ontolgy")[0])
+        self.assertEqual("pharmgkb.genes", self.lookup_ids("pharmgkb genes")[0])
+        self.assertEqual(2, len(self.lookup_ids("pharmgkb", k=2)))
+        self.assertEqual([], self.lookup_ids("zzzz"))
+        self.assertEqual([], self.lookup_ids("--"))
+
+        match = fuzzy_lookup(self.conn, "PharmGKB", 1)[0]
+        self.assertEqual(
+            ("resource", "pharmgkb", "pharmgkb"),
+            (match["entity_type"], match["entity_id"], match["resource_id"]),
+        )
+        self.assertEqual((1.0, 1.0), (match["score"], match["similarity"]))
+
+    def test_one_match_per_entity(self):
+        """Test that entities matching by several values are returned once."""
+        ids = self.lookup_ids("pharmgkb")
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual("pharmgkb", ids[0])
+
+    def test_posting_budget(self):
+        """Test that lookups still find candidates when every trigram is over budget."""
+        with mock.patch.object(lookup, "MAX_POSTINGS", 0):
+            self.assertIn("uberon", self.lookup_ids("uberon"))
+
+    def test_incremental_sync(self):
+        """Test that a sync updates the entries of changed and removed resources."""
+        resources = [
+            dict(RESOURCES[0], products=[RESOURCES[0]["products"][0]]),
+            dict(RESOURCES[1], name="Reasoner KG"),
+        ]
+        sync_resources(self.conn, resources)
+        self.assertEqual("rtx-kg2", self.lookup_ids("reasoner kg")[0])
+        self.assertNotIn("uberon", self.lookup_ids("uberon"))
+        self.assertNotIn("pharmgkb.genes", self.lookup_ids("pharmgkb genes"))
+        self.assertEqual(
+            0,
+            self.conn.execute(
+                "SELECT COUNT(*) FROM lookup_entries WHERE text = 'RTX-KG2' AND kind = 'name'"
+            ).fetchone()[0],
+        )
+        self.assert_index_consistent()
+
+        sync_resources(self.conn, [])
+        for table in lookup.LOOKUP_SCHEMAS:
+            self.assertEqual(0, self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+    def test_index_existing_database(self):
+        """Test that databases synced before the index existed are indexed on open."""
+        for table in lookup.LOOKUP_SCHEMAS:
+            self.conn.execute(f"DROP TABLE {table}")
+        create_tables(self.conn)
+        self.assertEqual("uberon", self.lookup_ids("uberon")[0])
+        self.assert_index_consistent()
+
+    def test_upgrade_postings(self):
+        """Test that an index with a separate postings table is rebuilt on open."""
+        self.conn.execute("DROP TABLE lookup_trigrams")
+        self.conn.execute("CREATE TABLE lookup_trigrams (trigram VARCHAR PRIMARY KEY, n INTEGER)")
+        self.conn.execute("CREATE TABLE lookup_postings (trigram VARCHAR, entry_id BIGINT)")
+        create_tables(self.conn)
+        self.assertNotIn(
+            "lookup_postings", [row[0] for row in self.conn.execute("SHOW TABLES").fetchall()]
+        )
+        self.assertEqual("uberon", self.lookup_ids("uberon")[0])
+        self.assert_index_consistent()
+
+
+if __name__ == "__main__":
+    unittest.main()
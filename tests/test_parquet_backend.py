@@ -1,5 +1,6 @@
 """Test Parquet backend functionality."""
 
+import importlib.util
 import json
 import os
 import tempfile
@@ -103,7 +104,8 @@ class TestParquetBackend(unittest.TestCase):
 
             # Check Parquet files were created
             parquet_files = [f for f in os.listdir(self.temp_dir) if f.endswith(".parquet")]
-            self.assertEqual(len(parquet_files), 3)  # resources, domains, products
+            # resources, domains, products and the search index
+            self.assertEqual(len(parquet_files), 5)
 
             # Check resources were inserted
             resources_query = backend.conn.execute("SELECT * FROM resources")
@@ -220,7 +222,8 @@ class TestParquetBackend(unittest.TestCase):
 
             # Verify Parquet files were created
             parquet_files = [f for f in os.listdir(self.temp_dir) if f.endswith(".parquet")]
-            self.assertEqual(len(parquet_files), 3)  # resources, domains, products
+            # resources, domains, products and the search index
+            self.assertEqual(len(parquet_files), 5)
 
             # Verify data was synced by loading and querying
             backend = ParquetBackend()
@@ -273,6 +276,31 @@ class TestParquetBackend(unittest.TestCase):
         finally:
             os.unlink(yaml_file)
 
+    def test_querier_output_modes(self):
+        """Test projected queries on Parquet files in every result mode."""
+        with ParquetBackend(self.temp_dir) as backend:
+            backend.sync_from_resources(self.test_data["resources"])
+
+        with DuckDBParquetQuerier(self.temp_dir) as querier:
+            query = "SELECT id, name FROM resources ORDER BY id"
+            rows = querier.execute_query(query, output="iter", batch_size=1)
+            self.assertEqual(["test-resource-1", "test-resource-2"], [row["id"] for row in rows])
+            relation = querier.execute_query(query, output="relation")
+            self.assertEqual(["id", "name"], relation.columns)
+            results = querier.search_resources("test", columns=["id"])
+            self.assertEqual({"test-resource-1", "test-resource-2"}, {row["id"] for row in results})
+            self.assertEqual([["id"]] * 2, [list(row) for row in results])
+            if importlib.util.find_spec("pyarrow"):
+                table = querier.execute_query(query, output="arrow")
+                self.assertEqual(["id", "name"], table.column_names)
+                batches = querier.execute_query(query, output="batches", batch_size=1)
+                self.assertEqual([1, 1], [batch.num_rows for batch in batches])
+            if importlib.util.find_spec("numpy"):
+                arrays = querier.execute_query(query, output="numpy")
+                self.assertEqual(["test-resource-1", "test-resource-2"], list(arrays["id"]))
+            with self.assertRaises(ValueError):
+                querier.execute_query(query, output="csv")
+
     def test_context_manager(self):
         """Test Parquet backend as context manager."""
         with tempfile.NamedTemporaryFile(mode="w", suffix=".yml", delete=False) as f:
@@ -0,0 +1,166 @@
+"""Test the cursor pool and reads from several threads."""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.pool import CursorPool, PoolTimeout
+
+CATEGORIES = ["KnowledgeGraph", "DataSource", "Aggregator"]
+DOMAINS = ["biomedical", "chemistry", "genomics", "health", "anatomy"]
+
+RESOURCES = [
+    {
+        "id": f"resource{i}",
+        "name": f"Resource {i} {DOMAINS[i % 5]} graph",
+        "description": f"A {CATEGORIES[i % 3]} about {DOMAINS[i % 5]} and {DOMAINS[i % 2]}",
+        "category": CATEGORIES[i % 3],
+        "activity_status": "active" if i % 4 else "inactive",
+        "domains": [DOMAINS[i % 5], DOMAINS[(i + 1) % 5]],
+        "products": [
+            {
+                "id": f"resource{i}.graph",
+                "name": f"Graph {i}",
+                "original_source": [f"resource{(i * 7) % 40}", f"resource{(i + 3) % 40}.graph"],
+            }
+        ],
+    }
+    for i in range(40)
+]
+
+#: Mixed reads, as backend method name, positional and keyword arguments
+QUERIES = [
+    ("query_resources", (), {"category": "DataSource"}),
+    ("query_resources", (), {"domain": "genomics", "columns": ["id", "name"]}),
+    ("query_resources", (), {"activity_status": "active", "output": "arrow"}),
+    ("query_resources", (), {"name_contains": "chem", "output": "iter"}),
+    ("search_resources", ("graph chemistry",), {}),
+    ("search", ("anatomy",), {"limit": 5}),
+    ("fuzzy_lookup", ("resorce12",), {"k": 3}),
+    ("upstream", ("resource5",), {}),
+    ("downstream", ("resource1.graph",), {"max_depth": 3}),
+    ("get_resource_stats", (), {}),
+]
+
+
+def run(backend, name, args, kwargs):
+    """Run a read and materialize its result."""
+    result = getattr(backend, name)(*args, **kwargs)
+    if kwargs.get("output") == "arrow":
+        return result.to_pylist()
+    if kwargs.get("output") == "iter":
+        return list(result)
+    return result
+
+
+class TestCursorPool(unittest.TestCase):
+    """Test checking cursors out of the pool."""
+
+    def setUp(self):
+        """Open a connection."""
+        self.conn = duckdb.connect(":memory:")
+        self.conn.execute("CREATE TABLE t AS SELECT 1 AS x")
+        self.pool = CursorPool(self.conn, size=2, timeout=0.05)
+
+    def tearDown(self):
+        """Close the pool and the connection."""
+        self.pool.close()
+        self.conn.close()
+
+    def test_reuse(self):
+        """Test that cursors see the connection's data and are reused."""
+        for _ in range(3):
+            with self.pool.checkout() as cursor:
+                self.assertEqual((1,), cursor.execute("SELECT x FROM t").fetchone())
+        self.assertEqual(1, self.pool.opened)
+
+    def test_reentrant(self):
+        """Test that a thread holding a cursor gets it again instead of waiting."""
+        with self.pool.checkout() as cursor:
+            with self.pool.checkout() as nested:
+                self.assertIs(cursor, nested)
+        self.assertEqual(1, self.pool.opened)
+
+    def test_timeout(self):
+        """Test that checkouts wait for a free cursor up to the timeout."""
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with self.pool.checkout():
+                held.set()
+                release.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+            held.wait()
+            held.clear()
+        with self.assertRaises(PoolTimeout):
+            with self.pool.checkout():
+                pass
+        release.set()
+        for thread in threads:
+            thread.join()
+        with self.pool.checkout(timeout=1) as cursor:
+            self.assertEqual((1,), cursor.execute("SELECT x FROM t").fetchone())
+        self.assertEqual(2, self.pool.opened)
+
+    def test_close(self):
+        """Test that a closed pool hands out no more cursors."""
+        self.pool.close()
+        with self.assertRaises(duckdb.ConnectionException):
+            with self.pool.checkout():
+                pass
+
+
+class TestConcurrentReads(unittest.TestCase):
+    """Test sharing a backend between threads."""
+
+    def test_stress(self):
+        """Test that mixed reads from 32 threads give the single-threaded results."""
+        with DuckDBBackend(pool_size=8, cache_size=4) as backend:
+            backend.sync_from_resources(RESOURCES)
+            expected = [run(backend, *query) for query in QUERIES]
+
+            def worker(offset):
+                # Each thread goes through the reads in another order
+                order = [(offset + i) % len(QUERIES) for i in range(3 * len(QUERIES))]
+                return [(i, run(backend, *QUERIES[i])) for i in order]
+
+            with ThreadPoolExecutor(32) as executor:
+                for results in executor.map(worker, range(32)):
+                    for i, result in results:
+                        self.assertEqual(expected[i], result, QUERIES[i])
+            self.assertLessEqual(backend.pool.opened, 8)
+
+    def test_sync_during_reads(self):
+        """Test that reads running during syncs see one generation or the other."""
+        with DuckDBBackend(pool_size=4) as backend:
+            backend.sync_from_resources(RESOURCES)
+            counts = {len(RESOURCES), len(RESOURCES) - 10}
+            stop = threading.Event()
+
+            def sync():
+                for i in range(6):
+                    backend.sync_from_resources(RESOURCES[: len(RESOURCES) - 10 * (i % 2)])
+                stop.set()
+
+            def read():
+                seen = set()
+                while not stop.is_set():
+                    seen.add(backend.get_resource_stats()["total_resources"])
+                return seen
+
+            with ThreadPoolExecutor(5) as executor:
+                readers = [executor.submit(read) for _ in range(4)]
+                executor.submit(sync).result()
+                for reader in readers:
+                    self.assertLessEqual(reader.result(), counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
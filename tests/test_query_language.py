@@ -0,0 +1,163 @@
+"""Test the query language."""
+
+import tempfile
+import unittest
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.parquet_backend import DuckDBParquetQuerier, ParquetBackend
+from kg_registry.query_language import Clause, compile_query, normalize_query, parse_query
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "interactome",
+        "name": "Interactome KG",
+        "description": "Protein interaction networks",
+        "category": "KnowledgeGraph",
+        "activity_status": "active",
+        "domains": ["drug discovery", "proteomics"],
+        "collection": ["translator"],
+        "license": {"id": "https://example.org/cc0", "label": "CC0"},
+        "products": [{"id": "interactome.graph", "category": "GraphProduct", "format": "kgx"}],
+    },
+    {
+        "id": "drugs",
+        "name": "Drug KG",
+        "description": "Drug targets and protein binding",
+        "category": "KnowledgeGraph",
+        "activity_status": "active",
+        "domains": ["drug discovery"],
+        "products": [
+            {
+                "id": "drugs.tsv",
+                "category": "Product",
+                "format": "tsv",
+                "description": "Protein interaction scores",
+            }
+        ],
+    },
+    {
+        "id": "stubby",
+        "name": "Protein Stub",
+        "description": "Protein interaction data",
+        "category": "DataSource",
+        "activity_status": "inactive",
+        "domains": ["stub"],
+    },
+]
+
+
+class TestParse(unittest.TestCase):
+    """Test parsing and normalizing queries."""
+
+    def test_parse(self):
+        """Test each kind of clause."""
+        self.assertEqual(
+            [
+                Clause("KnowledgeGraph", "category"),
+                Clause("drug discovery", "domain"),
+                Clause("inactive", "status", negated=True),
+                Clause("protein interaction", phrase=True),
+                Clause("stub", negated=True),
+            ],
+            parse_query(
+                'Category:KnowledgeGraph domain:"drug discovery" -status:inactive '
+                '"protein interaction" -stub - ""'
+            ),
+        )
+
+    def test_errors(self):
+        """Test that unknown fields, missing values and open quotes are reported."""
+        for query in ["size:large", "category:", 'domain:"drug', '"protein']:
+            with self.subTest(query=query), self.assertRaises(ValueError):
+                parse_query(query)
+
+    def test_normalize(self):
+        """Test that the same clauses in another order or case normalize the same."""
+        normalized = normalize_query('protein -STUB format:kgx Category:KnowledgeGraph "a b"')
+        self.assertEqual('protein "a b" -stub category:knowledgegraph format:kgx', normalized)
+        self.assertEqual(
+            normalized, normalize_query('category:knowledgegraph "A B" -stub protein FORMAT:kgx')
+        )
+        self.assertEqual(normalized, normalize_query(parse_query(normalized)))
+        self.assertIs(
+            compile_query("format:kgx protein"), compile_query("protein  FORMAT:KGX protein")
+        )
+
+
+class TestCompile(RegistryTestCase):
+    """Test running compiled queries."""
+
+    resources = RESOURCES
+
+    def ids(self, query, text_index=True):
+        """Get the IDs of the resources matching a query, in order."""
+        compiled = compile_query(query, ["id"], text_index)
+        return [row["id"] for row in compiled.run(self.conn)]
+
+    def test_filters(self):
+        """Test filters on resource and product fields, and their negation."""
+        self.assertEqual(["drugs", "interactome"], self.ids("category:KnowledgeGraph"))
+        self.assertEqual(["interactome"], self.ids("category:knowledgegraph format:KGX"))
+        self.assertEqual(["drugs", "interactome"], self.ids("format:kgx format:tsv"))
+        self.assertEqual(["stubby"], self.ids('-domain:"drug discovery"'))
+        self.assertEqual(["stubby"], self.ids("-format:kgx -format:tsv"))
+        self.assertEqual(
+            ["interactome"],
+            self.ids(
+                'category:KnowledgeGraph domain:"drug discovery" format:kgx '
+                '"protein interaction" -stub'
+            ),
+        )
+        self.assertEqual(["interactome"], self.ids("collection:translator license:CC0"))
+        self.assertEqual(["drugs"], self.ids("product_category:Product status:active"))
+        self.assertEqual(["drugs", "interactome", "stubby"], self.ids(""))
+
+    def test_text(self):
+        """Test words, phrases and their negation, with and without the search tables."""
+        self.assertEqual({"stubby", "interactome", "drugs"}, set(self.ids("protein interaction")))
+        self.assertEqual({"interactome", "drugs"}, set(self.ids("protein interaction -stub")))
+        self.assertEqual(["drugs"], self.ids('"protein binding"'))
+        self.assertEqual(["drugs"], self.ids('-"interaction networks" -stub protein'))
+        self.assertEqual(["drugs"], self.ids("protein -stub -networks", text_index=False))
+        self.assertEqual(
+            ["drugs", "interactome"],
+            self.ids("category:KnowledgeGraph protein interaction", text_index=False),
+        )
+
+
+class TestBackends(unittest.TestCase):
+    """Test queries on the backends."""
+
+    def test_duckdb_backend(self):
+        """Test that results are cached by normalized query."""
+        with DuckDBBackend(cache_size=8) as backend:
+            backend.sync_from_resources(RESOURCES)
+            self.assertEqual(
+                [{"id": "drugs"}],
+                backend.find_resources("-stub protein format:tsv", columns=["id"]),
+            )
+            backend.find_resources("FORMAT:tsv protein -stub", columns=["id"])
+            self.assertEqual(1, backend.cache_stats().hits)
+            rows = backend.find_resources([Clause("stub", "domain")], output="iter")
+            self.assertEqual(["stubby"], [row["id"] for row in rows])
+
+    def test_parquet(self):
+        """Test queries on Parquet files, with and without the search index."""
+        with tempfile.TemporaryDirectory() as directory:
+            with ParquetBackend(directory) as backend:
+                backend.sync_from_resources(RESOURCES)
+                self.assertEqual(
+                    ["interactome"],
+                    [row["id"] for row in backend.find_resources("collection:translator -stub kg")],
+                )
+            with DuckDBParquetQuerier(directory) as querier:
+                query = 'collection:translator "protein interaction"'
+                self.assertEqual(["interactome"], [r["id"] for r in querier.find_resources(query)])
+                querier.has_search_index = lambda: False
+                rows = querier.find_resources("interaction -stub", columns=["id", "name"])
+                self.assertEqual([["id", "name"]] * 2, [list(row) for row in rows])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+"""Test the full-text search index and BM25 ranking."""
+
+import unittest
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import create_tables, sync_resources
+from kg_registry.search import FACETS, facet_search, search, search_resources
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "drugs",
+        "name": "Drug Graph",
+        "description": "Approved drugs and drug targets",
+        "domains": ["pharmacology"],
+        "products": [{"id": "drugs.graph", "name": "Drug graph", "description": "KGX files"}],
+    },
+    {
+        "id": "genes",
+        "name": "Gene Graph",
+        "description": "Genes, proteins and one drug",
+        "domains": ["genomics"],
+        "products": [
+            {"id": "genes.graph", "name": "Gene graph"},
+            {"id": "drugs.graph", "name": "Drug graph", "description": "KGX files"},
+        ],
+    },
+    {"id": "empty", "name": "Empty"},
+]
+
+FACET_RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha drug graph",
+        "category": "KnowledgeGraph",
+        "activity_status": "active",
+        "domains": ["health", "drug discovery"],
+        "collection": ["translator"],
+        "products": [{"id": "alpha.kgx", "format": "kgx"}, {"id": "alpha.tsv", "format": "tsv"}],
+    },
+    {
+        "id": "beta",
+        "name": "Beta drugs",
+        "category": "DataSource",
+        "activity_status": "active",
+        "domains": ["drug discovery"],
+        "products": [{"id": "beta.tsv", "format": "tsv"}],
+    },
+    {
+        "id": "gamma",
+        "name": "Gamma genes",
+        "category": "DataSource",
+        "activity_status": "inactive",
+        "domains": ["genomics"],
+        "collection": ["translator"],
+    },
+    {"id": "delta", "name": "Delta"},
+]
+
+
+class TestSearch(RegistryTestCase):
+    """Test searching the index built by a sync."""
+
+    resources = RESOURCES
+
+    def test_index(self):
+        """Test term frequencies and field lengths."""
+        self.assertEqual(
+            [("description", 1), ("name", 1)],
+            self.conn.execute(
+                "SELECT field, tf FROM search_terms "
+                "WHERE term = 'drug' AND doc_id = 'drugs' ORDER BY field"
+            ).fetchall(),
+        )
+        self.assertEqual(
+            5,
+            self.conn.execute(
+                "SELECT length FROM search_docs WHERE doc_id = 'genes' AND field = 'description'"
+            ).fetchone()[0],
+        )
+
+    def test_ranking(self):
+        """Test that documents with more occurrences of rarer terms rank first."""
+        hits = search(self.conn, "drug", doc_types=["resource"])
+        self.assertEqual(["drugs", "genes"], [hit["doc_id"] for hit in hits])
+        self.assertGreater(hits[0]["score"], hits[1]["score"])
+        self.assertEqual([], search(self.conn, "unknown"))
+        self.assertEqual([], search(self.conn, "  "))
+
+    def test_filters(self):
+        """Test restricting fields, document types and the number of hits."""
+        hits = search(self.conn, "drug", fields=["name"], doc_types=["product"])
+        self.assertEqual(
+            [("drugs.graph", "drugs"), ("drugs.graph", "genes")],
+            [(hit["doc_id"], hit["resource_id"]) for hit in hits],
+        )
+        self.assertEqual(1, len(search(self.conn, "graph", limit=1)))
+        self.assertEqual(
+            ["genes"],
+            [hit["doc_id"] for hit in search(self.conn, "genomics", fields=["domain"])],
+        )
+
+    def test_search_resources(self):
+        """Test that resources must match every term, in their own fields or a product's."""
+        self.assertEqual(
+            ["drugs", "genes"], [row["id"] for row in search_resources(self.conn, "drug graph")]
+        )
+        self.assertEqual(
+            ["genes"], [row["id"] for row in search_resources(self.conn, "PROTEINS, drug")]
+        )
+        self.assertEqual([], search_resources(self.conn, "drug empty"))
+
+    def test_incremental_sync(self):
+        """Test that a sync reindexes exactly the changed resources."""
+        resources = [dict(RESOURCES[0], description="Approved medicines"), RESOURCES[1]]
+        sync_resources(self.conn, resources)
+        self.assertEqual(
+            ["drugs", "genes"],
+            sorted({hit["resource_id"] for hit in search(self.conn, "drug", limit=None)}),
+        )
+        self.assertEqual(["drugs"], [hit["doc_id"] for hit in search(self.conn, "medicines")])
+        self.assertEqual([], search(self.conn, "empty"))
+        self.assertEqual(
+            0,
+            self.conn.execute(
+                "SELECT COUNT(*) FROM search_terms WHERE term = 'approved' AND field = 'name'"
+            ).fetchone()[0],
+        )
+
+    def test_index_existing_database(self):
+        """Test that databases synced before the index existed are indexed on open."""
+        self.conn.execute("DROP TABLE search_terms")
+        self.conn.execute("DROP TABLE search_docs")
+        create_tables(self.conn)
+        self.assertEqual(["genes"], [hit["doc_id"] for hit in search(self.conn, "proteins")])
+
+
+class TestFacetSearch(RegistryTestCase):
+    """Test faceted search over the synced resources."""
+
+    resources = FACET_RESOURCES
+
+    def test_all_resources(self):
+        """Test the counts of every facet over all resources, sorted by name."""
+        results = facet_search(self.conn, columns=["id"])
+        self.assertEqual(4, results["total"])
+        self.assertEqual(["alpha", "beta", "delta", "gamma"], [h["id"] for h in results["hits"]])
+        self.assertEqual(list(FACETS), list(results["facets"]))
+        self.assertEqual(
+            {
+                "category": {"DataSource": 2, "KnowledgeGraph": 1},
+                "domain": {"drug discovery": 2, "genomics": 1, "health": 1},
+                "activity_status": {"active": 2, "inactive": 1},
+                "collection": {"translator": 2},
+                "format": {"tsv": 2, "kgx": 1},
+            },
+            results["facets"],
+        )
+
+    def test_filters(self):
+        """Test that resources match any value of a filter and every filter."""
+        results = facet_search(
+            self.conn,
+            {"category": ["DataSource", "KnowledgeGraph"], "collection": "translator"},
+            facets=["format", "activity_status"],
+            columns=["id"],
+        )
+        self.assertEqual(["alpha", "gamma"], [h["id"] for h in results["hits"]])
+        self.assertEqual(
+            {"format": {"kgx": 1, "tsv": 1}, "activity_status": {"active": 1, "inactive": 1}},
+            results["facets"],
+        )
+        results = facet_search(self.conn, {"format": "tsv", "domain": None}, facets=["domain"])
+        self.assertEqual(2, results["total"])
+        self.assertEqual({"domain": {"drug discovery": 2, "health": 1}}, results["facets"])
+        self.assertEqual(
+            {"total": 0, "hits": [], "facets": {"category": {}}},
+            facet_search(self.conn, {"domain": "unknown"}, facets=["category"]),
+        )
+
+    def test_query_and_pages(self):
+        """Test that a query restricts and ranks the hits, and that pages share the counts."""
+        results = facet_search(self.conn, query="drug", facets=["category"], columns=["id"])
+        self.assertEqual(
+            [row["id"] for row in search_resources(self.conn, "drug")],
+            [h["id"] for h in results["hits"]],
+        )
+        self.assertEqual({"category": {"DataSource": 1, "KnowledgeGraph": 1}}, results["facets"])
+
+        page = facet_search(self.conn, limit=2, offset=1, facets=["category"])
+        self.assertEqual(4, page["total"])
+        self.assertEqual(["beta", "delta"], [h["id"] for h in page["hits"]])
+        self.assertEqual(results["hits"][0].keys(), {"id"})
+        self.assertIn("raw_data", page["hits"][0])
+
+    def test_unknown_facet(self):
+        """Test that filters and facets must be known facets."""
+        with self.assertRaises(ValueError):
+            facet_search(self.conn, {"license": "CC0"})
+        with self.assertRaises(ValueError):
+            facet_search(self.conn, facets=["license"])
+
+    def test_backend(self):
+        """Test the backend method and its cache."""
+        with DuckDBBackend(cache_size=8) as backend:
+            backend.sync_from_resources(FACET_RESOURCES)
+            expected = facet_search(backend.conn, {"domain": ["genomics"]}, query="genes")
+            self.assertEqual(
+                expected, backend.facet_search({"domain": ["genomics"]}, query="genes")
+            )
+            self.assertEqual(
+                expected, backend.facet_search({"domain": ["genomics"]}, query="GENES")
+            )
+            self.assertEqual(1, backend.cache_stats().hits)
+
+
+if __name__ == "__main__":
+    unittest.main()
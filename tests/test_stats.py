@@ -0,0 +1,134 @@
+"""Test the statistics computed at sync time."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import create_tables, sync_resources
+from kg_registry.stats import STAT_DIMENSIONS, export_stats, read_stats
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "category": "KnowledgeGraph",
+        "activity_status": "active",
+        "license": {"id": "https://example.org/cc0", "label": "CC0"},
+        "domains": ["health", "genomics"],
+        "collection": ["translator"],
+        "products": [
+            {
+                "id": "alpha.graph",
+                "category": "GraphProduct",
+                "format": "kgx",
+                "compression": "zip",
+                "product_file_size": 100,
+            },
+            {"id": "alpha.tsv", "category": "Product", "format": "tsv", "product_file_size": 300},
+            {"id": "alpha.api", "category": "ProgrammingInterface", "license": "MIT"},
+        ],
+    },
+    {
+        "id": "beta",
+        "category": "DataSource",
+        "activity_status": "active",
+        "license": "CC0",
+        "domains": ["health"],
+        "products": [{"id": "beta.tsv", "category": "Product", "format": "tsv"}],
+    },
+    {"id": "gamma", "category": "DataSource", "activity_status": "inactive"},
+]
+
+
+class TestStats(RegistryTestCase):
+    """Test the statistics tables."""
+
+    resources = RESOURCES
+
+    def test_counts(self):
+        """Test the counts of every dimension, most frequent first, without missing values."""
+        counts = read_stats(self.conn)["counts"]
+        self.assertEqual(list(STAT_DIMENSIONS), list(counts))
+        self.assertEqual({"DataSource": 2, "KnowledgeGraph": 1}, counts["category"])
+        self.assertEqual(["DataSource", "KnowledgeGraph"], list(counts["category"]))
+        self.assertEqual({"active": 2, "inactive": 1}, counts["activity_status"])
+        self.assertEqual({"CC0": 2}, counts["license"])
+        self.assertEqual({"health": 2, "genomics": 1}, counts["domain"])
+        self.assertEqual({"translator": 1}, counts["collection"])
+        self.assertEqual(
+            {"Product": 2, "GraphProduct": 1, "ProgrammingInterface": 1},
+            counts["product_category"],
+        )
+        self.assertEqual({"tsv": 2, "kgx": 1}, counts["format"])
+        self.assertEqual({"zip": 1}, counts["compression"])
+        self.assertEqual({"MIT": 1}, counts["product_license"])
+
+    def test_totals_and_field_usage(self):
+        """Test the totals, product sizes and the number of records setting each field."""
+        stats = read_stats(self.conn)
+        self.assertEqual(
+            {
+                "resources": 3,
+                "active_resources": 2,
+                "products": 4,
+                "sized_products": 2,
+                "product_file_size": 400,
+                "median_product_file_size": 200.0,
+            },
+            stats["totals"],
+        )
+        self.assertEqual(3, stats["field_usage"]["resource"]["category"])
+        self.assertEqual(1, stats["field_usage"]["resource"]["collection"])
+        self.assertEqual(4, stats["field_usage"]["product"]["id"])
+        self.assertEqual(2, stats["field_usage"]["product"]["product_file_size"])
+        self.assertEqual(1, stats["generation"])
+
+    def test_sync_updates(self):
+        """Test that syncs that change the data recompute the statistics."""
+        sync_resources(self.conn, RESOURCES[1:])
+        stats = read_stats(self.conn)
+        self.assertEqual(2, stats["generation"])
+        self.assertEqual({"DataSource": 2}, stats["counts"]["category"])
+        self.assertEqual({}, stats["counts"]["collection"])
+        self.assertEqual(0, stats["totals"]["product_file_size"])
+        self.assertIsNone(stats["totals"]["median_product_file_size"])
+
+    def test_export(self):
+        """Test writing the statistics to a JSON file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats.json")
+            stats = export_stats(self.conn, path)
+            with open(path) as file:
+                self.assertEqual(stats, json.load(file))
+
+    def test_index_existing_database(self):
+        """Test that databases synced before the statistics existed get them on open."""
+        self.conn.execute("DROP TABLE registry_counts")
+        create_tables(self.conn)
+        self.assertEqual({"zip": 1}, read_stats(self.conn)["counts"]["compression"])
+
+
+class TestBackendStats(unittest.TestCase):
+    """Test the statistics methods of the DuckDB backend."""
+
+    def test_duckdb_backend(self):
+        """Test that resource statistics are read from the precomputed tables."""
+        with DuckDBBackend(cache_size=8) as backend:
+            self.assertEqual(0, backend.get_resource_stats()["total_resources"])
+            backend.sync_from_resources(RESOURCES)
+            self.assertEqual(
+                {
+                    "total_resources": 3,
+                    "active_resources": 2,
+                    "by_category": {"DataSource": 2, "KnowledgeGraph": 1},
+                    "by_domain": {"health": 2, "genomics": 1},
+                },
+                backend.get_resource_stats(),
+            )
+            self.assertEqual(4, backend.get_registry_stats()["totals"]["products"])
+
+
+if __name__ == "__main__":
+    unittest.main()
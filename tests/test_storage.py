@@ -0,0 +1,131 @@
+"""Test the storage profiles of the source records."""
+
+import tempfile
+import unittest
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import create_tables, current_storage, sync_resources
+from kg_registry.parquet_backend import DuckDBParquetQuerier, ParquetBackend
+from kg_registry.stats import read_stats
+from kg_registry.storage import STORAGE_PROFILES, read_record
+from tests.registry_case import RegistryTestCase
+
+RESOURCES = [
+    {
+        "id": "alpha",
+        "name": "Alpha KG",
+        "category": "KnowledgeGraph",
+        "activity_status": "active",
+        "infores_id": "infores:alpha",
+        "collection": ["translator"],
+        "domains": ["health"],
+        "products": [
+            {"id": "alpha.graph", "category": "GraphProduct", "format": "kgx", "node_count": 10},
+            {"id": "alpha.tsv", "category": "Product", "format": "tsv", "infores_id": "x"},
+        ],
+        "publications": [{"id": "doi:10.1/alpha", "title": "Alpha"}],
+    },
+    {"id": "beta", "name": "Beta", "category": "DataSource", "products": None},
+    {"id": "gamma", "name": "Gamma", "category": "DataSource", "domains": ["health"]},
+]
+
+
+class TestStorage(RegistryTestCase):
+    """Test storing the records in each profile."""
+
+    def test_round_trip(self):
+        """Test that every profile gives the records back as they were synced."""
+        for profile in STORAGE_PROFILES:
+            with self.subTest(profile=profile):
+                sync_resources(self.conn, RESOURCES, profile)
+                self.assertEqual(profile, current_storage(self.conn))
+                for resource in RESOURCES:
+                    self.assertEqual(resource, read_record(self.conn, resource["id"]))
+                self.assertIsNone(read_record(self.conn, "missing"))
+
+    def test_columns(self):
+        """Test what each profile keeps in raw_data."""
+        sync_resources(self.conn, RESOURCES, "compact")
+        raw_data, products = self.conn.execute(
+            "SELECT raw_data, products FROM resources WHERE id = 'alpha'"
+        ).fetchone()
+        self.assertIn('"products": null', raw_data)
+        self.assertIn("alpha.graph", products)
+
+        sync_resources(self.conn, RESOURCES, "full")
+        raw_data = self.conn.execute(
+            "SELECT raw_data FROM resources WHERE id = 'alpha'"
+        ).fetchone()[0]
+        self.assertIn("alpha.graph", raw_data)
+
+    def test_profile_change(self):
+        """Test that changing the profile rewrites every resource, and later syncs keep it."""
+        sync_resources(self.conn, RESOURCES)
+        self.assertEqual("full", current_storage(self.conn))
+        summary = sync_resources(self.conn, RESOURCES, "compact")
+        self.assertEqual((3, 2), (len(summary.changed), summary.generation))
+        summary = sync_resources(self.conn, RESOURCES[:2])
+        self.assertEqual((["gamma"], 0), (summary.removed, len(summary.changed)))
+        self.assertEqual("compact", current_storage(self.conn))
+        with self.assertRaises(ValueError):
+            sync_resources(self.conn, RESOURCES, "compressed")
+        with self.assertRaises(ValueError):
+            sync_resources(self.conn, RESOURCES, "tiny")
+
+    def test_queries(self):
+        """Test that statistics, facets and lookups are the same in every profile."""
+        results = []
+        for profile in STORAGE_PROFILES:
+            sync_resources(self.conn, RESOURCES, profile)
+            stats = read_stats(self.conn)
+            del stats["generation"], stats["synced_at"]
+            results.append(stats)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual({"translator": 1}, results[1]["counts"]["collection"])
+        self.assertEqual(3, results[1]["field_usage"]["resource"]["id"])
+        self.assertEqual(1, results[1]["field_usage"]["product"]["node_count"])
+
+    def test_existing_database(self):
+        """Test that databases synced before the record columns get them filled on open."""
+        sync_resources(self.conn, RESOURCES)
+        for name in ("collection", "infores_id", "record_fields"):
+            self.conn.execute(f"ALTER TABLE resources DROP COLUMN {name}")
+        create_tables(self.conn)
+        self.assertEqual(
+            (["translator"], "infores:alpha", list(RESOURCES[0])),
+            self.conn.execute(
+                "SELECT collection, infores_id, record_fields FROM resources WHERE id = 'alpha'"
+            ).fetchone(),
+        )
+
+
+class TestBackends(unittest.TestCase):
+    """Test reading records from the backends."""
+
+    def test_duckdb_backend(self):
+        """Test that the profile is kept by later syncs and records are read by ID."""
+        with DuckDBBackend() as backend:
+            backend.sync_from_resources(RESOURCES, storage_profile="compact")
+            backend.sync_from_resources(RESOURCES[:1])
+            self.assertEqual(RESOURCES[0], backend.get_record("alpha"))
+            self.assertIsNone(backend.get_record("beta"))
+            self.assertEqual(
+                ["alpha"],
+                [m["entity_id"] for m in backend.fuzzy_lookup("infores:alpha", k=1)],
+            )
+
+    def test_parquet(self):
+        """Test records read from Parquet files in every profile."""
+        for profile in STORAGE_PROFILES:
+            with self.subTest(profile=profile), tempfile.TemporaryDirectory() as directory:
+                with ParquetBackend(directory) as backend:
+                    backend.sync_from_resources(RESOURCES, profile)
+                with DuckDBParquetQuerier(directory) as querier:
+                    self.assertEqual(RESOURCES[0], querier.get_record("alpha"))
+                with ParquetBackend() as backend:
+                    backend.load_from_parquet(directory)
+                    self.assertEqual(RESOURCES[1], backend.get_record("beta"))
+
+
+if __name__ == "__main__":
+    unittest.main()
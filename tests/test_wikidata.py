@@ -0,0 +1,137 @@
+"""Test batched and cached Wikidata access against a local fake endpoint."""
+
+import email.utils
+import json
+import re
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from kg_registry.utils import WikidataClient
+
+TEMPLATE = """
+SELECT ?item ?label WHERE {
+    {{VALUES}}
+    ?item rdfs:label ?label .
+}
+"""
+
+
+class FakeSparqlHandler(BaseHTTPRequestHandler):
+    """Answer label queries for any ``wd:`` item in the ``VALUES`` block."""
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Silence request logging."""
+
+    def do_GET(self):  # noqa: N802
+        """Handle a GET request."""
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)["query"][0]
+        server.queries.append(query)
+        if server.throttle:
+            server.throttle -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        items = re.findall(r"wd:(Q\d+)", query)
+        bindings = [
+            {
+                "item": {"type": "uri", "value": f"http://www.wikidata.org/entity/{item}"},
+                "label": {"type": "literal", "value": f"Label of {item}"},
+            }
+            for item in items
+            if item != "Q0"
+        ]
+        payload = json.dumps({"results": {"bindings": bindings}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/sparql-results+json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestWikidataClient(unittest.TestCase):
+    """Test the Wikidata client."""
+
+    def setUp(self):
+        """Start the fake endpoint."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSparqlHandler)
+        self.server.queries = []
+        self.server.throttle = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/sparql"
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Stop the fake endpoint."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def _client(self, **kwargs):
+        return WikidataClient(endpoint=self.endpoint, cache_dir=self.cache_dir.name, **kwargs)
+
+    def test_batching(self):
+        """Test that per-value lookups are merged into VALUES blocks."""
+        values = [f"wd:Q{i}" for i in range(1, 11)]
+        results = self._client(batch_size=4).query_values(TEMPLATE, "item", values)
+        self.assertEqual(3, len(self.server.queries))
+        self.assertIn("VALUES ?item { wd:Q1 wd:Q2 wd:Q3 wd:Q4 }", self.server.queries[0])
+        self.assertEqual(values, list(results))
+        self.assertEqual("Label of Q7", results["wd:Q7"][0]["label"]["value"])
+
+    def test_per_value_cache(self):
+        """Test that only values missing from the cache are queried."""
+        client = self._client()
+        client.query_values(TEMPLATE, "item", ["wd:Q1", "wd:Q2", "wd:Q0"])
+        results = client.query_values(TEMPLATE, "item", ["wd:Q2", "wd:Q0", "wd:Q3"])
+        self.assertEqual(2, len(self.server.queries))
+        self.assertIn("VALUES ?item { wd:Q3 }", self.server.queries[1])
+        self.assertEqual([], results["wd:Q0"])
+
+    def test_query_cache_normalized(self):
+        """Test that whitespace differences share a cache entry."""
+        client = self._client()
+        client.query("SELECT ?item WHERE { VALUES ?item { wd:Q1 } }")
+        client.query("SELECT ?item\n  WHERE {\n VALUES ?item { wd:Q1 }\n}")
+        self.assertEqual(1, len(self.server.queries))
+
+    def test_ttl(self):
+        """Test that expired entries are queried again."""
+        client = self._client(ttl=0)
+        client.query("SELECT ?item WHERE { VALUES ?item { wd:Q1 } }")
+        client.query("SELECT ?item WHERE { VALUES ?item { wd:Q1 } }")
+        self.assertEqual(2, len(self.server.queries))
+
+    def test_offline(self):
+        """Test that offline mode serves expired entries and never hits the network."""
+        self._client().query_values(TEMPLATE, "item", ["wd:Q1"])
+        offline = self._client(ttl=0, offline=True)
+        results = offline.query_values(TEMPLATE, "item", ["wd:Q1"])
+        self.assertEqual("Label of Q1", results["wd:Q1"][0]["label"]["value"])
+        with self.assertRaises(LookupError):
+            offline.query_values(TEMPLATE, "item", ["wd:Q2"])
+        self.assertEqual(1, len(self.server.queries))
+
+    def test_retry_after(self):
+        """Test that throttled requests are retried."""
+        self.server.throttle = 2
+        bindings = self._client().query("SELECT ?item WHERE { VALUES ?item { wd:Q1 } }")
+        self.assertEqual(1, len(bindings))
+        self.assertEqual(3, len(self.server.queries))
+
+    def test_retry_after_header(self):
+        """Test reading delays and dates from Retry-After, and backing off on bad ones."""
+        self.assertEqual(5.0, WikidataClient._retry_after("5", 0))
+        self.assertEqual(4.0, WikidataClient._retry_after("not a date", 2))
+        self.assertEqual(0.0, WikidataClient._retry_after("Wed, 21 Oct 2015 07:28:00 -0000", 0))
+        later = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(30, WikidataClient._retry_after(later, 0), delta=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Benchmark the network stages of the KG-Registry build against a simulated server.
+
+A local asyncio HTTP server stands in for the internet. It listens on one port
+per simulated host, each with its own latency, and can answer with missing
+Content-Length, redirects, HTML pages, 4xx/5xx errors, slow responses that
+exceed the client timeout, and throttling. It also fakes the parts of the
+GitHub API and the Wikidata SPARQL endpoint used by the registry tooling.
+
+A synthetic registry whose products point at that server is run through:
+
+- file-sizes: ``util/retrieve-file-sizes.py`` (``update_product_file_sizes``)
+- check-urls: ``util/processor.py check-urls``
+- github: ``GitHubClient.get_contributors_many``
+- wikidata: ``WikidataClient.query_values``
+
+For each stage, throughput, p50/p95 request latency and total wall time are
+reported, and can be saved as JSON to compare against a previous run:
+
+    python util/benchmark-network.py --output bench.json
+    python util/benchmark-network.py --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import importlib.util
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+import yaml
+
+HERE = Path(__file__).parent.resolve()
+
+# Add the source directory to Python path
+sys.path.insert(0, str(HERE.parent / "src"))
+
+from kg_registry.github import GitHubClient
+from kg_registry.utils import WikidataClient
+
+STAGES = ["file-sizes", "check-urls", "github", "wikidata"]
+
+#: Default share of products answered by each scenario
+DEFAULT_MIX = {
+    "ok": 60,
+    "nolength": 8,
+    "redirect": 8,
+    "html": 8,
+    "notfound": 5,
+    "error": 5,
+    "slow": 2,
+    "throttle": 4,
+}
+
+GITHUB_PAGE_SIZE = 30
+GITHUB_CONTRIBUTORS = 75
+
+
+class SimulatedServer:
+    """Asyncio HTTP server simulating several hosts with different behaviour."""
+
+    def __init__(
+        self,
+        latencies: List[float],
+        hang: float = 2.0,
+        throttle_rate: Optional[float] = None,
+    ):
+        """Initialize the server.
+
+        Args:
+            latencies: Added latency in seconds for each simulated host
+            hang: How long ``/slow`` responses take, in seconds
+            throttle_rate: If given, answer 429 once a host exceeds this many requests/s
+        """
+        self.latencies = latencies
+        self.hang = hang
+        self.throttle_rate = throttle_rate
+        self.ports: List[int] = []
+        self._buckets: Dict[int, List[float]] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._servers: List[asyncio.AbstractServer] = []
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def url(self, host: int) -> str:
+        """Get the base URL of a simulated host."""
+        return f"http://127.0.0.1:{self.ports[host]}"
+
+    async def _start(self):
+        for host in range(len(self.latencies)):
+            server = await asyncio.start_server(
+                lambda r, w, host=host: self._serve(r, w, host), "127.0.0.1", 0
+            )
+            self._servers.append(server)
+            self.ports.append(server.sockets[0].getsockname()[1])
+
+    async def _stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+
+    async def _serve(self, reader, writer, host: int):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                await asyncio.sleep(self.latencies[host])
+                status, response_headers, body = await self._route(host, method, target, headers)
+                close = "Content-Length" not in response_headers
+                if close:
+                    response_headers["Connection"] = "close"
+                head = f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+                head += "".join(f"{k}: {v}\r\n" for k, v in response_headers.items()) + "\r\n"
+                writer.write(head.encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _throttled(self, host: int) -> bool:
+        if not self.throttle_rate:
+            return False
+        now = time.monotonic()
+        window = [t for t in self._buckets.get(host, []) if now - t < 1.0]
+        window.append(now)
+        self._buckets[host] = window
+        return len(window) > self.throttle_rate
+
+    async def _route(self, host: int, method: str, target: str, headers: Dict[str, str]):
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")
+        kind = parts[0]
+
+        if self._throttled(host) or kind == "throttle":
+            return 429, {"Retry-After": "1", "Content-Length": "0"}, b""
+        if kind == "ok":
+            body = b"\0" * int(parts[1])
+            return 200, {"Content-Type": "application/gzip", "Content-Length": str(len(body))}, body
+        if kind == "nolength":
+            return 200, {"Content-Type": "application/octet-stream"}, b"\0" * 512
+        if kind == "redirect":
+            hops = int(parts[1])
+            rest = "/".join(parts[2:])
+            location = f"/redirect/{hops - 1}/{rest}" if hops > 1 else f"/{rest}"
+            return 302, {"Location": location, "Content-Length": "0"}, b""
+        if kind == "html":
+            body = b"<html><body>Landing page</body></html>"
+            return 200, {"Content-Type": "text/html", "Content-Length": str(len(body))}, body
+        if kind == "status":
+            return int(parts[1]), {"Content-Length": "0"}, b""
+        if kind == "slow":
+            await asyncio.sleep(self.hang)
+            return 200, {"Content-Type": "application/gzip", "Content-Length": "0"}, b""
+        if kind == "repos":
+            return self._github(parts, url.query, headers)
+        if kind == "sparql":
+            return self._sparql(url.query)
+        return 404, {"Content-Length": "0"}, b""
+
+    def _github(self, parts: List[str], query: str, headers: Dict[str, str]):
+        rate_headers = {
+            "X-RateLimit-Remaining": "4999",
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+            "Content-Type": "application/json",
+        }
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        page = int(params.get("page", 1))
+        etag = f'"{"-".join(parts)}-{page}"'
+        if headers.get("if-none-match") == etag:
+            return 304, {**rate_headers, "Content-Length": "0"}, b""
+        if len(parts) == 3:
+            body = json.dumps({"full_name": f"{parts[1]}/{parts[2]}", "license": None})
+        else:
+            start = (page - 1) * GITHUB_PAGE_SIZE
+            logins = range(start, min(start + GITHUB_PAGE_SIZE, GITHUB_CONTRIBUTORS))
+            body = json.dumps([{"login": f"user{i}", "contributions": 1} for i in logins])
+            if start + GITHUB_PAGE_SIZE < GITHUB_CONTRIBUTORS:
+                base = f"http://{headers.get('host')}/{'/'.join(parts)}"
+                rate_headers["Link"] = f'<{base}?per_page=100&page={page + 1}>; rel="next"'
+        payload = body.encode()
+        return 200, {**rate_headers, "ETag": etag, "Content-Length": str(len(payload))}, payload
+
+    def _sparql(self, query: str):
+        sparql = parse_qs(query).get("query", [""])[0]
+        bindings = [
+            {
+                "item": {"type": "uri", "value": f"http://www.wikidata.org/entity/{item}"},
+                "label": {"type": "literal", "value": f"Item {item}"},
+            }
+            for item in re.findall(r"wd:(Q\d+)", sparql)
+        ]
+        payload = json.dumps({"results": {"bindings": bindings}}).encode()
+        return 200, {"Content-Type": "application/json", "Content-Length": str(len(payload))}, payload
+
+
+_REASONS = {
+    200: "OK",
+    302: "Found",
+    304: "Not Modified",
+    403: "Forbidden",
+    404: "Not Found",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+def generate_registry(
+    server: SimulatedServer,
+    n_resources: int,
+    products_per_resource: int,
+    mix: Dict[str, int],
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Generate a synthetic registry whose products point at the simulated server.
+
+    Products are spread round-robin over the simulated hosts, and each is
+    assigned a scenario at random according to ``mix``.
+    """
+    rng = random.Random(seed)
+    scenarios = list(mix)
+    weights = [mix[s] for s in scenarios]
+    resources = []
+    counter = 0
+    for r in range(n_resources):
+        products = []
+        for p in range(products_per_resource):
+            base = server.url(counter % len(server.ports))
+            counter += 1
+            name = f"r{r}-p{p}"
+            scenario = rng.choices(scenarios, weights)[0]
+            path = {
+                "ok": f"ok/{rng.randint(1, 64) * 1024}/{name}",
+                "nolength": f"nolength/{name}",
+                "redirect": f"redirect/2/ok/2048/{name}",
+                "html": f"html/{name}",
+                "notfound": f"status/404/{name}",
+                "error": f"status/500/{name}",
+                "slow": f"slow/{name}",
+                "throttle": f"throttle/{name}",
+            }[scenario]
+            url = f"{base}/{path}"
+            products.append(
+                {
+                    "id": f"resource{r}.{name}",
+                    "name": f"Product {name}",
+                    "category": "GraphProduct",
+                    "product_url": url,
+                    "resource_purl": url,
+                }
+            )
+        resources.append(
+            {
+                "id": f"resource{r}",
+                "name": f"Resource {r}",
+                "category": "KnowledgeGraph",
+                "repository": f"https://github.com/org/repo{r}",
+                "products": products,
+            }
+        )
+    return {"resources": resources}
+
+
+def _load_util(name: str, filename: str):
+    """Import one of the scripts in ``util/`` as a module."""
+    spec = importlib.util.spec_from_file_location(name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def record_request_latencies():
+    """Record the latency of every request made through ``requests`` while active."""
+    samples: List[float] = []
+    lock = threading.Lock()
+    original = requests.sessions.Session.request
+
+    def _timed(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, method, url, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append(elapsed)
+
+    requests.sessions.Session.request = _timed
+    try:
+        yield samples
+    finally:
+        requests.sessions.Session.request = original
+
+
+def _percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_stage(name: str, func: Callable[[], int]) -> Dict[str, Any]:
+    """Run a stage and summarize its timing.
+
+    Args:
+        name: Stage name
+        func: Callable running the stage and returning the number of items processed
+
+    Returns:
+        Dictionary of timing statistics
+    """
+    with record_request_latencies() as samples, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        items = func()
+        wall = time.perf_counter() - start
+    return {
+        "stage": name,
+        "items": items,
+        "requests": len(samples),
+        "wall_time_s": wall,
+        "throughput_items_per_s": items / wall if wall else None,
+        "p50_latency_s": _percentile(samples, 0.50),
+        "p95_latency_s": _percentile(samples, 0.95),
+    }
+
+
+def _stage_file_sizes(data: Dict[str, Any], timeout: float) -> int:
+    module = _load_util("retrieve_file_sizes", "retrieve-file-sizes.py")
+    module.REQUEST_TIMEOUT = timeout
+    data = copy.deepcopy(data)
+    module.update_product_file_sizes(data)
+    return sum(len(r["products"]) for r in data["resources"])
+
+
+def _stage_check_urls(data: Dict[str, Any]) -> int:
+    module = _load_util("processor", "processor.py")
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            module.check_urls(copy.deepcopy(data["resources"]), None)
+        except SystemExit:
+            pass  # failures are expected for the error scenarios
+    return sum(len(r["products"]) for r in data["resources"])
+
+
+def _stage_github(server: SimulatedServer, n_repos: int, workers: int) -> int:
+    client = GitHubClient(token="", api_url=server.url(0), max_workers=workers)
+    client.get_contributors_many(f"org/repo{i}" for i in range(n_repos))
+    return n_repos
+
+
+def _stage_wikidata(server: SimulatedServer, n_values: int, batch_size: int) -> int:
+    client = WikidataClient(endpoint=f"{server.url(0)}/sparql", cache_dir=None)
+    template = "SELECT ?item ?label WHERE { {{VALUES}} ?item rdfs:label ?label }"
+    client.query_values(template, "item", [f"wd:Q{i}" for i in range(n_values)], batch_size)
+    return n_values
+
+
+def _format(value: Optional[float], scale: float = 1.0, unit: str = "") -> str:
+    return "-" if value is None else f"{value * scale:.1f}{unit}"
+
+
+def print_report(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    """Print a table of stage results, with changes relative to a baseline run."""
+    previous = {r["stage"]: r for r in (baseline or {}).get("stages", [])}
+    header = f"{'stage':<12}{'items':>7}{'reqs':>7}{'wall':>10}{'items/s':>10}{'p50':>10}{'p95':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (
+            f"{r['stage']:<12}{r['items']:>7}{r['requests']:>7}"
+            f"{_format(r['wall_time_s'], 1, 's'):>10}{_format(r['throughput_items_per_s']):>10}"
+            f"{_format(r['p50_latency_s'], 1000, 'ms'):>10}"
+            f"{_format(r['p95_latency_s'], 1000, 'ms'):>10}"
+        )
+        before = previous.get(r["stage"])
+        if before and before["wall_time_s"]:
+            change = (r["wall_time_s"] - before["wall_time_s"]) / before["wall_time_s"]
+            line += f"  ({change:+.0%} wall vs baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark network stages against a simulated HTTP server",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("--resources", type=int, default=25, help="Number of synthetic resources")
+    parser.add_argument("--products", type=int, default=4, help="Products per resource")
+    parser.add_argument(
+        "--latency",
+        default="0.005,0.02,0.05,0.1",
+        help="Comma-separated latency in seconds of each simulated host",
+    )
+    parser.add_argument(
+        "--mix",
+        default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+        help="Comma-separated scenario=weight pairs for product URLs",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=1.0, help="Client timeout used for file-size probes"
+    )
+    parser.add_argument(
+        "--hang", type=float, default=2.0, help="Duration of simulated slow responses"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=None, help="Per-host requests/s before 429s"
+    )
+    parser.add_argument("--repos", type=int, default=50, help="Repositories for the github stage")
+    parser.add_argument("--workers", type=int, default=8, help="Workers for the github stage")
+    parser.add_argument(
+        "--wikidata-values", type=int, default=1000, help="Values for the wikidata stage"
+    )
+    parser.add_argument("--batch-size", type=int, default=200, help="Wikidata VALUES batch size")
+    parser.add_argument(
+        "--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the registry")
+    parser.add_argument("--write-registry", help="Write the synthetic registry to this YAML file")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results of a previous run")
+    args = parser.parse_args()
+
+    latencies = [float(x) for x in args.latency.split(",")]
+    mix = {k: int(v) for k, v in (pair.split("=") for pair in args.mix.split(","))}
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    with SimulatedServer(latencies, hang=args.hang, throttle_rate=args.throttle_rate) as server:
+        data = generate_registry(server, args.resources, args.products, mix, args.seed)
+        if args.write_registry:
+            with open(args.write_registry, "w") as f:
+                yaml.dump(data, f, default_flow_style=False)
+
+        runners = {
+            "file-sizes": lambda: _stage_file_sizes(data, args.timeout),
+            "check-urls": lambda: _stage_check_urls(data),
+            "github": lambda: _stage_github(server, args.repos, args.workers),
+            "wikidata": lambda: _stage_wikidata(server, args.wikidata_values, args.batch_size),
+        }
+        results = []
+        for stage in stages:
+            print(f"Running {stage}...", file=sys.stderr)
+            results.append(run_stage(stage, runners[stage]))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        config = {k: v for k, v in vars(args).items() if k not in {"output", "baseline"}}
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "stages": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark syncing the registry YAML into the DuckDB and Parquet backends.
+
+Synthetic registries of increasing size are written to a temporary directory
+and synced into ``DuckDBBackend`` (a database file) and ``ParquetBackend``
+(including the Parquet export). For each size, the time to parse the YAML (the
+same for both backends, so it is measured once), the time each backend takes
+to load its tables, the time DuckDB takes to re-sync the registry unchanged
+and with 1% of its resources changed, and the mean time of a fuzzy lookup of a
+misspelled resource or product name after that sync are reported, and can be
+saved as JSON to compare against a previous run:
+
+    python util/benchmark-sync.py --output bench.json
+    python util/benchmark-sync.py --sizes 250,10000 --baseline bench.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+HERE = Path(__file__).parent.resolve()
+
+# Add the source directory to Python path
+sys.path.insert(0, str(HERE.parent / "src"))
+
+from kg_registry.duckdb_backend import DuckDBBackend
+from kg_registry.ingest import load_resources
+from kg_registry.parquet_backend import ParquetBackend
+
+DEFAULT_SIZES = [250, 10_000, 100_000]
+
+CATEGORIES = ["KnowledgeGraph", "DataSource", "Aggregator", "OntologyResource"]
+DOMAINS = ["biomedical", "genomics", "chemistry", "health", "microbiology", "organisms"]
+PRODUCT_CATEGORIES = ["GraphProduct", "Product", "DataModelProduct", "ProgrammingInterface"]
+
+#: Number of fuzzy lookups timed per size
+LOOKUPS = 50
+
+
+def generate_registry(n_resources: int, seed: int = 0) -> Dict[str, Any]:
+    """Generate a synthetic registry shaped like ``registry/kgs.yml``.
+
+    Args:
+        n_resources: Number of resources
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        Registry with a ``resources`` list
+    """
+    rng = random.Random(seed)
+    resources = []
+    for i in range(n_resources):
+        resource_id = f"resource-{i}"
+        resources.append(
+            {
+                "id": resource_id,
+                "name": f"Resource {i}",
+                "description": f"Synthetic resource {i} for benchmarking the sync. " * 3,
+                "category": rng.choice(CATEGORIES),
+                "activity_status": "active" if rng.random() < 0.8 else "inactive",
+                "homepage_url": f"https://example.org/{resource_id}",
+                "repository": f"https://github.com/example/{resource_id}",
+                "creation_date": "2024-02-12T00:00:00Z",
+                "last_modified_date": "2025-06-01T00:00:00Z",
+                "license": {"id": "https://creativecommons.org/licenses/by/4.0/", "label": "CC-BY"},
+                "domains": rng.sample(DOMAINS, rng.randint(1, 3)),
+                "contacts": [
+                    {
+                        "category": "Individual",
+                        "label": f"Person {i}",
+                        "contact_details": [
+                            {"contact_type": "email", "value": f"person{i}@example.org"}
+                        ],
+                    }
+                ],
+                "products": [
+                    {
+                        "id": f"{resource_id}.product-{j}",
+                        "name": f"Product {j} of resource {i}",
+                        "category": rng.choice(PRODUCT_CATEGORIES),
+                        "description": "Synthetic product",
+                        "format": "kgx",
+                        "product_url": f"https://example.org/{resource_id}/{j}.tar.gz",
+                    }
+                    for j in range(rng.randint(0, 4))
+                ],
+                "layout": "resource_detail",
+            }
+        )
+    return {"resources": resources}
+
+
+def _time(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_size(
+    n_resources: int, directory: Path, memory_limit: Optional[str] = None
+) -> Dict[str, Any]:
+    """Benchmark both backends on a registry of a given size.
+
+    Args:
+        n_resources: Number of resources
+        directory: Scratch directory
+        memory_limit: DuckDB memory limit, such as ``2GB`` (default: DuckDB's)
+
+    Returns:
+        Timings in seconds
+    """
+    yaml_file = directory / f"registry-{n_resources}.yml"
+    with open(yaml_file, "w") as f:
+        yaml.dump(
+            generate_registry(n_resources),
+            f,
+            Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+        )
+
+    result: Dict[str, Any] = {"resources": n_resources}
+    start = time.perf_counter()
+    resources = load_resources(str(yaml_file))
+    result["parse"] = time.perf_counter() - start
+
+    db_path = directory / f"registry-{n_resources}.duckdb"
+    with DuckDBBackend(str(db_path), memory_limit=memory_limit) as backend:
+        result["duckdb_load"] = _time(lambda: backend.sync_from_resources(resources))
+        result["duckdb_resync"] = _time(lambda: backend.sync_from_resources(resources))
+        for resource in resources[:: max(len(resources) // 100, 1)]:
+            resource["name"] += " (renamed)"
+        result["duckdb_update"] = _time(lambda: backend.sync_from_resources(resources))
+        rng = random.Random(0)
+        queries = [
+            rng.choice([f"resorce {i}", f"Product 1 of resurce {i}", f"rsrc-{i}"])
+            for i in rng.sample(range(n_resources), min(LOOKUPS, n_resources))
+        ]
+        backend.fuzzy_lookup(queries[0])
+        start = time.perf_counter()
+        for query in queries:
+            backend.fuzzy_lookup(query)
+        result["duckdb_lookup"] = (time.perf_counter() - start) / len(queries)
+
+    parquet_dir = directory / f"parquet-{n_resources}"
+    with ParquetBackend(str(parquet_dir)) as backend:
+        if memory_limit:
+            backend.conn.execute(f"SET memory_limit = '{memory_limit}'")
+        result["parquet_load"] = _time(lambda: backend.sync_from_resources(resources))
+    return result
+
+
+COLUMNS = [
+    ("parse", "parse YAML"),
+    ("duckdb_load", "duckdb load"),
+    ("parquet_load", "parquet load"),
+    ("duckdb_resync", "duckdb unchanged"),
+    ("duckdb_update", "duckdb 1% changed"),
+    ("duckdb_lookup", "duckdb lookup"),
+]
+
+
+def print_report(results: List[Dict[str, Any]], baseline: Optional[List[Dict[str, Any]]] = None):
+    """Print a table of timings, with the change against a baseline if given."""
+    previous = {row["resources"]: row for row in baseline or []}
+    print(f"{'resources':>10}  " + "  ".join(f"{label:>18}" for _, label in COLUMNS))
+    for row in results:
+        cells = []
+        for key, _ in COLUMNS:
+            # Lookups take milliseconds
+            cell = f"{row[key] * 1000:.1f}ms" if key == "duckdb_lookup" else f"{row[key]:.3f}s"
+            before = previous.get(row["resources"], {}).get(key)
+            if before:
+                cell += f" ({(row[key] - before) / before:+.0%})"
+            cells.append(f"{cell:>18}")
+        rate = row["resources"] / row["duckdb_load"] if row["duckdb_load"] else float("inf")
+        print(f"{row['resources']:>10}  " + "  ".join(cells) + f"  {rate:,.0f} resources/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated registry sizes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        help="DuckDB memory limit, such as 2GB, for machines where the default runs out",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results from a previous --output")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm up, so one-time setup is not charged to the first size
+        run_size(10, Path(directory), args.memory_limit)
+        for size in sizes:
+            results.append(run_size(size, Path(directory), args.memory_limit))
+            print(f"Finished {size} resources", file=sys.stderr)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
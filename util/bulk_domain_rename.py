@@ -6,31 +6,36 @@ Author: `Charles Tapley Hoyt <https://cthoyt.com>`_.
 """
 
 import pathlib
+import sys
 
 import click
 
 HERE = pathlib.Path(__file__).parent.resolve()
 RESOURCE_DIRECTORY = HERE.parent.joinpath("resource").resolve()
 
+sys.path.insert(0, str(HERE.parent / "src"))
+
+from kg_registry.frontmatter_patch import REMOVE, FrontmatterDocument, Patch  # noqa: E402
+
 
 @click.command()
 @click.argument("old_label")
 @click.argument("new_label")
 def main(old_label: str, new_label: str):
     """Rename domains across all resources."""
-    old_line = f"domain: {old_label}"
-    new_line = f"domain: {new_label}"
-
-    for path in RESOURCE_DIRECTORY.glob("*.md"):
-        with path.open() as file:
-            lines = [line.rstrip("\n") for line in file]
-
-        with path.open("w") as file:
-            for line in lines:
-                if line == old_line:
-                    print(new_line, file=file)
-                else:
-                    print(line, file=file)
+    for path in RESOURCE_DIRECTORY.glob("*/*.md"):
+        # Only Resource pages, not product pages
+        if path.stem != path.parent.name:
+            continue
+        document = FrontmatterDocument.load(path)
+        domains = document.data.get("domains") or []
+        if old_label not in domains:
+            continue
+        if new_label in domains:
+            document.apply(Patch(f"domains[={old_label}]", op=REMOVE))
+        else:
+            document.apply(Patch(f"domains[={old_label}]", new_label))
+        path.write_text(document.render(), encoding="utf-8")
 
 
 if __name__ == "__main__":
@@ -1,42 +1,45 @@
-"""Script to count the number of resources and products in the registry YAML file."""
-
-import yaml
-from collections import Counter
-
-with open("registry/kgs.yml") as f:
-    data = yaml.safe_load(f)
-
-format_counter = Counter()
-resource_category_counter = Counter()
-product_category_counter = Counter()
-total_resources = 0
-total_products = 0
-
-for resource in data.get("resources", []):
-    total_resources += 1
-    category = resource.get("category", "Unknown")
-    resource_category_counter[category] += 1
-    
-    for product in resource.get("products", []):
-        total_products += 1
-        product_category = product.get("category", "Unknown")
-        product_category_counter[product_category] += 1
-        
-        fmt = product.get("format")
-        if fmt:
-            format_counter[fmt] += 1
-
-print("Resource counts by category:")
-for category, count in resource_category_counter.most_common():
-    print(f"{category}: {count}")
-print(f"Total resources: {total_resources}\n")
-
-print("Product counts by category:")
-for category, count in product_category_counter.most_common():
-    print(f"{category}: {count}")
-print(f"Total products: {total_products}\n")
-
-print("Format counts:")
-for fmt, count in format_counter.most_common():
-    print(f"{fmt}: {count}")
-print(f"Total formats: {sum(format_counter.values())}")
\ No newline at end of file
+"""Script to count the number of resources and products in the registry.
+
+Reads the statistics that ``python -m kg_registry.cli duckdb sync`` exports to
+``registry/stats.json``, and only computes them from the YAML file when that
+file does not exist yet.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+STATS_FILE = Path("registry/stats.json")
+
+if STATS_FILE.exists():
+    with open(STATS_FILE) as f:
+        stats = json.load(f)
+else:
+    sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+    from kg_registry.duckdb_backend import DuckDBBackend
+
+    with DuckDBBackend() as backend:
+        backend.sync_from_yaml("registry/kgs.yml")
+        stats = backend.get_registry_stats()
+
+totals = stats["totals"]
+counts = stats["counts"]
+
+
+def print_counts(title, counter, total=None):
+    """Print counts, most frequent first, with those without a value as Unknown."""
+    print(f"{title}:")
+    for value, count in counter.items():
+        print(f"{value}: {count}")
+    if total is not None and total > sum(counter.values()):
+        print(f"Unknown: {total - sum(counter.values())}")
+
+
+print_counts("Resource counts by category", counts["category"], totals["resources"])
+print(f"Total resources: {totals['resources']}\n")
+
+print_counts("Product counts by category", counts["product_category"], totals["products"])
+print(f"Total products: {totals['products']}\n")
+
+print_counts("Format counts", counts["format"])
+print(f"Total formats: {sum(counts['format'].values())}")
@@ -97,7 +97,7 @@ def main():
             {
                 "id": kg['id'],
                 "name": kg['name'],
-                "domains": json.loads(kg['raw_data']).get('domains', []),
+                "domains": kg['domains'],
                 "homepage_url": kg['homepage_url']
             }
             for kg in backend.query_resources(
@@ -7,6 +7,7 @@ import datetime
 
 import frontmatter
 import yaml
+from collections import defaultdict
 from copy import deepcopy
 from frontmatter.util import u
 from linkml.validator import validate
@@ -21,6 +22,10 @@ SOURCE_SCHEMA_PATH = ROOT.joinpath(
     "src", "kg_registry", "kg_registry_schema", "schema", "kg_registry_schema.yaml")
 SCHEMA_PATH = ROOT.joinpath("src", "kg_registry", "kg_registry_schema", "kg_registry_schema.json")
 
+sys.path.insert(0, str(ROOT / "src"))
+
+from kg_registry.frontmatter_patch import APPEND, REMOVE, Patch, patch_files, resource_path  # noqa: E402
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -156,8 +161,14 @@ def concat_resource_yaml(args):
     * Propagates derived products to the source Resource pages
     * Adds a logo to the license metadata if it exists
     * Creates stub Resource pages for sources mentioned in products but don't have a page yet
+
+    Changes to existing Resource pages are collected as frontmatter patches and
+    applied at the end, so each page is written at most once.
     """
 
+    # Maps Resource page path to the patches to apply to it
+    page_patches = defaultdict(list)
+
     def decorate_metadata(objs):
         """
         Add the logo corresponding to the given object's license (if it has one).
@@ -327,31 +338,27 @@ def concat_resource_yaml(args):
                     try:
                         # Load existing resource metadata
                         (metadata, md) = load_md(resource_file)
-                        if "products" not in metadata:
-                            metadata["products"] = []
-                        elif not isinstance(metadata["products"], list):
-                            # Convert to list if it's not already
-                            metadata["products"] = [metadata["products"]
-                                                    ] if metadata["products"] else []
-
-                        # Make sure dates are in the correct format
-                        if "creation_date" not in metadata:
-                            metadata["creation_date"] = datetime.datetime.now().strftime("%Y-%m-%dT00:00:00Z")
-                        if "last_modified_date" not in metadata:
-                            metadata["last_modified_date"] = datetime.datetime.now().strftime("%Y-%m-%dT00:00:00Z")
-                        
-                        # Normalize dates
-                        metadata = normalize_date_fields(metadata)
+                        patches = []
+
+                        # Make sure dates are present and in the correct format
+                        now = datetime.datetime.now().strftime("%Y-%m-%dT00:00:00Z")
+                        dates = normalize_date_fields(
+                            {field: metadata.get(field) or now
+                             for field in ["creation_date", "last_modified_date"]})
+                        for field, value in dates.items():
+                            if metadata.get(field) != value:
+                                patches.append(Patch(field, value))
 
                         # Get existing product IDs
                         existing_product_ids = set()
-                        for prod in metadata["products"]:
+                        products = metadata.get("products")
+                        for prod in products if isinstance(products, list) else []:
                             if isinstance(prod, dict) and "id" in prod:
                                 existing_product_ids.add(prod["id"])
 
                         # Add missing stub products
                         added_products = 0
-                        for product_id in resource_product_map[resource_id]:
+                        for product_id in sorted(resource_product_map[resource_id]):
                             if product_id not in existing_product_ids:
                                 # Create a stub product
                                 stub_product = {
@@ -360,17 +367,12 @@ def concat_resource_yaml(args):
                                     "description": f"Automatically generated stub product. Please update with accurate information.",
                                     "category": "DataModelProduct"  # Default category, can be updated later
                                 }
-                                metadata["products"].append(stub_product)
+                                patches.append(Patch("products", stub_product, APPEND))
                                 added_products += 1
 
                         if added_products > 0:
+                            page_patches[resource_file].extend(patches)
                             print(f"Added {added_products} stub products to {resource_id}")
-                            # Write updated metadata back to file
-                            with open(resource_file, "w") as f:
-                                f.write("---\n")
-                                yaml.dump(metadata, f)
-                                f.write("---\n")
-                                f.write(md)
                     except Exception as e:
                         print(f"Error updating products for {resource_id}: {str(e)}")
 
@@ -444,18 +446,10 @@ def concat_resource_yaml(args):
                     obj["domains"] = ["stub"]
 
                     # Update the resource page file
-                    fn = f"resource/{obj['id']}/{obj['id']}.md"
-                    try:
-                        (metadata, md) = load_md(fn)
-                        if "domains" in metadata and metadata["domains"] == ["other"]:
-                            metadata["domains"] = ["stub"]
-                            with open(fn, "w") as f:
-                                f.write("---\n" + yaml.dump(metadata) + "---\n" + md)
-                            updated_count += 1
-                            print(
-                                f"Updated domain for stub resource {obj['id']} from 'other' to 'stub'")
-                    except Exception as e:
-                        print(f"Error updating domain for resource {obj['id']}: {str(e)}")
+                    fn = resource_path(obj["id"], ROOT / "resource")
+                    page_patches[fn].append(Patch("domains[=other]", "stub"))
+                    updated_count += 1
+                    print(f"Updated domain for stub resource {obj['id']} from 'other' to 'stub'")
 
         if updated_count > 0:
             print(f"Updated domains for {updated_count} stub resources from 'other' to 'stub'")
@@ -507,38 +501,14 @@ def concat_resource_yaml(args):
                 if len(unique_products) < len(obj["products"]):
                     print(
                         f"Removed {len(obj['products']) - len(unique_products)} duplicate products from {obj['id']}")
+                    kept = {id(product) for product in unique_products}
+                    duplicates = [i for i, product in enumerate(obj["products"]) if id(product) not in kept]
                     obj["products"] = unique_products
 
-                    # Update the resource page file
-                    fn = f"resource/{obj['id']}/{obj['id']}.md"
-                    try:
-                        (metadata, md) = load_md(fn)
-                        if "products" in metadata:
-                            # Ensure products is a list
-                            if not isinstance(metadata["products"], list):
-                                metadata["products"] = [metadata["products"]
-                                                        ] if metadata["products"] else []
-
-                            # Deduplicate the products in the metadata
-                            unique_metadata_products = []
-                            metadata_product_ids = set()
-
-                            for product in metadata["products"]:
-                                if isinstance(product, dict) and "id" in product:
-                                    product_id = product["id"]
-                                    if product_id not in metadata_product_ids:
-                                        metadata_product_ids.add(product_id)
-                                        unique_metadata_products.append(product)
-                                else:
-                                    # For products without ID, keep them all
-                                    unique_metadata_products.append(product)
-
-                            if len(unique_metadata_products) < len(metadata["products"]):
-                                metadata["products"] = unique_metadata_products
-                                with open(fn, "w") as f:
-                                    f.write("---\n" + yaml.dump(metadata) + "---\n" + md)
-                    except Exception as e:
-                        print(f"Error updating resource file {fn}: {str(e)}")
+                    # Update the resource page file, removing from the end so positions stay valid
+                    fn = resource_path(obj["id"], ROOT / "resource")
+                    for i in reversed(duplicates):
+                        page_patches[fn].append(Patch(f"products[{i}]", op=REMOVE))
 
         # Now update the concatenated list of resources
         # And write newly added products to their respective Resource pages
@@ -574,34 +544,10 @@ def concat_resource_yaml(args):
                             obj["products"].append(product)
                             total_written += 1
 
-                    # Write to the respective Resource page
-                    fn = f"resource/{obj['id']}/{obj['id']}.md"
-                    (metadata, md) = load_md(fn)
-                    if "products" not in metadata:
-                        metadata["products"] = []
-                    elif not isinstance(metadata["products"], list):
-                        metadata["products"] = [metadata["products"]
-                                                ] if metadata["products"] else []
-
-                    # Check if a product with the same ID already exists in the Resource page
-                    metadata_product_exists = False
-                    if "id" in product:
-                        product_id = product["id"]
-                        for existing_product in metadata["products"]:
-                            if isinstance(existing_product, dict) and "id" in existing_product and existing_product["id"] == product_id:
-                                metadata_product_exists = True
-                                break
-
-                        if not metadata_product_exists:
-                            metadata["products"].append(product)
-                            with open(fn, "w") as f:
-                                f.write("---\n" + yaml.dump(metadata) + "---\n" + md)
-                    else:
-                        # Fall back to full object comparison if no ID exists
-                        if product not in metadata["products"]:
-                            metadata["products"].append(product)
-                            with open(fn, "w") as f:
-                                f.write("---\n" + yaml.dump(metadata) + "---\n" + md)
+                    # Write to the respective Resource page, unless it already lists
+                    # a product with the same ID (or an identical product without one)
+                    fn = resource_path(obj["id"], ROOT / "resource")
+                    page_patches[fn].append(Patch("products", product, APPEND))
 
                 if total_written > 0:
                     print(f" Wrote {str(total_written)} product(s) to {obj['id']} entry")
@@ -639,6 +585,10 @@ def concat_resource_yaml(args):
     # Update domains of existing stub resources
     update_stub_domains(objs)
 
+    # Write all changes to existing Resource pages, each page at most once
+    written = patch_files(page_patches)
+    print(f"Updated {sum(written.values())} Resource pages")
+
     with open(args.output, "w") as f:
         f.write(yaml.dump(cfg))
     return cfg
@@ -7,57 +7,55 @@ Author: `Charles Tapley Hoyt <https://cthoyt.com>`_.
 """
 
 import pathlib
+import sys
 from functools import cache
-from io import StringIO
 from typing import Union
 
 import click
 import pandas as pd
-import yaml
 from tqdm import tqdm
 
 HERE = pathlib.Path(__file__).parent.resolve()
 RESOURCE_DIRECTORY = HERE.parent.joinpath("resource").resolve()
 
+sys.path.insert(0, str(HERE.parent / "src"))
+
+from kg_registry.frontmatter_patch import FrontmatterDocument, Patch  # noqa: E402
+
+
+def _github_handle(contact: dict) -> Union[str, None]:
+    """Get the GitHub handle from a contact's details."""
+    for detail in contact.get("contact_details") or []:
+        if detail.get("contact_type") == "github":
+            return detail.get("value")
+    return None
+
 
 def update_orcid(path: Union[str, pathlib.Path]) -> None:
     """Update the given markdown file."""
-    with open(path) as file:
-        lines = [line.rstrip("\n") for line in file]
-
-    assert lines[0] == "---"
-    idx = min(i for i, line in enumerate(lines[1:], start=1) if line == "---")
-
-    # Load the data like it is YAML
-    data = yaml.safe_load(StringIO("\n".join(lines[1:idx])))
-
-    contact = data.get("contact", {})
-    if "orcid" in contact:
-        return  # already available!
-
-    github_handle = contact.get("github")
-    if github_handle is None:
-        tqdm.write(
-            f"Issue getting GitHub handle for {data['id']} for {contact.get('label')} ({contact.get('email')})"
-        )
-        return
-
-    orcid = get_github_to_orcid().get(github_handle)
-    if orcid is None:
-        tqdm.write(
-            f"Issue getting ORCID for {data['id']} with GitHub handle @{github_handle}"
-        )
-        return
-
-    with open(path, "w") as file:
-        print("---", file=file)
-        for line in lines[1:idx]:
-            print(line, file=file)
-            if line.startswith("  github:"):
-                print(f"  orcid: {orcid}", file=file)
-        print("---", file=file)
-        for line in lines[idx + 1 :]:
-            print(line, file=file)
+    document = FrontmatterDocument.load(path)
+    data = document.data
+
+    for i, contact in enumerate(data.get("contacts") or []):
+        if "orcid" in contact:
+            continue  # already available!
+
+        github_handle = _github_handle(contact)
+        if github_handle is None:
+            tqdm.write(f"Issue getting GitHub handle for {data['id']} for {contact.get('label')}")
+            continue
+
+        orcid = get_github_to_orcid().get(github_handle)
+        if orcid is None:
+            tqdm.write(
+                f"Issue getting ORCID for {data['id']} with GitHub handle @{github_handle}"
+            )
+            continue
+
+        document.apply(Patch(f"contacts[{i}].orcid", orcid))
+
+    if document.changed:
+        pathlib.Path(path).write_text(document.render(), encoding="utf-8")
 
 
 @cache
@@ -70,8 +68,10 @@ def get_github_to_orcid() -> dict[str, str]:
 
 @click.command()
 def main():
-    for path in tqdm(RESOURCE_DIRECTORY.glob("*.md")):
-        update_orcid(path)
+    for path in tqdm(RESOURCE_DIRECTORY.glob("*/*.md")):
+        # Only Resource pages, not product pages
+        if path.stem == path.parent.name:
+            update_orcid(path)
 
 
 if __name__ == "__main__":
@@ -3,13 +3,18 @@
 import argparse
 import logging
 import sys
-import time
 from contextlib import closing
 from json import dumps
+from pathlib import Path
 
 import requests
 import yaml
-from SPARQLWrapper import JSON, SPARQLWrapper
+
+# Add the source directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kg_registry.consistency import SparqlConsistencyChecker, load_registry_graph
+from kg_registry.github import GitHubClient
 
 __author__ = "cjm"
 
@@ -39,6 +44,27 @@ def main():
         "sparql-compare",
         help="Run SPARQL commands against the db to generate a " "consistency report",
     )
+    parser_n.add_argument(
+        "--endpoint",
+        default="http://sparql.hegroup.org/sparql",
+        help="SPARQL endpoint to compare against",
+    )
+    parser_n.add_argument(
+        "--graph",
+        help="Compare against a local RDF file (e.g. registry/kgs.jsonld) instead of an endpoint",
+    )
+    parser_n.add_argument(
+        "--batch-size", type=int, default=200, help="Number of resources per query"
+    )
+    parser_n.add_argument(
+        "--workers", type=int, default=4, help="Maximum number of concurrent queries"
+    )
+    parser_n.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Report format",
+    )
     parser_n.set_defaults(function=sparql_compare_all)
 
     parser_n = subparsers.add_parser("extract-context", help="Extracts JSON-LD context")
@@ -48,6 +74,18 @@ def main():
         "extract-contributors",
         help="Queries github API for metadata about contributors",
     )
+    parser_n.add_argument(
+        "--token",
+        help="GitHub token (defaults to the GITHUB_TOKEN environment variable)",
+    )
+    parser_n.add_argument(
+        "--cache-dir",
+        default=".cache/github",
+        help="Directory for the ETag cache of GitHub responses",
+    )
+    parser_n.add_argument(
+        "--workers", type=int, default=8, help="Maximum number of concurrent requests"
+    )
     parser_n.set_defaults(function=write_all_contributors)
 
     args = parser.parse_args()
@@ -125,40 +163,44 @@ def write_all_contributors(resources, args):
     Query github API for all contributors to a resource,
     write results as json
     """
-    results = []
+    client = GitHubClient(
+        token=args.token, cache_dir=args.cache_dir or None, max_workers=args.workers
+    )
+    repo_paths = {}
     for ont_obj in resources:
         id = ont_obj["id"]
-        logging.info("Getting info for {}".format(id))
         repo_path = get_repo_path(ont_obj)
         if repo_path is not None:
-            contribs = list(get_resource_contributors(repo_path))
-            print("CONTRIBS({})=={}".format(id, contribs))
-            for c in contribs:
-                print("#{}\t{}\n".format(id, c["login"]))
-            results.append(dict(id=id, contributors=contribs))
+            repo_paths[id] = repo_path
         else:
-            logging.warn("No repo_path declared for {}".format(id))
+            logging.warning("No repo_path declared for {}".format(id))
+
+    logging.info("Getting contributors for {} repositories".format(len(repo_paths)))
+    contributors = client.get_contributors_many(repo_paths.values())
+
+    results = []
+    for id, repo_path in repo_paths.items():
+        contribs = contributors.get(repo_path, [])
+        print("CONTRIBS({})=={}".format(id, contribs))
+        for c in contribs:
+            print("#{}\t{}\n".format(id, c["login"]))
+        results.append(dict(id=id, contributors=contribs))
     print(dumps(results, sort_keys=True, indent=4, separators=(",", ": ")))
 
 
-def get_resource_contributors(repo_path):
+def get_resource_contributors(repo_path, client=None):
     """
     Get individual contributors to a org/repo_path
     repo_path is a string "org/repo"
     """
-    url = "https://api.github.com/repos/{}/contributors".format(repo_path)
-    # TODO: allow use of oauth token;
-    # GH has a quota for non-logged in API calls
-    time.sleep(3)
-    with closing(requests.get(url, stream=False)) as resp:
-        ok = resp.status_code == 200
-        if ok:
-            results = resp.json()
-            logging.info("RESP={}".format(results))
-            return results
-        else:
-            logging.error("Failed: {}".format(url))
-            return []
+    client = client or GitHubClient()
+    try:
+        results = client.get_contributors(repo_path)
+    except requests.RequestException:
+        logging.error("Failed: {}".format(repo_path))
+        return []
+    logging.info("RESP={}".format(results))
+    return results
 
 
 def get_repo_path(ont_obj):
@@ -183,38 +225,25 @@ def get_repo_path(ont_obj):
         return None
 
 
-def run_sparql(obj, p, expected_value, q):
+def sparql_compare_all(resources, args):
     """
-    Generate a SPARQL statement using query q and parameter p, and expect 'expected_value' as the
-    result. Print out a message indicating whether the there is or is not a match for the given object
+    Compare local metadata for all resources against a SPARQL endpoint
+    or a local RDF graph, and write a consistency report to STDOUT
     """
-    sparql = SPARQLWrapper("http://sparql.hegroup.org/sparql")
-    sparql.setQuery(q)
-    sparql.setReturnFormat(JSON)
-    results = sparql.query().convert()
-
-    id = obj["id"]
-    got_value = False
-    is_match = False
-    vs = []
-
-    for result in results["results"]["bindings"]:
-        got_value = True
-        v = result[p]["value"]
-        vs.append(str(v))
-        if v == expected_value:
-            is_match = True
-
-    if got_value and is_match:
-        msg = "CONSISTENT"
-    elif got_value and not is_match:
-        if expected_value == "":
-            msg = "UNDECLARED_LOCAL: REMOTE:" + ",".join(vs)
-        else:
-            msg = "INCONSISTENT: REMOTE:" + ",".join(vs) + " != LOCAL:" + expected_value
+    if args.graph:
+        checker = SparqlConsistencyChecker(
+            graph=load_registry_graph(args.graph), batch_size=args.batch_size
+        )
+    else:
+        checker = SparqlConsistencyChecker(
+            endpoint=args.endpoint, batch_size=args.batch_size, max_workers=args.workers
+        )
+    results = checker.compare(resources)
+    if args.format == "json":
+        print(dumps(checker.to_report(results), sort_keys=True, indent=4, separators=(",", ": ")))
     else:
-        msg = "UNDECLARED_REMOTE"
-    print(id + " " + p + " " + msg)
+        for result in results:
+            print(result.to_text())
 
 
 if __name__ == "__main__":
@@ -5,10 +5,15 @@ import sys
 import pathlib
 import requests
 import yaml
-import frontmatter
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
 
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / "src"))
+
+from kg_registry.frontmatter_patch import APPEND, FrontmatterDocument, Patch, resource_path
+
+RESOURCE_DIRECTORY = pathlib.Path("resource")
+
 # Configuration
 REQUEST_TIMEOUT = 10  # seconds
 EXCLUDED_CATEGORIES = ['GraphicalInterface', 'ProgrammingInterface']
@@ -147,6 +152,9 @@ def should_skip_product(product: Dict[str, Any]) -> bool:
 def write_file_sizes_to_resource_files(updated_products: Dict[str, List[Dict[str, Any]]]) -> None:
     """
     Write updated file sizes back to the original resource files.
+
+    Changes are applied as surgical frontmatter patches, so each resource file is
+    read and written at most once and only the changed lines differ.
     
     Args:
         updated_products: Dictionary mapping resource_id to list of updated products
@@ -158,65 +166,36 @@ def write_file_sizes_to_resource_files(updated_products: Dict[str, List[Dict[str
     print(f"\n💾 Writing file sizes back to {len(updated_products)} resource files...")
     
     for resource_id, products in updated_products.items():
-        resource_file = f"resource/{resource_id}/{resource_id}.md"
+        resource_file = resource_path(resource_id, RESOURCE_DIRECTORY)
         
+        if not resource_file.exists():
+            print(f"  ⚠️  Resource file not found: {resource_file}")
+            continue
+
         try:
-            # Check if the resource file exists
-            if not pathlib.Path(resource_file).exists():
-                print(f"  ⚠️  Resource file not found: {resource_file}")
-                continue
-                
-            # Load the resource file
-            with open(resource_file, 'r', encoding='utf-8') as f:
-                post = frontmatter.load(f)
-                
-            metadata = post.metadata
-            content = post.content
-            
-            # Update products with file sizes
-            if 'products' not in metadata:
-                continue
-                
-            updated_count = 0
-            products_list = metadata.get('products')
-            if isinstance(products_list, list):
-                for product in products_list:
-                    if isinstance(product, dict) and 'id' in product:
-                        # Find matching updated product
-                        for updated_product in products:
-                            if updated_product.get('id') == product['id']:
-                                updated_this_product = False
-                                
-                                # Update file size if we don't already have one
-                                if 'product_file_size' in updated_product and 'product_file_size' not in product:
-                                    product['product_file_size'] = updated_product['product_file_size']
-                                    updated_this_product = True
-                                
-                                # Update warnings if there are new ones
-                                if 'warnings' in updated_product:
-                                    if 'warnings' not in product:
-                                        product['warnings'] = []
-                                    elif not isinstance(product['warnings'], list):
-                                        product['warnings'] = []
-                                    
-                                    # Add new warnings that aren't already present
-                                    for warning in updated_product['warnings']:
-                                        if warning not in product['warnings']:
-                                            product['warnings'].append(warning)
-                                            updated_this_product = True
-                                
-                                if updated_this_product:
-                                    updated_count += 1
-                                
-            if updated_count > 0:
-                # Write back to file
-                with open(resource_file, 'w', encoding='utf-8') as f:
-                    f.write("---\n")
-                    yaml.dump(metadata, f, default_flow_style=False, allow_unicode=True)
-                    f.write("---\n")
-                    f.write(content)
-                    
-                print(f"  ✅ Updated {updated_count} products in {resource_file}")
+            document = FrontmatterDocument.load(resource_file)
+            updated_ids = set()
+            for product in products:
+                product_id = product.get('id')
+                if not product_id:
+                    continue
+                selector = f"products[id={product_id}]"
+                patches = []
+                if 'product_file_size' in product:
+                    patches.append(Patch(f"{selector}.product_file_size", product['product_file_size']))
+                for warning in product.get('warnings', []):
+                    patches.append(Patch(f"{selector}.warnings", warning, APPEND))
+                for patch in patches:
+                    try:
+                        if document.apply(patch):
+                            updated_ids.add(product_id)
+                    except KeyError:
+                        # Product is not listed on the resource page (e.g. propagated)
+                        break
+
+            if updated_ids:
+                resource_file.write_text(document.render(), encoding='utf-8')
+                print(f"  ✅ Updated {len(updated_ids)} products in {resource_file}")
             else:
                 print(f"  ℹ️  No updates needed for {resource_file}")
                 